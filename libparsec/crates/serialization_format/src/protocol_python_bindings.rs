@@ -108,8 +108,16 @@ fn quote_versioned_cmds(
 
             #[pymethods]
             impl AnyCmdReq {
+                /// Any contiguous buffer is accepted (e.g. `bytes`, `bytearray` or `memoryview`),
+                /// so that the server doesn't have to copy the request body into a `bytes` object.
                 #[staticmethod]
-                fn load(py: Python, raw: &[u8]) -> PyResult<Py<PyAny>> {
+                fn load(py: Python, raw: ::pyo3::buffer::PyBuffer<u8>) -> PyResult<Py<PyAny>> {
+                    let raw = raw
+                        .as_slice(py)
+                        .ok_or_else(|| PyValueError::new_err("Buffer must be contiguous"))?;
+                    // SAFETY: `ReadOnlyCell<u8>` is transparent over `u8`, and the buffer cannot
+                    // be modified while we are holding the GIL.
+                    let raw = unsafe { std::slice::from_raw_parts(raw.as_ptr() as *const u8, raw.len()) };
                     let cmd = #protocol_versioned_cmds_path::AnyCmdReq::load(raw).map_err(|e| PyValueError::new_err(e.to_string()))?;
                     match cmd {
                         #(
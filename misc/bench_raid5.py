@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+"""
+Microbenchmark of the CPU cost of the RAID5 blockstore chunking & checksum.
+
+Compares the current implementation with the previous one (kept below for reference)
+on block creation (split + checksum) and degraded read (rebuild of a missing chunk).
+
+Must be run from the server's environment, e.g. `python misc/bench_raid5.py`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import struct
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from parsec.components.raid5_blockstore import (
+    generate_checksum_chunk,
+    rebuild_block_from_chunks,
+    split_block_in_chunks,
+)
+
+MiB = 1024 * 1024
+
+
+# Previous implementation, used as the baseline
+
+
+def _legacy_xor_buffers(*buffers: bytes) -> bytes:
+    buff_len = len(buffers[0])
+    xored = int.from_bytes(buffers[0], sys.byteorder)
+    for buff in buffers[1:]:
+        assert len(buff) == buff_len
+        xored ^= int.from_bytes(buff, sys.byteorder)
+    return xored.to_bytes(buff_len, sys.byteorder)
+
+
+def legacy_split_block_in_chunks(block: bytes, nb_chunks: int) -> list[bytes]:
+    payload_size = len(block) + 4
+    chunk_len = payload_size // nb_chunks
+    if nb_chunks * chunk_len < payload_size:
+        chunk_len += 1
+    padding_len = chunk_len * nb_chunks - payload_size
+
+    payload = struct.pack("!I", len(block)) + block + b"\x00" * padding_len
+
+    return [payload[chunk_len * i : chunk_len * (i + 1)] for i in range(nb_chunks)]
+
+
+def legacy_generate_checksum_chunk(chunks: list[bytes]) -> bytes:
+    return _legacy_xor_buffers(*chunks)
+
+
+def legacy_rebuild_block_from_chunks(
+    chunks: list[bytes | None], checksum_chunk: bytes | None
+) -> bytes:
+    valid_chunks = [chunk for chunk in chunks if chunk is not None]
+    try:
+        missing_chunk_id = next(index for index, chunk in enumerate(chunks) if chunk is None)
+        assert checksum_chunk is not None
+        chunks[missing_chunk_id] = _legacy_xor_buffers(*valid_chunks, checksum_chunk)
+    except StopIteration:
+        pass
+    payload = b"".join(chunks)  # type: ignore
+    (block_len,) = struct.unpack("!I", payload[:4])
+    return payload[4 : 4 + block_len]
+
+
+type Split = Callable[[bytes, int], list[bytes]]
+type Checksum = Callable[[list[bytes]], bytes]
+type Rebuild = Callable[[list[bytes | None], bytes | None], bytes]
+
+
+def cpu_ms_per_mib(fn: Callable[[], object], block_size: int, rounds: int) -> float:
+    fn()  # Warm-up
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+    elapsed = time.process_time() - start
+    return elapsed * 1000 / (rounds * block_size / MiB)
+
+
+def bench(
+    split: Split, checksum: Checksum, rebuild: Rebuild, block_size: int, nodes: int, rounds: int
+) -> tuple[float, float]:
+    block = os.urandom(block_size)
+    nb_chunks = nodes - 1
+
+    def _create() -> None:
+        chunks = split(block, nb_chunks)
+        checksum(chunks)
+
+    chunks = split(block, nb_chunks)
+    checksum_chunk = checksum(chunks)
+
+    def _degraded_read() -> None:
+        degraded_chunks: list[bytes | None] = list(chunks)
+        degraded_chunks[0] = None
+        assert rebuild(degraded_chunks, checksum_chunk) == block
+
+    return (
+        cpu_ms_per_mib(_create, block_size, rounds),
+        cpu_ms_per_mib(_degraded_read, block_size, rounds),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--block-size", type=int, default=512 * 1024, help="Block size in bytes")
+    parser.add_argument("--nodes", type=int, default=3, help="Number of RAID5 nodes")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    assert args.nodes >= 2
+
+    print(f"Block size: {args.block_size} bytes, {args.nodes} nodes, {args.rounds} rounds")
+    print(f"{'':10} {'create (CPU ms/MiB)':>20} {'degraded read (CPU ms/MiB)':>28}")
+    for name, split, checksum, rebuild in (
+        (
+            "before",
+            legacy_split_block_in_chunks,
+            legacy_generate_checksum_chunk,
+            legacy_rebuild_block_from_chunks,
+        ),
+        ("after", split_block_in_chunks, generate_checksum_chunk, rebuild_block_from_chunks),
+    ):
+        create, degraded_read = bench(
+            split, checksum, rebuild, args.block_size, args.nodes, args.rounds
+        )
+        print(f"{name:10} {create:>20.3f} {degraded_read:>28.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+"""
+Microbenchmark of the CPU cost of reading the body of an RPC request.
+
+Compares the current implementation with the previous one (kept below for reference)
+on a typical upload (e.g. a `block_create` request), both with `Content-Length` and
+in chunk-encoding mode.
+
+Must be run from the server's environment, e.g. `python misc/bench_rpc_body.py`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from fastapi import HTTPException, Request
+from starlette.requests import ClientDisconnect
+from starlette.types import Message
+
+from parsec.asgi.rpc import MAX_CONTENT_LENGTH, _rpc_get_body_with_limit_check
+
+MiB = 1024 * 1024
+
+
+# Previous implementation, used as the baseline
+
+
+async def legacy_rpc_get_body_with_limit_check(request: Request) -> bytes:
+    try:
+        content_length = int(request.headers["Content-Length"])
+
+    except ValueError:
+        raise HTTPException(status_code=413)
+
+    except KeyError:
+        # Header missing, we must be en chunk-encoding mode
+        content_length = MAX_CONTENT_LENGTH
+
+    else:
+        if content_length > MAX_CONTENT_LENGTH:
+            raise HTTPException(status_code=413)
+
+    chunks = []
+    try:
+        async for chunk in request.stream():
+            chunks.append(chunk)
+            if sum(len(c) for c in chunks) > content_length:
+                raise HTTPException(status_code=413)
+    except ClientDisconnect:
+        raise HTTPException(status_code=413)
+
+    return b"".join(chunks)
+
+
+type ReadBody = Callable[[Request], Awaitable[bytes | memoryview]]
+
+
+def build_request(body: bytes, chunk_size: int, with_content_length: bool) -> Request:
+    headers = [(b"content-length", str(len(body)).encode())] if with_content_length else []
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    messages: list[Message] = [
+        {"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks
+    ]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    messages.reverse()
+
+    async def receive() -> Message:
+        return messages.pop()
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+def cpu_ms_per_mib(
+    read_body: ReadBody,
+    body: bytes,
+    chunk_size: int,
+    with_content_length: bool,
+    rounds: int,
+) -> float:
+    async def _run() -> float:
+        # Warm-up
+        assert await read_body(build_request(body, chunk_size, with_content_length)) == body
+        requests = [build_request(body, chunk_size, with_content_length) for _ in range(rounds)]
+        start = time.process_time()
+        for request in requests:
+            await read_body(request)
+        return time.process_time() - start
+
+    elapsed = asyncio.run(_run())
+    return elapsed * 1000 / (rounds * len(body) / MiB)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--body-size", type=int, default=1 * MiB, help="Body size in bytes")
+    parser.add_argument(
+        "--chunk-size", type=int, default=64 * 1024, help="Size of the chunks sent by the client"
+    )
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    assert args.body_size <= MAX_CONTENT_LENGTH
+
+    body = os.urandom(args.body_size)
+    print(
+        f"Body size: {args.body_size} bytes, {args.chunk_size} bytes chunks, {args.rounds} rounds"
+    )
+    print(f"{'':10} {'content-length (CPU ms/MiB)':>28} {'chunk-encoding (CPU ms/MiB)':>28}")
+    for name, read_body in (
+        ("before", legacy_rpc_get_body_with_limit_check),
+        ("after", _rpc_get_body_with_limit_check),
+    ):
+        with_content_length = cpu_ms_per_mib(
+            read_body, body, args.chunk_size, with_content_length=True, rounds=args.rounds
+        )
+        chunk_encoding = cpu_ms_per_mib(
+            read_body, body, args.chunk_size, with_content_length=False, rounds=args.rounds
+        )
+        print(f"{name:10} {with_content_length:>28.3f} {chunk_encoding:>28.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+"""
+Microbenchmark of the CPU cost of the SSE event fan-out versus the number of
+connected clients.
+
+Compares the previous dispatch (checking each event against every registered
+client) with the routing indexes of `RegisteredClientsRouting`, for a mix of
+vlob (realm-wide) and common certificate (organization-wide) events.
+
+Must be run from the server's environment, e.g. `python misc/bench_sse_fanout.py`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+import anyio
+
+from parsec._parsec import DateTime, DeviceID, OrganizationID, UserID, UserProfile, VlobID
+from parsec.components.events import RegisteredClient, RegisteredClientsRouting
+from parsec.events import ClientBroadcastableEvent, EventCommonCertificate, EventVlob
+
+type Dispatch = Callable[[ClientBroadcastableEvent], int]
+
+
+def populate(
+    clients: int, organizations: int, realms_per_client: int
+) -> tuple[list[RegisteredClient], list[ClientBroadcastableEvent]]:
+    rng = random.Random(0)
+    organization_ids = [OrganizationID(f"Org{i}") for i in range(organizations)]
+    organization_realms = {
+        organization_id: [VlobID.new() for _ in range(4 * realms_per_client)]
+        for organization_id in organization_ids
+    }
+
+    registered = []
+    for i in range(clients):
+        organization_id = organization_ids[i % organizations]
+        registered.append(
+            RegisteredClient(
+                channel_sender=MagicMock(),
+                organization_id=organization_id,
+                device_id=DeviceID.new(),
+                user_id=UserID.new(),
+                realms=set(rng.sample(organization_realms[organization_id], realms_per_client)),
+                profile=UserProfile.STANDARD,
+                cancel_scope=anyio.CancelScope(),
+            )
+        )
+
+    now = DateTime.now()
+    events: list[ClientBroadcastableEvent] = []
+    for i in range(1000):
+        organization_id = rng.choice(organization_ids)
+        if i % 10:
+            events.append(
+                EventVlob(
+                    organization_id=organization_id,
+                    author=DeviceID.new(),
+                    realm_id=rng.choice(organization_realms[organization_id]),
+                    timestamp=now,
+                    vlob_id=VlobID.new(),
+                    version=1,
+                    blob=None,
+                    last_common_certificate_timestamp=now,
+                    last_realm_certificate_timestamp=now,
+                )
+            )
+        else:
+            events.append(EventCommonCertificate(organization_id=organization_id, timestamp=now))
+
+    return registered, events
+
+
+def full_scan_dispatch(registered: list[RegisteredClient]) -> Dispatch:
+    def _dispatch(event: ClientBroadcastableEvent) -> int:
+        return sum(1 for client in registered if event.is_event_for_client(client))
+
+    return _dispatch
+
+
+def indexed_dispatch(registered: list[RegisteredClient]) -> Dispatch:
+    routing = RegisteredClientsRouting()
+    for client in registered:
+        routing.add(client)
+
+    def _dispatch(event: ClientBroadcastableEvent) -> int:
+        return sum(1 for client in routing.candidates(event) if event.is_event_for_client(client))
+
+    return _dispatch
+
+
+def cpu_us_per_event(dispatch: Dispatch, events: list[ClientBroadcastableEvent]) -> float:
+    start = time.process_time()
+    for event in events:
+        dispatch(event)
+    elapsed = time.process_time() - start
+    return elapsed * 1e6 / len(events)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[100, 1_000, 10_000, 30_000],
+        help="Number of connected clients",
+    )
+    parser.add_argument("--organizations", type=int, default=500)
+    parser.add_argument("--realms-per-client", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.organizations} organizations, {args.realms_per_client} realms per client")
+    print(f"{'clients':>10} {'before (CPU us/event)':>22} {'after (CPU us/event)':>22}")
+    for clients in args.clients:
+        registered, events = populate(clients, args.organizations, args.realms_per_client)
+        # Both dispatches must deliver the events to the very same clients
+        before, after = full_scan_dispatch(registered), indexed_dispatch(registered)
+        assert [before(event) for event in events] == [after(event) for event in events]
+        print(
+            f"{clients:>10} {cpu_us_per_event(before, events):>22.1f}"
+            f" {cpu_us_per_event(after, events):>22.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -582,7 +582,7 @@ class ActiveUsersLimit:
 
 class AnyCmdReq:
     @classmethod
-    def load(cls, raw: bytes) -> {"|".join(cmd + ".Req" for cmd in cmds_names)}: ...
+    def load(cls, raw: bytes | bytearray | memoryview) -> {"|".join(cmd + ".Req" for cmd in cmds_names)}: ...
 """
             version_code += (
                 '\n\n__all__ =["AnyCmdReq", ' + ", ".join(f'"{c}"' for c in cmds_names) + "]\n"
@@ -8,13 +8,17 @@ from parsec.backend import Backend, backend_factory
 from parsec.config import (
     ActiveUsersLimit,
     BackendConfig,
+    CacheBlockStoreConfig,
+    FilesystemBlockStoreConfig,
     MockedBlockStoreConfig,
     MockedEmailConfig,
     RAID0BlockStoreConfig,
     RAID1BlockStoreConfig,
     RAID5BlockStoreConfig,
+    ReedSolomonBlockStoreConfig,
     S3BlockStoreConfig,
     SmtpEmailConfig,
+    TieredBlockStoreConfig,
 )
 
 __all__ = (
@@ -22,13 +26,17 @@ __all__ = (
     "AsgiApp",
     "Backend",
     "BackendConfig",
+    "CacheBlockStoreConfig",
+    "FilesystemBlockStoreConfig",
     "MockedBlockStoreConfig",
     "MockedEmailConfig",
     "RAID0BlockStoreConfig",
     "RAID1BlockStoreConfig",
     "RAID5BlockStoreConfig",
+    "ReedSolomonBlockStoreConfig",
     "S3BlockStoreConfig",
     "SmtpEmailConfig",
+    "TieredBlockStoreConfig",
     "__version__",
     "app_factory",
     "backend_factory",
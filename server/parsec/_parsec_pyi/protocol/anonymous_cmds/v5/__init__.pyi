@@ -18,7 +18,7 @@ from . import (
 class AnyCmdReq:
     @classmethod
     def load(
-        cls, raw: bytes
+        cls, raw: bytes | bytearray | memoryview
     ) -> (
         async_enrollment_cancel.Req
         | async_enrollment_info.Req
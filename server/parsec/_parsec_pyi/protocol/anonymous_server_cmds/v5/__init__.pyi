@@ -18,7 +18,7 @@ from . import (
 class AnyCmdReq:
     @classmethod
     def load(
-        cls, raw: bytes
+        cls, raw: bytes | bytearray | memoryview
     ) -> (
         account_create_proceed.Req
         | account_create_send_validation_email.Req
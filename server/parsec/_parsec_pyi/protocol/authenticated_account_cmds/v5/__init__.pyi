@@ -23,7 +23,7 @@ from . import (
 class AnyCmdReq:
     @classmethod
     def load(
-        cls, raw: bytes
+        cls, raw: bytes | bytearray | memoryview
     ) -> (
         account_delete_proceed.Req
         | account_delete_send_validation_email.Req
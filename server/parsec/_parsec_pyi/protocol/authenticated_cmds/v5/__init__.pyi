@@ -52,7 +52,7 @@ from . import (
 class AnyCmdReq:
     @classmethod
     def load(
-        cls, raw: bytes
+        cls, raw: bytes | bytearray | memoryview
     ) -> (
         async_enrollment_accept.Req
         | async_enrollment_list.Req
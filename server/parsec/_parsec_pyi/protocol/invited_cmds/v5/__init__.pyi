@@ -16,7 +16,7 @@ from . import (
 class AnyCmdReq:
     @classmethod
     def load(
-        cls, raw: bytes
+        cls, raw: bytes | bytearray | memoryview
     ) -> (
         invite_claimer_cancel_greeting_attempt.Req
         | invite_claimer_start_greeting_attempt.Req
@@ -8,6 +8,6 @@ from . import tos_accept, tos_get
 
 class AnyCmdReq:
     @classmethod
-    def load(cls, raw: bytes) -> tos_accept.Req | tos_get.Req: ...
+    def load(cls, raw: bytes | bytearray | memoryview) -> tos_accept.Req | tos_get.Req: ...
 
 __all__ = ["AnyCmdReq", "tos_accept", "tos_get"]
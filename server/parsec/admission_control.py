@@ -0,0 +1,253 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import math
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
+
+import anyio
+
+from parsec._parsec import OrganizationID
+from parsec.logging import get_logger
+from parsec.metrics import METRICS
+
+logger = get_logger()
+
+# Note the number of organizations is unbounded, hence the organization is not
+# a label of the metric (it can be found in the logs instead)
+ADMISSION_REJECTED = METRICS.counter(
+    "parsec_admission_rejected_total",
+    "Number of requests rejected by the admission control, by reason.",
+    labels=("reason",),
+)
+ADMISSION_QUEUE_WAIT = METRICS.histogram(
+    "parsec_admission_queue_wait_seconds",
+    "Time spent by the requests waiting for an organization's in-flight slot.",
+)
+ADMISSION_IN_FLIGHT = METRICS.gauge(
+    "parsec_admission_in_flight_requests",
+    "Number of requests currently processed, for all organizations.",
+)
+ADMISSION_QUEUED = METRICS.gauge(
+    "parsec_admission_queued_requests",
+    "Number of requests currently waiting for an in-flight slot, for all organizations.",
+)
+
+
+# Idle organizations are evicted once the number of tracked organizations reaches
+# this threshold (which is then doubled if most of them are still active)
+ORGANIZATIONS_PRUNE_THRESHOLD = 1024
+
+
+@dataclass(slots=True)
+class AdmissionRejected:
+    reason: str
+    # Seconds after which the client is expected to retry
+    retry_after: float
+
+
+@dataclass(slots=True)
+class _OrganizationState:
+    tokens: float
+    tokens_updated_at: float
+    # `None` if the number of in-flight requests is not limited
+    slots: anyio.Semaphore | None
+    # Serialize the requests taking multiple slots, so that they cannot deadlock
+    # each other by each holding part of the slots
+    multiple_slots_lock: anyio.Lock
+    queued: int = 0
+
+
+class OrganizationAdmissionControl:
+    """
+    Protect the server (and especially the database connections shared by all the
+    organizations) from a single organization sending too many requests:
+
+    - Each organization has at most `max_in_flight` requests processed at a time,
+      additional requests wait for a slot to be freed.
+    - If `max_queued` requests are already waiting, the request is rejected right
+      away (load shedding): it would most likely time out anyway.
+    - Each organization is rate-limited with a token bucket refilled with `rate`
+      tokens per second and containing at most `burst` tokens, a request consuming
+      one token (or `cost` tokens, see `admit`).
+
+    The state of idle organizations (no request in flight and a full token bucket)
+    is dropped once many organizations are tracked.
+
+    Rejected requests should be retried by the client after `retry_after` seconds.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int | None,
+        max_queued: int,
+        rate: float | None,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        assert max_in_flight is None or max_in_flight > 0, max_in_flight
+        assert max_queued >= 0, max_queued
+        assert rate is None or rate > 0, rate
+        assert burst > 0, burst
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._organizations: dict[OrganizationID, _OrganizationState] = {}
+        self._prune_threshold = ORGANIZATIONS_PRUNE_THRESHOLD
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight is not None or self.rate is not None
+
+    def collect_metrics(self) -> None:
+        in_flight = queued = 0
+        for state in self._organizations.values():
+            if state.slots is not None:
+                assert self.max_in_flight is not None
+                in_flight += self.max_in_flight - state.slots.value
+            queued += state.queued
+        ADMISSION_IN_FLIGHT.set(in_flight)
+        ADMISSION_QUEUED.set(queued)
+
+    def _is_idle(self, state: _OrganizationState, now: float) -> bool:
+        """
+        An idle state is equivalent to a brand new one, and hence can be dropped.
+        """
+        if state.queued or state.multiple_slots_lock.locked():
+            return False
+        if state.slots is not None and state.slots.value != self.max_in_flight:
+            return False
+        if self.rate is not None:
+            return state.tokens + (now - state.tokens_updated_at) * self.rate >= self.burst
+        return True
+
+    def _prune(self) -> None:
+        now = self._clock()
+        self._organizations = {
+            organization_id: state
+            for organization_id, state in self._organizations.items()
+            if not self._is_idle(state, now)
+        }
+        # Keep the pruning cost amortized if most organizations are active
+        self._prune_threshold = max(ORGANIZATIONS_PRUNE_THRESHOLD, 2 * len(self._organizations))
+
+    def _get_state(self, organization_id: OrganizationID) -> _OrganizationState:
+        state = self._organizations.get(organization_id)
+        if state is None:
+            if len(self._organizations) >= self._prune_threshold:
+                self._prune()
+            state = _OrganizationState(
+                tokens=self.burst,
+                tokens_updated_at=self._clock(),
+                slots=anyio.Semaphore(self.max_in_flight)
+                if self.max_in_flight is not None
+                else None,
+                multiple_slots_lock=anyio.Lock(),
+            )
+            self._organizations[organization_id] = state
+        return state
+
+    def _consume_tokens(self, state: _OrganizationState, cost: int) -> float | None:
+        """
+        Return `None` if the tokens have been consumed, otherwise the time (in
+        seconds) before enough tokens are available.
+        """
+        assert self.rate is not None
+        # A request cannot cost more than what the bucket can contain
+        cost = min(cost, self.burst)
+        now = self._clock()
+        state.tokens = min(self.burst, state.tokens + (now - state.tokens_updated_at) * self.rate)
+        state.tokens_updated_at = now
+        if state.tokens < cost:
+            return (cost - state.tokens) / self.rate
+        state.tokens -= cost
+        return None
+
+    def _reject(
+        self, organization_id: OrganizationID, reason: str, retry_after: float
+    ) -> AdmissionRejected:
+        ADMISSION_REJECTED.inc(reason)
+        logger.info(
+            "Request rejected by admission control",
+            organization_id=organization_id.str,
+            reason=reason,
+            retry_after=retry_after,
+        )
+        return AdmissionRejected(reason=reason, retry_after=retry_after)
+
+    @asynccontextmanager
+    async def admit(
+        self, organization_id: OrganizationID, cost: int = 1, in_flight: int = 1
+    ) -> AsyncGenerator[AdmissionRejected | None]:
+        """
+        Typical usage:
+
+            async with admission_control.admit(organization_id) as rejected:
+                if rejected is not None:
+                    ...  # Return an error to the client
+                ...  # Process the request
+
+        `cost` is the number of requests (e.g. the commands of a batch) accounted by
+        the rate-limit, while `in_flight` is the number of requests processed
+        concurrently (e.g. the concurrency of a batch, hence at most `max_in_flight`).
+        """
+        assert in_flight > 0, in_flight
+        assert self.max_in_flight is None or in_flight <= self.max_in_flight, in_flight
+        if not self.enabled:
+            yield None
+            return
+
+        state = self._get_state(organization_id)
+        slots = state.slots
+        # Requests taking multiple slots and waiting for them have priority
+        must_wait = slots is not None and (
+            slots.value < in_flight or state.multiple_slots_lock.locked()
+        )
+
+        if must_wait and state.queued >= self.max_queued:
+            # No way to know when a slot will be freed, let the client retry soon
+            yield self._reject(organization_id, "queue_full", retry_after=1)
+            return
+
+        if self.rate is not None:
+            retry_after = self._consume_tokens(state, cost)
+            if retry_after is not None:
+                yield self._reject(organization_id, "rate_limited", retry_after=retry_after)
+                return
+
+        if slots is None:
+            yield None
+            return
+
+        acquired = 0
+        try:
+            if not must_wait:
+                for _ in range(in_flight):
+                    slots.acquire_nowait()
+                    acquired += 1
+            else:
+                started_at = time.perf_counter()
+                state.queued += 1
+                try:
+                    async with state.multiple_slots_lock if in_flight > 1 else nullcontext():
+                        while acquired < in_flight:
+                            await slots.acquire()
+                            acquired += 1
+                finally:
+                    state.queued -= 1
+                ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - started_at)
+
+            yield None
+
+        finally:
+            for _ in range(acquired):
+                slots.release()
+
+
+def retry_after_header(rejected: AdmissionRejected) -> str:
+    # `Retry-After` only accepts an integer number of seconds
+    return str(max(1, math.ceil(rejected.retry_after)))
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import mimetypes
 import os
+import socket
 from pathlib import Path
 from typing import cast
 
@@ -20,6 +21,7 @@ from structlog import get_logger
 
 from parsec._version import __version__ as parsec_version
 from parsec.asgi.administration import administration_router
+from parsec.asgi.metrics import metrics_router
 from parsec.asgi.redirect import redirect_router
 from parsec.asgi.rpc import Backend, rpc_router
 
@@ -180,6 +182,7 @@ def app_factory(
     app.include_router(redirect_router)
     app.include_router(rpc_router)
     app.include_router(administration_router)
+    app.include_router(metrics_router)
 
     return app
 
@@ -228,7 +231,13 @@ async def serve_parsec_asgi_app(
     ssl_certfile: Path | None = None,
     ssl_keyfile: Path | None = None,
     workers: int | None = None,
+    reuse_port: bool = False,
 ) -> None:
+    """
+    With `reuse_port`, the listening socket is bound with `SO_REUSEPORT` so that
+    multiple server processes can listen on the same port (the kernel then
+    balances the incoming connections between them).
+    """
     # `app.state.backend` must be overwritten by caller !
     assert app.state.backend is not None
     assert not parsec_version.startswith("v")
@@ -277,11 +286,23 @@ async def serve_parsec_asgi_app(
     )
     server = Server(config)
 
+    if reuse_port:
+        # Same as `uvicorn.Config.bind_socket`, but with `SO_REUSEPORT`
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family=family)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.set_inheritable(True)
+        sockets = [sock]
+    else:
+        sockets = None
+
     async def server_task(task_status):
         # Protect server against cancellation
         with anyio.CancelScope(shield=True):
             task_status.started()
-            await server.serve()
+            await server.serve(sockets=sockets)
         tg.cancel_scope.cancel()
 
     async with anyio.create_task_group() as tg:
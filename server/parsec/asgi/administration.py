@@ -51,7 +51,7 @@ from parsec.components.sequester import (
 from parsec.components.totp import TOTPResetBadOutcome
 from parsec.components.user import UserFreezeUserBadOutcome, UserInfo, UserListActiveUsersBadOutcome
 from parsec.events import ActiveUsersLimitField, DateTimeField, OrganizationIDField, UserIDField
-from parsec.logging import get_logger
+from parsec.logging import LazyField, get_logger
 from parsec.types import (
     Base64BytesField,
     EmailAddressField,
@@ -138,8 +138,11 @@ def log_request[**P, T: BaseModel | Response](
     async def wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
         request = cast(Request, kwargs["request"])
         body = cast(BaseModel | None, kwargs.get("body"))
-        body_dict = {} if body is None else body.model_dump()
-        logger.debug(f"{request.method} {request.url.path} request", **body_dict)
+        logger.debug(
+            f"{request.method} {request.url.path} request",
+            # Only dumped if the log is emitted
+            body=None if body is None else LazyField(body.model_dump),
+        )
         try:
             result = await func(*args, **kwargs)
         except HTTPException as e:
@@ -156,19 +159,16 @@ def log_request[**P, T: BaseModel | Response](
             logger.debug(f"{request.method} {request.url.path} base exception", exc_info=e)
             raise
         if isinstance(result, Response):
-            body = result.body
-            if isinstance(body, memoryview):
-                body = bytes(body)
-            debug_extra = {
-                "status_code": result.status_code,
-                "body": body.decode("utf-8"),
-            }
             logger.info_with_debug_extra(
-                f"{request.method} {request.url.path} response", debug_extra=debug_extra
+                f"{request.method} {request.url.path} response",
+                debug_extra=lambda: {
+                    "status_code": result.status_code,
+                    "body": bytes(result.body).decode("utf-8"),
+                },
             )
         if isinstance(result, BaseModel):
             logger.info_with_debug_extra(
-                f"{request.method} {request.url.path} reply", debug_extra=result.model_dump()
+                f"{request.method} {request.url.path} reply", debug_extra=result.model_dump
             )
         return result
 
@@ -0,0 +1,23 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Response
+
+from parsec.asgi.administration import check_administration_auth
+from parsec.metrics import METRICS
+
+metrics_router = APIRouter(include_in_schema=False)
+
+# See https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics_router.get("/metrics")
+async def metrics(auth: Annotated[None, Depends(check_administration_auth)]) -> Response:
+    """
+    Metrics in the Prometheus text format, protected by the administration token
+    (to be configured as the scrape job's bearer token).
+    """
+    return Response(content=METRICS.render(), media_type=CONTENT_TYPE_PROMETHEUS)
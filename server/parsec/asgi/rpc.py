@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import time
 from collections.abc import AsyncGenerator, Mapping, Sequence
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
@@ -9,6 +10,7 @@ from enum import Enum
 from typing import (
     Any,
     NoReturn,
+    Protocol,
 )
 from uuid import UUID
 
@@ -30,6 +32,9 @@ from parsec._parsec import (
     invited_cmds,
     tos_cmds,
 )
+from parsec.admission_control import AdmissionRejected, retry_after_header
+from parsec.asgi.rpc_batch import dump_batch, load_batch
+from parsec.asgi.rpc_compression import compressed_response
 from parsec.backend import Backend
 from parsec.client_context import (
     AnonymousClientContext,
@@ -53,9 +58,22 @@ from parsec.components.auth import (
 from parsec.components.events import ClientBroadcastableEventStream, SseAPiEventsListenBadOutcome
 from parsec.events import EventOrganizationConfig
 from parsec.logging import get_logger
+from parsec.metrics import METRICS
+from parsec.tracing import start_trace
 
 logger = get_logger()
 
+RPC_REQUESTS = METRICS.counter(
+    "parsec_rpc_requests_total",
+    "Number of RPC requests processed, by command and reply status.",
+    labels=("cmd", "status"),
+)
+RPC_REQUEST_DURATION = METRICS.histogram(
+    "parsec_rpc_request_duration_seconds",
+    "Time spent processing RPC requests, by command.",
+    labels=("cmd",),
+)
+
 
 def block_repr(block: bytes, MAX_LOGGED_BLOCK_SIZE=64) -> str:
     if len(block) <= MAX_LOGGED_BLOCK_SIZE:
@@ -77,6 +95,14 @@ class LoggedReq:
             return repr(self.req)
 
 
+class RpcRep(Protocol):
+    """
+    Reply of a command (all the `Rep` types of the protocol).
+    """
+
+    def dump(self) -> bytes: ...
+
+
 @dataclass
 class LoggedRep:
     rep: object
@@ -103,6 +129,15 @@ SUPPORTED_API_VERSIONS = (ApiVersion.API_LATEST_VERSION,)
 # Max size for HTTP body, 1Mo seems plenty given our API never upload big chunk of data
 # (biggest request should be the `block_create` command with typically ~512Ko of data)
 MAX_CONTENT_LENGTH = 1 * 1024**2
+# Batch RPC requests contain multiple commands (each command still being limited
+# to `MAX_CONTENT_LENGTH`), and their commands can be run concurrently up to the
+# `Batch-Concurrency` header (1 by default, i.e. in order)
+BATCH_MAX_CONTENT_LENGTH = 16 * 1024**2
+BATCH_MAX_COMMANDS = 256
+BATCH_MAX_CONCURRENCY = 16
+# Initial size of the body buffer, which then grows as the data arrives (so a
+# `Content-Length` header alone doesn't make us allocate up to the max body size)
+BODY_INITIAL_BUFFER_SIZE = 64 * 1024
 
 
 AUTHENTICATED_CMDS_LOAD_FN = {
@@ -140,7 +175,14 @@ TOS_CMDS_LOAD_FN = {
 rpc_router = APIRouter(include_in_schema=False)
 
 
-async def _rpc_get_body_with_limit_check(request: Request) -> bytes:
+async def _rpc_get_body_with_limit_check(
+    request: Request, max_content_length: int = MAX_CONTENT_LENGTH
+) -> memoryview:
+    """
+    Read the request body into a single buffer, returned as a memoryview to be
+    passed as-is to the `AnyCmdReq.load` functions (so the received chunks are
+    only copied once, into this buffer).
+    """
     try:
         content_length = int(request.headers["Content-Length"])
 
@@ -149,32 +191,42 @@ async def _rpc_get_body_with_limit_check(request: Request) -> bytes:
 
     except KeyError:
         # Header missing, we must be en chunk-encoding mode
-        content_length = MAX_CONTENT_LENGTH
+        content_length = None
 
     else:
-        if content_length > MAX_CONTENT_LENGTH:
+        if not 0 <= content_length <= max_content_length:
             raise HTTPException(status_code=413)
 
-    chunks = []
+    # With `Content-Length`, the body cannot be bigger than announced (and the
+    # buffer never grows past it), otherwise we must be in chunk-encoding mode
+    max_size = content_length if content_length is not None else max_content_length
+    buffer = bytearray(min(BODY_INITIAL_BUFFER_SIZE, max_size))
+
+    size = 0
     try:
         async for chunk in request.stream():
-            chunks.append(chunk)
-            if sum(len(c) for c in chunks) > content_length:
+            new_size = size + len(chunk)
+            if new_size > max_size:
                 raise HTTPException(status_code=413)
+            if new_size > len(buffer):
+                # Grow geometrically to keep the number of resizes logarithmic
+                buffer.extend(bytes(min(max(new_size, 2 * len(buffer)), max_size) - len(buffer)))
+            buffer[size:new_size] = chunk
+            size = new_size
     # The client disconnected while sending the body.
     # Here we simply raise an HTTP exception to ignore the `ClientDisconnect` exception
     # so that it doesn't get logged as an error.
     except ClientDisconnect:
         raise HTTPException(status_code=413)
 
-    return b"".join(chunks)
+    return memoryview(buffer)[:size]
 
 
-def _rpc_rep(rep: Any, api_version: ApiVersion) -> Response:
-    return Response(
+def _rpc_rep(rep: Any, api_version: ApiVersion, request: Request) -> Response:
+    # Unlike REST, RPC doesn't use status to encode operational result (i.e. always 200)
+    return compressed_response(
         content=rep.dump(),
-        # Unlike REST, RPC doesn't use status to encode operational result
-        status_code=200,
+        accept_encoding=request.headers.get("Accept-Encoding"),
         headers={"Api-Version": str(api_version), "Content-Type": CONTENT_TYPE_MSGPACK},
     )
 
@@ -283,6 +335,15 @@ def _handshake_abort_bad_content(api_version: ApiVersion) -> NoReturn:
     _handshake_abort(CustomHttpStatus.BadContentTypeOrInvalidBodyOrUnknownCommand, api_version)
 
 
+def _admission_rejected_abort(rejected: AdmissionRejected, api_version: ApiVersion) -> NoReturn:
+    # `503` is considered by the client as the server being temporarily unavailable,
+    # hence the request will be retried later
+    raise HTTPException(
+        status_code=503,
+        headers={"Api-Version": str(api_version), "Retry-After": retry_after_header(rejected)},
+    )
+
+
 def _handshake_abort_unsupported_api_version() -> NoReturn:
     supported_api_versions = ";".join(str(api_version) for api_version in SUPPORTED_API_VERSIONS)
     raise HTTPException(
@@ -515,6 +576,11 @@ def _parse_anonymous_server_auth_headers_or_abort(
     )
 
 
+def _record_rpc_metrics(cmd_name: str, status: str, started_at: float) -> None:
+    RPC_REQUEST_DURATION.observe(time.perf_counter() - started_at, cmd_name)
+    RPC_REQUESTS.inc(cmd_name, status)
+
+
 async def run_request(
     backend: Backend,
     client_ctx: AuthenticatedClientContext
@@ -523,7 +589,7 @@ async def run_request(
     | AnonymousServerClientContext
     | AuthenticatedAccountClientContext,
     request: object,
-) -> object:
+) -> RpcRep:
     cmd_func = backend.apis[type(request)]
 
     # Bind the logger with the command name before logging the request
@@ -534,24 +600,32 @@ async def run_request(
         "RPC request",
         req=LoggedReq(request),
     )
-    try:
-        rep = await cmd_func(client_ctx, request)
-    except HTTPException as exc:
-        logger.info(
-            "RPC HTTP error",
-            status_code=exc.status_code,
-            detail=exc.detail,
-        )
-        raise
-    except Exception as exc:
-        logger.error("RPC exception", exc_info=exc)
-        raise
-    except BaseException as exc:
-        logger.debug("RPC base exception", exc_info=exc)
-        raise
+    with start_trace(f"rpc {cmd_name}", **{"rpc.method": cmd_name}) as trace:
+        started_at = time.perf_counter()
+        try:
+            rep = await cmd_func(client_ctx, request)
+        except HTTPException as exc:
+            _record_rpc_metrics(cmd_name, f"HTTP{exc.status_code}", started_at)
+            logger.info(
+                "RPC HTTP error",
+                status_code=exc.status_code,
+                detail=exc.detail,
+            )
+            raise
+        except Exception as exc:
+            _record_rpc_metrics(cmd_name, "Exception", started_at)
+            logger.error("RPC exception", exc_info=exc)
+            raise
+        except BaseException as exc:
+            logger.debug("RPC base exception", exc_info=exc)
+            raise
+        status = type(rep).__name__
+        _record_rpc_metrics(cmd_name, status, started_at)
+        if trace is not None:
+            trace.attributes["rpc.status"] = status
     client_ctx.logger.info_with_debug_extra(
         "RPC reply",
-        status=type(rep).__name__,
+        status=status,
         debug_extra={"rep": LoggedRep(rep)},
     )
     return rep
@@ -621,7 +695,7 @@ async def anonymous_api(raw_organization_id: str, request: Request) -> Response:
 
     rep = await run_request(backend, client_ctx, req)
 
-    return _rpc_rep(rep, parsed.settled_api_version)
+    return _rpc_rep(rep, parsed.settled_api_version, request)
 
 
 @rpc_router.post("/anonymous_server")
@@ -650,7 +724,7 @@ async def anonymous_server_api(request: Request) -> Response:
 
     rep = await run_request(backend, client_ctx, req)
 
-    return _rpc_rep(rep, parsed.settled_api_version)
+    return _rpc_rep(rep, parsed.settled_api_version, request)
 
 
 @rpc_router.post("/authenticated_account")
@@ -702,7 +776,7 @@ async def authenticated_account_api(request: Request) -> Response:
 
     rep = await run_request(backend, client_ctx, req)
 
-    return _rpc_rep(rep, parsed.settled_api_version)
+    return _rpc_rep(rep, parsed.settled_api_version, request)
 
 
 @rpc_router.post("/invited/{raw_organization_id}")
@@ -759,7 +833,7 @@ async def invited_api(raw_organization_id: str, request: Request) -> Response:
         client_user_agent=parsed.user_agent,
     )
 
-    body: bytes = await _rpc_get_body_with_limit_check(request)
+    body = await _rpc_get_body_with_limit_check(request)
 
     try:
         req = INVITED_CMDS_LOAD_FN[parsed.settled_api_version.version](body)
@@ -768,25 +842,13 @@ async def invited_api(raw_organization_id: str, request: Request) -> Response:
 
     rep = await run_request(backend, client_ctx, req)
 
-    return _rpc_rep(rep, parsed.settled_api_version)
+    return _rpc_rep(rep, parsed.settled_api_version, request)
 
 
-@rpc_router.post("/authenticated/{raw_organization_id}")
-async def authenticated_api(raw_organization_id: str, request: Request) -> Response:
-    backend: Backend = request.app.state.backend
-
-    parsed = _parse_auth_headers_or_abort(
-        headers=request.headers,
-        raw_organization_id=raw_organization_id,
-        with_authenticated_headers=True,
-        with_invited_headers=False,
-        with_sse_headers=False,
-        expected_accept_type=None,
-        expected_content_type=CONTENT_TYPE_MSGPACK,
-    )
+async def _authenticated_auth_or_abort(
+    backend: Backend, parsed: ParsedAuthHeaders
+) -> AuthenticatedAuthInfo:
     assert parsed.authenticated_token is not None
-
-    body: bytes = await _rpc_get_body_with_limit_check(request)
     outcome = await backend.auth.authenticated_auth(
         now=DateTime.now(),
         organization_id=parsed.organization_id,
@@ -794,7 +856,7 @@ async def authenticated_api(raw_organization_id: str, request: Request) -> Respo
     )
     match outcome:
         case AuthenticatedAuthInfo() as auth_info:
-            pass
+            return auth_info
         case AuthAuthenticatedAuthBadOutcome.ORGANIZATION_EXPIRED:
             _handshake_abort(
                 CustomHttpStatus.OrganizationExpired, api_version=parsed.settled_api_version
@@ -833,6 +895,25 @@ async def authenticated_api(raw_organization_id: str, request: Request) -> Respo
                 api_version=parsed.settled_api_version,
             )
 
+
+@rpc_router.post("/authenticated/{raw_organization_id}")
+async def authenticated_api(raw_organization_id: str, request: Request) -> Response:
+    backend: Backend = request.app.state.backend
+
+    parsed = _parse_auth_headers_or_abort(
+        headers=request.headers,
+        raw_organization_id=raw_organization_id,
+        with_authenticated_headers=True,
+        with_invited_headers=False,
+        with_sse_headers=False,
+        expected_accept_type=None,
+        expected_content_type=CONTENT_TYPE_MSGPACK,
+    )
+    assert parsed.authenticated_token is not None
+
+    body = await _rpc_get_body_with_limit_check(request)
+    auth_info = await _authenticated_auth_or_abort(backend, parsed)
+
     # Handshake is done
 
     client_ctx = AuthenticatedClientContext(
@@ -852,9 +933,107 @@ async def authenticated_api(raw_organization_id: str, request: Request) -> Respo
     except ValueError:
         _handshake_abort_bad_content(api_version=parsed.settled_api_version)
 
-    rep = await run_request(backend, client_ctx, req)
+    async with backend.admission_control.admit(auth_info.organization_id) as rejected:
+        if rejected is not None:
+            _admission_rejected_abort(rejected, api_version=parsed.settled_api_version)
+        rep = await run_request(backend, client_ctx, req)
 
-    return _rpc_rep(rep, parsed.settled_api_version)
+    return _rpc_rep(rep, parsed.settled_api_version, request)
+
+
+@rpc_router.post("/authenticated/{raw_organization_id}/batch")
+async def authenticated_batch_api(raw_organization_id: str, request: Request) -> Response:
+    """
+    Run multiple commands with a single request (and hence a single authentication).
+
+    The body is a msgpack array of serialized commands, the reply a msgpack array
+    of the serialized replies in the same order.
+    """
+    backend: Backend = request.app.state.backend
+
+    parsed = _parse_auth_headers_or_abort(
+        headers=request.headers,
+        raw_organization_id=raw_organization_id,
+        with_authenticated_headers=True,
+        with_invited_headers=False,
+        with_sse_headers=False,
+        expected_accept_type=None,
+        expected_content_type=CONTENT_TYPE_MSGPACK,
+    )
+    assert parsed.authenticated_token is not None
+
+    try:
+        concurrency = int(request.headers.get("Batch-Concurrency", "1"))
+    except ValueError:
+        _handshake_abort_bad_content(api_version=parsed.settled_api_version)
+    if not 1 <= concurrency <= BATCH_MAX_CONCURRENCY:
+        _handshake_abort_bad_content(api_version=parsed.settled_api_version)
+
+    # Given its size, the body is only read once the client is authenticated
+    auth_info = await _authenticated_auth_or_abort(backend, parsed)
+    body = await _rpc_get_body_with_limit_check(request, BATCH_MAX_CONTENT_LENGTH)
+
+    # Handshake is done
+
+    load_fn = AUTHENTICATED_CMDS_LOAD_FN[parsed.settled_api_version.version]
+    try:
+        raw_reqs = load_batch(body)
+        if len(raw_reqs) > BATCH_MAX_COMMANDS or any(
+            len(raw_req) > MAX_CONTENT_LENGTH for raw_req in raw_reqs
+        ):
+            raise ValueError
+        reqs = [load_fn(raw_req) for raw_req in raw_reqs]
+    except ValueError:
+        _handshake_abort_bad_content(api_version=parsed.settled_api_version)
+
+    # Each command counts against the rate limit, and the batch takes as many
+    # in-flight slots as the number of its commands run concurrently
+    concurrency = max(1, min(concurrency, len(reqs)))
+    max_in_flight = backend.admission_control.max_in_flight
+    if max_in_flight is not None:
+        concurrency = min(concurrency, max_in_flight)
+
+    reps: list[bytes] = [b""] * len(reqs)
+    limiter = anyio.CapacityLimiter(concurrency)
+
+    async def _run_request(index: int, req: object) -> None:
+        async with limiter:
+            # Each command has its own context (and hence its own request ID in the logs)
+            client_ctx = AuthenticatedClientContext(
+                client_user_agent=parsed.user_agent,
+                client_api_version=parsed.client_api_version,
+                settled_api_version=parsed.settled_api_version,
+                organization_id=auth_info.organization_id,
+                organization_internal_id=auth_info.organization_internal_id,
+                user_id=auth_info.user_id,
+                device_id=auth_info.device_id,
+                device_internal_id=auth_info.device_internal_id,
+                device_verify_key=auth_info.device_verify_key,
+            )
+            rep = await run_request(backend, client_ctx, req)
+            reps[index] = rep.dump()
+
+    async with backend.admission_control.admit(
+        auth_info.organization_id, cost=len(reqs), in_flight=concurrency
+    ) as rejected:
+        if rejected is not None:
+            _admission_rejected_abort(rejected, api_version=parsed.settled_api_version)
+        if concurrency == 1:
+            for index, req in enumerate(reqs):
+                await _run_request(index, req)
+        else:
+            async with anyio.create_task_group() as tg:
+                for index, req in enumerate(reqs):
+                    tg.start_soon(_run_request, index, req)
+
+    return compressed_response(
+        content=dump_batch(reps),
+        accept_encoding=request.headers.get("Accept-Encoding"),
+        headers={
+            "Api-Version": str(parsed.settled_api_version),
+            "Content-Type": CONTENT_TYPE_MSGPACK,
+        },
+    )
 
 
 @rpc_router.get("/authenticated/{raw_organization_id}/events")
@@ -873,51 +1052,7 @@ async def authenticated_events_api(raw_organization_id: str, request: Request) -
     )
     assert parsed.authenticated_token is not None
 
-    outcome = await backend.auth.authenticated_auth(
-        now=DateTime.now(),
-        organization_id=parsed.organization_id,
-        token=parsed.authenticated_token,
-    )
-    match outcome:
-        case AuthenticatedAuthInfo() as auth_info:
-            pass
-        case AuthAuthenticatedAuthBadOutcome.ORGANIZATION_EXPIRED:
-            _handshake_abort(
-                CustomHttpStatus.OrganizationExpired, api_version=parsed.settled_api_version
-            )
-        case AuthAuthenticatedAuthBadOutcome.ORGANIZATION_NOT_FOUND:
-            _handshake_abort(
-                CustomHttpStatus.OrganizationNotFound,
-                api_version=parsed.settled_api_version,
-            )
-        case AuthAuthenticatedAuthBadOutcome.TOKEN_OUT_OF_BALLPARK:
-            _handshake_abort(
-                CustomHttpStatus.TokenExpired,
-                api_version=parsed.settled_api_version,
-            )
-        case (
-            AuthAuthenticatedAuthBadOutcome.DEVICE_NOT_FOUND
-            | AuthAuthenticatedAuthBadOutcome.INVALID_TOKEN
-        ):
-            _handshake_abort(
-                CustomHttpStatus.BadAuthenticationInfo,
-                api_version=parsed.settled_api_version,
-            )
-        case AuthAuthenticatedAuthBadOutcome.USER_REVOKED:
-            _handshake_abort(
-                CustomHttpStatus.UserRevoked,
-                api_version=parsed.settled_api_version,
-            )
-        case AuthAuthenticatedAuthBadOutcome.USER_FROZEN:
-            _handshake_abort(
-                CustomHttpStatus.UserFrozen,
-                api_version=parsed.settled_api_version,
-            )
-        case AuthAuthenticatedAuthBadOutcome.USER_MUST_ACCEPT_TOS:
-            _handshake_abort(
-                CustomHttpStatus.UserMustAcceptTos,
-                api_version=parsed.settled_api_version,
-            )
+    auth_info = await _authenticated_auth_or_abort(backend, parsed)
 
     # Handshake is done
 
@@ -1154,7 +1289,7 @@ async def tos_api(raw_organization_id: str, request: Request) -> Response:
     )
     assert parsed.authenticated_token is not None
 
-    body: bytes = await _rpc_get_body_with_limit_check(request)
+    body = await _rpc_get_body_with_limit_check(request)
     outcome = await backend.auth.authenticated_auth(
         now=DateTime.now(),
         organization_id=parsed.organization_id,
@@ -1222,4 +1357,4 @@ async def tos_api(raw_organization_id: str, request: Request) -> Response:
 
     rep = await run_request(backend, client_ctx, req)
 
-    return _rpc_rep(rep, parsed.settled_api_version)
+    return _rpc_rep(rep, parsed.settled_api_version, request)
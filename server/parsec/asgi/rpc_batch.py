@@ -0,0 +1,95 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+"""
+Framing of the batch RPC requests and replies.
+
+A batch is a msgpack array of binaries, each binary being a serialized command
+request (i.e. the body of a regular RPC request) or reply. Only this subset of
+msgpack is supported, hence there is no need for a msgpack library here.
+"""
+
+from __future__ import annotations
+
+import struct
+
+# See https://github.com/msgpack/msgpack/blob/master/spec.md
+_FIXARRAY_MASK = 0x90
+_FIXARRAY_MAX_LEN = 0x0F
+_ARRAY16 = 0xDC
+_ARRAY32 = 0xDD
+_BIN8 = 0xC4
+_BIN16 = 0xC5
+_BIN32 = 0xC6
+
+
+def _read_uint(buffer: memoryview, offset: int, size: int) -> tuple[int, int]:
+    end = offset + size
+    if end > len(buffer):
+        raise ValueError("Truncated batch")
+    return int.from_bytes(buffer[offset:end], "big"), end
+
+
+def load_batch(raw: memoryview | bytes) -> list[memoryview]:
+    """
+    Raise `ValueError` if `raw` is not a msgpack array of binaries.
+
+    The returned items are views on `raw`, so no data is copied.
+    """
+    buffer = memoryview(raw)
+    if not buffer:
+        raise ValueError("Empty batch")
+
+    header = buffer[0]
+    if header & 0xF0 == _FIXARRAY_MASK:
+        items_count, offset = header & _FIXARRAY_MAX_LEN, 1
+    elif header == _ARRAY16:
+        items_count, offset = _read_uint(buffer, 1, 2)
+    elif header == _ARRAY32:
+        items_count, offset = _read_uint(buffer, 1, 4)
+    else:
+        raise ValueError("Batch must be a msgpack array")
+
+    items = []
+    for _ in range(items_count):
+        if offset >= len(buffer):
+            raise ValueError("Truncated batch")
+        item_header = buffer[offset]
+        if item_header == _BIN8:
+            item_len, offset = _read_uint(buffer, offset + 1, 1)
+        elif item_header == _BIN16:
+            item_len, offset = _read_uint(buffer, offset + 1, 2)
+        elif item_header == _BIN32:
+            item_len, offset = _read_uint(buffer, offset + 1, 4)
+        else:
+            raise ValueError("Batch items must be msgpack binaries")
+        end = offset + item_len
+        if end > len(buffer):
+            raise ValueError("Truncated batch")
+        items.append(buffer[offset:end])
+        offset = end
+
+    if offset != len(buffer):
+        raise ValueError("Trailing data after the batch")
+
+    return items
+
+
+def dump_batch(items: list[bytes]) -> bytes:
+    items_count = len(items)
+    if items_count <= _FIXARRAY_MAX_LEN:
+        parts = [struct.pack("!B", _FIXARRAY_MASK | items_count)]
+    elif items_count <= 0xFFFF:
+        parts = [struct.pack("!BH", _ARRAY16, items_count)]
+    else:
+        parts = [struct.pack("!BI", _ARRAY32, items_count)]
+
+    for item in items:
+        item_len = len(item)
+        if item_len <= 0xFF:
+            parts.append(struct.pack("!BB", _BIN8, item_len))
+        elif item_len <= 0xFFFF:
+            parts.append(struct.pack("!BH", _BIN16, item_len))
+        else:
+            parts.append(struct.pack("!BI", _BIN32, item_len))
+        parts.append(item)
+
+    return b"".join(parts)
@@ -0,0 +1,144 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+"""
+Compression of the RPC replies, negotiated with the `Accept-Encoding` header.
+
+Replies are msgpack, so even if the blobs they carry are encrypted (hence not
+compressible) the framing around them is, which matters for the big replies
+(e.g. the whole certificates history of an organization).
+
+Only the encodings provided by the standard library are supported, zstd being
+preferred over gzip since it is both faster and better at compressing. Note zstd
+is an optional module of the standard library (it is missing if CPython has been
+built without libzstd), in which case only gzip is available.
+"""
+
+from __future__ import annotations
+
+import zlib
+from collections.abc import AsyncIterator, Callable, Mapping
+
+import anyio.lowlevel
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+try:
+    from compression import zstd  # pyright: ignore[reportMissingImports] Python>=3.14 module
+except ImportError:
+    zstd = None
+
+# Smaller replies are not worth the compression (the framing of the compressed
+# data may even make them bigger)
+COMPRESSION_MIN_SIZE = 1024
+# Bigger replies are compressed by chunks while being sent, so that compressing
+# them doesn't block the event loop and the client starts receiving data sooner
+COMPRESSION_STREAMING_MIN_SIZE = 1024 * 1024
+COMPRESSION_CHUNK_SIZE = 256 * 1024
+
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+
+class _Compressor:
+    def compress(self, data: bytes | memoryview) -> bytes:
+        raise NotImplementedError
+
+    def flush(self) -> bytes:
+        raise NotImplementedError
+
+
+class _ZstdCompressor(_Compressor):
+    def __init__(self) -> None:
+        assert zstd is not None
+        self._compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+
+    def compress(self, data: bytes | memoryview) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _GzipCompressor(_Compressor):
+    def __init__(self) -> None:
+        # `wbits=31` for the gzip container (instead of the raw zlib one)
+        self._compressor = zlib.compressobj(GZIP_LEVEL, wbits=31)
+
+    def compress(self, data: bytes | memoryview) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Ordered by preference
+COMPRESSORS: dict[str, Callable[[], _Compressor]] = {}
+if zstd is not None:
+    COMPRESSORS["zstd"] = _ZstdCompressor
+COMPRESSORS["gzip"] = _GzipCompressor
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Return the preferred encoding among the ones accepted by the client (i.e.
+    listed in `Accept-Encoding` with a non-zero quality), `None` if none is.
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = set()
+    rejected = set()
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+        else:
+            rejected.add(coding)
+
+    for encoding in COMPRESSORS:
+        if encoding in accepted or ("*" in accepted and encoding not in rejected):
+            return encoding
+    return None
+
+
+async def _compress_by_chunks(content: bytes, encoding: str) -> AsyncIterator[bytes]:
+    compressor = COMPRESSORS[encoding]()
+    view = memoryview(content)
+    for offset in range(0, len(view), COMPRESSION_CHUNK_SIZE):
+        compressed = compressor.compress(view[offset : offset + COMPRESSION_CHUNK_SIZE])
+        if compressed:
+            yield compressed
+        else:
+            # Nothing to send yet, still let the other tasks run
+            await anyio.lowlevel.checkpoint()
+    yield compressor.flush()
+
+
+def compressed_response(
+    content: bytes, accept_encoding: str | None, headers: Mapping[str, str]
+) -> Response:
+    """
+    Build a `200` response with `content`, compressed if it is big enough and
+    the client accepts a supported encoding.
+    """
+    encoding = negotiate_encoding(accept_encoding) if len(content) >= COMPRESSION_MIN_SIZE else None
+    if encoding is None:
+        return Response(content=content, status_code=200, headers=headers)
+
+    headers = {**headers, "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    if len(content) >= COMPRESSION_STREAMING_MIN_SIZE:
+        return StreamingResponse(
+            _compress_by_chunks(content, encoding), status_code=200, headers=headers
+        )
+
+    compressor = COMPRESSORS[encoding]()
+    compressed = compressor.compress(content) + compressor.flush()
+    return Response(content=compressed, status_code=200, headers=headers)
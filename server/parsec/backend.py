@@ -25,6 +25,7 @@ from parsec._parsec import (
     UserUpdateCertificate,
     VerifyKey,
 )
+from parsec.admission_control import OrganizationAdmissionControl
 from parsec.api import collect_apis
 from parsec.components.account import BaseAccountComponent
 from parsec.components.async_enrollment import BaseAsyncEnrollmentComponent
@@ -48,6 +49,8 @@ from parsec.components.user import BaseUserComponent, UserInfo
 from parsec.components.vlob import BaseVlobComponent
 from parsec.config import BackendConfig
 from parsec.logging import get_logger
+from parsec.metrics import METRICS
+from parsec.tracing import tracing_factory
 from parsec.webhooks import WebhooksComponent
 
 if TYPE_CHECKING:
@@ -72,30 +75,40 @@ async def backend_factory(config: BackendConfig) -> AsyncGenerator[Backend, None
     else:
         components_factory = postgresql_components_factory
 
-    async with components_factory(config=config) as components:
-        yield Backend(
-            config=config,
-            mocked_data=components.get("mocked_data"),
-            account=components["account"],
-            async_enrollment=components["async_enrollment"],
-            auth=components["auth"],
-            block=components["block"],
-            blockstore=components["blockstore"],
-            cryptpad=components["cryptpad"],
-            event_bus=components["event_bus"],
-            events=components["events"],
-            invite=components["invite"],
-            organization=components["organization"],
-            ping=components["ping"],
-            realm=components["realm"],
-            scws=components["scws"],
-            sequester=components["sequester"],
-            shamir=components["shamir"],
-            totp=components["totp"],
-            user=components["user"],
-            vlob=components["vlob"],
-            webhooks=components["webhooks"],
-        )
+    # Tracing must be enabled before the components are created (e.g. to trace
+    # the database queries)
+    with tracing_factory(export=config.tracing_export, sample_rate=config.tracing_sample_rate):
+        async with components_factory(config=config) as components:
+            backend = Backend(
+                config=config,
+                mocked_data=components.get("mocked_data"),
+                account=components["account"],
+                async_enrollment=components["async_enrollment"],
+                auth=components["auth"],
+                block=components["block"],
+                blockstore=components["blockstore"],
+                cryptpad=components["cryptpad"],
+                event_bus=components["event_bus"],
+                events=components["events"],
+                invite=components["invite"],
+                organization=components["organization"],
+                ping=components["ping"],
+                realm=components["realm"],
+                scws=components["scws"],
+                sequester=components["sequester"],
+                shamir=components["shamir"],
+                totp=components["totp"],
+                user=components["user"],
+                vlob=components["vlob"],
+                webhooks=components["webhooks"],
+            )
+            METRICS.add_collector(backend.auth.collect_metrics)
+            METRICS.add_collector(backend.admission_control.collect_metrics)
+            try:
+                yield backend
+            finally:
+                METRICS.remove_collector(backend.admission_control.collect_metrics)
+                METRICS.remove_collector(backend.auth.collect_metrics)
 
 
 TEST_BOOTSTRAP_TOKEN = AccessToken.from_hex("672bc6ba9c43455da28344e975dc72b7")
@@ -129,6 +142,7 @@ class Backend:
     mocked_data: MemoryDatamodel | None = None
 
     apis: dict[type[Any], ApiFn] = field(init=False)  # pyright: ignore[reportMissingTypeArgument] Req/Rep are currently untyped
+    admission_control: OrganizationAdmissionControl = field(init=False)
 
     def __post_init__(self) -> None:
         self.apis = collect_apis(
@@ -150,6 +164,12 @@ class Backend:
             # Ping command is only used in tests
             include_ping=self.config.debug,
         )
+        self.admission_control = OrganizationAdmissionControl(
+            max_in_flight=self.config.organization_max_in_flight_requests,
+            max_queued=self.config.organization_max_queued_requests,
+            rate=self.config.organization_rate_limit,
+            burst=self.config.organization_rate_limit_burst,
+        )
 
     async def test_duplicate_organization(self, id: OrganizationID, new_id: OrganizationID) -> None:
         await self.organization.test_duplicate_organization(id, new_id)
@@ -13,8 +13,10 @@ from parsec.cli.inspect import human_accesses
 from parsec.cli.migration import migrate
 from parsec.cli.options import version_option
 from parsec.cli.realm_delete import delete_realm, list_deletable_realms
+from parsec.cli.rebalance_raid0 import rebalance_raid0
 from parsec.cli.render_email import render_email
 from parsec.cli.run import run_cmd
+from parsec.cli.scrub_blockstore import scrub_blockstore
 from parsec.cli.sequester_create import create_service, generate_service_certificate
 from parsec.cli.sequester_list import list_services
 from parsec.cli.sequester_revoke import generate_service_revocation_certificate, revoke_service
@@ -52,6 +54,8 @@ cli.add_command(export_realm, "export_realm")
 cli.add_command(human_accesses, "human_accesses")
 cli.add_command(list_deletable_realms, "list_deletable_realms")
 cli.add_command(delete_realm, "delete_realm")
+cli.add_command(rebalance_raid0, "rebalance_raid0")
+cli.add_command(scrub_blockstore, "scrub_blockstore")
 cli.add_command(server_sequester_cmd, "sequester")
 if TESTBED_AVAILABLE:
     cli.add_command(testbed_cmd, "testbed")
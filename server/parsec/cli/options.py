@@ -2,10 +2,11 @@
 from __future__ import annotations
 
 import asyncio
+import re
 import sys
 from collections import defaultdict
 from collections.abc import Callable, Coroutine, Generator, Iterable
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from functools import wraps
 from itertools import count
 from typing import (
@@ -21,18 +22,43 @@ from parsec._version import __version__
 from parsec.config import (
     BaseBlockStoreConfig,
     BaseDatabaseConfig,
+    FilesystemBlockStoreConfig,
+    FilesystemBlockStoreDurability,
     LogLevel,
     MockedBlockStoreConfig,
     MockedDatabaseConfig,
     PostgreSQLBlockStoreConfig,
     PostgreSQLDatabaseConfig,
     RAID0BlockStoreConfig,
+    RAID0BlockStorePlacement,
     RAID1BlockStoreConfig,
     RAID5BlockStoreConfig,
+    ReedSolomonBlockStoreConfig,
     S3BlockStoreConfig,
     SWIFTBlockStoreConfig,
 )
-from parsec.logging import LogFormat, configure_logging, enable_sentry_logging
+from parsec.logging import (
+    LogFormat,
+    configure_logging,
+    enable_sentry_logging,
+    queue_log_stream,
+)
+
+
+def _parse_log_sampling(raw: str | None) -> dict[str, float]:
+    sampling: dict[str, float] = {}
+    if not raw:
+        return sampling
+    for item in raw.split(","):
+        message, sep, raw_rate = item.rpartition("=")
+        try:
+            rate = float(raw_rate)
+        except ValueError:
+            rate = -1
+        if not sep or not message.strip() or not 0 <= rate <= 1:
+            raise click.BadParameter(f"Invalid sampling `{item}` (expected `<message>=<rate>`)")
+        sampling[message.strip()] = rate
+    return sampling
 
 
 def logging_config_options(
@@ -43,7 +69,7 @@ def logging_config_options(
 
     def _logging_config_options[**P, R](
         fn: Callable[P, R],
-    ) -> Callable[Concatenate[str, str, str, P], R]:
+    ) -> Callable[Concatenate[str, str, str, dict[str, float], bool, P], R]:
         @click.option(
             "--log-level",
             "-l",
@@ -69,11 +95,37 @@ def logging_config_options(
             show_envvar=True,
             show_default="stderr",
         )
+        @click.option(
+            "--log-sampling",
+            envvar="PARSEC_LOG_SAMPLING",
+            show_envvar=True,
+            callback=lambda ctx, param, value: _parse_log_sampling(value),
+            show_default="no sampling",
+            help="""Only keep a fraction of the INFO/DEBUG logs with the given messages, to reduce
+the logging overhead under heavy load (warnings and errors are always kept).
+
+The sampling should be provided as a comma-separated list of `<message>=<rate>`,
+the rate being between 0 and 1.
+
+For instance: `RPC request=0,RPC reply=0.01,Dispatching event=0.1`.
+""",
+        )
+        @click.option(
+            "--log-async",
+            is_flag=True,
+            envvar="PARSEC_LOG_ASYNC",
+            show_envvar=True,
+            help="""Write the logs from a dedicated thread, so that a slow output never blocks
+the server (logs are dropped if the output cannot keep up).
+""",
+        )
         @wraps(fn)
         def wrapper(
             log_level: str,
             log_format: str,
             log_file: str | None,
+            log_sampling: dict[str, float],
+            log_async: bool,
             *args: P.args,
             **kwargs: P.kwargs,
         ) -> R:
@@ -97,9 +149,15 @@ def logging_config_options(
             kwargs["log_format"] = parsed_log_format
             kwargs["log_file"] = log_file
 
-            with open_log_file() as fd:
+            with (
+                open_log_file() as fd,
+                queue_log_stream(fd) if log_async else nullcontext(fd) as log_stream,
+            ):
                 configure_logging(
-                    log_level=parsed_log_level, log_format=parsed_log_format, log_stream=fd
+                    log_level=parsed_log_level,
+                    log_format=parsed_log_format,
+                    log_stream=log_stream,
+                    sampling=log_sampling,
                 )
 
                 return fn(*args, **kwargs)
@@ -400,6 +458,16 @@ def _split_with_escaping(txt: str, delimiter: str) -> list[str]:
     return parts
 
 
+def _parse_positive_int(raw: str, name: str) -> int:
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise click.BadParameter(f"Invalid {name} `{raw}`, must be a positive integer")
+    return value
+
+
 def _parse_blockstore_param(value: str) -> BaseBlockStoreConfig:
     if value.upper() == "MOCKED":
         return MockedBlockStoreConfig()
@@ -408,12 +476,20 @@ def _parse_blockstore_param(value: str) -> BaseBlockStoreConfig:
     else:
         parts = _split_with_escaping(value, delimiter=":")
         if parts[0].upper() == "S3":
-            try:
-                endpoint_url, region, bucket, key, secret = parts[1:]
-            except ValueError:
-                raise click.BadParameter(
-                    "Invalid S3 config, must be `s3:[<endpoint_url>]:<region>:<bucket>:<key>:<secret>`"
-                )
+            match parts[1:]:
+                case [endpoint_url, region, bucket, key, secret, *extra] if len(extra) <= 2:
+                    pass
+                case _:
+                    raise click.BadParameter(
+                        "Invalid S3 config, must be `s3:[<endpoint_url>]:<region>:<bucket>:<key>:<secret>[:<max_concurrency>[:<max_pool_connections>]]`"
+                    )
+            max_concurrency = max_pool_connections = 10
+            if len(extra) >= 1:
+                max_concurrency = _parse_positive_int(extra[0], "S3 max concurrency")
+                # The pool must be big enough for the concurrent requests
+                max_pool_connections = max(max_pool_connections, max_concurrency)
+            if len(extra) == 2:
+                max_pool_connections = _parse_positive_int(extra[1], "S3 max pool connections")
             # Provide https by default to avoid annoying escaping for most cases
             if (
                 endpoint_url
@@ -427,15 +503,22 @@ def _parse_blockstore_param(value: str) -> BaseBlockStoreConfig:
                 s3_bucket=bucket,
                 s3_key=key,
                 s3_secret=secret,
+                s3_max_concurrency=max_concurrency,
+                s3_max_pool_connections=max_pool_connections,
             )
 
         elif parts[0].upper() == "SWIFT":
-            try:
-                auth_url, tenant, container, user, password = parts[1:]
-            except ValueError:
-                raise click.BadParameter(
-                    "Invalid SWIFT config, must be `swift:<auth_url>:<tenant>:<container>:<user>:<password>`"
-                )
+            match parts[1:]:
+                case [auth_url, tenant, container, user, password]:
+                    max_concurrency = 10
+                case [auth_url, tenant, container, user, password, raw_max_concurrency]:
+                    max_concurrency = _parse_positive_int(
+                        raw_max_concurrency, "SWIFT max concurrency"
+                    )
+                case _:
+                    raise click.BadParameter(
+                        "Invalid SWIFT config, must be `swift:<auth_url>:<tenant>:<container>:<user>:<password>[:<max_concurrency>]`"
+                    )
             # Provide https by default to avoid annoying escaping for most cases
             if (
                 auth_url
@@ -449,18 +532,59 @@ def _parse_blockstore_param(value: str) -> BaseBlockStoreConfig:
                 swift_container=container,
                 swift_user=user,
                 swift_password=password,
+                swift_max_concurrency=max_concurrency,
             )
+
+        elif parts[0].upper() == "FILESYSTEM":
+            # Only split the durability from the path if it is a known one, so that
+            # the path can contain colons (e.g. Windows drive `filesystem:C:\data`)
+            raw_path = value.partition(":")[2]
+            durability = FilesystemBlockStoreDurability.FULL
+            head, sep, tail = raw_path.rpartition(":")
+            # An odd number of trailing backslashes means the colon is escaped
+            colon_escaped = (len(head) - len(head.rstrip("\\"))) % 2 == 1
+            if (
+                sep
+                and not colon_escaped
+                and tail.upper() in FilesystemBlockStoreDurability.__members__
+            ):
+                durability = FilesystemBlockStoreDurability[tail.upper()]
+                raw_path = head
+            path = ":".join(_split_with_escaping(raw_path, delimiter=":"))
+            if not path:
+                raise click.BadParameter(
+                    "Invalid FILESYSTEM config, must be `filesystem:<path>[:<durability>]`"
+                )
+            return FilesystemBlockStoreConfig(path=path, durability=durability)
+
         else:
             raise click.BadParameter(f"Invalid blockstore type `{parts[0]}`")
 
 
-def _parse_blockstore_params(raw_params: Iterable[str]) -> BaseBlockStoreConfig:
+_RAID_MODE_PATTERN = re.compile(
+    r"RAID0(CH)?(/RAID0(CH)?/[0-9]+)?|RAID1|RAID5|RS[0-9]+", flags=re.IGNORECASE
+)
+
+
+def _parse_raid0_placement(raid_mode: str) -> RAID0BlockStorePlacement:
+    return (
+        RAID0BlockStorePlacement.CONSISTENT_HASHING
+        if raid_mode.upper() == "RAID0CH"
+        else RAID0BlockStorePlacement.MODULO
+    )
+
+
+def parse_blockstore_params(raw_params: Iterable[str]) -> BaseBlockStoreConfig:
+    """
+    Parse the values of a `--blockstore` option (see `blockstore_server_options`),
+    raise `click.BadParameter` if the config is invalid.
+    """
     raid_configs = defaultdict(list)
     for raw_param in raw_params:
         raid_mode: str | None
         raid_node: int | None
         raw_param_parts = raw_param.split(":", 2)
-        if raw_param_parts[0].upper() in ("RAID0", "RAID1", "RAID5") and len(raw_param_parts) == 3:
+        if _RAID_MODE_PATTERN.fullmatch(raw_param_parts[0]) and len(raw_param_parts) == 3:
             raid_mode, raw_raid_node, node_param = raw_param_parts
             try:
                 raid_node = int(raw_raid_node)
@@ -496,12 +620,37 @@ def _parse_blockstore_params(raw_params: Iterable[str]) -> BaseBlockStoreConfig:
             raise click.BadParameter(f"Multiple configuration for node index `{x}` in RAID config")
         blockstores.append(_parse_blockstore_param(x_node_params[0]))
 
-    if raid_mode.upper() == "RAID0":
-        return RAID0BlockStoreConfig(blockstores=blockstores)
+    if raid_mode.upper().startswith("RAID0"):
+        match raid_mode.split("/"):
+            case [current_mode]:
+                return RAID0BlockStoreConfig(
+                    blockstores=blockstores, placement=_parse_raid0_placement(current_mode)
+                )
+            case [current_mode, previous_mode, raw_previous_nodes_count]:
+                previous_nodes_count = int(raw_previous_nodes_count)
+                if not 0 < previous_nodes_count <= len(blockstores):
+                    raise click.BadParameter(
+                        f"Invalid RAID0 config `{raid_mode}`, the previous number of nodes must be between 1 and the number of nodes"
+                    )
+                return RAID0BlockStoreConfig(
+                    blockstores=blockstores,
+                    placement=_parse_raid0_placement(current_mode),
+                    previous_placement=_parse_raid0_placement(previous_mode),
+                    previous_nodes_count=previous_nodes_count,
+                )
+            case _:
+                assert False, raid_mode
     elif raid_mode.upper() == "RAID1":
         return RAID1BlockStoreConfig(blockstores=blockstores)
     elif raid_mode.upper() == "RAID5":
         return RAID5BlockStoreConfig(blockstores=blockstores)
+    elif raid_mode.upper().startswith("RS"):
+        parity_shards = int(raid_mode[2:])
+        if not 0 < parity_shards < len(blockstores):
+            raise click.BadParameter(
+                f"Invalid Reed-Solomon config `{raid_mode}`, the number of parity shards must be between 1 and the number of nodes minus 1"
+            )
+        return ReedSolomonBlockStoreConfig(blockstores=blockstores, parity_shards=parity_shards)
     else:
         raise click.BadParameter(f"Invalid multi blockstore mode `{raid_mode}`")
 
@@ -513,7 +662,7 @@ def blockstore_server_options[**P, T](fn: Callable[P, T]) -> Callable[P, T]:
             "-b",
             required=True,
             multiple=True,
-            callback=lambda _ctx, _param, value: _parse_blockstore_params(value),
+            callback=lambda _ctx, _param, value: parse_blockstore_params(value),
             envvar="PARSEC_BLOCKSTORE",
             show_envvar=True,
             metavar="CONFIG",
@@ -523,19 +672,36 @@ Allowed values:
 \b
 -`MOCKED`: Mocked in memory
 -`POSTGRESQL`: Use the database specified in the `--db` param
--`s3:[<endpoint_url>]:<region>:<bucket>:<key>:<secret>`: Use S3 storage
--`swift:<auth_url>:<tenant>:<container>:<user>:<password>`: Use SWIFT storage
+-`s3:[<endpoint_url>]:<region>:<bucket>:<key>:<secret>[:<max_concurrency>[:<max_pool_connections>]]`:
+Use S3 storage, with `<max_concurrency>` the maximum number of concurrent requests
+(default: 10) and `<max_pool_connections>` the size of the HTTP connection pool
+(default: `<max_concurrency>`, with a minimum of 10)
+-`swift:<auth_url>:<tenant>:<container>:<user>:<password>[:<max_concurrency>]`:
+Use SWIFT storage, with `<max_concurrency>` the maximum number of concurrent
+requests (default: 10)
+-`filesystem:<path>[:<durability>]`: Use a local directory, with `<durability>`
+NONE/FILE/FULL (default: FULL) controlling how data is flushed to disk (the path
+can contain colons, e.g. `filesystem:C:\\data:file`)
 
 Note endpoint_url/auth_url are considered as https by default (e.g.
 `s3:foo.com:[...]` -> https://foo.com).
 Escaping must be used to provide a custom scheme (e.g. `s3:http\\://foo.com:[...]`).
 
 On top of that, multiple blockstore configurations can be provided to form a
-RAID0/1/5 cluster.
+RAID0/1/5 or Reed-Solomon cluster.
 
 Each configuration must be provided with the form
-`<raid_type>:<node>:<config>` with `<raid_type>` RAID0/RAID1/RAID5, `<node>` a
-integer and `<config>` the MOCKED/POSTGRESQL/S3/SWIFT config.
+`<raid_type>:<node>:<config>` with `<raid_type>` RAID0/RAID0CH/RAID1/RAID5/RS<m>,
+`<node>` a integer and `<config>` the MOCKED/POSTGRESQL/S3/SWIFT/FILESYSTEM config.
+
+`RAID0CH` places the blocks using consistent hashing, so that adding a node only
+moves the blocks it takes over (nodes must be added last). After the nodes have
+changed, use `<raid_type>/<previous_raid_type>/<previous_nodes_count>` (e.g.
+`RAID0CH/RAID0CH/3`) until the blocks are moved by `parsec rebalance_raid0`.
+
+With Reed-Solomon (`RS<m>`), the last `<m>` nodes store parity shards, so up
+to `<m>` nodes can fail (e.g. `RS2` with 6 nodes stores 4 data shards and 2
+parity shards).
 """,
         )
     ]
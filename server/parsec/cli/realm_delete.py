@@ -10,14 +10,17 @@ import anyio
 import click
 
 from parsec._parsec import (
+    BlockID,
     DateTime,
     OrganizationID,
     VlobID,
 )
+from parsec.backend import Backend
 from parsec.cli.options import (
     db_server_options,
     debug_config_options,
     logging_config_options,
+    parse_blockstore_params,
 )
 from parsec.cli.testbed import if_testbed_available
 from parsec.cli.utils import cli_exception_handler, start_backend
@@ -30,6 +33,7 @@ from parsec.components.realm import (
     RealmListDeletionCandidatesBadOutcome,
 )
 from parsec.config import (
+    BaseBlockStoreConfig,
     BaseDatabaseConfig,
     DisabledBlockStoreConfig,
     LogLevel,
@@ -41,6 +45,9 @@ from parsec.config import (
 # PostgreSQL returns only a SERIAL (4 bytes) + UUID (16 bytes) for each
 # row, so we can go with a large batch.
 BLOCK_BATCH_SIZE = 10_000
+# Number of blocks deleted from the blockstore between two saves of the purge
+# progress (the blockstore takes care of deleting the blocks of a batch concurrently).
+BLOCK_PURGE_BATCH_SIZE = 10_000
 
 
 class ListDeletableRealmsDevOption(click.Option):
@@ -218,6 +225,18 @@ class DeleteRealmDevOption(click.Option):
     default=False,
     help="Pretend to do the deletion (export block slugs but do not delete metadata)",
 )
+@click.option(
+    "--purge-blockstore",
+    multiple=True,
+    callback=lambda _ctx, _param, value: parse_blockstore_params(value) if value else None,
+    metavar="CONFIG",
+    help=(
+        "Also delete the realm's blocks from this blockstore once the metadata have been"
+        " deleted (same format as the `--blockstore` option of `parsec run`)."
+        " If interrupted, run the command again with the same `--dump-realm-blocks`"
+        " to resume the purge."
+    ),
+)
 @db_server_options
 # Add --log-level/--log-format/--log-file
 @logging_config_options(default_log_level="INFO")
@@ -242,6 +261,7 @@ def delete_realm(
     realm: VlobID,
     dump_realm_blocks: Path,
     dry_run: bool,
+    purge_blockstore: BaseBlockStoreConfig | None,
     db: BaseDatabaseConfig,
     db_min_connections: int,
     db_max_connections: int,
@@ -261,6 +281,7 @@ def delete_realm(
                 realm_id=realm,
                 dump_realm_blocks=dump_realm_blocks,
                 dry_run=dry_run,
+                purge_blockstore=purge_blockstore,
                 with_testbed=with_testbed,
             )
         )
@@ -274,13 +295,27 @@ async def _delete_realm(
     realm_id: VlobID,
     dump_realm_blocks: Path,
     dry_run: bool,
+    purge_blockstore: BaseBlockStoreConfig | None = None,
 ) -> None:
+    if purge_blockstore is not None:
+        blockstore_config = purge_blockstore
     # Can use a dummy blockstore config since we are not going to query it
-    if with_testbed is None:
+    elif with_testbed is None:
         blockstore_config = DisabledBlockStoreConfig()
     else:
         blockstore_config = MockedBlockStoreConfig()
 
+    # The purge progress file is created once the list of blocks has been exported,
+    # hence its presence means we are resuming a purge (in which case the realm
+    # metadata are most likely already deleted and the list of blocks cannot be
+    # exported again).
+    purge_progress_file = dump_realm_blocks.with_name(f"{dump_realm_blocks.name}.purge-progress")
+    resume_purge = (
+        purge_blockstore is not None
+        and not dry_run
+        and await anyio.Path(purge_progress_file).exists()
+    )
+
     async with start_backend(
         db_config=db_config,
         blockstore_config=blockstore_config,
@@ -291,53 +326,61 @@ async def _delete_realm(
 
         # Step 1: Export block slugs
 
-        batch_offset_marker = 0
-        total_blocks = 0
-        async with await anyio.open_file(dump_realm_blocks, "w") as f:
-            with click.progressbar(
-                length=0,
-                label="Exporting a list of all the realm's block that can be removed",
-                show_pos=True,
-                update_min_steps=0,
-            ) as bar:
-                assert bar.length is not None
-
-                while True:
-                    outcome = await backend.realm.delete_1_get_blocks_batch(
-                        organization_id=organization_id,
-                        realm_id=realm_id,
-                        batch_offset_marker=batch_offset_marker,
-                        batch_size=BLOCK_BATCH_SIZE,
-                    )
+        blocks_file_display = click.style(str(dump_realm_blocks), fg="green")
+        if resume_purge:
+            click.echo(f"Resuming the purge of the blocks listed in {blocks_file_display}")
+        else:
+            batch_offset_marker = 0
+            total_blocks = 0
+            async with await anyio.open_file(dump_realm_blocks, "w") as f:
+                with click.progressbar(
+                    length=0,
+                    label="Exporting a list of all the realm's block that can be removed",
+                    show_pos=True,
+                    update_min_steps=0,
+                ) as bar:
+                    assert bar.length is not None
+
+                    while True:
+                        outcome = await backend.realm.delete_1_get_blocks_batch(
+                            organization_id=organization_id,
+                            realm_id=realm_id,
+                            batch_offset_marker=batch_offset_marker,
+                            batch_size=BLOCK_BATCH_SIZE,
+                        )
 
-                    match outcome:
-                        case RealmDeleteGetBlocksBatch() as batch:
-                            pass
-                        case RealmDelete1GetBlocksBatchBadOutcome.ORGANIZATION_NOT_FOUND:
-                            raise RuntimeError(f"Organization `{organization_id.str}` not found")
-                        case RealmDelete1GetBlocksBatchBadOutcome.REALM_NOT_FOUND:
-                            raise RuntimeError(f"Realm `{realm_id.hex}` not found")
+                        match outcome:
+                            case RealmDeleteGetBlocksBatch() as batch:
+                                pass
+                            case RealmDelete1GetBlocksBatchBadOutcome.ORGANIZATION_NOT_FOUND:
+                                raise RuntimeError(
+                                    f"Organization `{organization_id.str}` not found"
+                                )
+                            case RealmDelete1GetBlocksBatchBadOutcome.REALM_NOT_FOUND:
+                                raise RuntimeError(f"Realm `{realm_id.hex}` not found")
 
-                    for block_id in batch.blocks:
-                        slug = f"{organization_id.str}/{block_id.hyphenated}"
-                        await f.write(slug + "\n")
+                        for block_id in batch.blocks:
+                            slug = f"{organization_id.str}/{block_id.hyphenated}"
+                            await f.write(slug + "\n")
 
-                    total_blocks += len(batch.blocks)
-                    bar.length += len(batch.blocks)
-                    bar.update(len(batch.blocks))
+                        total_blocks += len(batch.blocks)
+                        bar.length += len(batch.blocks)
+                        bar.update(len(batch.blocks))
 
-                    if len(batch.blocks) < BLOCK_BATCH_SIZE:
-                        break
+                        if len(batch.blocks) < BLOCK_BATCH_SIZE:
+                            break
 
-                    batch_offset_marker = batch.batch_offset_marker
+                        batch_offset_marker = batch.batch_offset_marker
 
-        blocks_file_display = click.style(str(dump_realm_blocks), fg="green")
-        click.echo(f"Exported {total_blocks} block slug(s) to {blocks_file_display}")
+            click.echo(f"Exported {total_blocks} block slug(s) to {blocks_file_display}")
 
         if dry_run:
             click.echo(click.style("Dry run: skipping metadata deletion", fg="yellow"))
             return
 
+        if purge_blockstore is not None and not resume_purge:
+            await anyio.Path(purge_progress_file).write_text("0")
+
         # Step 2: Delete metadata
 
         click.echo(f"Deleting metadata for realm {realm_display}... ", nl=False)
@@ -356,6 +399,8 @@ async def _delete_realm(
                 raise RuntimeError(f"Organization `{organization_id.str}` not found")
             case RealmDelete2DoDeleteMetadataBadOutcome.REALM_NOT_FOUND:
                 raise RuntimeError(f"Realm `{realm_id.hex}` not found")
+            case RealmDelete2DoDeleteMetadataBadOutcome.REALM_ALREADY_DELETED if resume_purge:
+                pass
             case RealmDelete2DoDeleteMetadataBadOutcome.REALM_ALREADY_DELETED:
                 raise RuntimeError(f"Realm `{realm_id.hex}` has already been deleted")
             case RealmDelete2DoDeleteMetadataBadOutcome.REALM_NOT_ORPHANED_NOR_DELETION_PLANNED:
@@ -368,9 +413,71 @@ async def _delete_realm(
                 )
 
         click.echo(click.style("✔", fg="green"))
+
+        if purge_blockstore is not None:
+            # Step 3: Purge blocks
+
+            await _purge_blocks(backend, organization_id, dump_realm_blocks, purge_progress_file)
+            await anyio.Path(purge_progress_file).unlink()
+            return
+
         click.echo(
             "⚠️ The realm has been deleted, however its blocks are still present in the object storage"
         )
         click.echo(
             f"⚠️ You should now manually clean the object storage by removing all the path listed in {blocks_file_display}"
         )
+
+
+async def _purge_blocks(
+    backend: Backend,
+    organization_id: OrganizationID,
+    dump_realm_blocks: Path,
+    purge_progress_file: Path,
+) -> None:
+    slug_prefix = f"{organization_id.str}/"
+    block_ids: list[BlockID] = []
+    async with await anyio.open_file(dump_realm_blocks, "r") as f:
+        async for line in f:
+            slug = line.strip()
+            if not slug:
+                continue
+            if not slug.startswith(slug_prefix):
+                raise RuntimeError(f"Unexpected block slug `{slug}` in {dump_realm_blocks}")
+            try:
+                block_ids.append(BlockID.from_hex(slug.removeprefix(slug_prefix)))
+            except ValueError as exc:
+                raise RuntimeError(f"Invalid block slug `{slug}` in {dump_realm_blocks}") from exc
+
+    # Blocks before this index have already been deleted (note deleting a block
+    # is idempotent, so it is fine if the progress is a bit behind).
+    purged = int(await anyio.Path(purge_progress_file).read_text())
+
+    with click.progressbar(
+        length=len(block_ids),
+        label="Deleting the realm's blocks from the blockstore",
+        show_pos=True,
+        update_min_steps=0,
+    ) as bar:
+        bar.update(purged)
+
+        while purged < len(block_ids):
+            batch = block_ids[purged : purged + BLOCK_PURGE_BATCH_SIZE]
+            failed = 0
+            async with backend.blockstore.delete_many(organization_id, batch) as results:
+                async for _, outcome in results:
+                    if outcome is not None:
+                        failed += 1
+                    bar.update(1)
+
+            if failed:
+                # Details about the errors should have been logged by the blockstore
+                raise RuntimeError(
+                    f"Failed to delete {failed} block(s) from the blockstore,"
+                    " run the command again to resume the purge"
+                )
+
+            purged += len(batch)
+            await anyio.Path(purge_progress_file).write_text(str(purged))
+
+    click.echo(f"Deleted {len(block_ids)} block(s) from the blockstore")
@@ -0,0 +1,127 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import click
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.cli.options import (
+    blockstore_server_options,
+    db_server_options,
+    debug_config_options,
+    logging_config_options,
+)
+from parsec.cli.utils import cli_exception_handler, for_each_block, start_backend
+from parsec.components.raid0_blockstore import (
+    RAID0BlockStoreComponent,
+    RAID0BlockStoreRebalanceBadOutcome,
+)
+from parsec.config import (
+    BaseBlockStoreConfig,
+    BaseDatabaseConfig,
+    LogLevel,
+)
+
+
+@click.command(short_help="Move the blocks of a RAID0 blockstore after its nodes have changed")
+@click.option(
+    "--progress-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    required=True,
+    help="File used to save the progress (run the command again with the same file to resume)",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Maximum number of blocks moved concurrently",
+)
+@db_server_options
+@blockstore_server_options
+# Add --log-level/--log-format/--log-file
+@logging_config_options(default_log_level="INFO")
+# Add --debug & --version
+@debug_config_options
+def rebalance_raid0(
+    progress_file: Path,
+    concurrency: int,
+    db: BaseDatabaseConfig,
+    db_min_connections: int,
+    db_max_connections: int,
+    blockstore: BaseBlockStoreConfig,
+    log_level: LogLevel,
+    log_format: str,
+    log_file: str | None,
+    debug: bool,
+) -> None:
+    """
+    Move each block from the node it was stored on with the previous layout of the
+    RAID0 cluster (e.g. `--blockstore RAID0CH/RAID0CH/3:<node>:<config>`) to its
+    node with the current layout.
+
+    Only the blocks whose node has changed are moved. The server can keep running
+    during the rebalance (reads fall back to the previous node of the block), once
+    done the previous layout can be removed from the blockstore config.
+    """
+    with cli_exception_handler(debug):
+        asyncio.run(
+            _rebalance_raid0(
+                debug=debug,
+                db_config=db,
+                blockstore_config=blockstore,
+                progress_file=progress_file,
+                concurrency=concurrency,
+            )
+        )
+
+
+async def _rebalance_raid0(
+    db_config: BaseDatabaseConfig,
+    blockstore_config: BaseBlockStoreConfig,
+    debug: bool,
+    progress_file: Path,
+    concurrency: int,
+) -> None:
+    async with start_backend(
+        db_config=db_config,
+        blockstore_config=blockstore_config,
+        debug=debug,
+    ) as backend:
+        blockstore = backend.blockstore
+        if not isinstance(blockstore, RAID0BlockStoreComponent):
+            raise RuntimeError("Blockstore must be a RAID0 cluster")
+        if blockstore.previous_layout is None:
+            raise RuntimeError(
+                "Blockstore must provide the previous layout of the RAID0 cluster"
+                " (i.e. `<raid_type>/<previous_raid_type>/<previous_nodes_count>:<node>:<config>`)"
+            )
+
+        moved = 0
+
+        async def _rebalance(organization_id: OrganizationID, block_id: BlockID) -> bool:
+            nonlocal moved
+            match await blockstore.rebalance(organization_id, block_id):
+                case True:
+                    moved += 1
+                case False:
+                    pass
+                case RAID0BlockStoreRebalanceBadOutcome.STORE_UNAVAILABLE:
+                    return False
+            return True
+
+        # Note moving a block is idempotent, so it is fine to process a batch again
+        await for_each_block(
+            backend,
+            _rebalance,
+            label="Moving the blocks to their new node",
+            progress_file=progress_file,
+            concurrency=concurrency,
+        )
+
+        click.echo(f"Moved {moved} block(s)")
+        click.echo(
+            "The previous layout can now be removed from the blockstore config, and the progress file deleted"
+        )
@@ -2,11 +2,24 @@
 from __future__ import annotations
 
 import asyncio
+import multiprocessing
+import multiprocessing.connection
+import signal
+import socket
+import sys
+import time
 from collections.abc import Callable, Coroutine
+from contextlib import suppress
+from functools import partial
 from hashlib import blake2b
 from pathlib import Path
-from typing import Any
+from typing import Any, cast
 
+import anyio
+
+# Required because the top-level module of anyio does not correctly load the submodule to_thread
+# see https://github.com/microsoft/pyright/issues/10912
+import anyio.to_thread
 import click
 
 from parsec._parsec import (
@@ -40,8 +53,10 @@ from parsec.config import (
     BackendConfig,
     BaseBlockStoreConfig,
     BaseDatabaseConfig,
+    CacheBlockStoreConfig,
     CryptpadConfig,
     EmailConfig,
+    FilesystemBlockStoreConfig,
     LogLevel,
     MockedEmailConfig,
     OpenBaoAuthConfig,
@@ -49,6 +64,7 @@ from parsec.config import (
     OpenBaoConfig,
     ScwsConfig,
     SmtpEmailConfig,
+    TieredBlockStoreConfig,
 )
 from parsec.logging import get_logger
 from parsec.templates import get_environment
@@ -56,6 +72,8 @@ from parsec.templates import get_environment
 logger = get_logger()
 
 DEFAULT_PORT = 6777
+# Uvicorn's graceful shutdown timeout (see `serve_parsec_asgi_app`), plus some margin
+WORKERS_SHUTDOWN_TIMEOUT = 15
 DEFAULT_EMAIL_SENDER = EmailAddress("no-reply@parsec.com")
 
 
@@ -143,6 +161,19 @@ For instance:
     show_envvar=True,
     help="Port to listen on",
 )
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    envvar="PARSEC_WORKERS",
+    show_envvar=True,
+    help=(
+        "Number of server processes (requires PostgreSQL, not available on Windows)."
+        " The processes share the listening port and split the database connections"
+        " (i.e. `--db-min-connections` and `--db-max-connections` are totals for all processes)"
+    ),
+)
 @db_server_options
 @click.option(
     "--skip-database-migrations-check",
@@ -169,6 +200,62 @@ For instance:
     help="Number of seconds before a new attempt at connecting to the database",
 )
 @blockstore_server_options
+@click.option(
+    "--blockstore-cache-size",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    envvar="PARSEC_BLOCKSTORE_CACHE_SIZE",
+    show_envvar=True,
+    metavar="MiB",
+    help="Size (in MiB) of the in-memory cache for the blocks read from the blockstore (pass 0 to disable)",
+)
+@click.option(
+    "--blockstore-hot-tier",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True),
+    envvar="PARSEC_BLOCKSTORE_HOT_TIER",
+    show_envvar=True,
+    show_default="disabled",
+    metavar="PATH",
+    help="""Local directory used as a fast tier in front of the blockstore.
+
+Recently created or read blocks are kept in this directory, which is typically
+located on a local SSD while the blockstore is a remote object storage.
+
+Not compatible with `--workers`.
+""",
+)
+@click.option(
+    "--blockstore-hot-tier-size",
+    default=1024,
+    show_default=True,
+    type=click.IntRange(min=1),
+    envvar="PARSEC_BLOCKSTORE_HOT_TIER_SIZE",
+    show_envvar=True,
+    metavar="MiB",
+    help="Maximum size (in MiB) of the blocks kept in the hot tier",
+)
+@click.option(
+    "--blockstore-hot-tier-max-age",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    envvar="PARSEC_BLOCKSTORE_HOT_TIER_MAX_AGE",
+    show_envvar=True,
+    metavar="SECONDS",
+    help="Evict blocks from the hot tier once they have not been accessed for this amount of time (pass 0 to disable)",
+)
+@click.option(
+    "--blockstore-hot-tier-write-back",
+    is_flag=True,
+    envvar="PARSEC_BLOCKSTORE_HOT_TIER_WRITE_BACK",
+    show_envvar=True,
+    help="""Only write the created blocks in the hot tier, then upload them to the blockstore in the background.
+
+This reduces the latency of block creation, at the cost of losing the blocks not yet
+uploaded in case the hot tier directory is lost.
+""",
+)
 @click.option(
     "--administration-token",
     required=True,
@@ -358,6 +445,69 @@ For instance: `en_US:https://example.com/tos_en,fr_FR:https://example.com/tos_fr
 """,
     show_default="no TOS",
 )
+@click.option(
+    "--organization-max-in-flight-requests",
+    envvar="PARSEC_ORGANIZATION_MAX_IN_FLIGHT_REQUESTS",
+    show_envvar=True,
+    type=click.IntRange(min=1),
+    show_default="no limit",
+    help="""Maximum number of authenticated requests processed at the same time for
+a given organization.
+
+Additional requests wait for a request to be done, unless `--organization-max-queued-requests`
+requests are already waiting in which case they are rejected with a `503` status (the client
+then retries later).
+
+Note this limit is applied by each worker (see `--workers`).
+""",
+)
+@click.option(
+    "--organization-max-queued-requests",
+    envvar="PARSEC_ORGANIZATION_MAX_QUEUED_REQUESTS",
+    show_envvar=True,
+    type=click.IntRange(min=0),
+    default=100,
+    show_default=True,
+    help="Maximum number of authenticated requests waiting for `--organization-max-in-flight-requests`",
+)
+@click.option(
+    "--organization-rate-limit",
+    envvar="PARSEC_ORGANIZATION_RATE_LIMIT",
+    show_envvar=True,
+    type=click.FloatRange(min=0, min_open=True),
+    show_default="no limit",
+    help="""Number of authenticated requests per second allowed for a given organization.
+
+Requests exceeding the limit are rejected with a `503` status and a `Retry-After` header
+(the client then retries later).
+
+Note this limit is applied by each worker (see `--workers`).
+""",
+)
+@click.option(
+    "--organization-rate-limit-burst",
+    envvar="PARSEC_ORGANIZATION_RATE_LIMIT_BURST",
+    show_envvar=True,
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Number of authenticated requests an organization can send at once when `--organization-rate-limit` is set",
+)
+@click.option(
+    "--auth-token-verify-threads",
+    envvar="PARSEC_AUTH_TOKEN_VERIFY_THREADS",
+    show_envvar=True,
+    type=click.IntRange(min=1),
+    show_default="verify on the event loop",
+    help="""Number of threads verifying the signature of the authentication tokens.
+
+By default the signature is verified directly on the event loop, which is the fastest
+as long as the server is not saturated by authenticated requests. Otherwise verifying
+them in threads (by batches) frees the event loop for the other requests.
+
+Note those threads are created by each worker (see `--workers`).
+""",
+)
 # Add option to load trusted CA for server to do a pre-check during async-enrollment
 @pki_server_options
 # Add scws related options (scws public keys, scws service private key)
@@ -541,6 +691,29 @@ for any given email address).
     show_envvar=True,
     help="Keep SSE connection open by sending keepalive messages to client, in seconds (pass <= 0 to disable)",
 )
+@click.option(
+    "--tracing-export",
+    envvar="PARSEC_TRACING_EXPORT",
+    show_envvar=True,
+    show_default="tracing disabled",
+    help="""Enable the tracing of the requests (time spent waiting for a database connection,
+in each database query, in the blockstore etc.), and export the spans to:
+
+\b
+- An OpenTelemetry collector if it is an OTLP/HTTP traces URL
+  (e.g. `http://localhost:4318/v1/traces`)
+- A local file otherwise, with one OTLP JSON export request per line
+""",
+)
+@click.option(
+    "--tracing-sample-rate",
+    envvar="PARSEC_TRACING_SAMPLE_RATE",
+    show_envvar=True,
+    type=click.FloatRange(min=0, max=1),
+    default=0.01,
+    show_default=True,
+    help="Fraction of the requests traced when `--tracing-export` is set",
+)
 @click.option(
     "--with-client-web-app",
     type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
@@ -579,6 +752,7 @@ for any given email address).
 async def run_cmd(
     host: str,
     port: int,
+    workers: int,
     db: BaseDatabaseConfig,
     db_min_connections: int,
     db_max_connections: int,
@@ -586,6 +760,11 @@ async def run_cmd(
     maximum_database_connection_attempts: int,
     pause_before_retry_database_connection: float,
     blockstore: BaseBlockStoreConfig,
+    blockstore_cache_size: int,
+    blockstore_hot_tier: str | None,
+    blockstore_hot_tier_size: int,
+    blockstore_hot_tier_max_age: int,
+    blockstore_hot_tier_write_back: bool,
     administration_token: str,
     account_config: AccountConfig,
     advisory_device_file_protection: tuple[AdvisoryDeviceFileProtection, ...],
@@ -601,6 +780,11 @@ async def run_cmd(
     organization_initial_user_profile_outsider_allowed: bool,
     organization_initial_realm_deletion_min_archiving_period: int,
     organization_initial_tos: dict[TosLocale, TosUrl] | None,
+    organization_max_in_flight_requests: int | None,
+    organization_max_queued_requests: int,
+    organization_rate_limit: float | None,
+    organization_rate_limit_burst: int,
+    auth_token_verify_threads: int | None,
     trusted_x509_root_dir: list[X509TrustAnchor],
     scws_config: ScwsConfig | None,
     # (cooldown in seconds, max number of email per hour)
@@ -628,6 +812,8 @@ async def run_cmd(
     sentry_profiles_sample_rate: float | None,
     configure_sentry: Callable[[], Coroutine[Any, Any, None]],
     sse_keepalive: int | None,
+    tracing_export: str | None,
+    tracing_sample_rate: float,
     with_client_web_app: Path | None,
     cors_allow_origins: list[str],
     debug: bool,
@@ -641,6 +827,22 @@ async def run_cmd(
         if not skip_database_migrations_check:
             await _check_database_migrations_applied(db)
 
+        if workers > 1:
+            # Each worker would have its own view of the hot tier directory (blocks
+            # index, write-back queue, eviction), so they cannot share it
+            if blockstore_hot_tier is not None:
+                raise ValueError("--blockstore-hot-tier is not compatible with --workers")
+            if db.is_mocked():
+                raise ValueError("--workers requires a PostgreSQL database (see --db)")
+            if not hasattr(socket, "SO_REUSEPORT") or sys.platform == "win32":
+                raise ValueError("--workers is not available on this platform")
+            if db_max_connections // workers < 2:
+                raise ValueError(
+                    "--db-max-connections must allow at least 2 connections per worker"
+                )
+            # Each worker has its own pool
+            db.set_min_max_connections(db_min_connections // workers, db_max_connections // workers)
+
         email_config: EmailConfig
         if email_host == "MOCKED":
             if email_sender:
@@ -699,6 +901,24 @@ async def run_cmd(
                 auths=auths,
             )
 
+        if blockstore_hot_tier is not None:
+            blockstore = TieredBlockStoreConfig(
+                hot=FilesystemBlockStoreConfig(path=blockstore_hot_tier),
+                cold=blockstore,
+                hot_max_size=blockstore_hot_tier_size * 1024 * 1024,
+                hot_max_age=blockstore_hot_tier_max_age or None,
+                write_back=blockstore_hot_tier_write_back,
+            )
+        elif blockstore_hot_tier_write_back:
+            raise ValueError(
+                "--blockstore-hot-tier is required when --blockstore-hot-tier-write-back is provided"
+            )
+
+        if blockstore_cache_size:
+            blockstore = CacheBlockStoreConfig(
+                blockstore=blockstore, max_size=blockstore_cache_size * 1024 * 1024
+            )
+
         app_config = BackendConfig(
             jinja_env=jinja_env,
             administration_token=administration_token,
@@ -725,6 +945,13 @@ async def run_cmd(
             organization_initial_user_profile_outsider_allowed=organization_initial_user_profile_outsider_allowed,
             organization_initial_realm_deletion_min_archiving_period=organization_initial_realm_deletion_min_archiving_period,
             organization_initial_tos=organization_initial_tos,
+            organization_max_in_flight_requests=organization_max_in_flight_requests,
+            organization_max_queued_requests=organization_max_queued_requests,
+            organization_rate_limit=organization_rate_limit,
+            organization_rate_limit_burst=organization_rate_limit_burst,
+            auth_token_verify_threads=auth_token_verify_threads,
+            tracing_export=tracing_export,
+            tracing_sample_rate=tracing_sample_rate,
             email_rate_limit_cooldown_delay=max(validation_email_rate_limit[0], 0),
             email_rate_limit_max_per_hour=max(validation_email_rate_limit[1], 0),
             fake_account_password_algorithm_seed=fake_account_password_algorithm_seed,
@@ -732,7 +959,8 @@ async def run_cmd(
 
         click.echo(
             f"Starting Parsec server on {host}:{port}"
-            f"(db={app_config.db_config.type}"
+            f"(workers={workers}"
+            f" db={app_config.db_config.type}"
             f" blockstore={app_config.blockstore_config.type}"
             f" email={email_config.type}"
             f" telemetry={'on' if sentry_dsn else 'off'}"
@@ -743,7 +971,8 @@ async def run_cmd(
             retry_policy = RetryPolicy(
                 maximum_database_connection_attempts, pause_before_retry_database_connection
             )
-            await _run_backend(
+            run_backend = partial(
+                _run_backend,
                 host=host,
                 port=port,
                 ssl_certfile=ssl_certfile,
@@ -754,6 +983,10 @@ async def run_cmd(
                 cors_allow_origins=cors_allow_origins,
                 app_config=app_config,
             )
+            if workers == 1:
+                await run_backend()
+            else:
+                await _run_workers(workers, partial(run_backend, reuse_port=True))
         # Ignore some noisy cancellation
         # Note that this is no longer necessary with the latest anyio version (version 4.6)
         # This can be verified using the following protocol:
@@ -798,6 +1031,7 @@ async def _run_backend(
     with_client_web_app: Path | None,
     cors_allow_origins: list[str],
     app_config: BackendConfig,
+    reuse_port: bool = False,
 ) -> None:
     # Log the server version and the backend configuration
     logger.info("Parsec version", version=server_version)
@@ -830,6 +1064,7 @@ async def _run_backend(
                     ssl_keyfile=ssl_keyfile,
                     ssl_ciphers=ssl_ciphers,
                     proxy_trusted_addresses=app_config.proxy_trusted_addresses,
+                    reuse_port=reuse_port,
                 )
                 return
 
@@ -844,6 +1079,95 @@ async def _run_backend(
             await retry_policy.pause()
 
 
+def _run_worker(run_backend: Callable[[], Coroutine[Any, Any, None]]) -> None:
+    # The worker is forked from the supervisor while its event loop is running,
+    # asyncio takes care of letting the worker start its own one.
+    # Note the worker is stopped by a signal, which is re-raised by uvicorn once
+    # the graceful shutdown is done: SIGTERM is handled like SIGINT so that the
+    # worker exits normally (e.g. flushing the logs, see `queue_log_stream`)
+    # instead of being killed by the signal.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with suppress(KeyboardInterrupt):
+        asyncio.run(run_backend())
+
+
+async def _run_workers(workers: int, run_backend: Callable[[], Coroutine[Any, Any, None]]) -> None:
+    """
+    Run the server in `workers` processes sharing nothing but the listening port:
+    each worker has its own database pool, SSE clients etc. (events between workers
+    go through PostgreSQL just like between servers).
+
+    The supervisor (i.e. this process) stops all the workers as soon as it receives
+    SIGINT/SIGTERM or one of the workers stops, so that the workers are either all
+    running or all stopped. A worker stopping on its own (whatever its exit code,
+    e.g. the server exits with 0 if it fails to start) is reported as a crash.
+    """
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_run_worker, args=(run_backend,), name=f"parsec-worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.info("Workers started", pids=[process.pid for process in processes])
+
+    stopped_worker: multiprocessing.process.BaseProcess | None = None
+    try:
+        with anyio.open_signal_receiver(signal.SIGINT, signal.SIGTERM) as signals:
+            async with anyio.create_task_group() as tg:
+
+                async def _wait_for_signal() -> None:
+                    async for signum in signals:
+                        logger.info("Stopping workers", signal=signal.Signals(signum).name)
+                        break
+                    tg.cancel_scope.cancel()
+
+                async def _watch_workers() -> None:
+                    nonlocal stopped_worker
+                    sentinels = {process.sentinel: process for process in processes}
+                    ready = await anyio.to_thread.run_sync(
+                        multiprocessing.connection.wait, list(sentinels), abandon_on_cancel=True
+                    )
+                    # The supervisor may have started the shutdown in the meantime
+                    if not tg.cancel_scope.cancel_called:
+                        stopped_worker = sentinels[cast(int, ready[0])]
+                        tg.cancel_scope.cancel()
+
+                tg.start_soon(_wait_for_signal)
+                tg.start_soon(_watch_workers)
+
+    finally:
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(_stop_workers, processes)
+
+    # Only set if the worker stopped before the supervisor started the shutdown
+    # (i.e. the workers exiting during the shutdown are expected to do so).
+    # Note that when the whole service is stopped (e.g. SIGINT sent to all the
+    # processes on Ctrl-C), the supervisor handles its signal right away while the
+    # workers first go through their graceful shutdown.
+    if stopped_worker is not None:
+        raise SystemExit(
+            f"Worker {stopped_worker.name} has stopped unexpectedly"
+            f" (exit code {stopped_worker.exitcode})"
+        )
+
+
+def _stop_workers(processes: list[multiprocessing.process.BaseProcess]) -> None:
+    # SIGTERM triggers the graceful shutdown of the worker (i.e. ongoing requests
+    # are given some time to complete)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+    deadline = time.monotonic() + WORKERS_SHUTDOWN_TIMEOUT
+    for process in processes:
+        process.join(max(deadline - time.monotonic(), 0))
+        if process.is_alive():
+            logger.warning("Worker didn't stop in time, killing it", pid=process.pid)
+            process.kill()
+            process.join()
+
+
 async def _check_database_migrations_applied(db_config: BaseDatabaseConfig) -> None:
     if db_config.is_mocked():
         return
@@ -0,0 +1,140 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from pathlib import Path
+
+import click
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.cli.options import (
+    blockstore_server_options,
+    db_server_options,
+    debug_config_options,
+    logging_config_options,
+)
+from parsec.cli.utils import cli_exception_handler, for_each_block, start_backend
+from parsec.components.blockstore import BlockStoreScrubBadOutcome, BlockStoreScrubOutcome
+from parsec.config import (
+    BaseBlockStoreConfig,
+    BaseDatabaseConfig,
+    LogLevel,
+)
+
+
+@click.command(short_help="Check the blocks are consistent across the blockstore nodes")
+@click.option(
+    "--progress-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    required=True,
+    help="File used to save the progress (run the command again with the same file to resume)",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Maximum number of blocks checked concurrently",
+)
+@click.option(
+    "--max-rate",
+    type=click.FloatRange(min=0, min_open=True),
+    default=100,
+    show_default=True,
+    help="Maximum number of blocks checked per second",
+)
+@db_server_options
+@blockstore_server_options
+# Add --log-level/--log-format/--log-file
+@logging_config_options(default_log_level="INFO")
+# Add --debug & --version
+@debug_config_options
+def scrub_blockstore(
+    progress_file: Path,
+    concurrency: int,
+    max_rate: float,
+    db: BaseDatabaseConfig,
+    db_min_connections: int,
+    db_max_connections: int,
+    blockstore: BaseBlockStoreConfig,
+    log_level: LogLevel,
+    log_format: str,
+    log_file: str | None,
+    debug: bool,
+) -> None:
+    """
+    Go through all the blocks and check each node of the blockstore holds a
+    consistent copy (RAID1) or chunk (RAID5, Reed-Solomon) of them.
+
+    Missing copies/chunks are rebuilt from the other nodes (divergent RAID1 replicas
+    are also overwritten with the majority copy), so that reads don't have to go
+    through the degraded path. Blocks that cannot be repaired are listed at the end.
+
+    This is meant to be run periodically alongside the server (see `--max-rate`).
+    """
+    with cli_exception_handler(debug):
+        asyncio.run(
+            _scrub_blockstore(
+                debug=debug,
+                db_config=db,
+                blockstore_config=blockstore,
+                progress_file=progress_file,
+                concurrency=concurrency,
+                max_rate=max_rate,
+            )
+        )
+
+
+async def _scrub_blockstore(
+    db_config: BaseDatabaseConfig,
+    blockstore_config: BaseBlockStoreConfig,
+    debug: bool,
+    progress_file: Path,
+    concurrency: int,
+    max_rate: float,
+) -> None:
+    async with start_backend(
+        db_config=db_config,
+        blockstore_config=blockstore_config,
+        debug=debug,
+    ) as backend:
+        stats: Counter[BlockStoreScrubOutcome | BlockStoreScrubBadOutcome] = Counter()
+        unrepairable: list[tuple[OrganizationID, BlockID, BlockStoreScrubBadOutcome]] = []
+
+        async def _scrub(organization_id: OrganizationID, block_id: BlockID) -> bool:
+            outcome = await backend.blockstore.scrub(organization_id, block_id)
+            stats[outcome] += 1
+            match outcome:
+                case BlockStoreScrubOutcome():
+                    pass
+                case BlockStoreScrubBadOutcome.STORE_UNAVAILABLE:
+                    # Block will be checked again when the command is resumed
+                    return False
+                case BlockStoreScrubBadOutcome():
+                    unrepairable.append((organization_id, block_id, outcome))
+            return True
+
+        try:
+            await for_each_block(
+                backend,
+                _scrub,
+                label="Checking the blocks",
+                progress_file=progress_file,
+                concurrency=concurrency,
+                max_rate=max_rate,
+            )
+
+        finally:
+            click.echo(
+                f"Healthy: {stats[BlockStoreScrubOutcome.HEALTHY]}, "
+                f"repaired: {stats[BlockStoreScrubOutcome.REPAIRED]}, "
+                f"corrupted: {stats[BlockStoreScrubBadOutcome.BLOCK_CORRUPTED]}, "
+                f"lost: {stats[BlockStoreScrubBadOutcome.BLOCK_LOST]}, "
+                f"unavailable: {stats[BlockStoreScrubBadOutcome.STORE_UNAVAILABLE]}"
+            )
+            for organization_id, block_id, outcome in unrepairable:
+                click.echo(
+                    f"{click.style(outcome.name, fg='red')}: organization `{organization_id.str}`,"
+                    f" block `{block_id.hex}`"
+                )
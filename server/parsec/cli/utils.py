@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 import datetime
+import math
 import traceback
 from collections.abc import AsyncGenerator, Awaitable, Callable, Generator
 from contextlib import asynccontextmanager, contextmanager
 from functools import partial
+from pathlib import Path
 from typing import (
     Any,
     ClassVar,
@@ -20,7 +22,7 @@ import anyio
 import anyio.to_thread
 import click
 
-from parsec._parsec import DateTime, ParsecAddr, SecretKey
+from parsec._parsec import BlockID, DateTime, OrganizationID, ParsecAddr, SecretKey
 from parsec.backend import Backend, backend_factory
 from parsec.config import (
     BackendConfig,
@@ -321,6 +323,86 @@ async def start_backend(
         yield backend
 
 
+# Number of block IDs fetched at once from the database by `for_each_block`,
+# the progress is saved after each batch.
+BLOCK_BATCH_SIZE = 1_000
+
+
+async def for_each_block(
+    backend: Backend,
+    fn: Callable[[OrganizationID, BlockID], Awaitable[bool]],
+    label: str,
+    progress_file: Path,
+    concurrency: int,
+    max_rate: float | None = None,
+) -> None:
+    """
+    Call `fn` on each block of the server (all organizations included), typically to
+    run a maintenance operation on the blockstore.
+
+    `fn` returns `False` if it has failed on a block, in which case the current batch
+    is completed but an error is raised instead of saving the progress. Hence running
+    the command again with the same progress file resumes where it stopped (and
+    retries the failed blocks).
+
+    `max_rate` limits the number of blocks processed per second, so that the command
+    can run alongside the server without starving it.
+    """
+    if await anyio.Path(progress_file).exists():
+        batch_offset_marker = int(await anyio.Path(progress_file).read_text())
+        progress_file_display = click.style(str(progress_file), fg="green")
+        click.echo(f"Resuming from the progress saved in {progress_file_display}")
+    else:
+        batch_offset_marker = 0
+
+    interval = 1 / max_rate if max_rate else 0.0
+    next_start = -math.inf
+
+    with click.progressbar(
+        length=0,
+        label=label,
+        show_pos=True,
+        update_min_steps=0,
+    ) as bar:
+        assert bar.length is not None
+
+        while True:
+            batch = await backend.block.get_blocks_batch(
+                batch_offset_marker=batch_offset_marker,
+                batch_size=BLOCK_BATCH_SIZE,
+            )
+            bar.length += len(batch.blocks)
+            todo = iter(batch.blocks)
+            failed = 0
+
+            async def _worker() -> None:
+                nonlocal failed, next_start
+                for organization_id, block_id in todo:
+                    # Throttling: blocks are started at `interval` from one another
+                    now = anyio.current_time()
+                    next_start = max(now, next_start + interval)
+                    await anyio.sleep(next_start - now)
+                    if not await fn(organization_id, block_id):
+                        failed += 1
+                    bar.update(1)
+
+            async with anyio.create_task_group() as task_group:
+                for _ in range(min(concurrency, len(batch.blocks))):
+                    task_group.start_soon(_worker)
+
+            if failed:
+                # Details about the errors should have been logged by the blockstore
+                raise RuntimeError(
+                    f"Failed on {failed} block(s), run the command again to resume the operation"
+                )
+
+            batch_offset_marker = batch.batch_offset_marker
+            await anyio.Path(progress_file).write_text(str(batch_offset_marker))
+
+            if len(batch.blocks) < BLOCK_BATCH_SIZE:
+                break
+
+
 async def _populate_backend(backend: Backend, testbed_template: str) -> None:
     from parsec._parsec import testbed
 
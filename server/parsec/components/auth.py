@@ -1,9 +1,17 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 
+import time
 from base64 import urlsafe_b64decode, urlsafe_b64encode
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import auto
 
+import anyio
+import anyio.lowlevel
+
+# Required because the top-level module of anyio does not correctly load the submodule to_thread
+# see https://github.com/microsoft/pyright/issues/10912
+import anyio.to_thread
+
 from parsec._parsec import (
     AccessToken,
     AccountAuthMethodID,
@@ -23,10 +31,15 @@ from parsec.components.events import EventBus
 from parsec.config import BackendConfig
 from parsec.events import (
     Event,
+    EventAccountAuthMethodsDisabled,
+    EventInvitation,
+    EventOrganizationExpired,
     EventOrganizationTosUpdated,
     EventUserRevokedOrFrozen,
     EventUserUnfrozen,
 )
+from parsec.indexed_cache import IndexedCache
+from parsec.metrics import METRICS
 from parsec.types import BadOutcomeEnum
 
 
@@ -154,6 +167,115 @@ class AuthenticatedToken:
             return False
 
 
+@dataclass(slots=True)
+class _PendingTokenVerification:
+    token: AuthenticatedToken
+    verify_key: VerifyKey
+    done: anyio.Event = field(default_factory=anyio.Event)
+    valid: bool = False
+
+
+class TokenVerifier:
+    """
+    Verify the signature of the authenticated tokens in worker threads (the GIL is
+    released during the verification), so that it doesn't block the event loop.
+
+    Tokens arriving together are verified as a single batch to amortize the cost of
+    the thread hop: the first token to arrive waits for the other requests ready to
+    run on the event loop, then verifies all the pending tokens at once. Meanwhile
+    new tokens form the next batch, which can run concurrently in another thread.
+    """
+
+    def __init__(self, max_threads: int):
+        self._limiter = anyio.CapacityLimiter(max_threads)
+        self._pending: list[_PendingTokenVerification] = []
+        # Metrics
+        self.verifications = 0
+        self.batches = 0
+        # Time (in seconds) spent verifying signatures in the worker threads
+        self.verification_time = 0.0
+        # Time (in seconds) from the verification request to its result, so
+        # including the time waiting for the batch and for a worker thread
+        self.wait_time = 0.0
+
+    @property
+    def average_verification_cost(self) -> float:
+        return self.verification_time / self.verifications if self.verifications else 0.0
+
+    @property
+    def average_wait_time(self) -> float:
+        return self.wait_time / self.verifications if self.verifications else 0.0
+
+    async def verify(self, token: AuthenticatedToken, verify_key: VerifyKey) -> bool:
+        started_at = time.perf_counter()
+        pending = _PendingTokenVerification(token=token, verify_key=verify_key)
+        self._pending.append(pending)
+
+        if len(self._pending) == 1:
+            # We are the first one, so in charge of this batch. Other requests of the
+            # batch rely on us, hence we cannot be cancelled until the batch is done.
+            with anyio.CancelScope(shield=True):
+                await anyio.lowlevel.checkpoint()
+                batch = self._pending
+                self._pending = []
+                try:
+                    cost = await anyio.to_thread.run_sync(
+                        _verify_batch, batch, limiter=self._limiter
+                    )
+                finally:
+                    for item in batch:
+                        item.done.set()
+            self.batches += 1
+            self.verifications += len(batch)
+            self.verification_time += cost
+
+        else:
+            await pending.done.wait()
+
+        self.wait_time += time.perf_counter() - started_at
+        return pending.valid
+
+
+def _verify_batch(batch: list[_PendingTokenVerification]) -> float:
+    started_at = time.perf_counter()
+    for item in batch:
+        item.valid = item.token.verify(item.verify_key)
+    return time.perf_counter() - started_at
+
+
+AUTH_CACHE_LOOKUPS = METRICS.counter(
+    "parsec_auth_cache_lookups_total",
+    "Number of lookups in the authentication caches, by cache and result.",
+    labels=("cache", "result"),
+)
+AUTH_CACHE_HIT_RATIO = METRICS.gauge(
+    "parsec_auth_cache_hit_ratio",
+    "Ratio of the lookups in the authentication caches being hits, by cache.",
+    labels=("cache",),
+)
+AUTH_CACHE_ENTRIES = METRICS.gauge(
+    "parsec_auth_cache_entries",
+    "Number of entries in the authentication caches, by cache.",
+    labels=("cache",),
+)
+AUTH_TOKEN_VERIFICATIONS = METRICS.counter(
+    "parsec_auth_token_verifications_total",
+    "Number of authenticated token signatures verified in worker threads.",
+)
+AUTH_TOKEN_VERIFICATION_BATCHES = METRICS.counter(
+    "parsec_auth_token_verification_batches_total",
+    "Number of batches of authenticated token signatures verified in worker threads.",
+)
+AUTH_TOKEN_VERIFICATION_SECONDS = METRICS.counter(
+    "parsec_auth_token_verification_seconds_total",
+    "Time spent verifying authenticated token signatures in worker threads.",
+)
+AUTH_TOKEN_VERIFICATION_WAIT_SECONDS = METRICS.counter(
+    "parsec_auth_token_verification_wait_seconds_total",
+    "Time spent by the requests waiting for their authenticated token to be verified.",
+)
+
+
 @dataclass
 class AccountAuthenticationToken:
     """
@@ -221,27 +343,69 @@ class AccountAuthenticationToken:
 class BaseAuthComponent:
     def __init__(self, event_bus: EventBus, config: BackendConfig):
         self._config = config
-        self._device_cache: dict[tuple[OrganizationID, DeviceID], AuthenticatedAuthInfo] = {}
+        # Devices are indexed by organization and by user for invalidation
+        self._device_cache: IndexedCache[tuple[OrganizationID, DeviceID], AuthenticatedAuthInfo] = (
+            IndexedCache(
+                max_size=config.auth_device_cache_size,
+                ttl=config.auth_device_cache_ttl,
+            )
+        )
+        # Invitations are indexed by organization for invalidation
+        self._invited_cache: IndexedCache[tuple[OrganizationID, AccessToken], InvitedAuthInfo] = (
+            IndexedCache(
+                max_size=config.auth_invited_cache_size,
+                ttl=config.auth_device_cache_ttl,
+            )
+        )
+        # Authentication methods are indexed by account for invalidation
+        self._account_auth_cache: IndexedCache[
+            AccountAuthMethodID, tuple[AuthenticatedAccountAuthInfo, SecretKey]
+        ] = IndexedCache(
+            max_size=config.auth_account_cache_size,
+            ttl=config.auth_device_cache_ttl,
+        )
+        self._token_verifier = (
+            TokenVerifier(max_threads=config.auth_token_verify_threads)
+            if config.auth_token_verify_threads is not None
+            else None
+        )
         event_bus.connect(self._on_event)
 
+    def collect_metrics(self) -> None:
+        for name, cache in (
+            ("device", self._device_cache),
+            ("invited", self._invited_cache),
+            ("account", self._account_auth_cache),
+        ):
+            AUTH_CACHE_LOOKUPS.set(cache.hits, name, "hit")
+            AUTH_CACHE_LOOKUPS.set(cache.misses, name, "miss")
+            AUTH_CACHE_HIT_RATIO.set(cache.hit_rate, name)
+            AUTH_CACHE_ENTRIES.set(len(cache), name)
+
+        if self._token_verifier is not None:
+            AUTH_TOKEN_VERIFICATIONS.set(self._token_verifier.verifications)
+            AUTH_TOKEN_VERIFICATION_BATCHES.set(self._token_verifier.batches)
+            AUTH_TOKEN_VERIFICATION_SECONDS.set(self._token_verifier.verification_time)
+            AUTH_TOKEN_VERIFICATION_WAIT_SECONDS.set(self._token_verifier.wait_time)
+
     def _on_event(self, event: Event) -> None:
         match event:
             # Revocation and freezing/unfreezing affect the authentication process,
             # so we clear the cache when such events occur.
             case EventUserUnfrozen() | EventUserRevokedOrFrozen():
-                self._device_cache = {
-                    (org_id, device_id): v
-                    for ((org_id, device_id), v) in self._device_cache.items()
-                    if org_id != event.organization_id or v.user_id != event.user_id
-                }
+                self._device_cache.invalidate_index((event.organization_id, event.user_id))
             # If TOS has changed they must be re-accepted by the users, so we clear the
             # cache given that the TOS acceptance is checked on cache miss.
             case EventOrganizationTosUpdated():
-                self._device_cache = {
-                    (org_id, device_id): v
-                    for ((org_id, device_id), v) in self._device_cache.items()
-                    if org_id != event.organization_id
-                }
+                self._device_cache.invalidate_index(event.organization_id)
+            # Invitation has been cancelled or completed, so it cannot be used anymore.
+            case EventInvitation():
+                self._invited_cache.invalidate((event.organization_id, event.token))
+            case EventOrganizationExpired():
+                self._invited_cache.invalidate_index(event.organization_id)
+            # Password change, vault key rotation, account deletion etc.
+            case EventAccountAuthMethodsDisabled():
+                self._account_auth_cache.invalidate_index(event.account_email)
             case _:
                 pass
 
@@ -256,6 +420,21 @@ class BaseAuthComponent:
 
     async def invited_auth(
         self, now: DateTime, organization_id: OrganizationID, token: AccessToken
+    ) -> InvitedAuthInfo | AuthInvitedAuthBadOutcome:
+        # Greeting steps are polled by the clients, hence the cache.
+        # Only valid invitations are cached: a not found invitation might be
+        # created at anytime, and an already used one cannot come back.
+        auth_info = self._invited_cache.get((organization_id, token))
+        if auth_info is not None:
+            return auth_info
+
+        outcome = await self._get_invited_info(organization_id, token)
+        if isinstance(outcome, InvitedAuthInfo):
+            self._invited_cache.set((organization_id, token), outcome, indexes=(organization_id,))
+        return outcome
+
+    async def _get_invited_info(
+        self, organization_id: OrganizationID, token: AccessToken
     ) -> InvitedAuthInfo | AuthInvitedAuthBadOutcome:
         raise NotImplementedError
 
@@ -266,12 +445,11 @@ class BaseAuthComponent:
         token: AuthenticatedToken,
         tos_acceptance_required: bool = True,
     ) -> AuthenticatedAuthInfo | AuthAuthenticatedAuthBadOutcome:
-        try:
-            # The cache is only available if the authentication already succeeded,
-            # and if no revocation or freezing occurred since then.
-            auth_info = self._device_cache[(organization_id, token.device_id)]
+        # The cache is only available if the authentication already succeeded,
+        # and if no revocation or freezing occurred since then.
+        auth_info = self._device_cache.get((organization_id, token.device_id))
 
-        except KeyError:
+        if auth_info is None:
             outcome = await self._get_authenticated_info(
                 organization_id, token.device_id, tos_acceptance_required=tos_acceptance_required
             )
@@ -281,7 +459,11 @@ class BaseAuthComponent:
                     # so we shouldn't updated the cache if we got our auth info
                     # without having checked the TOS acceptance !
                     if tos_acceptance_required:
-                        self._device_cache[(organization_id, token.device_id)] = auth_info
+                        self._device_cache.set(
+                            (organization_id, token.device_id),
+                            auth_info,
+                            indexes=(organization_id, (organization_id, auth_info.user_id)),
+                        )
 
                 case AuthAuthenticatedAuthBadOutcome.ORGANIZATION_NOT_FOUND:
                     # Cannot store cache as the organization might be created at anytime !
@@ -290,7 +472,11 @@ class BaseAuthComponent:
                 case bad_outcome:
                     return bad_outcome
 
-        if not token.verify(auth_info.device_verify_key):
+        if self._token_verifier is not None:
+            valid = await self._token_verifier.verify(token, auth_info.device_verify_key)
+        else:
+            valid = token.verify(auth_info.device_verify_key)
+        if not valid:
             return AuthAuthenticatedAuthBadOutcome.INVALID_TOKEN
 
         if timestamps_in_the_ballpark(token.timestamp, now) is not None:
@@ -308,4 +494,33 @@ class BaseAuthComponent:
         now: DateTime,
         token: AccountAuthenticationToken,
     ) -> AuthenticatedAccountAuthInfo | AuthAuthenticatedAccountAuthBadOutcome:
+        # The cache is only available if the authentication method is known,
+        # and if it hasn't been disabled since then.
+        cached = self._account_auth_cache.get(token.auth_method_id)
+
+        if cached is None:
+            outcome = await self._get_authenticated_account_info(token.auth_method_id)
+            match outcome:
+                case (AuthenticatedAccountAuthInfo() as auth_info, SecretKey()):
+                    self._account_auth_cache.set(
+                        token.auth_method_id, outcome, indexes=(auth_info.account_email,)
+                    )
+                    cached = outcome
+
+                case bad_outcome:
+                    return bad_outcome
+
+        auth_info, auth_method_mac_key = cached
+
+        if not token.verify(auth_method_mac_key):
+            return AuthAuthenticatedAccountAuthBadOutcome.INVALID_TOKEN
+
+        if timestamps_in_the_ballpark(token.timestamp, now) is not None:
+            return AuthAuthenticatedAccountAuthBadOutcome.TOKEN_OUT_OF_BALLPARK
+
+        return auth_info
+
+    async def _get_authenticated_account_info(
+        self, auth_method_id: AccountAuthMethodID
+    ) -> tuple[AuthenticatedAccountAuthInfo, SecretKey] | AuthAuthenticatedAccountAuthBadOutcome:
         raise NotImplementedError
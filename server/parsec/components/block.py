@@ -51,6 +51,15 @@ class BlockCreateBadOutcome(BadOutcomeEnum):
     STORE_UNAVAILABLE = auto()
 
 
+type BlockGetBlocksBatchOffsetMarker = int
+
+
+@dataclass(slots=True)
+class BlockGetBlocksBatch:
+    blocks: list[tuple[OrganizationID, BlockID]]
+    batch_offset_marker: BlockGetBlocksBatchOffsetMarker
+
+
 class BaseBlockComponent:
     #
     # Public methods
@@ -73,6 +82,21 @@ class BaseBlockComponent:
     ) -> BadKeyIndex | BlockCreateBadOutcome | None:
         raise NotImplementedError
 
+    async def get_blocks_batch(
+        self,
+        batch_offset_marker: BlockGetBlocksBatchOffsetMarker,
+        batch_size: int,
+    ) -> BlockGetBlocksBatch:
+        """
+        Return the IDs of all the blocks (among all organizations), one batch at a time.
+
+        This is used to go through the whole blockstore (e.g. to move the blocks after
+        the nodes of a RAID0 cluster have changed). Start with a `batch_offset_marker`
+        of 0, then use the one returned by the previous batch until a batch with less
+        than `batch_size` blocks is returned.
+        """
+        raise NotImplementedError
+
     async def test_dump_blocks(
         self, organization_id: OrganizationID
     ) -> dict[BlockID, tuple[DateTime, DeviceID, VlobID, int, int]]:
@@ -1,20 +1,32 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
-from enum import auto
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterable
+from contextlib import asynccontextmanager
+from enum import Enum, auto
+from pathlib import Path
 from typing import TYPE_CHECKING
 
+import anyio
+from anyio.abc import TaskGroup
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
 from parsec._parsec import BlockID, OrganizationID
 from parsec.config import (
     BaseBlockStoreConfig,
+    BaseRedundantBlockStoreConfig,
+    CacheBlockStoreConfig,
     DisabledBlockStoreConfig,
+    FilesystemBlockStoreConfig,
     MockedBlockStoreConfig,
     PostgreSQLBlockStoreConfig,
     RAID0BlockStoreConfig,
     RAID1BlockStoreConfig,
     RAID5BlockStoreConfig,
+    ReedSolomonBlockStoreConfig,
     S3BlockStoreConfig,
     SWIFTBlockStoreConfig,
+    TieredBlockStoreConfig,
 )
 from parsec.types import BadOutcomeEnum
 
@@ -32,6 +44,129 @@ class BlockStoreCreateBadOutcome(BadOutcomeEnum):
     STORE_UNAVAILABLE = auto()
 
 
+class BlockStoreDeleteBadOutcome(BadOutcomeEnum):
+    STORE_UNAVAILABLE = auto()
+
+
+class BlockStoreScrubOutcome(Enum):
+    HEALTHY = auto()
+    REPAIRED = auto()
+
+
+class BlockStoreScrubBadOutcome(BadOutcomeEnum):
+    # Some nodes cannot be reached, so the block cannot be fully checked
+    STORE_UNAVAILABLE = auto()
+    # Copies of the block are inconsistent, and there is no telling which ones are valid
+    BLOCK_CORRUPTED = auto()
+    # Not enough copies of the block remain to rebuild it
+    BLOCK_LOST = auto()
+
+
+type BlockStoreReadManyResult = tuple[BlockID, bytes | BlockStoreReadBadOutcome]
+type BlockStoreCreateManyResult = tuple[BlockID, BlockStoreCreateBadOutcome | None]
+type BlockStoreDeleteManyResult = tuple[BlockID, BlockStoreDeleteBadOutcome | None]
+
+
+@asynccontextmanager
+async def _stream_results[T](
+    producer: Callable[[MemoryObjectSendStream[T]], Awaitable[None]],
+) -> AsyncGenerator[MemoryObjectReceiveStream[T]]:
+    send, receive = anyio.create_memory_object_stream[T]()
+
+    async def _run_producer() -> None:
+        async with send:
+            await producer(send)
+
+    body_exc: Exception | None = None
+    with receive:
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(_run_producer)
+            try:
+                yield receive
+            except Exception as exc:
+                # Don't let the task group wrap the caller's own exceptions into
+                # an exception group, this would be very surprising for the caller.
+                body_exc = exc
+            # Leaving early (or with an error) cancels the remaining operations
+            task_group.cancel_scope.cancel()
+
+    if body_exc is not None:
+        raise body_exc
+
+
+# Composite blockstores (RAID1/RAID5/etc.) run the batch operations by sub-batches of
+# this many blocks: the outcome of a block is only known once enough nodes have replied,
+# so this bounds the data kept around while waiting for a slow node.
+COMPOSITE_SUB_BATCH_SIZE = 100
+
+
+def split_in_sub_batches[T](items: list[T]) -> list[list[T]]:
+    return [
+        items[start : start + COMPOSITE_SUB_BATCH_SIZE]
+        for start in range(0, len(items), COMPOSITE_SUB_BATCH_SIZE)
+    ]
+
+
+def sort_by_availability(blockstores: list[BaseBlockStoreComponent]) -> list[int]:
+    """
+    Return the indexes of the blockstores, the ones known to be unavailable last
+    (the order is otherwise preserved).
+    """
+    return sorted(range(len(blockstores)), key=lambda index: not blockstores[index].is_available())
+
+
+async def read_from_all_nodes(
+    blockstores: list[BaseBlockStoreComponent], organization_id: OrganizationID, block_id: BlockID
+) -> list[bytes | BlockStoreReadBadOutcome]:
+    """
+    Read the block from all the nodes of a composite blockstore concurrently (used to
+    scrub the block).
+    """
+    outcomes: list[bytes | BlockStoreReadBadOutcome] = [
+        BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    ] * len(blockstores)
+
+    async def _read(index: int) -> None:
+        outcomes[index] = await blockstores[index].read(organization_id, block_id)
+
+    async with anyio.create_task_group() as task_group:
+        for index in range(len(blockstores)):
+            task_group.start_soon(_read, index)
+
+    return outcomes
+
+
+async def repair_nodes(
+    blockstores: list[BaseBlockStoreComponent],
+    organization_id: OrganizationID,
+    block_id: BlockID,
+    repairs: dict[int, bytes],
+) -> bool:
+    """
+    Write back the expected data on the given nodes of a composite blockstore, return
+    `False` if a node has failed.
+
+    Create doesn't overwrite an existing block on all blockstores (e.g. PostgreSQL),
+    hence the invalid data is deleted first.
+    """
+    ok = True
+
+    async def _repair(index: int, data: bytes) -> None:
+        nonlocal ok
+        blockstore = blockstores[index]
+        if (
+            await blockstore.delete(organization_id, block_id) is not None
+            or await blockstore.create(organization_id, block_id, data) is not None
+        ):
+            ok = False
+
+    async with anyio.create_task_group() as task_group:
+        for index, data in repairs.items():
+            task_group.start_soon(_repair, index, data)
+
+    return ok
+
+
 class BaseBlockStoreComponent:
     """
     BlockStoreComponent wraps a distributed object storage service, distributed implies
@@ -48,17 +183,32 @@ class BaseBlockStoreComponent:
     - `BlockStoreComponent.create` must be implemented in an idempotent way
       (making the assumption multiple creates with the same orgID/ID couple
       always comes with the same block data).
+    - `BlockStoreComponent.delete` must also be idempotent (i.e. deleting a block
+      that doesn't exist is not an error).
     - BlockStoreComponent never raises business logic errors: for instance if a
       `BlockStoreComponent.read` raises a not found error, it shows the underlying
       storage is faulty (given `BlockComponent` has already checked the orgID/ID
       couple exists)
     - Each BlockStoreComponent should log any error of it underlying storage, as it
-      most likely indicates some manual maintenance operation is required.
+      most likely indicates some manual maintenance operation is required (missing
+      copies of the blocks in a RAID cluster can be rebuilt with `parsec scrub_blockstore`).
     - An object storage such as S3 has no overwrite protection, hence in case of a
     partially failed create operation, all object storages will write the new block data
     (and not only the ones that failed the first time)
     """
 
+    # Number of blocks processed concurrently by the default implementation of
+    # `read_many`/`create_many`/`delete_many`. Blockstores limiting the concurrency
+    # of their underlying storage should set this to the same value.
+    batch_max_concurrency: int = 10
+
+    def is_available(self) -> bool:
+        """
+        Whether the blockstore is expected to serve requests, composite blockstores
+        use it to skip the nodes known to be down (see `CircuitBreakerBlockStoreComponent`).
+        """
+        return True
+
     async def read(
         self, organization_id: OrganizationID, block_id: BlockID
     ) -> bytes | BlockStoreReadBadOutcome:
@@ -69,11 +219,178 @@ class BaseBlockStoreComponent:
     ) -> BlockStoreCreateBadOutcome | None:
         raise NotImplementedError
 
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        raise NotImplementedError
 
-def blockstore_factory(
+    async def scrub(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreScrubOutcome | BlockStoreScrubBadOutcome:
+        """
+        Check all copies of the block are consistent, and rebuild the missing ones.
+
+        Blockstores without redundancy can only check the block is present.
+        """
+        match await self.read(organization_id, block_id):
+            case bytes():
+                return BlockStoreScrubOutcome.HEALTHY
+            case BlockStoreReadBadOutcome.BLOCK_NOT_FOUND:
+                return BlockStoreScrubBadOutcome.BLOCK_LOST
+            case BlockStoreReadBadOutcome.STORE_UNAVAILABLE:
+                return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+
+    @asynccontextmanager
+    async def read_many(
+        self, organization_id: OrganizationID, block_ids: Iterable[BlockID]
+    ) -> AsyncGenerator[MemoryObjectReceiveStream[BlockStoreReadManyResult]]:
+        """
+        Read multiple blocks at once, typical usage:
+
+            async with blockstore.read_many(organization_id, block_ids) as results:
+                async for block_id, outcome in results:
+                    ...
+
+        Results are provided as soon as they are available (i.e. not necessarily in
+        the order of `block_ids`), with exactly one result per block ID.
+
+        Leaving the context manager before all results have been consumed cancels
+        the remaining reads.
+        """
+        # Duplicates are removed while preserving the order
+        block_ids = list(dict.fromkeys(block_ids))
+        async with _stream_results(
+            lambda results: self._read_many(organization_id, block_ids, results)
+        ) as results:
+            yield results
+
+    @asynccontextmanager
+    async def create_many(
+        self, organization_id: OrganizationID, blocks: Iterable[tuple[BlockID, bytes]]
+    ) -> AsyncGenerator[MemoryObjectReceiveStream[BlockStoreCreateManyResult]]:
+        """
+        Create multiple blocks at once, see `read_many` for the usage.
+        """
+        # Duplicates are removed (blocks are immutable, so same ID means same data)
+        blocks = list(dict(blocks).items())
+        async with _stream_results(
+            lambda results: self._create_many(organization_id, blocks, results)
+        ) as results:
+            yield results
+
+    @asynccontextmanager
+    async def delete_many(
+        self, organization_id: OrganizationID, block_ids: Iterable[BlockID]
+    ) -> AsyncGenerator[MemoryObjectReceiveStream[BlockStoreDeleteManyResult]]:
+        """
+        Delete multiple blocks at once, see `read_many` for the usage.
+        """
+        # Duplicates are removed while preserving the order
+        block_ids = list(dict.fromkeys(block_ids))
+        async with _stream_results(
+            lambda results: self._delete_many(organization_id, block_ids, results)
+        ) as results:
+            yield results
+
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        # Default implementation for blockstores without a batch read capability:
+        # a pool of workers reading the blocks one by one.
+        todo = iter(block_ids)
+
+        async def _worker() -> None:
+            for block_id in todo:
+                outcome = await self.read(organization_id, block_id)
+                await results.send((block_id, outcome))
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(min(self.batch_max_concurrency, len(block_ids))):
+                task_group.start_soon(_worker)
+
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        # Default implementation for blockstores without a batch create capability:
+        # a pool of workers creating the blocks one by one.
+        todo = iter(blocks)
+
+        async def _worker() -> None:
+            for block_id, block in todo:
+                outcome = await self.create(organization_id, block_id, block)
+                await results.send((block_id, outcome))
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(min(self.batch_max_concurrency, len(blocks))):
+                task_group.start_soon(_worker)
+
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        # Default implementation for blockstores without a batch delete capability:
+        # a pool of workers deleting the blocks one by one.
+        todo = iter(block_ids)
+
+        async def _worker() -> None:
+            for block_id in todo:
+                outcome = await self.delete(organization_id, block_id)
+                await results.send((block_id, outcome))
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(min(self.batch_max_concurrency, len(block_ids))):
+                task_group.start_soon(_worker)
+
+
+@asynccontextmanager
+async def blockstore_factory(
     config: BaseBlockStoreConfig,
     postgresql_pool: AsyncpgPool | None = None,
     mocked_data: MemoryDatamodel | None = None,
+) -> AsyncGenerator[BaseBlockStoreComponent]:
+    # Some blockstores (e.g. tiered blockstore) need to run tasks in the background
+    async with anyio.create_task_group() as task_group:
+        yield _blockstore_factory(config, task_group, postgresql_pool, mocked_data)
+        task_group.cancel_scope.cancel()
+
+
+def _blockstore_factory(
+    config: BaseBlockStoreConfig,
+    task_group: TaskGroup,
+    postgresql_pool: AsyncpgPool | None,
+    mocked_data: MemoryDatamodel | None,
+    instrumented: bool = True,
+) -> BaseBlockStoreComponent:
+    blockstore = _blockstore_config_factory(config, task_group, postgresql_pool, mocked_data)
+    # Only the backends are instrumented: composite blockstores are measured through
+    # their nodes, and keep their type (needed e.g. by `parsec rebalance_raid0`)
+    if instrumented and isinstance(
+        config,
+        MockedBlockStoreConfig
+        | PostgreSQLBlockStoreConfig
+        | S3BlockStoreConfig
+        | SWIFTBlockStoreConfig
+        | FilesystemBlockStoreConfig,
+    ):
+        from parsec.components.instrumented_blockstore import InstrumentedBlockStoreComponent
+
+        blockstore = InstrumentedBlockStoreComponent(blockstore, backend=config.type)
+    return blockstore
+
+
+def _blockstore_config_factory(
+    config: BaseBlockStoreConfig,
+    task_group: TaskGroup,
+    postgresql_pool: AsyncpgPool | None,
+    mocked_data: MemoryDatamodel | None,
 ) -> BaseBlockStoreComponent:
     if isinstance(config, DisabledBlockStoreConfig):
         return BaseBlockStoreComponent()
@@ -102,6 +419,8 @@ def blockstore_factory(
                 config.s3_key,
                 config.s3_secret,
                 config.s3_endpoint_url,
+                max_concurrency=config.s3_max_concurrency,
+                max_pool_connections=config.s3_max_pool_connections,
             )
         except ImportError as exc:
             raise ValueError("S3 block store is not available") from exc
@@ -116,23 +435,87 @@ def blockstore_factory(
                 config.swift_container,
                 config.swift_user,
                 config.swift_password,
+                max_concurrency=config.swift_max_concurrency,
             )
         except ImportError as exc:
             raise ValueError("Swift block store is not available") from exc
 
+    elif isinstance(config, FilesystemBlockStoreConfig):
+        from parsec.components.filesystem_blockstore import FilesystemBlockStoreComponent
+
+        return FilesystemBlockStoreComponent(
+            Path(config.path),
+            durability=config.durability,
+            max_concurrency=config.max_concurrency,
+        )
+
+    elif isinstance(config, CacheBlockStoreConfig):
+        from parsec.components.cache_blockstore import CacheBlockStoreComponent
+
+        block = _blockstore_factory(config.blockstore, task_group, postgresql_pool, mocked_data)
+
+        return CacheBlockStoreComponent(block, max_size=config.max_size)
+
+    elif isinstance(config, TieredBlockStoreConfig):
+        from parsec.components.filesystem_blockstore import FilesystemBlockStoreComponent
+        from parsec.components.tiered_blockstore import TieredBlockStoreComponent
+
+        # The hot tier is accessed through its filesystem path, so cannot be wrapped
+        hot = _blockstore_factory(
+            config.hot, task_group, postgresql_pool, mocked_data, instrumented=False
+        )
+        assert isinstance(hot, FilesystemBlockStoreComponent)
+        cold = _blockstore_factory(config.cold, task_group, postgresql_pool, mocked_data)
+
+        return TieredBlockStoreComponent(
+            hot,
+            cold,
+            task_group,
+            max_size=config.hot_max_size,
+            max_age=config.hot_max_age,
+            write_back=config.write_back,
+        )
+
     elif isinstance(config, RAID1BlockStoreConfig):
         from parsec.components.raid1_blockstore import RAID1BlockStoreComponent
 
-        blocks = [blockstore_factory(sub_conf, postgresql_pool) for sub_conf in config.blockstores]
+        blocks = [
+            _blockstore_factory(sub_conf, task_group, postgresql_pool, mocked_data)
+            for sub_conf in config.blockstores
+        ]
 
-        return RAID1BlockStoreComponent(blocks, partial_create_ok=config.partial_create_ok)
+        return RAID1BlockStoreComponent(
+            _with_circuit_breakers("RAID1", blocks, config),
+            partial_create_ok=config.partial_create_ok,
+            hedged_read_percentile=config.hedged_read_percentile,
+        )
 
     elif isinstance(config, RAID0BlockStoreConfig):
-        from parsec.components.raid0_blockstore import RAID0BlockStoreComponent
-
-        blocks = [blockstore_factory(sub_conf, postgresql_pool) for sub_conf in config.blockstores]
-
-        return RAID0BlockStoreComponent(blocks)
+        from parsec.components.raid0_blockstore import RAID0BlockStoreComponent, RAID0Layout
+
+        match (config.previous_placement, config.previous_nodes_count):
+            case (None, None):
+                previous_layout = None
+            case (previous_placement, previous_nodes_count) if (
+                previous_placement is not None
+                and previous_nodes_count is not None
+                and 0 < previous_nodes_count <= len(config.blockstores)
+            ):
+                previous_layout = RAID0Layout(previous_placement, previous_nodes_count)
+            case _:
+                raise ValueError(
+                    "RAID0 block store previous layout must have a placement and between 1 and"
+                    " the current number of nodes"
+                )
+
+        blocks = [
+            _blockstore_factory(sub_conf, task_group, postgresql_pool, mocked_data)
+            for sub_conf in config.blockstores
+        ]
+
+        return RAID0BlockStoreComponent(
+            blocks, placement=config.placement, previous_layout=previous_layout
+        )
 
     elif isinstance(config, RAID5BlockStoreConfig):
         from parsec.components.raid5_blockstore import RAID5BlockStoreComponent
@@ -140,9 +523,59 @@ def blockstore_factory(
         if len(config.blockstores) < 3:
             raise ValueError("RAID5 block store needs at least 3 nodes")
 
-        blocks = [blockstore_factory(sub_conf, postgresql_pool) for sub_conf in config.blockstores]
-
-        return RAID5BlockStoreComponent(blocks, partial_create_ok=config.partial_create_ok)
+        blocks = [
+            _blockstore_factory(sub_conf, task_group, postgresql_pool, mocked_data)
+            for sub_conf in config.blockstores
+        ]
+
+        return RAID5BlockStoreComponent(
+            _with_circuit_breakers("RAID5", blocks, config),
+            partial_create_ok=config.partial_create_ok,
+        )
+
+    elif isinstance(config, ReedSolomonBlockStoreConfig):
+        from parsec.components.reed_solomon_blockstore import ReedSolomonBlockStoreComponent
+
+        if config.parity_shards < 1:
+            raise ValueError("Reed-Solomon block store needs at least 1 parity shard")
+        if len(config.blockstores) <= config.parity_shards:
+            raise ValueError("Reed-Solomon block store needs more nodes than parity shards")
+        if len(config.blockstores) > 256:
+            raise ValueError("Reed-Solomon block store supports at most 256 nodes")
+
+        blocks = [
+            _blockstore_factory(sub_conf, task_group, postgresql_pool, mocked_data)
+            for sub_conf in config.blockstores
+        ]
+
+        return ReedSolomonBlockStoreComponent(
+            _with_circuit_breakers("REED_SOLOMON", blocks, config),
+            parity_shards=config.parity_shards,
+            partial_create_ok=config.partial_create_ok,
+        )
 
     else:
         raise ValueError(f"Unknown block store configuration `{config}`")
+
+
+def _with_circuit_breakers(
+    blockstore_type: str,
+    blocks: list[BaseBlockStoreComponent],
+    config: BaseRedundantBlockStoreConfig,
+) -> list[BaseBlockStoreComponent]:
+    from parsec.components.circuit_breaker_blockstore import CircuitBreakerBlockStoreComponent
+
+    if config.circuit_breaker_threshold is None:
+        return blocks
+    if config.circuit_breaker_threshold < 1:
+        raise ValueError("Circuit breaker threshold must be at least 1")
+
+    return [
+        CircuitBreakerBlockStoreComponent(
+            block,
+            name=f"{blockstore_type} node {index}",
+            failure_threshold=config.circuit_breaker_threshold,
+            reset_timeout=config.circuit_breaker_reset_timeout,
+        )
+        for index, block in enumerate(blocks)
+    ]
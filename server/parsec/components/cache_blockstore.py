@@ -0,0 +1,176 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import override
+
+import anyio
+from anyio.streams.memory import MemoryObjectSendStream
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
+    BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+    BlockStoreScrubBadOutcome,
+    BlockStoreScrubOutcome,
+)
+
+
+class CacheBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Read-through in-memory cache in front of another blockstore.
+
+    Blocks are immutable (two creates with the same orgID/ID couple always come
+    with the same block data), so a cached block never needs to be invalidated.
+
+    Cached blocks are evicted in least-recently-used order so that the total size
+    of the cached data never exceeds `max_size` bytes.
+
+    Concurrent reads of a block missing from the cache are coalesced into a single
+    read on the underlying blockstore.
+
+    Batch reads (e.g. realm export) typically go through a whole realm, so they are
+    served from the cache when possible but never populate it (otherwise they would
+    evict all the frequently accessed blocks).
+    """
+
+    def __init__(self, blockstore: BaseBlockStoreComponent, max_size: int):
+        assert max_size > 0, max_size
+        self.blockstore = blockstore
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache: OrderedDict[tuple[OrganizationID, BlockID], bytes] = OrderedDict()
+        self._pending_reads: dict[tuple[OrganizationID, BlockID], anyio.Event] = {}
+
+    def _cache_get(self, key: tuple[OrganizationID, BlockID]) -> bytes | None:
+        try:
+            block = self._cache[key]
+        except KeyError:
+            return None
+        self._cache.move_to_end(key)
+        return block
+
+    def _cache_put(self, key: tuple[OrganizationID, BlockID], block: bytes) -> None:
+        if len(block) > self.max_size or key in self._cache:
+            return
+        while self.size + len(block) > self.max_size:
+            _, evicted = self._cache.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+        self._cache[key] = block
+        self.size += len(block)
+
+    def _cache_remove(self, key: tuple[OrganizationID, BlockID]) -> None:
+        block = self._cache.pop(key, None)
+        if block is not None:
+            self.size -= len(block)
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        key = (organization_id, block_id)
+
+        while True:
+            block = self._cache_get(key)
+            if block is not None:
+                self.hits += 1
+                return block
+
+            pending = self._pending_reads.get(key)
+            if pending is None:
+                break
+            # Another read of this block is already in progress, wait for it
+            # and then check the cache again (if this other read has failed, we
+            # will end up doing our own read).
+            await pending.wait()
+
+        self.misses += 1
+        pending = self._pending_reads[key] = anyio.Event()
+        try:
+            outcome = await self.blockstore.read(organization_id, block_id)
+            if isinstance(outcome, bytes):
+                self._cache_put(key, outcome)
+            return outcome
+
+        finally:
+            del self._pending_reads[key]
+            pending.set()
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        return await self.blockstore.create(organization_id, block_id, block)
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        self._cache_remove((organization_id, block_id))
+        return await self.blockstore.delete(organization_id, block_id)
+
+    @override
+    async def scrub(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreScrubOutcome | BlockStoreScrubBadOutcome:
+        # Bypass the cache, the point is to check the underlying storage
+        return await self.blockstore.scrub(organization_id, block_id)
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        missing: list[BlockID] = []
+        for block_id in block_ids:
+            # Don't use `_cache_get` here to leave the LRU order untouched
+            block = self._cache.get((organization_id, block_id))
+            if block is None:
+                missing.append(block_id)
+            else:
+                self.hits += 1
+                await results.send((block_id, block))
+
+        if not missing:
+            # All blocks were in the cache, no need for a round trip to the blockstore
+            return
+
+        self.misses += len(missing)
+        async with self.blockstore.read_many(organization_id, missing) as sub_results:
+            async for result in sub_results:
+                await results.send(result)
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        async with self.blockstore.create_many(organization_id, blocks) as sub_results:
+            async for result in sub_results:
+                await results.send(result)
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        for block_id in block_ids:
+            self._cache_remove((organization_id, block_id))
+        async with self.blockstore.delete_many(organization_id, block_ids) as sub_results:
+            async for result in sub_results:
+                await results.send(result)
@@ -0,0 +1,237 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+from enum import Enum, auto
+from typing import override
+
+import anyio
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
+    BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+)
+from parsec.logging import get_logger
+
+logger = get_logger()
+
+
+class CircuitBreakerState(Enum):
+    # Requests go through
+    CLOSED = auto()
+    # Node is considered down, requests fail right away
+    OPEN = auto()
+    # Reset timeout has elapsed, a single request is let through to probe the node
+    HALF_OPEN = auto()
+
+
+class CircuitBreakerBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Circuit breaker in front of a node of a composite blockstore (RAID1/RAID5/etc.).
+
+    After `failure_threshold` consecutive failures, the node is considered down and
+    the circuit opens: requests fail right away with `STORE_UNAVAILABLE` instead of
+    waiting for the node's timeout, and `is_available` returns `False` so that the
+    composite blockstore can go straight to the other nodes.
+
+    Once `reset_timeout` seconds have elapsed, the circuit is half-open: the next
+    request is used as a probe (the other ones keep failing right away until the
+    probe is done). The circuit closes if it succeeds, otherwise it opens again.
+
+    Note only `STORE_UNAVAILABLE` is considered a failure (e.g. a block not found
+    still shows the node is up).
+    """
+
+    def __init__(
+        self,
+        blockstore: BaseBlockStoreComponent,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        assert failure_threshold > 0, failure_threshold
+        self.blockstore = blockstore
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        # Number of times the circuit has opened
+        self.trips = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._logger = logger.bind(blockstore_type="CIRCUIT_BREAKER", node=name)
+
+    @property
+    def state(self) -> CircuitBreakerState:
+        if self._opened_at is None:
+            return CircuitBreakerState.CLOSED
+        if anyio.current_time() - self._opened_at < self.reset_timeout:
+            return CircuitBreakerState.OPEN
+        return CircuitBreakerState.HALF_OPEN
+
+    @override
+    def is_available(self) -> bool:
+        match self.state:
+            case CircuitBreakerState.CLOSED:
+                return True
+            case CircuitBreakerState.OPEN:
+                return False
+            case CircuitBreakerState.HALF_OPEN:
+                return not self._probing
+
+    def _acquire(self) -> bool | None:
+        """
+        Return `None` if the request must fail right away, otherwise whether the
+        request is a probe.
+        """
+        if not self.is_available():
+            return None
+        if self.state == CircuitBreakerState.HALF_OPEN:
+            self._probing = True
+            return True
+        return False
+
+    def _release(self, is_probe: bool) -> None:
+        if is_probe:
+            self._probing = False
+
+    def _record(self, failed: bool) -> None:
+        if not failed:
+            if self._opened_at is not None:
+                self._logger.info("Node is back, closing the circuit")
+            self.consecutive_failures = 0
+            self._opened_at = None
+            return
+
+        self.consecutive_failures += 1
+        match self.state:
+            case CircuitBreakerState.CLOSED:
+                if self.consecutive_failures >= self.failure_threshold:
+                    self._logger.warning(
+                        "Node is down, opening the circuit",
+                        consecutive_failures=self.consecutive_failures,
+                    )
+                    self._opened_at = anyio.current_time()
+                    self.trips += 1
+            case CircuitBreakerState.HALF_OPEN:
+                # Probe has failed
+                self._opened_at = anyio.current_time()
+            case CircuitBreakerState.OPEN:
+                # Request started before the circuit has opened
+                pass
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        is_probe = self._acquire()
+        if is_probe is None:
+            return BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+        try:
+            outcome = await self.blockstore.read(organization_id, block_id)
+        finally:
+            self._release(is_probe)
+        self._record(outcome == BlockStoreReadBadOutcome.STORE_UNAVAILABLE)
+        return outcome
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        is_probe = self._acquire()
+        if is_probe is None:
+            return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+        try:
+            outcome = await self.blockstore.create(organization_id, block_id, block)
+        finally:
+            self._release(is_probe)
+        self._record(outcome == BlockStoreCreateBadOutcome.STORE_UNAVAILABLE)
+        return outcome
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        is_probe = self._acquire()
+        if is_probe is None:
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+        try:
+            outcome = await self.blockstore.delete(organization_id, block_id)
+        finally:
+            self._release(is_probe)
+        self._record(outcome == BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE)
+        return outcome
+
+    async def _forward_many[T](
+        self,
+        block_ids: list[BlockID],
+        sub_many: Callable[
+            [], AbstractAsyncContextManager[MemoryObjectReceiveStream[tuple[BlockID, T]]]
+        ],
+        unavailable: T,
+        results: MemoryObjectSendStream[tuple[BlockID, T]],
+    ) -> None:
+        is_probe = self._acquire()
+        if is_probe is None:
+            for block_id in block_ids:
+                await results.send((block_id, unavailable))
+            return
+
+        # The whole batch is the probe
+        try:
+            async with sub_many() as sub_results:
+                async for block_id, outcome in sub_results:
+                    self._record(outcome == unavailable)
+                    await results.send((block_id, outcome))
+        finally:
+            self._release(is_probe)
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        await self._forward_many(
+            block_ids,
+            lambda: self.blockstore.read_many(organization_id, block_ids),
+            BlockStoreReadBadOutcome.STORE_UNAVAILABLE,
+            results,
+        )
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        await self._forward_many(
+            [block_id for block_id, _ in blocks],
+            lambda: self.blockstore.create_many(organization_id, blocks),
+            BlockStoreCreateBadOutcome.STORE_UNAVAILABLE,
+            results,
+        )
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        await self._forward_many(
+            block_ids,
+            lambda: self.blockstore.delete_many(organization_id, block_ids),
+            BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE,
+            results,
+        )
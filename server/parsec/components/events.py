@@ -2,11 +2,13 @@
 from __future__ import annotations
 
 import asyncio
-from collections import deque
-from collections.abc import AsyncGenerator, Callable, Generator, Sequence
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncGenerator, Callable, Generator, Iterable, Iterator, Sequence
 from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass, field
 from enum import auto
+from itertools import islice
 from unittest.mock import ANY
 from uuid import UUID
 
@@ -27,17 +29,45 @@ from parsec.config import AccountConfig, BackendConfig
 from parsec.events import (
     ClientBroadcastableEvent,
     Event,
+    EventAccountAuthMethodsDisabled,
+    EventGreetingAttemptCancelled,
+    EventGreetingAttemptJoined,
+    EventGreetingAttemptReady,
+    EventInvitation,
     EventOrganizationConfig,
     EventOrganizationExpired,
     EventOrganizationTosUpdated,
     EventRealmCertificate,
+    EventShamirRecoveryCertificate,
     EventUserRevokedOrFrozen,
     EventUserUpdated,
+    EventVlob,
 )
+from parsec.metrics import METRICS
 from parsec.types import BadOutcomeEnum
 
 PER_CLIENT_MAX_BUFFER_EVENTS = 100
 
+SSE_REGISTERED_CLIENTS = METRICS.gauge(
+    "parsec_sse_registered_clients",
+    "Number of clients currently listening to the SSE events API.",
+)
+SSE_FAN_OUT_DURATION = METRICS.histogram(
+    "parsec_sse_fan_out_duration_seconds",
+    "Time spent dispatching an event to the listening SSE clients.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+SSE_EVENTS_CACHE_SIZE = METRICS.gauge(
+    "parsec_sse_events_cache_bytes",
+    "Size of the SSE events kept in memory to handle the `Last-Event-ID` reconnections.",
+)
+SSE_RECONNECTIONS = METRICS.counter(
+    "parsec_sse_reconnections_total",
+    "Number of SSE connections with a `Last-Event-ID`, by outcome (`missed_events` means"
+    " the client has to do a full resync).",
+    labels=("outcome",),
+)
+
 
 type ClientBroadcastableEventStream = MemoryObjectReceiveStream[
     tuple[ClientBroadcastableEvent, bytes | None] | None
@@ -243,6 +273,203 @@ class RegisteredClient:
     cancel_scope: anyio.CancelScope
 
 
+class RegisteredClientsRouting:
+    """
+    Index of the registered clients by organization, user and realm, so that an
+    event is only checked against the clients that may be interested in it
+    (instead of every client connected to the server).
+
+    Within each index, the clients are kept in registration order.
+    """
+
+    def __init__(self):
+        self.by_organization: dict[OrganizationID, dict[int, RegisteredClient]] = {}
+        self.by_user: dict[tuple[OrganizationID, UserID], dict[int, RegisteredClient]] = {}
+        self.by_realm: dict[tuple[OrganizationID, VlobID], dict[int, RegisteredClient]] = {}
+
+    @staticmethod
+    def _index_add[K](
+        index: dict[K, dict[int, RegisteredClient]], key: K, client: RegisteredClient
+    ) -> None:
+        index.setdefault(key, {})[id(client)] = client
+
+    @staticmethod
+    def _index_remove[K](
+        index: dict[K, dict[int, RegisteredClient]], key: K, client: RegisteredClient
+    ) -> None:
+        clients = index.get(key)
+        if clients is None:
+            return
+        clients.pop(id(client), None)
+        # Don't keep empty entries around, they would add up with each organization,
+        # user and realm that has ever been connected
+        if not clients:
+            del index[key]
+
+    def add(self, client: RegisteredClient) -> None:
+        self._index_add(self.by_organization, client.organization_id, client)
+        self._index_add(self.by_user, (client.organization_id, client.user_id), client)
+        for realm_id in client.realms:
+            self._index_add(self.by_realm, (client.organization_id, realm_id), client)
+
+    def remove(self, client: RegisteredClient) -> None:
+        self._index_remove(self.by_organization, client.organization_id, client)
+        self._index_remove(self.by_user, (client.organization_id, client.user_id), client)
+        for realm_id in client.realms:
+            self._index_remove(self.by_realm, (client.organization_id, realm_id), client)
+
+    def add_realm(self, client: RegisteredClient, realm_id: VlobID) -> None:
+        client.realms.add(realm_id)
+        self._index_add(self.by_realm, (client.organization_id, realm_id), client)
+
+    def discard_realm(self, client: RegisteredClient, realm_id: VlobID) -> None:
+        client.realms.discard(realm_id)
+        self._index_remove(self.by_realm, (client.organization_id, realm_id), client)
+
+    def organization_clients(self, organization_id: OrganizationID) -> list[RegisteredClient]:
+        return list(self.by_organization.get(organization_id, {}).values())
+
+    def user_clients(
+        self, organization_id: OrganizationID, user_id: UserID
+    ) -> list[RegisteredClient]:
+        return list(self.by_user.get((organization_id, user_id), {}).values())
+
+    def _users_clients(
+        self, organization_id: OrganizationID, user_ids: Iterable[UserID]
+    ) -> list[RegisteredClient]:
+        clients: dict[int, RegisteredClient] = {}
+        for user_id in user_ids:
+            clients |= self.by_user.get((organization_id, user_id), {})
+        return list(clients.values())
+
+    def candidates(self, event: ClientBroadcastableEvent) -> list[RegisteredClient]:
+        """
+        Return the clients the event may be for (`event.is_event_for_client` is
+        still to be checked on each of them).
+
+        Note a copy is returned, so the indexes can be modified while iterating.
+        """
+        match event:
+            case EventVlob():
+                return list(self.by_realm.get((event.organization_id, event.realm_id), {}).values())
+            case EventRealmCertificate():
+                # Also the clients of the user the certificate is about: the realm may
+                # have just been shared with them (see `BaseEventsComponent._on_event`)
+                return list(
+                    (
+                        self.by_realm.get((event.organization_id, event.realm_id), {})
+                        | self.by_user.get((event.organization_id, event.user_id), {})
+                    ).values()
+                )
+            case (
+                EventGreetingAttemptReady()
+                | EventGreetingAttemptCancelled()
+                | EventGreetingAttemptJoined()
+            ):
+                return self.user_clients(event.organization_id, event.greeter)
+            case EventInvitation():
+                return self._users_clients(event.organization_id, event.possible_greeters)
+            case EventShamirRecoveryCertificate():
+                return self._users_clients(event.organization_id, event.participants)
+            case _:
+                # Organization-wide events (e.g. `EventCommonCertificate`), as well as
+                # any event not listed above
+                return self.organization_clients(event.organization_id)
+
+
+@dataclass(slots=True)
+class _OrganizationEvents:
+    # Events in dispatch order, along with their size
+    events: deque[tuple[ClientBroadcastableEvent, int]] = field(default_factory=deque)
+    # Event ID to position, the positions keep increasing as events are added (i.e.
+    # the first item in `events` is at position `first_position`)
+    positions: dict[UUID, int] = field(default_factory=dict)
+    first_position: int = 0
+    size: int = 0
+
+
+class SseEventsCache:
+    """
+    The last dispatched events, so that a reconnecting SSE client can be sent the
+    events it has missed since the one referred by its `Last-Event-ID` header.
+
+    Events are kept per organization, so that a burst of events in a busy organization
+    doesn't evict the history of the others. The retention is bounded by a number
+    of events and a size (in bytes) for each organization, and by a total size, in
+    which case the oldest events of the least recently active organizations are
+    evicted first.
+    """
+
+    def __init__(self, max_events: int, organization_max_bytes: int, max_bytes: int):
+        assert max_events > 0, max_events
+        self.max_events = max_events
+        self.organization_max_bytes = organization_max_bytes
+        self.max_bytes = max_bytes
+        self.size = 0
+        # Ordered from the least to the most recently active organization
+        self._organizations: OrderedDict[OrganizationID, _OrganizationEvents] = OrderedDict()
+
+    def append(self, event: ClientBroadcastableEvent, size: int) -> None:
+        organization_id = event.organization_id
+        organization = self._organizations.get(organization_id)
+        if organization is None:
+            organization = self._organizations[organization_id] = _OrganizationEvents()
+        else:
+            self._organizations.move_to_end(organization_id)
+
+        organization.positions[event.event_id] = organization.first_position + len(
+            organization.events
+        )
+        organization.events.append((event, size))
+        organization.size += size
+        self.size += size
+
+        # Note the last event is always kept, even if too big, so that the client
+        # receiving it can still reconnect from it.
+        while len(organization.events) > 1 and (
+            len(organization.events) > self.max_events
+            or organization.size > self.organization_max_bytes
+        ):
+            self._evict_oldest(organization_id, organization)
+        while self.size > self.max_bytes and len(self._organizations) > 1:
+            self._evict_oldest(*next(iter(self._organizations.items())))
+
+    def _evict_oldest(
+        self, organization_id: OrganizationID, organization: _OrganizationEvents
+    ) -> None:
+        event, size = organization.events.popleft()
+        # Don't remove the position of a more recent event with the same ID (should
+        # not occur, but better safe than sorry)
+        if organization.positions.get(event.event_id) == organization.first_position:
+            del organization.positions[event.event_id]
+        organization.first_position += 1
+        organization.size -= size
+        self.size -= size
+        if not organization.events:
+            del self._organizations[organization_id]
+
+    def events_after(
+        self, organization_id: OrganizationID, event_id: UUID
+    ) -> Iterator[ClientBroadcastableEvent] | None:
+        """
+        Return the events of the organization that have been dispatched after `event_id`
+        (from the oldest to the most recent), or `None` if this event is not in the
+        cache (i.e. it is too old).
+        """
+        organization = self._organizations.get(organization_id)
+        if organization is None:
+            return None
+        position = organization.positions.get(event_id)
+        if position is None:
+            return None
+        start = position - organization.first_position + 1
+        # Note `deque` indexing is O(n) in the middle but O(1) at both ends, hence
+        # we walk back from the end (the client is likely to have missed only a
+        # few events)
+        missed = islice(reversed(organization.events), len(organization.events) - start)
+        return (event for event, _ in reversed(list(missed)))
+
+
 class SseAPiEventsListenBadOutcome(BadOutcomeEnum):
     ORGANIZATION_NOT_FOUND = auto()
     ORGANIZATION_EXPIRED = auto()
@@ -258,10 +485,13 @@ class BaseEventsComponent:
         self._event_bus = event_bus
         # Key is `id(client_ctx)`
         self._registered_clients: dict[int, RegisteredClient] = {}
+        self._routing = RegisteredClientsRouting()
         # Keep in cache the last dispatched events so that we can handle SSE reconnection
         # with the `Last-Event-Id` header
-        self._last_events_cache: deque[ClientBroadcastableEvent] = deque(
-            maxlen=config.sse_events_cache_size
+        self._last_events_cache = SseEventsCache(
+            max_events=config.sse_events_cache_size,
+            organization_max_bytes=config.sse_events_cache_organization_max_bytes,
+            max_bytes=config.sse_events_cache_max_bytes,
         )
         self._event_bus.connect(self._on_event)
         # Note we don't have a `__del__` to disconnect from the event bus: the lifetime
@@ -286,10 +516,13 @@ class BaseEventsComponent:
             case ClientBroadcastableEvent():
                 # It's likely the latest api is the most used, hence we only dump the
                 # event once for this case
+                started_at = time.perf_counter()
                 apiv5_sse_payload = event.dump_as_apiv5_sse_payload()
 
-                self._last_events_cache.append(event)
-                for registered in self._registered_clients.values():
+                # The size of the payload is used as an estimate of the memory used by the event
+                self._last_events_cache.append(event, len(apiv5_sse_payload))
+                SSE_EVENTS_CACHE_SIZE.set(self._last_events_cache.size)
+                for registered in self._routing.candidates(event):
                     if not event.is_event_for_client(registered):
                         if (
                             isinstance(event, EventRealmCertificate)
@@ -299,7 +532,7 @@ class BaseEventsComponent:
                             # This is a special case: the current certificate is new a sharing
                             # for our user (hence he doesn't know yet he should be interested
                             # in this realm !).
-                            registered.realms.add(event.realm_id)
+                            self._routing.add_realm(registered, event.realm_id)
                         else:
                             # The event is not meant for this client, skip it
                             continue
@@ -312,7 +545,7 @@ class BaseEventsComponent:
                         and event.role_removed
                         and event.user_id == registered.user_id
                     ):
-                        registered.realms.discard(event.realm_id)
+                        self._routing.discard_realm(registered, event.realm_id)
 
                     try:
                         registered.channel_sender.send_nowait((event, apiv5_sse_payload))
@@ -320,27 +553,23 @@ class BaseEventsComponent:
                         # Client is lagging too much behind, kill it
                         registered.cancel_scope.cancel()
 
+                SSE_FAN_OUT_DURATION.observe(time.perf_counter() - started_at)
+
             # Events for cross-server communication requiring disconnection of some listening clients
 
             case EventOrganizationExpired():
-                for registered in self._registered_clients.values():
-                    if registered.organization_id == event.organization_id:
-                        registered.cancel_scope.cancel()
+                for registered in self._routing.organization_clients(event.organization_id):
+                    registered.cancel_scope.cancel()
 
             case EventUserRevokedOrFrozen():
-                for registered in self._registered_clients.values():
-                    if (
-                        registered.organization_id == event.organization_id
-                        and registered.user_id == event.user_id
-                    ):
-                        registered.cancel_scope.cancel()
+                for registered in self._routing.user_clients(event.organization_id, event.user_id):
+                    registered.cancel_scope.cancel()
 
             case EventOrganizationTosUpdated():
                 # All users in the organization must re-accept the TOS before being
                 # able to communicate with the server again.
-                for registered in self._registered_clients.values():
-                    if registered.organization_id == event.organization_id:
-                        registered.cancel_scope.cancel()
+                for registered in self._routing.organization_clients(event.organization_id):
+                    registered.cancel_scope.cancel()
 
             # Other events for cross-server communication, just ignore them
 
@@ -370,7 +599,10 @@ class BaseEventsComponent:
         def _collect_realm_changes(event: Event):
             nonlocal user_profile_changed
 
-            if event.organization_id != client_ctx.organization_id:
+            if (
+                isinstance(event, EventAccountAuthMethodsDisabled)
+                or event.organization_id != client_ctx.organization_id
+            ):
                 return
 
             if isinstance(event, EventUserUpdated):
@@ -425,6 +657,8 @@ class BaseEventsComponent:
         if self._stopped:
             return SseAPiEventsListenBadOutcome.STOPPED
         self._registered_clients[id(client_ctx)] = registered
+        self._routing.add(registered)
+        SSE_REGISTERED_CLIENTS.set(len(self._registered_clients))
 
         # Finally populate the event channel with the event that have been missed
         # since `last_event_id`.
@@ -432,25 +666,28 @@ class BaseEventsComponent:
         # concurrent event may be handled by `_on_event` callback and also appear
         # in the cache (and in the end we will send to the client this event twice !)
         if last_event_id is not None:
-            missed_events: deque[ClientBroadcastableEvent] = deque()
-            # It is likely the client has missed only few events, hence we
-            # iter over the events starting by the most recent.
-            for event in reversed(self._last_events_cache):
-                if event.event_id == last_event_id:
-                    # Found the last event !
-                    # Now we can populate the channel with all the missed event.
-                    for event in missed_events:
-                        channel_sender.send_nowait((event, None))
-                    break
-                if event.is_event_for_client(registered):
-                    if len(missed_events) >= PER_CLIENT_MAX_BUFFER_EVENTS:
-                        # We missed too many events
-                        channel_sender.send_nowait(None)
-                        break
-                    missed_events.appendleft(event)
-            else:
+            events_after = self._last_events_cache.events_after(
+                client_ctx.organization_id, last_event_id
+            )
+            if events_after is None:
                 # Cannot find the last event referred by the ID, just consider it is too old
+                SSE_RECONNECTIONS.inc("missed_events")
                 channel_sender.send_nowait(None)
+            else:
+                missed_events = []
+                for event in events_after:
+                    if event.is_event_for_client(registered):
+                        missed_events.append(event)
+                        if len(missed_events) > PER_CLIENT_MAX_BUFFER_EVENTS:
+                            break
+                if len(missed_events) > PER_CLIENT_MAX_BUFFER_EVENTS:
+                    # We missed too many events
+                    SSE_RECONNECTIONS.inc("missed_events")
+                    channel_sender.send_nowait(None)
+                else:
+                    SSE_RECONNECTIONS.inc("replayed")
+                    for event in missed_events:
+                        channel_sender.send_nowait((event, None))
 
         return initial_organization_config_event, channel_receiver, registered
 
@@ -486,6 +723,8 @@ class BaseEventsComponent:
                 # It's vital to unregister the client here given the memory location of the
                 # client (and hence the id resulting of it) will most likely be re-used !
                 self._registered_clients.pop(id(client_ctx))
+                self._routing.remove(registered_client)
+                SSE_REGISTERED_CLIENTS.set(len(self._registered_clients))
 
     # This API has obviously nothing to do with the Event component...
     # It has been put there since it is an orphan feature and giving it its own
@@ -0,0 +1,166 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import os
+from functools import partial
+from hashlib import blake2b
+from pathlib import Path
+from typing import override
+
+import anyio
+
+# Required because the top-level module of anyio does not correctly load the submodule to_thread
+# see https://github.com/microsoft/pyright/issues/10912
+import anyio.to_thread
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreReadBadOutcome,
+)
+from parsec.config import FilesystemBlockStoreDurability
+from parsec.logging import get_logger
+
+logger = get_logger()
+
+
+TMP_FILE_PREFIX = ".tmp-"
+
+
+def build_filesystem_path(root: Path, organization_id: OrganizationID, block_id: BlockID) -> Path:
+    # Blocks are spread among 2 levels of 256 sub-directories to keep the number of
+    # entries per directory reasonable (e.g.
+    # `<root>/CoolOrg/a1/f3/3b91779235ac409f9af1fe6de8d2b905`).
+    # Block IDs are generated by the clients, so we rely on a hash instead of the ID
+    # itself to guarantee an even distribution among the shards.
+    shard = blake2b(block_id.bytes, digest_size=2).hexdigest()
+    return root / organization_id.str / shard[:2] / shard[2:] / block_id.hex
+
+
+class FilesystemBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Store each block as a regular file in a local directory.
+
+    Filesystem operations are blocking, hence they are run in worker threads (limited
+    by a dedicated capacity limiter to bound the number of concurrently opened files).
+
+    Block creation is atomic: the data is written to a temporary file that is then
+    renamed to its final name. Since blocks are immutable, a create on an already
+    existing block is a no-op.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        durability: FilesystemBlockStoreDurability = FilesystemBlockStoreDurability.FULL,
+        max_concurrency: int = 10,
+    ):
+        assert max_concurrency > 0, max_concurrency
+        if not path.is_dir():
+            raise ValueError(f"Filesystem block store directory `{path}` does not exist")
+        self.path = path
+        self._durability = durability
+        self._limiter = anyio.CapacityLimiter(max_concurrency)
+        self.batch_max_concurrency = max_concurrency
+        self._logger = logger.bind(
+            blockstore_type="Filesystem", path=str(path), durability=durability.name
+        )
+
+    def _sync_read(self, path: Path) -> bytes:
+        # Unbuffered `readall` sizes its buffer from `fstat`, so the block is read
+        # with a single allocation and no intermediate copy.
+        with open(path, "rb", buffering=0) as fd:
+            return fd.readall()
+
+    def _sync_create(self, path: Path, block: bytes) -> None:
+        if path.exists():
+            # Keep calm and stay idempotent
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{TMP_FILE_PREFIX}{path.name}-{os.urandom(4).hex()}")
+        try:
+            with open(tmp_path, "xb", buffering=0) as fd:
+                view = memoryview(block)
+                while view:
+                    written = fd.write(view)
+                    assert written is not None
+                    view = view[written:]
+                if self._durability != FilesystemBlockStoreDurability.NONE:
+                    os.fsync(fd.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        # Also sync the parent directory, otherwise the rename itself may be lost in
+        # case of power failure (not needed, nor possible, on Windows).
+        if self._durability == FilesystemBlockStoreDurability.FULL and os.name != "nt":
+            dir_fd = os.open(path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        path = build_filesystem_path(self.path, organization_id, block_id)
+        try:
+            return await anyio.to_thread.run_sync(self._sync_read, path, limiter=self._limiter)
+
+        except FileNotFoundError:
+            self._logger.warning(
+                "Block read error: Block not found",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+        except OSError as exc:
+            self._logger.warning(
+                "Block read error",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+            return BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        path = build_filesystem_path(self.path, organization_id, block_id)
+        try:
+            await anyio.to_thread.run_sync(self._sync_create, path, block, limiter=self._limiter)
+
+        except OSError as exc:
+            self._logger.warning(
+                "Block create error",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+            return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        path = build_filesystem_path(self.path, organization_id, block_id)
+        try:
+            await anyio.to_thread.run_sync(
+                partial(path.unlink, missing_ok=True), limiter=self._limiter
+            )
+
+        except OSError as exc:
+            self._logger.warning(
+                "Block delete error",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
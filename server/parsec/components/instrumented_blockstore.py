@@ -0,0 +1,165 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+from typing import override
+
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
+    BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+)
+from parsec.metrics import METRICS
+from parsec.tracing import Span, span
+
+BLOCKSTORE_OPERATION_DURATION = METRICS.histogram(
+    "parsec_blockstore_operation_duration_seconds",
+    "Time spent by the block store backends on operations, by backend and operation"
+    " (a batch operation is measured as a whole).",
+    labels=("backend", "operation"),
+)
+BLOCKSTORE_OPERATIONS = METRICS.counter(
+    "parsec_blockstore_operations_total",
+    "Number of blocks processed by the block store backends, by backend, operation and outcome.",
+    labels=("backend", "operation", "outcome"),
+)
+
+
+def _outcome_label(outcome: object) -> str:
+    match outcome:
+        case (
+            BlockStoreReadBadOutcome() | BlockStoreCreateBadOutcome() | BlockStoreDeleteBadOutcome()
+        ):
+            return outcome.name
+        case _:
+            return "OK"
+
+
+class InstrumentedBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Record the latency and the outcome of the operations on a block store backend
+    (S3, SWIFT etc.) for the `/metrics` endpoint, and as tracing spans.
+    """
+
+    def __init__(self, blockstore: BaseBlockStoreComponent, backend: str):
+        self.blockstore = blockstore
+        self.backend = backend
+        self.batch_max_concurrency = blockstore.batch_max_concurrency
+
+    def _span(self, operation: str) -> AbstractContextManager[Span | None]:
+        return span(f"blockstore.{operation}", **{"blockstore.backend": self.backend})
+
+    def _record(
+        self, operation: str, started_at: float, outcome: object, current_span: Span | None
+    ) -> None:
+        label = _outcome_label(outcome)
+        BLOCKSTORE_OPERATION_DURATION.observe(
+            time.perf_counter() - started_at, self.backend, operation
+        )
+        BLOCKSTORE_OPERATIONS.inc(self.backend, operation, label)
+        if current_span is not None:
+            current_span.attributes["blockstore.outcome"] = label
+
+    @override
+    def is_available(self) -> bool:
+        return self.blockstore.is_available()
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        with self._span("read") as current_span:
+            started_at = time.perf_counter()
+            outcome = await self.blockstore.read(organization_id, block_id)
+            self._record("read", started_at, outcome, current_span)
+        return outcome
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        with self._span("create") as current_span:
+            started_at = time.perf_counter()
+            outcome = await self.blockstore.create(organization_id, block_id, block)
+            self._record("create", started_at, outcome, current_span)
+        return outcome
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        with self._span("delete") as current_span:
+            started_at = time.perf_counter()
+            outcome = await self.blockstore.delete(organization_id, block_id)
+            self._record("delete", started_at, outcome, current_span)
+        return outcome
+
+    async def _forward_many[T](
+        self,
+        operation: str,
+        sub_many: Callable[
+            [], AbstractAsyncContextManager[MemoryObjectReceiveStream[tuple[BlockID, T]]]
+        ],
+        results: MemoryObjectSendStream[tuple[BlockID, T]],
+    ) -> None:
+        with self._span(operation) as current_span:
+            started_at = time.perf_counter()
+            blocks = 0
+            async with sub_many() as sub_results:
+                async for block_id, outcome in sub_results:
+                    blocks += 1
+                    BLOCKSTORE_OPERATIONS.inc(self.backend, operation, _outcome_label(outcome))
+                    await results.send((block_id, outcome))
+            BLOCKSTORE_OPERATION_DURATION.observe(
+                time.perf_counter() - started_at, self.backend, operation
+            )
+            if current_span is not None:
+                current_span.attributes["blockstore.blocks"] = blocks
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        await self._forward_many(
+            "read_many",
+            lambda: self.blockstore.read_many(organization_id, block_ids),
+            results,
+        )
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        await self._forward_many(
+            "create_many",
+            lambda: self.blockstore.create_many(organization_id, blocks),
+            results,
+        )
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        await self._forward_many(
+            "delete_many",
+            lambda: self.blockstore.delete_many(organization_id, block_ids),
+            results,
+        )
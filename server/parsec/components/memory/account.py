@@ -53,6 +53,7 @@ from parsec.components.memory.datamodel import (
     MemoryDatamodel,
 )
 from parsec.config import BackendConfig
+from parsec.events import EventAccountAuthMethodsDisabled
 
 
 class MemoryAccountComponent(BaseAccountComponent):
@@ -288,6 +289,9 @@ class MemoryAccountComponent(BaseAccountComponent):
             for auth_method in account.current_vault.authentication_methods.values():
                 if auth_method.disabled_on is None:
                     auth_method.disabled_on = now
+            await self._event_bus.send(
+                EventAccountAuthMethodsDisabled(account_email=account.account_email)
+            )
 
             # 4) And finally discard the used validation email
 
@@ -368,6 +372,7 @@ class MemoryAccountComponent(BaseAccountComponent):
 
             for auth_method in account.current_vault.active_authentication_methods:
                 auth_method.disabled_on = now
+            await self._event_bus.send(EventAccountAuthMethodsDisabled(account_email=email))
 
             # 4) Create the new vault with its authentication method
 
@@ -449,6 +454,9 @@ class MemoryAccountComponent(BaseAccountComponent):
 
         for auth_method in account.current_vault.authentication_methods.values():
             auth_method.disabled_on = now
+        await self._event_bus.send(
+            EventAccountAuthMethodsDisabled(account_email=account.account_email)
+        )
         account.previous_vaults.append(account.current_vault)
         account.current_vault = MemoryAccountVault(
             items=items,
@@ -623,6 +631,9 @@ class MemoryAccountComponent(BaseAccountComponent):
                     and existing_auth_method.disabled_on is None
                 ):
                     existing_auth_method.disabled_on = now
+            await self._event_bus.send(
+                EventAccountAuthMethodsDisabled(account_email=account.account_email)
+            )
 
         # Create the new authentication method
 
@@ -698,3 +709,6 @@ class MemoryAccountComponent(BaseAccountComponent):
 
         # Disable the authentication method
         target_auth_method.disabled_on = now
+        await self._event_bus.send(
+            EventAccountAuthMethodsDisabled(account_email=account.account_email)
+        )
@@ -2,10 +2,15 @@
 
 from typing import Any, override
 
-from parsec._parsec import AccessToken, DateTime, DeviceID, OrganizationID
-from parsec.ballpark import timestamps_in_the_ballpark
+from parsec._parsec import (
+    AccessToken,
+    AccountAuthMethodID,
+    DateTime,
+    DeviceID,
+    OrganizationID,
+    SecretKey,
+)
 from parsec.components.auth import (
-    AccountAuthenticationToken,
     AnonymousAuthInfo,
     AuthAnonymousAuthBadOutcome,
     AuthAuthenticatedAccountAuthBadOutcome,
@@ -60,8 +65,8 @@ class MemoryAuthComponent(BaseAuthComponent):
         )
 
     @override
-    async def invited_auth(
-        self, now: DateTime, organization_id: OrganizationID, token: AccessToken
+    async def _get_invited_info(
+        self, organization_id: OrganizationID, token: AccessToken
     ) -> InvitedAuthInfo | AuthInvitedAuthBadOutcome:
         try:
             org = self._data.organizations[organization_id]
@@ -123,26 +128,19 @@ class MemoryAuthComponent(BaseAuthComponent):
         )
 
     @override
-    async def authenticated_account_auth(
-        self,
-        now: DateTime,
-        token: AccountAuthenticationToken,
-    ) -> AuthenticatedAccountAuthInfo | AuthAuthenticatedAccountAuthBadOutcome:
-        match self._data.get_account_from_active_auth_method(auth_method_id=token.auth_method_id):
+    async def _get_authenticated_account_info(
+        self, auth_method_id: AccountAuthMethodID
+    ) -> tuple[AuthenticatedAccountAuthInfo, SecretKey] | AuthAuthenticatedAccountAuthBadOutcome:
+        match self._data.get_account_from_active_auth_method(auth_method_id=auth_method_id):
             case (account, auth_method):
                 pass
             case None:
                 return AuthAuthenticatedAccountAuthBadOutcome.ACCOUNT_NOT_FOUND
 
-        if not token.verify(auth_method.mac_key):
-            return AuthAuthenticatedAccountAuthBadOutcome.INVALID_TOKEN
-
-        if timestamps_in_the_ballpark(token.timestamp, now) is not None:
-            return AuthAuthenticatedAccountAuthBadOutcome.TOKEN_OUT_OF_BALLPARK
-
-        return AuthenticatedAccountAuthInfo(
+        auth_info = AuthenticatedAccountAuthInfo(
             account_email=account.account_email,
             auth_method_id=auth_method.id,
             account_internal_id=0,  # Only used by PostgreSQL implementation
             auth_method_internal_id=0,  # Only used by PostgreSQL implementation
         )
+        return auth_info, auth_method.mac_key
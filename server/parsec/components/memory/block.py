@@ -4,18 +4,25 @@ from __future__ import annotations
 from collections.abc import Buffer
 from typing import override
 
+from anyio.streams.memory import MemoryObjectSendStream
+
 from parsec._parsec import BlockID, DateTime, DeviceID, OrganizationID, RealmRole, VlobID
 from parsec.components.block import (
     BadKeyIndex,
     BaseBlockComponent,
     BlockCreateBadOutcome,
+    BlockGetBlocksBatch,
+    BlockGetBlocksBatchOffsetMarker,
     BlockReadBadOutcome,
     BlockReadResult,
 )
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
     BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
 )
 from parsec.components.memory.datamodel import MemoryBlock, MemoryDatamodel
 
@@ -141,6 +148,30 @@ class MemoryBlockComponent(BaseBlockComponent):
                 created_on=now,
             )
 
+    @override
+    async def get_blocks_batch(
+        self,
+        batch_offset_marker: BlockGetBlocksBatchOffsetMarker,
+        batch_size: int,
+    ) -> BlockGetBlocksBatch:
+        # Simulate a single PostgreSQL table for the blocks of all organizations
+        all_blocks = (
+            (org.organization_id, block)
+            for org in self._data.organizations.values()
+            for _, block in org.simulate_postgresql_block_table()
+        )
+
+        blocks: list[tuple[OrganizationID, BlockID]] = []
+        sequential_row_id = batch_offset_marker
+        for sequential_row_id, (organization_id, block) in enumerate(all_blocks, start=100):
+            if sequential_row_id <= batch_offset_marker:
+                continue
+            blocks.append((organization_id, block.block_id))
+            if len(blocks) >= batch_size:
+                break
+
+        return BlockGetBlocksBatch(blocks=blocks, batch_offset_marker=sequential_row_id)
+
     @override
     async def test_dump_blocks(
         self, organization_id: OrganizationID
@@ -186,3 +217,34 @@ class MemoryBlockStoreComponent(BaseBlockStoreComponent):
             return
 
         org.block_store[block_id] = block
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        try:
+            org = self._data.organizations[organization_id]
+        except KeyError:
+            return
+
+        org.block_store.pop(block_id, None)
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        for block_id in block_ids:
+            await results.send((block_id, await self.read(organization_id, block_id)))
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        for block_id, block in blocks:
+            await results.send((block_id, await self.create(organization_id, block_id, block)))
@@ -12,7 +12,7 @@ from anyio.streams.memory import MemoryObjectSendStream
 from parsec._parsec import OrganizationID, UserID, UserProfile, VlobID
 from parsec.components.events import BaseEventsComponent, EventBus, SseAPiEventsListenBadOutcome
 from parsec.components.memory.datamodel import MemoryDatamodel
-from parsec.events import Event, EventOrganizationConfig
+from parsec.events import Event, EventAccountAuthMethodsDisabled, EventOrganizationConfig
 from parsec.logging import get_logger
 
 logger = get_logger()
@@ -46,8 +46,11 @@ async def event_bus_factory() -> AsyncGenerator[MemoryEventBus]:
                 "Received internal event",
                 type=event.type,
                 event_id=event.event_id.hex,
-                organization_id=event.organization_id.str,
-                debug_extra=event.model_dump(),
+                # Account events are not related to any organization
+                organization_id=None
+                if isinstance(event, EventAccountAuthMethodsDisabled)
+                else event.organization_id.str,
+                debug_extra=event.model_dump,
             )
 
             event_bus._dispatch_incoming_event(event)
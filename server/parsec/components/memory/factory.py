@@ -41,46 +41,45 @@ async def components_factory(config: BackendConfig) -> AsyncGenerator[dict[str,
     async with event_bus_factory() as event_bus:
         async with httpx.AsyncClient(verify=SSL_CONTEXT) as http_client:
             webhooks = WebhooksComponent(config, http_client)
-            blockstore = blockstore_factory(config.blockstore_config, mocked_data=data)
+            async with blockstore_factory(config.blockstore_config, mocked_data=data) as blockstore:
+                account = MemoryAccountComponent(data, config, event_bus)
+                async_enrollment = MemoryAsyncEnrollmentComponent(data, event_bus, config)
+                auth = MemoryAuthComponent(data, event_bus, config)
+                block = MemoryBlockComponent(data, blockstore)
+                cryptpad = MemoryCryptpadComponent(data, config)
+                events = MemoryEventsComponent(data, config, event_bus)
+                invite = MemoryInviteComponent(data, event_bus, config)
+                organization = MemoryOrganizationComponent(data, event_bus, webhooks, config)
+                ping = MemoryPingComponent(event_bus)
+                realm = MemoryRealmComponent(data, event_bus, webhooks)
+                scws = ScwsComponent(config)
+                sequester = MemorySequesterComponent(data, event_bus)
+                shamir = MemoryShamirComponent(data, event_bus)
+                totp = MemoryTOTPComponent(data, config)
+                user = MemoryUserComponent(data, event_bus)
+                vlob = MemoryVlobComponent(data, event_bus, webhooks)
 
-            account = MemoryAccountComponent(data, config, event_bus)
-            async_enrollment = MemoryAsyncEnrollmentComponent(data, event_bus, config)
-            auth = MemoryAuthComponent(data, event_bus, config)
-            block = MemoryBlockComponent(data, blockstore)
-            cryptpad = MemoryCryptpadComponent(data, config)
-            events = MemoryEventsComponent(data, config, event_bus)
-            invite = MemoryInviteComponent(data, event_bus, config)
-            organization = MemoryOrganizationComponent(data, event_bus, webhooks, config)
-            ping = MemoryPingComponent(event_bus)
-            realm = MemoryRealmComponent(data, event_bus, webhooks)
-            scws = ScwsComponent(config)
-            sequester = MemorySequesterComponent(data, event_bus)
-            shamir = MemoryShamirComponent(data, event_bus)
-            totp = MemoryTOTPComponent(data, config)
-            user = MemoryUserComponent(data, event_bus)
-            vlob = MemoryVlobComponent(data, event_bus, webhooks)
+                components = {
+                    "account": account,
+                    "async_enrollment": async_enrollment,
+                    "auth": auth,
+                    "block": block,
+                    "blockstore": blockstore,
+                    "cryptpad": cryptpad,
+                    "event_bus": event_bus,
+                    "events": events,
+                    "invite": invite,
+                    "mocked_data": data,
+                    "organization": organization,
+                    "ping": ping,
+                    "realm": realm,
+                    "scws": scws,
+                    "sequester": sequester,
+                    "shamir": shamir,
+                    "totp": totp,
+                    "user": user,
+                    "vlob": vlob,
+                    "webhooks": webhooks,
+                }
 
-            components = {
-                "account": account,
-                "async_enrollment": async_enrollment,
-                "auth": auth,
-                "block": block,
-                "blockstore": blockstore,
-                "cryptpad": cryptpad,
-                "event_bus": event_bus,
-                "events": events,
-                "invite": invite,
-                "mocked_data": data,
-                "organization": organization,
-                "ping": ping,
-                "realm": realm,
-                "scws": scws,
-                "sequester": sequester,
-                "shamir": shamir,
-                "totp": totp,
-                "user": user,
-                "vlob": vlob,
-                "webhooks": webhooks,
-            }
-
-            yield components
+                yield components
@@ -7,16 +7,21 @@ from asyncpg import UniqueViolationError
 from parsec._parsec import (
     AccountAuthMethodID,
     DateTime,
+    EmailAddress,
     SecretKey,
     UntrustedPasswordAlgorithm,
     UntrustedPasswordAlgorithmArgon2id,
 )
 from parsec.components.account import AccountAuthMethodCreateBadOutcome
 from parsec.components.postgresql import AsyncpgConnection
+from parsec.components.postgresql.handler import send_signal
 from parsec.components.postgresql.utils import Q
+from parsec.events import EventAccountAuthMethodsDisabled
 
 _q_get_current_vault_from_auth_method = Q("""
-SELECT vault._id AS vault_internal_id
+SELECT
+    vault._id AS vault_internal_id,
+    account.email
 FROM vault_authentication_method
 INNER JOIN vault ON vault_authentication_method.vault = vault._id
 INNER JOIN account ON vault.account = account._id
@@ -101,6 +106,12 @@ async def auth_method_create(
         case _:
             assert False, row
 
+    match row["email"]:
+        case str() as raw_email:
+            email = EmailAddress(raw_email)
+        case _:
+            assert False, row
+
     # 2) If we're creating a password authentication method, disable any existing
     # password authentication methods in the current vault
 
@@ -114,6 +125,8 @@ async def auth_method_create(
         # In theory there should be at most a single active password authentication
         # method per vault.
         assert disabled_count == 0 or disabled_count == 1, disabled_count
+        if disabled_count:
+            await send_signal(conn, EventAccountAuthMethodsDisabled(account_email=email))
 
     # 3) Actual creation of the authentication method
 
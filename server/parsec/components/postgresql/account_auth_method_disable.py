@@ -3,13 +3,18 @@
 from parsec._parsec import (
     AccountAuthMethodID,
     DateTime,
+    EmailAddress,
 )
 from parsec.components.account import AccountAuthMethodDisableBadOutcome
 from parsec.components.postgresql import AsyncpgConnection
+from parsec.components.postgresql.handler import send_signal
 from parsec.components.postgresql.utils import Q
+from parsec.events import EventAccountAuthMethodsDisabled
 
 _q_get_account_from_auth_method = Q("""
-SELECT account._id AS account_internal_id
+SELECT
+    account._id AS account_internal_id,
+    account.email
 FROM vault_authentication_method
 INNER JOIN vault ON vault_authentication_method.vault = vault._id
 INNER JOIN account ON vault.account = account._id
@@ -75,6 +80,12 @@ async def auth_method_disable(
         case _:
             assert False, row
 
+    match row["email"]:
+        case str() as raw_email:
+            email = EmailAddress(raw_email)
+        case _:
+            assert False, row
+
     # 2) Check if target
 
     row = await conn.fetchrow(
@@ -117,3 +128,5 @@ async def auth_method_disable(
         )
     )
     assert disabled_count == 1, disabled_count
+
+    await send_signal(conn, EventAccountAuthMethodsDisabled(account_email=email))
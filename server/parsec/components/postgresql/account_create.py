@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 
 
-from typing import Literal, cast
+from typing import Literal
 
 from parsec._parsec import (
     AccountAuthMethodID,
@@ -19,7 +19,7 @@ from parsec.components.account import (
     ValidationCodeInfo,
 )
 from parsec.components.postgresql import AsyncpgConnection, AsyncpgPool
-from parsec.components.postgresql.utils import Q
+from parsec.components.postgresql.utils import Q, acquire_connection
 
 
 async def q_take_account_create_write_lock(
@@ -121,8 +121,7 @@ async def create_check_validation_code(
     # Acquire a connection from the pool by hand is needed here since we don't
     # want a rollback-on-error behavior (which is what the `@transaction`
     # decorator does).
-    async with pool.acquire() as conn, conn.transaction():
-        conn = cast(AsyncpgConnection, conn)
+    async with acquire_connection(pool) as conn, conn.transaction():
         return await _create_check_validation_code(conn, now, email, validation_code)
 
 
@@ -287,8 +286,7 @@ async def create_proceed(
     # decorator does).
     # This is to handle invalid validation code, since in this case an error is
     # returned but we still has to update the database to register the failed attempt.
-    async with pool.acquire() as conn:
-        conn = cast(AsyncpgConnection, conn)
+    async with acquire_connection(pool) as conn:
         transaction = conn.transaction()
         await transaction.start()
         try:
@@ -1,7 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 
 
-from typing import Literal, cast
+from typing import Literal
 
 from parsec._parsec import AccountAuthMethodID, DateTime, EmailAddress, ValidationCode
 from parsec.components.account import (
@@ -10,7 +10,9 @@ from parsec.components.account import (
     ValidationCodeInfo,
 )
 from parsec.components.postgresql import AsyncpgConnection, AsyncpgPool
-from parsec.components.postgresql.utils import Q
+from parsec.components.postgresql.handler import send_signal
+from parsec.components.postgresql.utils import Q, acquire_connection
+from parsec.events import EventAccountAuthMethodsDisabled
 
 _q_get_account_from_auth_method = Q("""
 SELECT
@@ -91,7 +93,9 @@ async def delete_send_validation_email(
 
 _q_get_account_and_validation_code_from_auth_method = Q("""
 WITH my_account AS (
-    SELECT account._id
+    SELECT
+        account._id,
+        account.email
     FROM vault_authentication_method
     INNER JOIN vault ON vault_authentication_method.vault = vault._id
     INNER JOIN account ON vault.account = account._id
@@ -123,6 +127,7 @@ my_validation_code AS (
 
 SELECT
     (SELECT _id FROM my_account) AS account_internal_id,
+    (SELECT email FROM my_account) AS email,
     (SELECT validation_code FROM my_validation_code) AS expected_validation_code,
     (SELECT created_at FROM my_validation_code) AS created_at,
     (SELECT failed_attempts FROM my_validation_code) AS failed_attempts
@@ -177,8 +182,7 @@ async def delete_proceed(
     # decorator does).
     # This is to handle invalid validation code, since in this case an error is
     # returned but we still have to update the database to register the failed attempt.
-    async with pool.acquire() as conn:
-        conn = cast(AsyncpgConnection, conn)
+    async with acquire_connection(pool) as conn:
         transaction = conn.transaction()
         await transaction.start()
         try:
@@ -227,6 +231,12 @@ async def _delete_proceed(
         case _:
             assert False, row
 
+    match row["email"]:
+        case str() as raw_email:
+            email = EmailAddress(raw_email)
+        case _:
+            assert False, row
+
     # 2) Check the validation code
 
     match row["expected_validation_code"]:
@@ -282,5 +292,7 @@ async def _delete_proceed(
     # At least, the auth method used to do this operation should have been disabled!
     assert row["disabled_auth_methods_count"] >= 1, row
 
+    await send_signal(conn, EventAccountAuthMethodsDisabled(account_email=email))
+
     # All done! Ask for the transaction to be committed
     return _commit()
@@ -6,6 +6,7 @@ from typing import Literal
 from parsec._parsec import (
     AccountAuthMethodID,
     DateTime,
+    EmailAddress,
     HashDigest,
     SecretKey,
     UntrustedPasswordAlgorithm,
@@ -13,11 +14,14 @@ from parsec._parsec import (
 )
 from parsec.components.account import AccountVaultKeyRotation
 from parsec.components.postgresql import AsyncpgConnection
+from parsec.components.postgresql.handler import send_signal
 from parsec.components.postgresql.utils import Q
+from parsec.events import EventAccountAuthMethodsDisabled
 
 _q_get_account_and_vault_from_auth_method = Q("""
 SELECT
     account._id AS account_internal_id,
+    account.email,
     vault._id AS vault_internal_id
 FROM vault_authentication_method
 INNER JOIN vault ON vault_authentication_method.vault = vault._id
@@ -133,6 +137,12 @@ async def vault_key_rotation(
         case _:
             assert False, row
 
+    match row["email"]:
+        case str() as raw_email:
+            email = EmailAddress(raw_email)
+        case _:
+            assert False, row
+
     match row["vault_internal_id"]:
         case int() as current_vault_internal_id:
             pass
@@ -161,6 +171,7 @@ async def vault_key_rotation(
     await conn.execute(
         *_q_disable_previous_auth_methods(account_internal_id=account_internal_id, now=now)
     )
+    await send_signal(conn, EventAccountAuthMethodsDisabled(account_email=email))
 
     # 4) Insert the new vault and its initial authentication method
 
@@ -14,9 +14,7 @@ from parsec._parsec import (
     UserID,
     VerifyKey,
 )
-from parsec.ballpark import timestamps_in_the_ballpark
 from parsec.components.auth import (
-    AccountAuthenticationToken,
     AnonymousAuthInfo,
     AuthAnonymousAuthBadOutcome,
     AuthAuthenticatedAccountAuthBadOutcome,
@@ -240,10 +238,9 @@ class PGAuthComponent(BaseAuthComponent):
 
     @override
     @no_transaction
-    async def invited_auth(
+    async def _get_invited_info(
         self,
         conn: AsyncpgConnection,
-        now: DateTime,
         organization_id: OrganizationID,
         token: AccessToken,
     ) -> InvitedAuthInfo | AuthInvitedAuthBadOutcome:
@@ -381,15 +378,12 @@ class PGAuthComponent(BaseAuthComponent):
 
     @override
     @no_transaction
-    async def authenticated_account_auth(
+    async def _get_authenticated_account_info(
         self,
         conn: AsyncpgConnection,
-        now: DateTime,
-        token: AccountAuthenticationToken,
-    ) -> AuthenticatedAccountAuthInfo | AuthAuthenticatedAccountAuthBadOutcome:
-        row = await conn.fetchrow(
-            *_q_authenticated_account_get_info(auth_method_id=token.auth_method_id)
-        )
+        auth_method_id: AccountAuthMethodID,
+    ) -> tuple[AuthenticatedAccountAuthInfo, SecretKey] | AuthAuthenticatedAccountAuthBadOutcome:
+        row = await conn.fetchrow(*_q_authenticated_account_get_info(auth_method_id=auth_method_id))
         if not row:
             return AuthAuthenticatedAccountAuthBadOutcome.ACCOUNT_NOT_FOUND
 
@@ -413,7 +407,7 @@ class PGAuthComponent(BaseAuthComponent):
 
         match row["auth_method_id"]:
             case str() as raw_auth_method_id:
-                auth_method_id = AccountAuthMethodID.from_hex(raw_auth_method_id)
+                assert AccountAuthMethodID.from_hex(raw_auth_method_id) == auth_method_id, row
             case _:
                 assert False, row
 
@@ -423,17 +417,10 @@ class PGAuthComponent(BaseAuthComponent):
             case _:
                 assert False, row
 
-        # Verify the token with the MAC key
-        if not token.verify(auth_method_mac_key):
-            return AuthAuthenticatedAccountAuthBadOutcome.INVALID_TOKEN
-
-        # Check token timestamp is within ballpark
-        if timestamps_in_the_ballpark(token.timestamp, now) is not None:
-            return AuthAuthenticatedAccountAuthBadOutcome.TOKEN_OUT_OF_BALLPARK
-
-        return AuthenticatedAccountAuthInfo(
+        auth_info = AuthenticatedAccountAuthInfo(
             account_email=account_email,
             auth_method_id=auth_method_id,
             account_internal_id=account_internal_id,
             auth_method_internal_id=auth_method_internal_id,
         )
+        return auth_info, auth_method_mac_key
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 from typing import override
 
+from anyio.streams.memory import MemoryObjectSendStream
 from asyncpg.exceptions import UniqueViolationError
 
 from parsec._parsec import (
@@ -15,20 +16,29 @@ from parsec._parsec import (
 from parsec.components.block import (
     BaseBlockComponent,
     BlockCreateBadOutcome,
+    BlockGetBlocksBatch,
+    BlockGetBlocksBatchOffsetMarker,
     BlockReadBadOutcome,
     BlockReadResult,
 )
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
     BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
 )
 from parsec.components.postgresql import AsyncpgConnection, AsyncpgPool
 from parsec.components.postgresql.block_create import block_create
+from parsec.components.postgresql.block_get_blocks_batch import block_get_blocks_batch
 from parsec.components.postgresql.block_read import block_read
 from parsec.components.postgresql.block_test_dump_blocks import block_test_dump_blocks
 from parsec.components.postgresql.utils import (
     Q,
+    acquire_connection,
+    no_transaction,
     transaction,
 )
 from parsec.components.realm import BadKeyIndex
@@ -74,6 +84,16 @@ class PGBlockComponent(BaseBlockComponent):
             block,
         )
 
+    @override
+    @no_transaction
+    async def get_blocks_batch(
+        self,
+        conn: AsyncpgConnection,
+        batch_offset_marker: BlockGetBlocksBatchOffsetMarker,
+        batch_size: int,
+    ) -> BlockGetBlocksBatch:
+        return await block_get_blocks_batch(conn, batch_offset_marker, batch_size)
+
     @override
     @transaction
     async def test_dump_blocks(
@@ -99,6 +119,54 @@ VALUES ($organization_id, $block_id, $data)
 """
 )
 
+_q_get_many_block_data = Q(
+    """
+SELECT
+    block_id,
+    data
+FROM block_data
+WHERE
+    organization_id = $organization_id
+    AND block_id = ANY($block_ids::UUID [])
+"""
+)
+
+_q_insert_many_block_data = Q(
+    """
+INSERT INTO block_data (organization_id, block_id, data)
+SELECT
+    $organization_id,
+    UNNEST($block_ids::UUID []),
+    UNNEST($blocks::BYTEA [])
+ON CONFLICT (organization_id, block_id) DO NOTHING
+"""
+)
+
+_q_delete_block_data = Q(
+    """
+DELETE FROM block_data
+WHERE
+    organization_id = $organization_id
+    AND block_id = $block_id
+"""
+)
+
+_q_delete_many_block_data = Q(
+    """
+DELETE FROM block_data
+WHERE
+    organization_id = $organization_id
+    AND block_id = ANY($block_ids::UUID [])
+"""
+)
+
+
+# Blocks are up to a few MB each, so batches are kept small enough for a query
+# result to fit in memory comfortably.
+BLOCK_DATA_BATCH_SIZE = 50
+# On the other hand, deleting only involves block IDs
+BLOCK_DATA_DELETE_BATCH_SIZE = 1000
+
 
 class PGBlockStoreComponent(BaseBlockStoreComponent):
     def __init__(self, pool: AsyncpgPool):
@@ -107,7 +175,7 @@ class PGBlockStoreComponent(BaseBlockStoreComponent):
     async def read(
         self, organization_id: OrganizationID, block_id: BlockID
     ) -> bytes | BlockStoreReadBadOutcome:
-        async with self.pool.acquire() as conn:
+        async with acquire_connection(self.pool) as conn:
             ret = await conn.fetchrow(
                 *_q_get_block_data(organization_id=organization_id.str, block_id=block_id)
             )
@@ -119,7 +187,7 @@ class PGBlockStoreComponent(BaseBlockStoreComponent):
     async def create(
         self, organization_id: OrganizationID, block_id: BlockID, block: bytes
     ) -> BlockStoreCreateBadOutcome | None:
-        async with self.pool.acquire() as conn:
+        async with acquire_connection(self.pool) as conn:
             try:
                 ret = await conn.execute(
                     *_q_insert_block_data(
@@ -132,3 +200,76 @@ class PGBlockStoreComponent(BaseBlockStoreComponent):
             except UniqueViolationError:
                 # Keep calm and stay idempotent
                 pass
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        async with acquire_connection(self.pool) as conn:
+            # Deleting a block that doesn't exist is fine
+            await conn.execute(
+                *_q_delete_block_data(organization_id=organization_id.str, block_id=block_id)
+            )
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        for start in range(0, len(block_ids), BLOCK_DATA_BATCH_SIZE):
+            batch = block_ids[start : start + BLOCK_DATA_BATCH_SIZE]
+            async with acquire_connection(self.pool) as conn:
+                rows = await conn.fetch(
+                    *_q_get_many_block_data(organization_id=organization_id.str, block_ids=batch)
+                )
+
+            found: set[BlockID] = set()
+            for row in rows:
+                block_id = BlockID.from_hex(row["block_id"])
+                found.add(block_id)
+                await results.send((block_id, row["data"]))
+
+            for block_id in batch:
+                if block_id not in found:
+                    await results.send((block_id, BlockStoreReadBadOutcome.BLOCK_NOT_FOUND))
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        for start in range(0, len(blocks), BLOCK_DATA_BATCH_SIZE):
+            batch = blocks[start : start + BLOCK_DATA_BATCH_SIZE]
+            async with acquire_connection(self.pool) as conn:
+                # Already existing blocks are ignored to stay idempotent
+                await conn.execute(
+                    *_q_insert_many_block_data(
+                        organization_id=organization_id.str,
+                        block_ids=[block_id for block_id, _ in batch],
+                        blocks=[block for _, block in batch],
+                    )
+                )
+
+            for block_id, _ in batch:
+                await results.send((block_id, None))
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        for start in range(0, len(block_ids), BLOCK_DATA_DELETE_BATCH_SIZE):
+            batch = block_ids[start : start + BLOCK_DATA_DELETE_BATCH_SIZE]
+            async with acquire_connection(self.pool) as conn:
+                await conn.execute(
+                    *_q_delete_many_block_data(organization_id=organization_id.str, block_ids=batch)
+                )
+
+            for block_id in batch:
+                await results.send((block_id, None))
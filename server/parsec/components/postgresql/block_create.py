@@ -20,6 +20,7 @@ from parsec.components.blockstore import (
 from parsec.components.postgresql import AsyncpgPool
 from parsec.components.postgresql.utils import (
     Q,
+    acquire_connection,
 )
 from parsec.components.realm import BadKeyIndex
 
@@ -196,7 +197,7 @@ async def block_create(
     # We keep it this way nevertheless (at least for now) to stay consistent with
     # the rest of the codebase and to simplify handling of concurrent insertions
     # of common & realm certificates.
-    async with pool.acquire() as conn:
+    async with acquire_connection(pool) as conn:
         row = await conn.fetchrow(
             *_q_create_fetch_data_and_lock_topics(
                 organization_id=organization_id.str,
@@ -319,7 +320,7 @@ async def block_create(
     # 3) Insert the block metadata into the database
 
     # No need for explicit transaction here since we use this session for a single query
-    async with pool.acquire() as conn:
+    async with acquire_connection(pool) as conn:
         try:
             ret = await conn.execute(
                 *_q_insert_block(
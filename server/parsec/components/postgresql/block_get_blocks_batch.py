@@ -0,0 +1,52 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.block import BlockGetBlocksBatch, BlockGetBlocksBatchOffsetMarker
+from parsec.components.postgresql import AsyncpgConnection
+from parsec.components.postgresql.utils import Q
+
+_q_get_blocks_batch = Q("""
+SELECT
+    block._id AS block_internal_id,
+    organization.organization_id,
+    block.block_id
+FROM block
+INNER JOIN realm ON block.realm = realm._id
+INNER JOIN organization ON realm.organization = organization._id
+WHERE block._id > $batch_offset_marker
+ORDER BY block._id
+LIMIT $batch_size
+""")
+
+
+async def block_get_blocks_batch(
+    conn: AsyncpgConnection,
+    batch_offset_marker: BlockGetBlocksBatchOffsetMarker,
+    batch_size: int,
+) -> BlockGetBlocksBatch:
+    rows = await conn.fetch(
+        *_q_get_blocks_batch(batch_offset_marker=batch_offset_marker, batch_size=batch_size)
+    )
+    assert rows is not None
+
+    blocks: list[tuple[OrganizationID, BlockID]] = []
+    if not rows:
+        last_block_internal_id = batch_offset_marker
+    else:
+        match rows[-1]["block_internal_id"]:
+            case int() as last_block_internal_id:
+                pass
+            case unknown:
+                assert False, unknown
+    for row in rows:
+        match (row["organization_id"], row["block_id"]):
+            case (str() as raw_organization_id, str() as raw_block_id):
+                blocks.append((OrganizationID(raw_organization_id), BlockID.from_hex(raw_block_id)))
+            case _:
+                assert False, row
+
+    return BlockGetBlocksBatch(
+        blocks=blocks,
+        batch_offset_marker=last_block_internal_id,
+    )
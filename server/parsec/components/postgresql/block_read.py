@@ -21,6 +21,7 @@ from parsec.components.blockstore import (
 from parsec.components.postgresql import AsyncpgPool
 from parsec.components.postgresql.utils import (
     Q,
+    acquire_connection,
 )
 from parsec.logging import get_logger
 
@@ -130,7 +131,7 @@ async def block_read(
     # - In case of PostgreSQL blockstore (only used for testing), this can create
     #   a deadlock in case of too many concurrent `block_create` given the
     #   blockstore is waiting on the PostgreSQL connection pool.
-    async with pool.acquire() as conn:
+    async with acquire_connection(pool) as conn:
         row = await conn.fetchrow(
             *_q_read_fetch_data(
                 organization_id=organization_id.str,
@@ -18,7 +18,7 @@ from parsec.components.postgresql import AsyncpgConnection, AsyncpgPool
 from parsec.components.postgresql.handler import parse_signal, send_signal
 from parsec.components.postgresql.utils import Q, transaction
 from parsec.config import BackendConfig
-from parsec.events import Event, EventOrganizationConfig
+from parsec.events import Event, EventAccountAuthMethodsDisabled, EventOrganizationConfig
 from parsec.logging import get_logger
 
 logger = get_logger()
@@ -68,8 +68,11 @@ async def event_bus_factory(pool: AsyncpgPool) -> AsyncGenerator[PGEventBus]:
             "Dispatching event",
             type=event.type,
             event_id=event.event_id.hex,
-            organization_id=event.organization_id.str,
-            debug_extra=event.model_dump(),
+            # Account events are not related to any organization
+            organization_id=None
+            if isinstance(event, EventAccountAuthMethodsDisabled)
+            else event.organization_id.str,
+            debug_extra=event.model_dump,
         )
         event_bus._dispatch_incoming_event(event)
 
@@ -48,51 +48,52 @@ async def components_factory(
         async with event_bus_factory(pool) as event_bus:
             async with httpx.AsyncClient(verify=SSL_CONTEXT) as http_client:
                 webhooks = WebhooksComponent(config, http_client)
-                blockstore = blockstore_factory(
+                async with blockstore_factory(
                     config=config.blockstore_config, postgresql_pool=pool
-                )
+                ) as blockstore:
+                    account = PGAccountComponent(pool=pool, config=config)
+                    async_enrollment = PGAsyncEnrollmentComponent(pool=pool, config=config)
+                    auth = PGAuthComponent(pool=pool, event_bus=event_bus, config=config)
+                    block = PGBlockComponent(pool=pool, blockstore=blockstore)
+                    cryptpad = PGCryptpadComponent(pool=pool, config=config)
+                    events = PGEventsComponent(pool=pool, config=config, event_bus=event_bus)
+                    invite = PGInviteComponent(pool=pool, config=config)
+                    organization = PGOrganizationComponent(
+                        pool=pool, webhooks=webhooks, config=config
+                    )
+                    ping = PGPingComponent(pool=pool)
+                    realm = PGRealmComponent(pool=pool, webhooks=webhooks)
+                    scws = ScwsComponent(config)
+                    sequester = PGSequesterComponent(pool=pool)
+                    shamir = PGShamirComponent(pool=pool)
+                    totp = PGTOTPComponent(pool=pool, config=config)
+                    user = PGUserComponent(pool=pool)
+                    vlob = PGVlobComponent(pool=pool, webhooks=webhooks)
 
-                account = PGAccountComponent(pool=pool, config=config)
-                async_enrollment = PGAsyncEnrollmentComponent(pool=pool, config=config)
-                auth = PGAuthComponent(pool=pool, event_bus=event_bus, config=config)
-                block = PGBlockComponent(pool=pool, blockstore=blockstore)
-                cryptpad = PGCryptpadComponent(pool=pool, config=config)
-                events = PGEventsComponent(pool=pool, config=config, event_bus=event_bus)
-                invite = PGInviteComponent(pool=pool, config=config)
-                organization = PGOrganizationComponent(pool=pool, webhooks=webhooks, config=config)
-                ping = PGPingComponent(pool=pool)
-                realm = PGRealmComponent(pool=pool, webhooks=webhooks)
-                scws = ScwsComponent(config)
-                sequester = PGSequesterComponent(pool=pool)
-                shamir = PGShamirComponent(pool=pool)
-                totp = PGTOTPComponent(pool=pool, config=config)
-                user = PGUserComponent(pool=pool)
-                vlob = PGVlobComponent(pool=pool, webhooks=webhooks)
+                    components = {
+                        "account": account,
+                        "async_enrollment": async_enrollment,
+                        "auth": auth,
+                        "block": block,
+                        "blockstore": blockstore,
+                        "cryptpad": cryptpad,
+                        "event_bus": event_bus,
+                        "events": events,
+                        "invite": invite,
+                        "organization": organization,
+                        "ping": ping,
+                        "realm": realm,
+                        "scws": scws,
+                        "sequester": sequester,
+                        "shamir": shamir,
+                        "totp": totp,
+                        "user": user,
+                        "vlob": vlob,
+                        "webhooks": webhooks,
+                    }
+                    for component in components.values():
+                        method = getattr(component, "register_components", None)
+                        if method is not None:
+                            method(**components)
 
-                components = {
-                    "account": account,
-                    "async_enrollment": async_enrollment,
-                    "auth": auth,
-                    "block": block,
-                    "blockstore": blockstore,
-                    "cryptpad": cryptpad,
-                    "event_bus": event_bus,
-                    "events": events,
-                    "invite": invite,
-                    "organization": organization,
-                    "ping": ping,
-                    "realm": realm,
-                    "scws": scws,
-                    "sequester": sequester,
-                    "shamir": shamir,
-                    "totp": totp,
-                    "user": user,
-                    "vlob": vlob,
-                    "webhooks": webhooks,
-                }
-                for component in components.values():
-                    method = getattr(component, "register_components", None)
-                    if method is not None:
-                        method(**components)
-
-                yield components
+                    yield components
@@ -18,11 +18,23 @@ from parsec._parsec import ActiveUsersLimit, DateTime
 from parsec.components.postgresql import AsyncpgConnection, AsyncpgPool
 from parsec.events import AnyEvent, Event
 from parsec.logging import get_logger
+from parsec.metrics import METRICS
+from parsec.tracing import is_tracing_enabled, record_span
 
 from . import migrations as migrations_module
 
 logger = get_logger()
 
+POOL_CONNECTIONS = METRICS.gauge(
+    "parsec_postgresql_pool_connections",
+    "Number of connections currently opened by the PostgreSQL pool, by state.",
+    labels=("state",),
+)
+POOL_MAX_CONNECTIONS = METRICS.gauge(
+    "parsec_postgresql_pool_max_connections",
+    "Maximum number of connections the PostgreSQL pool can open.",
+)
+
 MIGRATION_FILE_PATTERN = r"^(?P<id>\d{4})_(?P<name>\w*).sql$"
 # Expose migration table here to simply modify it during tests
 MIGRATION_TABLE = "migration"
@@ -201,6 +213,17 @@ async def handle_json(conn: AsyncpgConnection) -> None:
     await conn.set_type_codec("json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
 
 
+def _record_query_span(query: asyncpg.connection.LoggedQuery) -> None:
+    # Note the query logger is called with the context of the task that did the
+    # query, hence the span is a child of the one the query was done in
+    record_span(
+        "postgresql.query",
+        duration=query.elapsed,
+        error=query.exception is not None,
+        **{"db.system": "postgresql", "db.statement": query.query},
+    )
+
+
 @asynccontextmanager
 async def asyncpg_pool_factory(
     url: str, min_connections: int, max_connections: int
@@ -214,6 +237,8 @@ async def asyncpg_pool_factory(
         await handle_integer(conn)
         await handle_json(conn)
         await handle_uuid(conn)
+        if is_tracing_enabled():
+            conn.add_query_logger(_record_query_span)
 
     async with asyncpg.create_pool(
         url,
@@ -221,7 +246,18 @@ async def asyncpg_pool_factory(
         max_size=max_connections,
         init=_init_connection,
     ) as pool:
-        yield pool
+
+        def _collect_pool_metrics() -> None:
+            idle = pool.get_idle_size()
+            POOL_CONNECTIONS.set(pool.get_size() - idle, "used")
+            POOL_CONNECTIONS.set(idle, "idle")
+            POOL_MAX_CONNECTIONS.set(pool.get_max_size())
+
+        METRICS.add_collector(_collect_pool_metrics)
+        try:
+            yield pool
+        finally:
+            METRICS.remove_collector(_collect_pool_metrics)
 
 
 async def send_signal(conn: AsyncpgConnection, event: Event) -> None:
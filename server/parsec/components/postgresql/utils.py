@@ -4,7 +4,8 @@ from __future__ import annotations
 import importlib
 import re
 import traceback
-from collections.abc import Callable, Iterable
+from collections.abc import AsyncGenerator, Callable, Iterable
+from contextlib import AsyncExitStack, asynccontextmanager
 from functools import wraps
 from types import CoroutineType
 from typing import Any, Concatenate, ParamSpec, Protocol, TypeVar, cast
@@ -23,6 +24,7 @@ from parsec._parsec import (
     UserID,
     VlobID,
 )
+from parsec.tracing import span
 from parsec.types import BadOutcome
 
 from . import AsyncpgConnection, AsyncpgPool
@@ -291,6 +293,18 @@ class WithPool(Protocol):
     pool: AsyncpgPool
 
 
+@asynccontextmanager
+async def acquire_connection(pool: AsyncpgPool) -> AsyncGenerator[AsyncpgConnection]:
+    """
+    Same as `pool.acquire()`, but the wait for a connection is traced (so that
+    a slow request due to the pool being exhausted can be told apart).
+    """
+    async with AsyncExitStack() as stack:
+        with span("postgresql.pool_acquire"):
+            conn = await stack.enter_async_context(pool.acquire())
+        yield cast(AsyncpgConnection, conn)
+
+
 def transaction[**P, T, S: WithPool](
     func: Callable[Concatenate[S, AsyncpgConnection, P], CoroutineType[Any, Any, T]],
 ) -> Callable[Concatenate[S, P], CoroutineType[Any, Any, T]]:
@@ -302,8 +316,7 @@ def transaction[**P, T, S: WithPool](
 
     @wraps(func)
     async def wrapper(self: S, *args: P.args, **kwargs: P.kwargs) -> T:
-        async with self.pool.acquire() as conn:
-            conn = cast(AsyncpgConnection, conn)
+        async with acquire_connection(self.pool) as conn:
             transaction = conn.transaction()
             await transaction.start()
             try:
@@ -331,8 +344,7 @@ def no_transaction[**P, T, S: WithPool](
 
     @wraps(func)
     async def wrapper(self: S, *args: P.args, **kwargs: P.kwargs) -> T:
-        async with self.pool.acquire() as conn:
-            conn = cast(AsyncpgConnection, conn)
+        async with acquire_connection(self.pool) as conn:
             return await func(self, conn, *args, **kwargs)
 
     return wrapper
@@ -1,33 +1,299 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+from bisect import bisect_left
+from enum import auto
+from hashlib import blake2b
 from typing import override
 
+import anyio
+from anyio.streams.memory import MemoryObjectSendStream
+
 from parsec._parsec import BlockID, OrganizationID
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
     BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
 )
+from parsec.config import RAID0BlockStorePlacement
+from parsec.logging import get_logger
+from parsec.types import BadOutcomeEnum
+
+logger = get_logger()
+
+
+# Number of points each node has on the hash ring, the more points the more even
+# the distribution of the blocks among the nodes.
+CONSISTENT_HASHING_VIRTUAL_NODES = 256
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(blake2b(data, digest_size=8).digest())
+
+
+class RAID0Layout:
+    """
+    Placement of the blocks among a given number of nodes.
+
+    With consistent hashing, each node owns the ranges of the hash ring preceding
+    its points. Points only depend on the node index, so appending a node only moves
+    (roughly `1 / nodes_count` of) the blocks to this new node.
+    """
+
+    def __init__(self, placement: RAID0BlockStorePlacement, nodes_count: int):
+        assert nodes_count > 0
+        self.placement = placement
+        self.nodes_count = nodes_count
+        ring = sorted(
+            (_hash(f"{node}-{virtual_node}".encode()), node)
+            for node in range(nodes_count)
+            for virtual_node in range(CONSISTENT_HASHING_VIRTUAL_NODES)
+        )
+        self._ring_points = [point for point, _ in ring]
+        self._ring_nodes = [node for _, node in ring]
+
+    def get_node(self, block_id: BlockID) -> int:
+        match self.placement:
+            case RAID0BlockStorePlacement.MODULO:
+                return block_id.int % self.nodes_count
+            case RAID0BlockStorePlacement.CONSISTENT_HASHING:
+                index = bisect_left(self._ring_points, _hash(block_id.bytes))
+                return self._ring_nodes[index % len(self._ring_nodes)]
+
+
+def _fallback_read_outcome(
+    outcome: BlockStoreReadBadOutcome, previous_outcome: bytes | BlockStoreReadBadOutcome
+) -> bytes | BlockStoreReadBadOutcome:
+    """
+    Outcome of a read that failed on the current node of the block, then has been
+    retried on its previous node.
+    """
+    # A block not found on its previous node may still be on its current node if
+    # the latter is unavailable
+    if isinstance(previous_outcome, bytes) or outcome == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND:
+        return previous_outcome
+    return outcome
+
+
+class RAID0BlockStoreRebalanceBadOutcome(BadOutcomeEnum):
+    STORE_UNAVAILABLE = auto()
 
 
 class RAID0BlockStoreComponent(BaseBlockStoreComponent):
-    def __init__(self, blockstores: list[BaseBlockStoreComponent]):
+    """
+    Stripe the blocks among the nodes (each block is stored on a single node).
+
+    When the nodes have changed, `previous_layout` describes how the blocks were
+    placed before: blocks are created on their new node, but reads fall back to the
+    previous node until the block has been moved (see `rebalance`).
+    """
+
+    def __init__(
+        self,
+        blockstores: list[BaseBlockStoreComponent],
+        placement: RAID0BlockStorePlacement = RAID0BlockStorePlacement.MODULO,
+        previous_layout: RAID0Layout | None = None,
+    ):
+        assert previous_layout is None or previous_layout.nodes_count <= len(blockstores)
         self.blockstores = blockstores
+        self.layout = RAID0Layout(placement, len(blockstores))
+        self.previous_layout = previous_layout
+        self._logger = logger.bind(blockstore_type="RAID0", placement=placement.name)
 
     def _get_blockstore(self, block_id: BlockID) -> BaseBlockStoreComponent:
-        return self.blockstores[block_id.int % len(self.blockstores)]
+        return self.blockstores[self.layout.get_node(block_id)]
+
+    def _get_previous_blockstore(self, block_id: BlockID) -> BaseBlockStoreComponent | None:
+        """
+        Return the node the block was stored on before the nodes have changed (or
+        `None` if the block doesn't need to be moved).
+        """
+        if self.previous_layout is None:
+            return None
+        previous = self.blockstores[self.previous_layout.get_node(block_id)]
+        return previous if previous is not self._get_blockstore(block_id) else None
+
+    def _split_per_blockstore(
+        self, block_ids: list[BlockID], previous: bool = False
+    ) -> dict[BaseBlockStoreComponent, list[BlockID]]:
+        per_blockstore: dict[BaseBlockStoreComponent, list[BlockID]] = {}
+        for block_id in block_ids:
+            blockstore = (
+                self._get_previous_blockstore(block_id)
+                if previous
+                else self._get_blockstore(block_id)
+            )
+            if blockstore is not None:
+                per_blockstore.setdefault(blockstore, []).append(block_id)
+        return per_blockstore
+
+    async def rebalance(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bool | RAID0BlockStoreRebalanceBadOutcome:
+        """
+        Move the block from its previous node to its current one.
+
+        Return `True` if the block has been moved, `False` if there was nothing to do
+        (block stored on the same node in both layouts, or already moved).
+        """
+        previous = self._get_previous_blockstore(block_id)
+        if previous is None:
+            return False
+
+        # The previous node is the source of truth here: the block has already been
+        # moved only if it is not found there (e.g. resumed rebalance)
+        match await previous.read(organization_id, block_id):
+            case bytes() as block:
+                pass
+            case BlockStoreReadBadOutcome.BLOCK_NOT_FOUND:
+                return False
+            case BlockStoreReadBadOutcome.STORE_UNAVAILABLE:
+                return RAID0BlockStoreRebalanceBadOutcome.STORE_UNAVAILABLE
+
+        # The block is only removed from its previous node once it is safely stored
+        # on its new one (so it is always readable thanks to the read fallback).
+        outcome = await self._get_blockstore(block_id).create(organization_id, block_id, block)
+        if outcome is not None:
+            return RAID0BlockStoreRebalanceBadOutcome.STORE_UNAVAILABLE
+        outcome = await previous.delete(organization_id, block_id)
+        if outcome is not None:
+            return RAID0BlockStoreRebalanceBadOutcome.STORE_UNAVAILABLE
+
+        return True
 
     @override
     async def read(
         self, organization_id: OrganizationID, block_id: BlockID
     ) -> bytes | BlockStoreReadBadOutcome:
         blockstore = self._get_blockstore(block_id)
-        return await blockstore.read(organization_id, block_id)
+        outcome = await blockstore.read(organization_id, block_id)
+        if not isinstance(outcome, bytes):
+            # The block may not have been moved to its new node yet
+            previous = self._get_previous_blockstore(block_id)
+            if previous is not None:
+                previous_outcome = await previous.read(organization_id, block_id)
+                outcome = _fallback_read_outcome(outcome, previous_outcome)
+        return outcome
 
     @override
     async def create(
         self, organization_id: OrganizationID, block_id: BlockID, block: bytes
     ) -> BlockStoreCreateBadOutcome | None:
         blockstore = self._get_blockstore(block_id)
-        await blockstore.create(organization_id, block_id, block)
+        return await blockstore.create(organization_id, block_id, block)
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        blockstore = self._get_blockstore(block_id)
+        outcome = await blockstore.delete(organization_id, block_id)
+        # The block may not have been moved to its new node yet
+        previous = self._get_previous_blockstore(block_id)
+        if outcome is None and previous is not None:
+            outcome = await previous.delete(organization_id, block_id)
+        return outcome
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        # Blocks that may not have been moved to their new node yet, along with the
+        # outcome of the read on their new node
+        not_read: dict[BlockID, BlockStoreReadBadOutcome] = {}
+
+        async def _single_blockstore_read_many(
+            blockstore: BaseBlockStoreComponent, block_ids: list[BlockID]
+        ) -> None:
+            async with blockstore.read_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    if (
+                        not isinstance(outcome, bytes)
+                        and self._get_previous_blockstore(block_id) is not None
+                    ):
+                        not_read[block_id] = outcome
+                    else:
+                        await results.send((block_id, outcome))
+
+        async def _previous_blockstore_read_many(
+            blockstore: BaseBlockStoreComponent, block_ids: list[BlockID]
+        ) -> None:
+            async with blockstore.read_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    await results.send(
+                        (block_id, _fallback_read_outcome(not_read[block_id], outcome))
+                    )
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore, sub_block_ids in self._split_per_blockstore(block_ids).items():
+                task_group.start_soon(_single_blockstore_read_many, blockstore, sub_block_ids)
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore, sub_block_ids in self._split_per_blockstore(
+                list(not_read), previous=True
+            ).items():
+                task_group.start_soon(_previous_blockstore_read_many, blockstore, sub_block_ids)
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        per_blockstore: dict[BaseBlockStoreComponent, list[tuple[BlockID, bytes]]] = {}
+        for block_id, block in blocks:
+            per_blockstore.setdefault(self._get_blockstore(block_id), []).append((block_id, block))
+
+        async def _single_blockstore_create_many(
+            blockstore: BaseBlockStoreComponent, blocks: list[tuple[BlockID, bytes]]
+        ) -> None:
+            async with blockstore.create_many(organization_id, blocks) as sub_results:
+                async for result in sub_results:
+                    await results.send(result)
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore, sub_blocks in per_blockstore.items():
+                task_group.start_soon(_single_blockstore_create_many, blockstore, sub_blocks)
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        # Blocks not moved yet must also be deleted from their previous node
+        previous_outcomes: dict[BlockID, BlockStoreDeleteBadOutcome | None] = {}
+
+        async def _previous_blockstore_delete_many(
+            blockstore: BaseBlockStoreComponent, block_ids: list[BlockID]
+        ) -> None:
+            async with blockstore.delete_many(organization_id, block_ids) as sub_results:
+                previous_outcomes.update(
+                    {block_id: outcome async for block_id, outcome in sub_results}
+                )
+
+        async def _single_blockstore_delete_many(
+            blockstore: BaseBlockStoreComponent, block_ids: list[BlockID]
+        ) -> None:
+            async with blockstore.delete_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    await results.send((block_id, outcome or previous_outcomes.get(block_id)))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore, sub_block_ids in self._split_per_blockstore(
+                block_ids, previous=True
+            ).items():
+                task_group.start_soon(_previous_blockstore_delete_many, blockstore, sub_block_ids)
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore, sub_block_ids in self._split_per_blockstore(block_ids).items():
+                task_group.start_soon(_single_blockstore_delete_many, blockstore, sub_block_ids)
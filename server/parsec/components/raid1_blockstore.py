@@ -1,32 +1,124 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+import math
+from collections import Counter, deque
 from typing import override
 
 import anyio
 from anyio.abc import CancelScope, TaskGroup
+from anyio.streams.memory import MemoryObjectSendStream
 
 from parsec._parsec import BlockID, OrganizationID
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
     BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+    BlockStoreScrubBadOutcome,
+    BlockStoreScrubOutcome,
+    read_from_all_nodes,
+    repair_nodes,
+    split_in_sub_batches,
 )
 from parsec.logging import get_logger
 
 logger = get_logger()
 
 
+# Latencies are recorded over a sliding window of the most recent reads
+LATENCY_WINDOW = 128
+# Until enough latencies have been recorded, reads are sent to all nodes at once
+LATENCY_MIN_SAMPLES = 8
+LATENCY_EWMA_ALPHA = 0.2
+# Latency (in seconds) accounted for a failed read, so that failing nodes get
+# queried last (without impacting the hedged read delay)
+FAILED_READ_LATENCY_PENALTY = 1.0
+
+
+class NodeLatency:
+    """
+    Read latency of a RAID1 node.
+
+    The EWMA is used to order the nodes (fastest first), while the sliding window
+    of the recent latencies is used to compute the hedged read delay.
+    """
+
+    def __init__(self) -> None:
+        self.ewma: float | None = None
+        self.samples: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def _update_ewma(self, latency: float) -> None:
+        if self.ewma is None:
+            self.ewma = latency
+        else:
+            self.ewma += LATENCY_EWMA_ALPHA * (latency - self.ewma)
+
+    def record(self, latency: float) -> None:
+        self._update_ewma(latency)
+        self.samples.append(latency)
+
+    def record_lower_bound(self, latency: float) -> None:
+        # Only used to push back a node that is much slower than expected (e.g. a
+        # stuck request), hence not taken into account in the recent latencies
+        if self.ewma is None or latency > self.ewma:
+            self._update_ewma(latency)
+
+    def record_failure(self, latency: float) -> None:
+        self._update_ewma(latency + FAILED_READ_LATENCY_PENALTY)
+
+    def percentile(self, percentile: float) -> float | None:
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        index = min(int(len(ordered) * percentile / 100), len(ordered) - 1)
+        return ordered[index]
+
+
 class RAID1BlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Replicate each block on all the nodes.
+
+    Reads go to the currently fastest node (according to its latency EWMA). If it
+    hasn't answered after `hedged_read_percentile` of its recent latencies, a hedged
+    read is sent to the next fastest node, and so on: the first node to answer wins
+    and the other reads are cancelled. A failed read triggers the next read right away.
+    """
+
     def __init__(
         self,
         blockstores: list[BaseBlockStoreComponent],
         partial_create_ok: bool = False,
+        hedged_read_percentile: float | None = 95.0,
     ):
+        assert hedged_read_percentile is None or 0 <= hedged_read_percentile <= 100
         self.blockstores = blockstores
+        self.latencies = [NodeLatency() for _ in blockstores]
         self._partial_create_ok = partial_create_ok
+        self._hedged_read_percentile = hedged_read_percentile
         self._logger = logger.bind(blockstore_type="RAID1", partial_create_ok=partial_create_ok)
 
+    def _nodes_by_latency(self) -> list[int]:
+        # Nodes without latency yet come first so that they get measured, while
+        # nodes known to be down come last (they would only fail right away)
+        return sorted(
+            range(len(self.blockstores)),
+            key=lambda index: (
+                not self.blockstores[index].is_available(),
+                self.latencies[index].ewma or 0.0,
+            ),
+        )
+
+    def _hedged_read_delay(self, blockstore_index: int) -> float:
+        if self._hedged_read_percentile is None:
+            return math.inf
+        delay = self.latencies[blockstore_index].percentile(self._hedged_read_percentile)
+        # Not enough samples yet, don't wait for the node
+        return delay if delay is not None else 0.0
+
     @override
     async def read(
         self, organization_id: OrganizationID, block_id: BlockID
@@ -34,17 +126,33 @@ class RAID1BlockStoreComponent(BaseBlockStoreComponent):
         value = None
 
         async def _single_blockstore_read(
-            task_group: TaskGroup, blockstore: BaseBlockStoreComponent
+            task_group: TaskGroup, blockstore_index: int, failed: anyio.Event
         ) -> None:
             nonlocal value
-            outcome = await blockstore.read(organization_id, block_id)
+            latency = self.latencies[blockstore_index]
+            started_at = anyio.current_time()
+            try:
+                outcome = await self.blockstores[blockstore_index].read(organization_id, block_id)
+            except anyio.get_cancelled_exc_class():
+                # Read has lost the race: the elapsed time is a lower bound of its latency
+                latency.record_lower_bound(anyio.current_time() - started_at)
+                raise
+
             if isinstance(outcome, bytes):
+                latency.record(anyio.current_time() - started_at)
                 value = outcome
                 task_group.cancel_scope.cancel()
+            else:
+                latency.record_failure(anyio.current_time() - started_at)
+                failed.set()
 
         async with anyio.create_task_group() as task_group:
-            for blockstore in self.blockstores:
-                task_group.start_soon(_single_blockstore_read, task_group, blockstore)
+            for blockstore_index in self._nodes_by_latency():
+                failed = anyio.Event()
+                task_group.start_soon(_single_blockstore_read, task_group, blockstore_index, failed)
+                # Move to the next node if this one fails or is too slow to answer
+                with anyio.move_on_after(self._hedged_read_delay(blockstore_index)):
+                    await failed.wait()
 
         if not value:
             self._logger.warning(
@@ -100,3 +208,191 @@ class RAID1BlockStoreComponent(BaseBlockStoreComponent):
                     block_id=block_id.hex,
                 )
                 return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        # Block must be deleted from all nodes (otherwise the remaining data
+        # would never be reclaimed), hence no partial delete mode here.
+        error_count = 0
+
+        async def _sub_blockstore_delete(blockstore: BaseBlockStoreComponent) -> None:
+            nonlocal error_count
+            outcome = await blockstore.delete(organization_id, block_id)
+            if outcome is not None:
+                error_count += 1
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_sub_blockstore_delete, blockstore)
+
+        if error_count:
+            self._logger.warning(
+                "Block delete error: A node has failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def scrub(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreScrubOutcome | BlockStoreScrubBadOutcome:
+        copies = await read_from_all_nodes(self.blockstores, organization_id, block_id)
+        if BlockStoreReadBadOutcome.STORE_UNAVAILABLE in copies:
+            return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+
+        # Replicas have no checksum, so the valid copy is the most common one
+        votes = Counter(copy for copy in copies if isinstance(copy, bytes)).most_common(2)
+        if not votes:
+            return BlockStoreScrubBadOutcome.BLOCK_LOST
+        if len(votes) > 1 and votes[0][1] == votes[1][1]:
+            self._logger.warning(
+                "Block scrub error: Replicas are divergent",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreScrubBadOutcome.BLOCK_CORRUPTED
+        block, _ = votes[0]
+
+        repairs = {index: block for index, copy in enumerate(copies) if copy != block}
+        if not repairs:
+            return BlockStoreScrubOutcome.HEALTHY
+
+        self._logger.warning(
+            "Block scrub: Repairing missing or divergent replicas",
+            organization_id=organization_id.str,
+            block_id=block_id.hex,
+            nodes=list(repairs),
+        )
+        if not await repair_nodes(self.blockstores, organization_id, block_id, repairs):
+            return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+        return BlockStoreScrubOutcome.REPAIRED
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        for sub_block_ids in split_in_sub_batches(block_ids):
+            await self._read_sub_batch(organization_id, sub_block_ids, results)
+
+    async def _read_sub_batch(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        # Unlike `read` (which queries all nodes concurrently to get the best latency),
+        # batch reads are about throughput: each block is only requested to the next
+        # node if the previous ones have failed.
+        remaining = block_ids
+        for blockstore_index in self._nodes_by_latency():
+            if not remaining:
+                break
+            failed: list[BlockID] = []
+            blockstore = self.blockstores[blockstore_index]
+            async with blockstore.read_many(organization_id, remaining) as sub_results:
+                async for block_id, outcome in sub_results:
+                    if isinstance(outcome, bytes):
+                        await results.send((block_id, outcome))
+                    else:
+                        failed.append(block_id)
+            remaining = failed
+
+        for block_id in remaining:
+            self._logger.warning(
+                "Block read error: All nodes have failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            await results.send((block_id, BlockStoreReadBadOutcome.STORE_UNAVAILABLE))
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        for sub_blocks in split_in_sub_batches(blocks):
+            await self._create_sub_batch(organization_id, sub_blocks, results)
+
+    async def _create_sub_batch(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        replies: dict[BlockID, int] = {}
+        successes: dict[BlockID, int] = {}
+
+        async def _single_blockstore_create_many(blockstore: BaseBlockStoreComponent) -> None:
+            async with blockstore.create_many(organization_id, blocks) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is None:
+                        successes[block_id] = successes.get(block_id, 0) + 1
+                    # The block outcome is known once all nodes have replied
+                    if replies[block_id] < len(self.blockstores):
+                        continue
+
+                    block_successes = successes.get(block_id, 0)
+                    if self._partial_create_ok and not block_successes:
+                        self._logger.warning(
+                            "Block create error: All nodes have failed",
+                            organization_id=organization_id.str,
+                            block_id=block_id.hex,
+                        )
+                        outcome = BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+                    elif not self._partial_create_ok and block_successes < len(self.blockstores):
+                        self._logger.warning(
+                            "Block create error: A node have failed",
+                            organization_id=organization_id.str,
+                            block_id=block_id.hex,
+                        )
+                        outcome = BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+                    else:
+                        outcome = None
+                    await results.send((block_id, outcome))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_single_blockstore_create_many, blockstore)
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        replies: dict[BlockID, int] = {}
+        errors: dict[BlockID, int] = {}
+
+        async def _sub_blockstore_delete_many(blockstore: BaseBlockStoreComponent) -> None:
+            async with blockstore.delete_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is not None:
+                        errors[block_id] = errors.get(block_id, 0) + 1
+                    # The block outcome is known once all nodes have replied
+                    if replies[block_id] < len(self.blockstores):
+                        continue
+
+                    if errors.get(block_id, 0):
+                        self._logger.warning(
+                            "Block delete error: A node has failed",
+                            organization_id=organization_id.str,
+                            block_id=block_id.hex,
+                        )
+                        await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+                    else:
+                        await results.send((block_id, None))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_sub_blockstore_delete_many, blockstore)
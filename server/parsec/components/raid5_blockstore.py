@@ -7,19 +7,32 @@ from typing import override
 
 import anyio
 from anyio.abc import TaskGroup
+from anyio.streams.memory import MemoryObjectSendStream
 
 from parsec._parsec import BlockID, OrganizationID
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
     BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+    BlockStoreScrubBadOutcome,
+    BlockStoreScrubOutcome,
+    read_from_all_nodes,
+    repair_nodes,
+    sort_by_availability,
+    split_in_sub_batches,
 )
 from parsec.logging import get_logger
 
 logger = get_logger()
 
 
-def _xor_buffers(*buffers: bytes) -> bytes:
+# Python ints are used as wide registers: XOR is then done in C on the whole buffer,
+# and `int.from_bytes` accepts memoryviews (so no intermediary copy is needed).
+def _xor_buffers(*buffers: bytes | memoryview) -> bytes:
     buff_len = len(buffers[0])
     xored = int.from_bytes(buffers[0], byteorder)
     for buff in buffers[1:]:
@@ -29,15 +42,33 @@ def _xor_buffers(*buffers: bytes) -> bytes:
 
 
 def split_block_in_chunks(block: bytes, nb_chunks: int) -> list[bytes]:
-    payload_size = len(block) + 4  # encode block len as a uint32
+    """
+    Chunks are the slices of the payload `<block len as uint32><block><zero padding>`.
+
+    The payload itself is never built: each chunk is assembled directly from the
+    relevant parts of the block, so each byte is copied only once.
+    """
+    header = struct.pack("!I", len(block))
+    payload_size = len(header) + len(block)
     chunk_len = payload_size // nb_chunks
     if nb_chunks * chunk_len < payload_size:
         chunk_len += 1
-    padding_len = chunk_len * nb_chunks - payload_size
+    view = memoryview(block)
 
-    payload = struct.pack("!I", len(block)) + block + b"\x00" * padding_len
+    chunks = []
+    for i in range(nb_chunks):
+        start = chunk_len * i
+        end = start + chunk_len
+        parts: list[bytes | memoryview] = [
+            header[start:end],
+            view[max(start - len(header), 0) : max(end - len(header), 0)],
+        ]
+        padding_len = chunk_len - sum(len(part) for part in parts)
+        if padding_len:
+            parts.append(bytes(padding_len))
+        chunks.append(b"".join(parts))
 
-    return [payload[chunk_len * i : chunk_len * (i + 1)] for i in range(nb_chunks)]
+    return chunks
 
 
 def generate_checksum_chunk(chunks: list[bytes]) -> bytes:
@@ -54,9 +85,24 @@ def rebuild_block_from_chunks(chunks: list[bytes | None], checksum_chunk: bytes
     except StopIteration:
         pass
     # By now, all chunks are valid
-    payload = b"".join(chunks)  # type: ignore
-    (block_len,) = struct.unpack("!I", payload[:4])
-    return payload[4 : 4 + block_len]
+    payload_parts = [memoryview(chunk) for chunk in chunks]  # type: ignore[arg-type]
+
+    # Header is only split among multiple chunks for very small blocks
+    header = payload_parts[0][:4]
+    if len(header) < 4:
+        header = b"".join(payload_parts)[:4]
+    (block_len,) = struct.unpack("!I", header)
+
+    # Only copy the block data (i.e. leave the header and the padding out)
+    block_parts = []
+    offset = -4
+    for part in payload_parts:
+        start = max(-offset, 0)
+        end = min(block_len - offset, len(part))
+        if start < end:
+            block_parts.append(part[start:end])
+        offset += len(part)
+    return b"".join(block_parts)
 
 
 class RAID5BlockStoreComponent(BaseBlockStoreComponent):
@@ -77,6 +123,9 @@ class RAID5BlockStoreComponent(BaseBlockStoreComponent):
         fetch_results: list[BlockStoreReadBadOutcome | bytes | None] = [None] * len(
             self.blockstores
         )
+        # Don't fetch the checksum by default, unless a node is known to be down: the
+        # checksum is then fetched right away instead of once the node has failed.
+        read_order = sort_by_availability(self.blockstores)
 
         async def _partial_blockstore_read(task_group: TaskGroup, blockstore_index: int) -> None:
             nonlocal error_count
@@ -91,37 +140,14 @@ class RAID5BlockStoreComponent(BaseBlockStoreComponent):
                     if error_count > 1:
                         task_group.cancel_scope.cancel()
                     else:
-                        # Try to fetch the checksum to rebuild the current missing chunk...
-                        task_group.start_soon(
-                            _partial_blockstore_read, task_group, len(self.blockstores) - 1
-                        )
+                        # Try to fetch the remaining node to rebuild the current missing chunk...
+                        task_group.start_soon(_partial_blockstore_read, task_group, read_order[-1])
 
         async with anyio.create_task_group() as task_group:
-            # Don't fetch the checksum by default
-            for blockstore_index in range(len(self.blockstores) - 1):
+            for blockstore_index in read_order[:-1]:
                 task_group.start_soon(_partial_blockstore_read, task_group, blockstore_index)
 
-        if error_count == 0:
-            # Sanity check: no errors and we didn't fetch the checksum
-            assert len([res for res in fetch_results if res is None]) == 1
-            assert fetch_results[-1] is None
-            assert not any(isinstance(res, BlockStoreReadBadOutcome) for res in fetch_results)
-
-            return rebuild_block_from_chunks(fetch_results[:-1], None)  # type: ignore
-
-        elif error_count == 1:
-            checksum = fetch_results[-1]
-            # Sanity check: one error and we have fetched the checksum
-            assert len([res for res in fetch_results if res is None]) == 0
-            assert isinstance(checksum, bytes | bytearray)
-            assert len([isinstance(res, BlockStoreReadBadOutcome) for res in fetch_results]) == 1
-
-            return rebuild_block_from_chunks(
-                [res if isinstance(res, bytes | bytearray) else None for res in fetch_results[:-1]],
-                checksum,
-            )
-
-        else:
+        if error_count > 1:
             # No need to log the detail of the nodes errors, they should have
             # already been logged before raising their exceptions
             self._logger.warning(
@@ -131,6 +157,14 @@ class RAID5BlockStoreComponent(BaseBlockStoreComponent):
             )
             return BlockStoreReadBadOutcome.STORE_UNAVAILABLE
 
+        # Sanity check: a single chunk (or checksum) is missing, either because
+        # it hasn't been fetched or because its node has failed
+        assert len([res for res in fetch_results if not isinstance(res, bytes | bytearray)]) == 1
+        *chunks, checksum = [
+            res if isinstance(res, bytes | bytearray) else None for res in fetch_results
+        ]
+        return rebuild_block_from_chunks(chunks, checksum)
+
     @override
     async def create(
         self, organization_id: OrganizationID, block_id: BlockID, block: bytes
@@ -185,3 +219,246 @@ class RAID5BlockStoreComponent(BaseBlockStoreComponent):
                     block_id=block_id.hex,
                 )
                 return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        # Block must be deleted from all nodes (otherwise the remaining data
+        # would never be reclaimed), hence no partial delete mode here.
+        error_count = 0
+
+        async def _sub_blockstore_delete(blockstore: BaseBlockStoreComponent) -> None:
+            nonlocal error_count
+            outcome = await blockstore.delete(organization_id, block_id)
+            if outcome is not None:
+                error_count += 1
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_sub_blockstore_delete, blockstore)
+
+        if error_count:
+            self._logger.warning(
+                "Block delete error: A node has failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def scrub(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreScrubOutcome | BlockStoreScrubBadOutcome:
+        chunks = await read_from_all_nodes(self.blockstores, organization_id, block_id)
+        if BlockStoreReadBadOutcome.STORE_UNAVAILABLE in chunks:
+            return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+
+        present = [chunk for chunk in chunks if isinstance(chunk, bytes)]
+        if len(present) < len(chunks) - 1:
+            return BlockStoreScrubBadOutcome.BLOCK_LOST
+        # The checksum is the XOR of the chunks, hence XORing all the chunks together
+        # with the checksum gives zero (and any missing one is the XOR of the others)
+        if len({len(chunk) for chunk in present}) > 1 or (
+            len(present) == len(chunks) and any(_xor_buffers(*present))
+        ):
+            self._logger.warning(
+                "Block scrub error: Chunks don't match the checksum",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreScrubBadOutcome.BLOCK_CORRUPTED
+        if len(present) == len(chunks):
+            return BlockStoreScrubOutcome.HEALTHY
+
+        missing_index = next(
+            index for index, chunk in enumerate(chunks) if not isinstance(chunk, bytes)
+        )
+        self._logger.warning(
+            "Block scrub: Rebuilding missing chunk",
+            organization_id=organization_id.str,
+            block_id=block_id.hex,
+            node=missing_index,
+        )
+        repairs = {missing_index: _xor_buffers(*present)}
+        if not await repair_nodes(self.blockstores, organization_id, block_id, repairs):
+            return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+        return BlockStoreScrubOutcome.REPAIRED
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        for sub_block_ids in split_in_sub_batches(block_ids):
+            await self._read_sub_batch(organization_id, sub_block_ids, results)
+
+    async def _read_sub_batch(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        nb_chunks = len(self.blockstores) - 1
+        # Chunks of each block, followed by its checksum
+        chunks: dict[BlockID, list[bytes | None]] = {
+            block_id: [None] * len(self.blockstores) for block_id in block_ids
+        }
+        replies: dict[BlockID, int] = {}
+        errors: dict[BlockID, int] = {}
+        # Blocks with a single missing chunk, to be rebuilt from the remaining node
+        degraded: list[BlockID] = []
+        # Don't fetch the checksums by default, unless a node is known to be down
+        read_order = sort_by_availability(self.blockstores)
+
+        def _rebuild(block_id: BlockID) -> bytes:
+            *block_chunks, checksum = chunks.pop(block_id)
+            return rebuild_block_from_chunks(block_chunks, checksum)
+
+        async def _partial_blockstore_read_many(blockstore_index: int) -> None:
+            blockstore = self.blockstores[blockstore_index]
+            async with blockstore.read_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if isinstance(outcome, bytes):
+                        chunks[block_id][blockstore_index] = outcome
+                    else:
+                        errors[block_id] = errors.get(block_id, 0) + 1
+                    # Wait for all the chunks of the block to be fetched
+                    if replies[block_id] < nb_chunks:
+                        continue
+
+                    match errors.get(block_id, 0):
+                        case 0:
+                            await results.send((block_id, _rebuild(block_id)))
+                        case 1:
+                            degraded.append(block_id)
+                        case _:
+                            del chunks[block_id]
+                            await self._send_read_error(organization_id, block_id, results)
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore_index in read_order[:-1]:
+                task_group.start_soon(_partial_blockstore_read_many, blockstore_index)
+
+        if not degraded:
+            return
+
+        # Try to fetch the remaining node to rebuild the missing chunks...
+        last_index = read_order[-1]
+        async with self.blockstores[last_index].read_many(organization_id, degraded) as sub_results:
+            async for block_id, outcome in sub_results:
+                if isinstance(outcome, bytes):
+                    chunks[block_id][last_index] = outcome
+                    await results.send((block_id, _rebuild(block_id)))
+                else:
+                    await self._send_read_error(organization_id, block_id, results)
+
+    async def _send_read_error(
+        self,
+        organization_id: OrganizationID,
+        block_id: BlockID,
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        # No need to log the detail of the nodes errors, they should have
+        # already been logged before raising their exceptions
+        self._logger.warning(
+            "Block read error: More than 1 nodes have failed",
+            organization_id=organization_id.str,
+            block_id=block_id.hex,
+        )
+        await results.send((block_id, BlockStoreReadBadOutcome.STORE_UNAVAILABLE))
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        for sub_blocks in split_in_sub_batches(blocks):
+            await self._create_sub_batch(organization_id, sub_blocks, results)
+
+    async def _create_sub_batch(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        nb_chunks = len(self.blockstores) - 1
+        # `per_blockstore[i]` contains the i-th chunk of each block (the last one being
+        # the checksums)
+        per_blockstore: list[list[tuple[BlockID, bytes]]] = [[] for _ in self.blockstores]
+        for block_id, block in blocks:
+            chunks = split_block_in_chunks(block, nb_chunks)
+            for i, chunk_or_checksum in enumerate([*chunks, generate_checksum_chunk(chunks)]):
+                per_blockstore[i].append((block_id, chunk_or_checksum))
+
+        replies: dict[BlockID, int] = {}
+        errors: dict[BlockID, int] = {}
+
+        async def _sub_blockstore_create_many(blockstore_index: int) -> None:
+            blockstore = self.blockstores[blockstore_index]
+            sub_blocks = per_blockstore[blockstore_index]
+            async with blockstore.create_many(organization_id, sub_blocks) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is not None:
+                        errors[block_id] = errors.get(block_id, 0) + 1
+                    # The block outcome is known once all nodes have replied
+                    if replies[block_id] < len(self.blockstores):
+                        continue
+
+                    block_errors = errors.get(block_id, 0)
+                    # In partial create mode, a single error is tolerated
+                    if block_errors > 1 or (block_errors and not self._partial_create_ok):
+                        self._logger.warning(
+                            "Block create error: More than 1 nodes have failed"
+                            if self._partial_create_ok
+                            else "Block create error: A node has failed",
+                            organization_id=organization_id.str,
+                            block_id=block_id.hex,
+                        )
+                        await results.send((block_id, BlockStoreCreateBadOutcome.STORE_UNAVAILABLE))
+                    else:
+                        await results.send((block_id, None))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore_index in range(len(self.blockstores)):
+                task_group.start_soon(_sub_blockstore_create_many, blockstore_index)
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        replies: dict[BlockID, int] = {}
+        errors: dict[BlockID, int] = {}
+
+        async def _sub_blockstore_delete_many(blockstore: BaseBlockStoreComponent) -> None:
+            async with blockstore.delete_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is not None:
+                        errors[block_id] = errors.get(block_id, 0) + 1
+                    # The block outcome is known once all nodes have replied
+                    if replies[block_id] < len(self.blockstores):
+                        continue
+
+                    if errors.get(block_id, 0):
+                        self._logger.warning(
+                            "Block delete error: A node has failed",
+                            organization_id=organization_id.str,
+                            block_id=block_id.hex,
+                        )
+                        await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+                    else:
+                        await results.send((block_id, None))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_sub_blockstore_delete_many, blockstore)
@@ -0,0 +1,499 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from collections.abc import Sequence
+from functools import cache
+from sys import byteorder
+from typing import override
+
+import anyio
+from anyio.abc import TaskGroup
+from anyio.streams.memory import MemoryObjectSendStream
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreCreateManyResult,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
+    BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+    BlockStoreScrubBadOutcome,
+    BlockStoreScrubOutcome,
+    read_from_all_nodes,
+    repair_nodes,
+    sort_by_availability,
+    split_in_sub_batches,
+)
+from parsec.components.raid5_blockstore import rebuild_block_from_chunks, split_block_in_chunks
+from parsec.logging import get_logger
+
+logger = get_logger()
+
+
+# Arithmetic over GF(2^8) (with the usual 0x11d reduction polynomial): addition is a
+# XOR, multiplication is done through the log/exp tables.
+def _build_gf_tables() -> tuple[list[int], list[int]]:
+    exp = [0] * 512  # Doubled to avoid a modulo when adding logarithms
+    log = [0] * 256
+    x = 1
+    for i in range(255):
+        exp[i] = exp[i + 255] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= 0x11D
+    return exp, log
+
+
+_GF_EXP, _GF_LOG = _build_gf_tables()
+
+
+def _gf_mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _GF_EXP[_GF_LOG[a] + _GF_LOG[b]]
+
+
+def _gf_inv(a: int) -> int:
+    assert a != 0
+    return _GF_EXP[255 - _GF_LOG[a]]
+
+
+@cache
+def _gf_mul_table(coef: int) -> bytes:
+    # Multiplying a whole shard by a constant is then a single `bytes.translate`
+    return bytes(_gf_mul(coef, x) for x in range(256))
+
+
+def _gf_linear_combination(coefs: Sequence[int], shards: Sequence[bytes]) -> bytes:
+    shard_len = len(shards[0])
+    # Python ints are used as wide registers to XOR the whole shards at once
+    acc = 0
+    for coef, shard in zip(coefs, shards):
+        assert len(shard) == shard_len
+        if coef == 0:
+            continue
+        if coef != 1:
+            shard = shard.translate(_gf_mul_table(coef))
+        acc ^= int.from_bytes(shard, byteorder)
+    return acc.to_bytes(shard_len, byteorder)
+
+
+@cache
+def _encoding_matrix(data_shards: int, parity_shards: int) -> list[list[int]]:
+    """
+    Systematic encoding matrix: the identity (data shards are stored as-is) on top
+    of a Cauchy matrix (parity shards).
+
+    Any square sub-matrix of a Cauchy matrix is invertible, hence any `data_shards`
+    rows of the encoding matrix can be used to decode the data shards.
+    """
+    assert data_shards + parity_shards <= 256
+    identity = [[int(i == j) for j in range(data_shards)] for i in range(data_shards)]
+    cauchy = [
+        [_gf_inv((data_shards + i) ^ j) for j in range(data_shards)] for i in range(parity_shards)
+    ]
+    return identity + cauchy
+
+
+@cache
+def _decoding_matrix(
+    data_shards: int, parity_shards: int, shard_indexes: tuple[int, ...]
+) -> list[list[int]]:
+    # Gauss-Jordan inversion of the encoding matrix rows of the available shards
+    encoding = _encoding_matrix(data_shards, parity_shards)
+    size = data_shards
+    matrix = [
+        [*encoding[index], *(int(i == j) for j in range(size))]
+        for i, index in enumerate(shard_indexes)
+    ]
+    for col in range(size):
+        pivot = next(row for row in range(col, size) if matrix[row][col])
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        pivot_inv = _gf_inv(matrix[col][col])
+        matrix[col] = [_gf_mul(pivot_inv, x) for x in matrix[col]]
+        for row in range(size):
+            factor = matrix[row][col]
+            if row != col and factor:
+                matrix[row] = [x ^ _gf_mul(factor, y) for x, y in zip(matrix[row], matrix[col])]
+    return [row[size:] for row in matrix]
+
+
+def encode_parity_shards(data_shards: list[bytes], parity_shards: int) -> list[bytes]:
+    encoding = _encoding_matrix(len(data_shards), parity_shards)
+    return [_gf_linear_combination(coefs, data_shards) for coefs in encoding[len(data_shards) :]]
+
+
+def decode_data_shards(
+    shards: dict[int, bytes], data_shards: int, parity_shards: int
+) -> list[bytes]:
+    """
+    Rebuild the data shards from any `data_shards` shards (the keys of `shards` being
+    the shard indexes, data shards first).
+    """
+    assert len(shards) >= data_shards
+    if all(index in shards for index in range(data_shards)):
+        return [shards[index] for index in range(data_shards)]
+
+    shard_indexes = tuple(sorted(shards)[:data_shards])
+    decoding = _decoding_matrix(data_shards, parity_shards, shard_indexes)
+    available = [shards[index] for index in shard_indexes]
+    return [
+        shards[index] if index in shards else _gf_linear_combination(decoding[index], available)
+        for index in range(data_shards)
+    ]
+
+
+class ReedSolomonBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Erasure coded blockstore, a generalization of RAID5 to any number of parity nodes.
+
+    Each block is split into `k` data shards (stored on the first `k` nodes) from
+    which `m` parity shards are computed (stored on the last `m` nodes). Any `k`
+    shards are enough to rebuild the block, so up to `m` nodes can fail.
+
+    Reads only fetch the data shards, a parity shard is fetched for each data shard
+    that cannot be retrieved (or right away if its node is known to be down).
+
+    In partial create mode, up to `m` shards are allowed to fail.
+    """
+
+    def __init__(
+        self,
+        blockstores: list[BaseBlockStoreComponent],
+        parity_shards: int,
+        partial_create_ok: bool = False,
+    ):
+        assert 0 < parity_shards < len(blockstores) <= 256
+        self.blockstores = blockstores
+        self.data_shards = len(blockstores) - parity_shards
+        self.parity_shards = parity_shards
+        self._partial_create_ok = partial_create_ok
+        self._logger = logger.bind(
+            blockstore_type="REED_SOLOMON",
+            data_shards=self.data_shards,
+            parity_shards=parity_shards,
+            partial_create_ok=partial_create_ok,
+        )
+
+    def _split_block_in_shards(self, block: bytes) -> list[bytes]:
+        data_shards = split_block_in_chunks(block, self.data_shards)
+        return [*data_shards, *encode_parity_shards(data_shards, self.parity_shards)]
+
+    def _rebuild_block_from_shards(self, shards: dict[int, bytes]) -> bytes:
+        data_shards = decode_data_shards(shards, self.data_shards, self.parity_shards)
+        chunks: list[bytes | None] = [*data_shards]
+        return rebuild_block_from_chunks(chunks, None)
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        shards: dict[int, bytes] = {}
+        error_count = 0
+        # Don't fetch the parity shards by default, unless nodes are known to be down:
+        # parity shards are then fetched right away instead of once the nodes have failed.
+        read_order = sort_by_availability(self.blockstores)
+        next_fallback = self.data_shards
+
+        async def _partial_blockstore_read(task_group: TaskGroup, blockstore_index: int) -> None:
+            nonlocal error_count
+            nonlocal next_fallback
+            outcome = await self.blockstores[blockstore_index].read(organization_id, block_id)
+            match outcome:
+                case bytes() as shard:
+                    shards[blockstore_index] = shard
+                case _:
+                    error_count += 1
+                    if error_count > self.parity_shards:
+                        task_group.cancel_scope.cancel()
+                    else:
+                        # Try to fetch another shard to replace the missing one...
+                        task_group.start_soon(
+                            _partial_blockstore_read, task_group, read_order[next_fallback]
+                        )
+                        next_fallback += 1
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore_index in read_order[: self.data_shards]:
+                task_group.start_soon(_partial_blockstore_read, task_group, blockstore_index)
+
+        if error_count > self.parity_shards:
+            # No need to log the detail of the nodes errors, they should have
+            # already been logged before raising their exceptions
+            self._logger.warning(
+                "Block read error: Too many nodes have failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+
+        assert len(shards) == self.data_shards
+        return self._rebuild_block_from_shards(shards)
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        shards = self._split_block_in_shards(block)
+        error_count = 0
+
+        async def _sub_blockstore_create(
+            task_group: TaskGroup, blockstore_index: int, shard: bytes
+        ) -> None:
+            nonlocal error_count
+            outcome = await self.blockstores[blockstore_index].create(
+                organization_id, block_id, shard
+            )
+            if isinstance(outcome, BlockStoreCreateBadOutcome):
+                error_count += 1
+                # In partial create mode, up to `m` errors are tolerated
+                if not self._partial_create_ok or error_count > self.parity_shards:
+                    # Early exit
+                    task_group.cancel_scope.cancel()
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore_index, shard in enumerate(shards):
+                task_group.start_soon(_sub_blockstore_create, task_group, blockstore_index, shard)
+
+        # Note it's possible to have failed and still have some blockstore nodes
+        # that have written their shard. This is no big deal given we consider the
+        # create operation to be idempotent (and two create with the same orgID/ID
+        # couple are expected to have the same block data).
+        if self._create_has_failed(organization_id, block_id, error_count):
+            return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+    def _create_has_failed(
+        self, organization_id: OrganizationID, block_id: BlockID, error_count: int
+    ) -> bool:
+        if self._partial_create_ok:
+            if error_count > self.parity_shards:
+                # No need to log the detail of the nodes errors, they should have
+                # already been logged before raising their exceptions
+                self._logger.warning(
+                    "Block create error: Too many nodes have failed",
+                    organization_id=organization_id.str,
+                    block_id=block_id.hex,
+                )
+                return True
+
+        elif error_count:
+            self._logger.warning(
+                "Block create error: A node has failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return True
+
+        return False
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        # Block must be deleted from all nodes (otherwise the remaining data
+        # would never be reclaimed), hence no partial delete mode here.
+        error_count = 0
+
+        async def _sub_blockstore_delete(blockstore: BaseBlockStoreComponent) -> None:
+            nonlocal error_count
+            outcome = await blockstore.delete(organization_id, block_id)
+            if outcome is not None:
+                error_count += 1
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_sub_blockstore_delete, blockstore)
+
+        if error_count:
+            self._logger.warning(
+                "Block delete error: A node has failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def scrub(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreScrubOutcome | BlockStoreScrubBadOutcome:
+        fetched = await read_from_all_nodes(self.blockstores, organization_id, block_id)
+        if BlockStoreReadBadOutcome.STORE_UNAVAILABLE in fetched:
+            return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+
+        present = {index: shard for index, shard in enumerate(fetched) if isinstance(shard, bytes)}
+        if len(present) < self.data_shards:
+            return BlockStoreScrubBadOutcome.BLOCK_LOST
+
+        # All the shards are recomputed from the first available ones, the other
+        # available shards must then match
+        expected: list[bytes] = []
+        if len({len(shard) for shard in present.values()}) == 1:
+            data_shards = decode_data_shards(present, self.data_shards, self.parity_shards)
+            expected = [*data_shards, *encode_parity_shards(data_shards, self.parity_shards)]
+        if not expected or any(shard != expected[index] for index, shard in present.items()):
+            self._logger.warning(
+                "Block scrub error: Shards are inconsistent",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            return BlockStoreScrubBadOutcome.BLOCK_CORRUPTED
+
+        repairs = {index: shard for index, shard in enumerate(expected) if index not in present}
+        if not repairs:
+            return BlockStoreScrubOutcome.HEALTHY
+
+        self._logger.warning(
+            "Block scrub: Rebuilding missing shards",
+            organization_id=organization_id.str,
+            block_id=block_id.hex,
+            nodes=list(repairs),
+        )
+        if not await repair_nodes(self.blockstores, organization_id, block_id, repairs):
+            return BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+        return BlockStoreScrubOutcome.REPAIRED
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        for sub_block_ids in split_in_sub_batches(block_ids):
+            await self._read_sub_batch(organization_id, sub_block_ids, results)
+
+    async def _read_sub_batch(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        shards: dict[BlockID, dict[int, bytes]] = {block_id: {} for block_id in block_ids}
+        replies: dict[BlockID, int] = {}
+        # See `read`
+        read_order = sort_by_availability(self.blockstores)
+
+        async def _send_block_if_complete(block_id: BlockID) -> None:
+            if len(shards[block_id]) == self.data_shards:
+                block = self._rebuild_block_from_shards(shards.pop(block_id))
+                await results.send((block_id, block))
+
+        async def _partial_blockstore_read_many(blockstore_index: int) -> None:
+            blockstore = self.blockstores[blockstore_index]
+            async with blockstore.read_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if isinstance(outcome, bytes):
+                        shards[block_id][blockstore_index] = outcome
+                    # Wait for all the data shards of the block to be fetched
+                    if replies[block_id] == self.data_shards:
+                        await _send_block_if_complete(block_id)
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore_index in read_order[: self.data_shards]:
+                task_group.start_soon(_partial_blockstore_read_many, blockstore_index)
+
+        # Remaining blocks have missing shards, try to fetch them from the other nodes
+        # (one node after the other, so that only the shards needed are fetched)
+        for blockstore_index in read_order[self.data_shards :]:
+            if not shards:
+                break
+            blockstore = self.blockstores[blockstore_index]
+            async with blockstore.read_many(organization_id, list(shards)) as sub_results:
+                async for block_id, outcome in sub_results:
+                    if isinstance(outcome, bytes):
+                        shards[block_id][blockstore_index] = outcome
+                        await _send_block_if_complete(block_id)
+
+        for block_id in shards:
+            # No need to log the detail of the nodes errors, they should have
+            # already been logged before raising their exceptions
+            self._logger.warning(
+                "Block read error: Too many nodes have failed",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+            )
+            await results.send((block_id, BlockStoreReadBadOutcome.STORE_UNAVAILABLE))
+
+    @override
+    async def _create_many(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        for sub_blocks in split_in_sub_batches(blocks):
+            await self._create_sub_batch(organization_id, sub_blocks, results)
+
+    async def _create_sub_batch(
+        self,
+        organization_id: OrganizationID,
+        blocks: list[tuple[BlockID, bytes]],
+        results: MemoryObjectSendStream[BlockStoreCreateManyResult],
+    ) -> None:
+        # `per_blockstore[i]` contains the i-th shard of each block
+        per_blockstore: list[list[tuple[BlockID, bytes]]] = [[] for _ in self.blockstores]
+        for block_id, block in blocks:
+            for i, shard in enumerate(self._split_block_in_shards(block)):
+                per_blockstore[i].append((block_id, shard))
+
+        replies: dict[BlockID, int] = {}
+        errors: dict[BlockID, int] = {}
+
+        async def _sub_blockstore_create_many(blockstore_index: int) -> None:
+            blockstore = self.blockstores[blockstore_index]
+            sub_blocks = per_blockstore[blockstore_index]
+            async with blockstore.create_many(organization_id, sub_blocks) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is not None:
+                        errors[block_id] = errors.get(block_id, 0) + 1
+                    # The block outcome is known once all nodes have replied
+                    if replies[block_id] < len(self.blockstores):
+                        continue
+
+                    if self._create_has_failed(organization_id, block_id, errors.get(block_id, 0)):
+                        await results.send((block_id, BlockStoreCreateBadOutcome.STORE_UNAVAILABLE))
+                    else:
+                        await results.send((block_id, None))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore_index in range(len(self.blockstores)):
+                task_group.start_soon(_sub_blockstore_create_many, blockstore_index)
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        replies: dict[BlockID, int] = {}
+        errors: dict[BlockID, int] = {}
+
+        async def _sub_blockstore_delete_many(blockstore: BaseBlockStoreComponent) -> None:
+            async with blockstore.delete_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is not None:
+                        errors[block_id] = errors.get(block_id, 0) + 1
+                    # The block outcome is known once all nodes have replied
+                    if replies[block_id] < len(self.blockstores):
+                        continue
+
+                    if errors.get(block_id, 0):
+                        self._logger.warning(
+                            "Block delete error: A node has failed",
+                            organization_id=organization_id.str,
+                            block_id=block_id.hex,
+                        )
+                        await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+                    else:
+                        await results.send((block_id, None))
+
+        async with anyio.create_task_group() as task_group:
+            for blockstore in self.blockstores:
+                task_group.start_soon(_sub_blockstore_delete_many, blockstore)
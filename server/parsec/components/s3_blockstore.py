@@ -10,12 +10,16 @@ import anyio
 # see https://github.com/microsoft/pyright/issues/10912
 import anyio.to_thread
 import boto3
+from anyio.streams.memory import MemoryObjectSendStream
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import BotoCoreError, ClientError
 
 from parsec._parsec import BlockID, OrganizationID
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
     BlockStoreReadBadOutcome,
 )
 from parsec.logging import get_logger
@@ -23,13 +27,39 @@ from parsec.logging import get_logger
 logger = get_logger()
 
 
+# Maximum number of keys accepted by a single S3 `DeleteObjects` request
+DELETE_OBJECTS_MAX_KEYS = 1000
+
+
 def build_s3_slug(organization_id: OrganizationID, block_id: BlockID) -> str:
     # The slug uses the UUID canonical textual representation (eg.
     # `CoolOrg/3b917792-35ac-409f-9af1-fe6de8d2b905`)
     return f"{organization_id.str}/{block_id.hyphenated}"
 
 
+def _is_no_such_key(exc: BotoCoreError | ClientError) -> bool:
+    # Note this is not to be confused with a missing bucket (`NoSuchBucket`), which is
+    # a configuration error
+    return isinstance(exc, ClientError) and exc.response.get("Error", {}).get("Code") == "NoSuchKey"
+
+
 class S3BlockStoreComponent(BaseBlockStoreComponent):
+    """
+    boto3 is a synchronous library, hence each S3 request is run in a worker thread
+    to never block the event loop.
+
+    Those threads are not taken from the default anyio thread pool (which is shared
+    with the rest of the server) but limited by a dedicated capacity limiter, so
+    the number of in-flight S3 requests is bounded by `max_concurrency`.
+
+    S3 has no batch read/create API, so `read_many`/`create_many` use the default
+    implementation with as many workers as allowed S3 requests. On the other hand,
+    `delete_many` relies on `DeleteObjects` to delete up to 1000 blocks per request.
+
+    Note boto3 clients are thread-safe, so a single client (and hence a single HTTP
+    connection pool of `max_pool_connections` connections) is shared by all threads.
+    """
+
     def __init__(
         self,
         s3_region: str,
@@ -37,7 +67,11 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
         s3_key: str,
         s3_secret: str,
         s3_endpoint_url: str | None = None,
+        max_concurrency: int = 10,
+        max_pool_connections: int = 10,
     ):
+        assert max_concurrency > 0, max_concurrency
+        assert max_pool_connections > 0, max_pool_connections
         self._s3_bucket = None
         self._s3 = boto3.client(
             "s3",
@@ -45,11 +79,32 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
             aws_access_key_id=s3_key,
             aws_secret_access_key=s3_secret,
             endpoint_url=s3_endpoint_url,
+            config=BotoConfig(max_pool_connections=max_pool_connections),
         )
         self._s3_bucket = s3_bucket
         self._s3.head_bucket(Bucket=s3_bucket)
+        self._limiter = anyio.CapacityLimiter(max_concurrency)
+        self.batch_max_concurrency = max_concurrency
         self._logger = logger.bind(blockstore_type="S3", s3_region=s3_region, s3_bucket=s3_bucket)
 
+    def _sync_get_object(self, slug: str) -> bytes:
+        # Reading the body is also a blocking network operation, so it must be
+        # done in the worker thread along with the request itself.
+        obj = self._s3.get_object(Bucket=self._s3_bucket, Key=slug)
+        return obj["Body"].read()
+
+    def _sync_delete_objects(self, slugs: list[str]) -> dict[str, str]:
+        # In quiet mode, only the keys that failed to be deleted are returned
+        # (note deleting a key that doesn't exist is not an error).
+        rep = self._s3.delete_objects(
+            Bucket=self._s3_bucket,
+            Delete={"Objects": [{"Key": slug} for slug in slugs], "Quiet": True},
+        )
+        return {
+            error.get("Key", ""): f"{error.get('Code')}: {error.get('Message')}"
+            for error in rep.get("Errors", [])
+        }
+
     @override
     async def read(
         self, organization_id: OrganizationID, block_id: BlockID
@@ -57,8 +112,12 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
         slug = build_s3_slug(organization_id=organization_id, block_id=block_id)
         try:
             assert self._s3 is not None
-            obj = self._s3.get_object(Bucket=self._s3_bucket, Key=slug)
+            return await anyio.to_thread.run_sync(
+                self._sync_get_object, slug, limiter=self._limiter
+            )
         except (BotoCoreError, ClientError) as exc:
+            if _is_no_such_key(exc):
+                return BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
             self._logger.warning(
                 "Block read error",
                 organization_id=organization_id.str,
@@ -67,8 +126,6 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
             )
             return BlockStoreReadBadOutcome.STORE_UNAVAILABLE
 
-        return obj["Body"].read()
-
     @override
     async def create(
         self, organization_id: OrganizationID, block_id: BlockID, block: bytes
@@ -77,7 +134,8 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
         try:
             assert self._s3 is not None
             await anyio.to_thread.run_sync(
-                partial(self._s3.put_object, Bucket=self._s3_bucket, Key=slug, Body=block)
+                partial(self._s3.put_object, Bucket=self._s3_bucket, Key=slug, Body=block),
+                limiter=self._limiter,
             )
         except (BotoCoreError, ClientError) as exc:
             self._logger.warning(
@@ -87,3 +145,67 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
                 exc_info=exc,
             )
             return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        slug = build_s3_slug(organization_id=organization_id, block_id=block_id)
+        try:
+            assert self._s3 is not None
+            await anyio.to_thread.run_sync(
+                partial(self._s3.delete_object, Bucket=self._s3_bucket, Key=slug),
+                limiter=self._limiter,
+            )
+        except (BotoCoreError, ClientError) as exc:
+            self._logger.warning(
+                "Block delete error",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        async def _delete_objects(batch: list[BlockID]) -> None:
+            slugs = [build_s3_slug(organization_id, block_id) for block_id in batch]
+            try:
+                errors = await anyio.to_thread.run_sync(
+                    self._sync_delete_objects, slugs, limiter=self._limiter
+                )
+            except (BotoCoreError, ClientError) as exc:
+                self._logger.warning(
+                    "Block delete error",
+                    organization_id=organization_id.str,
+                    blocks_count=len(batch),
+                    exc_info=exc,
+                )
+                for block_id in batch:
+                    await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+                return
+
+            for block_id, slug in zip(batch, slugs):
+                error = errors.get(slug)
+                if error is None:
+                    await results.send((block_id, None))
+                    continue
+                self._logger.warning(
+                    "Block delete error",
+                    organization_id=organization_id.str,
+                    block_id=block_id.hex,
+                    error=error,
+                )
+                await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+
+        # Concurrency is bounded by the capacity limiter
+        async with anyio.create_task_group() as task_group:
+            for start in range(0, len(block_ids), DELETE_OBJECTS_MAX_KEYS):
+                task_group.start_soon(
+                    _delete_objects, block_ids[start : start + DELETE_OBJECTS_MAX_KEYS]
+                )
@@ -1,9 +1,11 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 from __future__ import annotations
 
+import json
 from functools import partial
 from typing import override
 from unittest.mock import Mock
+from urllib.parse import quote, unquote
 
 import anyio
 
@@ -11,6 +13,7 @@ import anyio
 # see https://github.com/microsoft/pyright/issues/10912
 import anyio.to_thread
 import pbr.version
+from anyio.streams.memory import MemoryObjectSendStream
 
 # TODO: is this still needed ? for what purpose ?
 original_version_info = pbr.version.VersionInfo
@@ -33,6 +36,8 @@ from parsec._parsec import BlockID, OrganizationID
 from parsec.components.blockstore import (
     BaseBlockStoreComponent,
     BlockStoreCreateBadOutcome,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
     BlockStoreReadBadOutcome,
 )
 from parsec.logging import get_logger
@@ -40,6 +45,11 @@ from parsec.logging import get_logger
 logger = get_logger()
 
 
+# Swift accepts up to 10000 objects per bulk delete request by default, but
+# smaller requests are less likely to time out.
+BULK_DELETE_MAX_OBJECTS = 1000
+
+
 def build_swift_slug(organization_id: OrganizationID, id: BlockID) -> str:
     # The slug uses the UUID canonical textual representation (eg.
     # `CoolOrg/3b917792-35ac-409f-9af1-fe6de8d2b905`)
@@ -47,16 +57,56 @@ def build_swift_slug(organization_id: OrganizationID, id: BlockID) -> str:
 
 
 class SwiftBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    swiftclient is a synchronous library, hence each Swift request is run in a worker
+    thread (limited by a dedicated capacity limiter to bound the number of in-flight
+    requests to `max_concurrency`).
+
+    Swift has no batch read/create API, so `read_many`/`create_many` use the default
+    implementation with as many workers as allowed Swift requests. On the other
+    hand, `delete_many` relies on the bulk delete middleware.
+    """
+
     def __init__(
-        self, auth_url: str, tenant: str, container: str, user: str, password: str
+        self,
+        auth_url: str,
+        tenant: str,
+        container: str,
+        user: str,
+        password: str,
+        max_concurrency: int = 10,
     ) -> None:
+        assert max_concurrency > 0, max_concurrency
         self.swift_client = swiftclient.Connection(
             authurl=auth_url, user=":".join([user, tenant]), key=password
         )
         self._container = container
         self.swift_client.head_container(container)
+        self._limiter = anyio.CapacityLimiter(max_concurrency)
+        self.batch_max_concurrency = max_concurrency
         self._logger = logger.bind(blockstore_type="Swift", authurl=auth_url)
 
+    def _sync_bulk_delete(self, slugs: list[str]) -> dict[str, str]:
+        # See https://docs.openstack.org/swift/latest/middleware.html#module-swift.common.middleware.bulk
+        _, body = self.swift_client.post_account(
+            headers={"Accept": "application/json", "Content-Type": "text/plain"},
+            query_string="bulk-delete",
+            data=b"".join(quote(f"/{self._container}/{slug}").encode() + b"\n" for slug in slugs),
+        )
+        if not body:
+            raise ClientException("Bulk delete not supported (is the middleware enabled ?)")
+        rep = json.loads(body)
+        # Objects not found are not reported as errors
+        errors = {
+            unquote(path).removeprefix(f"/{self._container}/"): status
+            for path, status in rep.get("Errors", [])
+        }
+        if not errors and not rep.get("Response Status", "").startswith("2"):
+            raise ClientException(
+                f"Bulk delete error: {rep.get('Response Status')} {rep.get('Response Body')}"
+            )
+        return errors
+
     @override
     async def read(
         self, organization_id: OrganizationID, block_id: BlockID
@@ -64,12 +114,14 @@ class SwiftBlockStoreComponent(BaseBlockStoreComponent):
         slug = build_swift_slug(organization_id=organization_id, id=block_id)
         try:
             _, obj = await anyio.to_thread.run_sync(
-                self.swift_client.get_object, self._container, slug
+                self.swift_client.get_object, self._container, slug, limiter=self._limiter
             )
             # TODO: further tests are needed to ensure this is okay
             assert isinstance(obj, bytes)
 
         except ClientException as exc:
+            if exc.http_status == 404:
+                return BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
             self._logger.warning(
                 "Block read error",
                 organization_id=organization_id.str,
@@ -87,7 +139,8 @@ class SwiftBlockStoreComponent(BaseBlockStoreComponent):
         slug = build_swift_slug(organization_id=organization_id, id=block_id)
         try:
             await anyio.to_thread.run_sync(
-                partial(self.swift_client.put_object, self._container, slug, block)
+                partial(self.swift_client.put_object, self._container, slug, block),
+                limiter=self._limiter,
             )
 
         except ClientException as exc:
@@ -98,3 +151,70 @@ class SwiftBlockStoreComponent(BaseBlockStoreComponent):
                 exc_info=exc,
             )
             return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        slug = build_swift_slug(organization_id=organization_id, id=block_id)
+        try:
+            await anyio.to_thread.run_sync(
+                partial(self.swift_client.delete_object, self._container, slug),
+                limiter=self._limiter,
+            )
+
+        except ClientException as exc:
+            if exc.http_status == 404:
+                # Keep calm and stay idempotent
+                return
+            self._logger.warning(
+                "Block delete error",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        async def _bulk_delete(batch: list[BlockID]) -> None:
+            slugs = [build_swift_slug(organization_id, block_id) for block_id in batch]
+            try:
+                errors = await anyio.to_thread.run_sync(
+                    self._sync_bulk_delete, slugs, limiter=self._limiter
+                )
+            except (ClientException, ValueError) as exc:
+                self._logger.warning(
+                    "Block delete error",
+                    organization_id=organization_id.str,
+                    blocks_count=len(batch),
+                    exc_info=exc,
+                )
+                for block_id in batch:
+                    await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+                return
+
+            for block_id, slug in zip(batch, slugs):
+                error = errors.get(slug)
+                if error is None:
+                    await results.send((block_id, None))
+                    continue
+                self._logger.warning(
+                    "Block delete error",
+                    organization_id=organization_id.str,
+                    block_id=block_id.hex,
+                    error=error,
+                )
+                await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+
+        # Concurrency is bounded by the capacity limiter
+        async with anyio.create_task_group() as task_group:
+            for start in range(0, len(block_ids), BULK_DELETE_MAX_OBJECTS):
+                task_group.start_soon(
+                    _bulk_delete, block_ids[start : start + BULK_DELETE_MAX_OBJECTS]
+                )
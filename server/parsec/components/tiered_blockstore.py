@@ -0,0 +1,493 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import override
+
+import anyio
+
+# Required because the top-level module of anyio does not correctly load the submodule to_thread
+# see https://github.com/microsoft/pyright/issues/10912
+import anyio.to_thread
+from anyio.abc import TaskGroup
+from anyio.streams.memory import MemoryObjectSendStream
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreDeleteManyResult,
+    BlockStoreReadBadOutcome,
+    BlockStoreReadManyResult,
+)
+from parsec.components.filesystem_blockstore import (
+    TMP_FILE_PREFIX,
+    FilesystemBlockStoreComponent,
+    build_filesystem_path,
+)
+from parsec.logging import get_logger
+
+logger = get_logger()
+
+
+DIRTY_MARKER_SUFFIX = ".dirty"
+WRITE_BACK_RETRY_DELAY = 10  # seconds
+WRITE_BACK_MAX_CONCURRENCY = 10
+AGE_EVICTION_MAX_PERIOD = 60  # seconds
+
+type BlockKey = tuple[OrganizationID, BlockID]
+
+
+@dataclass(slots=True)
+class HotBlock:
+    size: int
+    last_access: float
+    # Block not yet uploaded to the cold tier (only in write-back mode)
+    dirty: bool
+
+
+def build_dirty_marker_path(root: Path, organization_id: OrganizationID, block_id: BlockID) -> Path:
+    path = build_filesystem_path(root, organization_id, block_id)
+    return path.with_name(f"{path.name}{DIRTY_MARKER_SUFFIX}")
+
+
+def _scan_hot_tier(root: Path) -> list[tuple[BlockKey, HotBlock]]:
+    """
+    Retrieve the blocks already present in the hot tier (e.g. from a previous
+    run of the server), sorted by last modification time.
+    """
+    items: list[tuple[BlockKey, HotBlock]] = []
+    for org_dir in root.iterdir():
+        if not org_dir.is_dir():
+            continue
+        try:
+            organization_id = OrganizationID(org_dir.name)
+        except ValueError:
+            continue
+        for shard_dir in org_dir.glob("*/*"):
+            if not shard_dir.is_dir():
+                continue
+            names = {entry.name: entry for entry in os.scandir(shard_dir)}
+            for name, entry in names.items():
+                if name.startswith(TMP_FILE_PREFIX):
+                    continue
+                if name.endswith(DIRTY_MARKER_SUFFIX):
+                    if name.removesuffix(DIRTY_MARKER_SUFFIX) not in names:
+                        # The server has crashed before the block was actually written
+                        os.unlink(entry.path)
+                    continue
+                try:
+                    block_id = BlockID.from_hex(name)
+                except ValueError:
+                    continue
+                stat = entry.stat()
+                items.append(
+                    (
+                        (organization_id, block_id),
+                        HotBlock(
+                            size=stat.st_size,
+                            last_access=stat.st_mtime,
+                            dirty=f"{name}{DIRTY_MARKER_SUFFIX}" in names,
+                        ),
+                    )
+                )
+    items.sort(key=lambda item: item[1].last_access)
+    return items
+
+
+class TieredBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    Blockstore composed of a fast local filesystem (the hot tier) in front of a
+    durable blockstore (the cold tier, e.g. S3).
+
+    - Reads are served by the hot tier when possible, otherwise the block is
+      read from the cold tier and then promoted in the background to the hot tier.
+    - In write-through mode, a create is done on both tiers at the same time, and
+      is considered successful as soon as the cold tier has stored the block.
+    - In write-back mode, a create is only done on the hot tier, the block is then
+      uploaded to the cold tier in the background. Blocks waiting for upload are
+      marked as dirty on disk, so that their upload is resumed on server restart.
+    - The least recently accessed blocks are evicted from the hot tier when its
+      total size exceeds `max_size` bytes, or once they have not been accessed
+      for `max_age` seconds. Dirty blocks are never evicted.
+    - Batch reads (e.g. realm export) neither promote blocks nor refresh their
+      last access, so that they don't evict the frequently accessed blocks.
+
+    Note the content of the hot tier is kept in an in-memory index, which is
+    built on startup by scanning the hot tier directory. Hence the hot tier directory
+    must not be shared between processes (see `parsec run --workers`).
+    """
+
+    def __init__(
+        self,
+        hot: FilesystemBlockStoreComponent,
+        cold: BaseBlockStoreComponent,
+        task_group: TaskGroup,
+        max_size: int,
+        max_age: int | None = None,
+        write_back: bool = False,
+    ):
+        assert max_size > 0, max_size
+        assert max_age is None or max_age > 0, max_age
+        self.hot = hot
+        self.cold = cold
+        self.max_size = max_size
+        self.max_age = max_age
+        self.write_back = write_back
+        self.size = 0
+        self.dirty_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._task_group = task_group
+        self._index: OrderedDict[BlockKey, HotBlock] = OrderedDict()
+        self._promoting: set[BlockKey] = set()
+        self._write_back_send, self._write_back_receive = anyio.create_memory_object_stream[
+            BlockKey
+        ](max_buffer_size=math.inf)
+        self._write_back_limiter = anyio.CapacityLimiter(WRITE_BACK_MAX_CONCURRENCY)
+        self._logger = logger.bind(
+            blockstore_type="Tiered", max_size=max_size, max_age=max_age, write_back=write_back
+        )
+
+        # Note this is a blocking operation, but it is only done once on startup
+        for key, hot_block in _scan_hot_tier(hot.path):
+            self._index[key] = hot_block
+            self.size += hot_block.size
+            if hot_block.dirty:
+                self.dirty_size += hot_block.size
+                self._write_back_send.send_nowait(key)
+
+        task_group.start_soon(self._write_back_worker)
+        if max_age is not None:
+            task_group.start_soon(self._age_eviction_worker, max_age)
+        self._evict()
+
+    def _touch(self, key: BlockKey, hot_block: HotBlock) -> None:
+        hot_block.last_access = time.time()
+        self._index.move_to_end(key)
+
+    def _insert(self, key: BlockKey, size: int, dirty: bool) -> None:
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self.size -= previous.size
+            if previous.dirty:
+                self.dirty_size -= previous.size
+                dirty = True
+        self._index[key] = HotBlock(size=size, last_access=time.time(), dirty=dirty)
+        self.size += size
+        if dirty:
+            self.dirty_size += size
+        self._evict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        to_evict = []
+        for key, hot_block in self._index.items():
+            # Dirty blocks cannot be evicted, so no need to go further if only
+            # they are left
+            too_big = self.size > self.max_size and self.size > self.dirty_size
+            too_old = self.max_age is not None and now - hot_block.last_access > self.max_age
+            if not too_big and not too_old:
+                break
+            if hot_block.dirty:
+                continue
+            to_evict.append(key)
+            self.size -= hot_block.size
+
+        if to_evict:
+            for key in to_evict:
+                del self._index[key]
+            self.evictions += len(to_evict)
+            self._task_group.start_soon(self._remove_from_hot_tier, to_evict)
+
+    def _forget(self, key: BlockKey) -> HotBlock | None:
+        hot_block = self._index.pop(key, None)
+        if hot_block is not None:
+            self.size -= hot_block.size
+            if hot_block.dirty:
+                self.dirty_size -= hot_block.size
+        return hot_block
+
+    async def _remove_from_hot_tier(self, keys: list[BlockKey]) -> None:
+        per_organization: dict[OrganizationID, list[BlockID]] = {}
+        for key in keys:
+            # The block may have been promoted again since its eviction
+            if key not in self._index and key not in self._promoting:
+                organization_id, block_id = key
+                per_organization.setdefault(organization_id, []).append(block_id)
+
+        for organization_id, block_ids in per_organization.items():
+            async with self.hot.delete_many(organization_id, block_ids) as results:
+                async for _ in results:
+                    # Hot tier should have already logged the errors (and the
+                    # block will be evicted again after the next restart)
+                    pass
+
+    async def _age_eviction_worker(self, max_age: int) -> None:
+        while True:
+            await anyio.sleep(min(max_age, AGE_EVICTION_MAX_PERIOD))
+            self._evict()
+
+    async def _promote(self, key: BlockKey, block: bytes) -> None:
+        organization_id, block_id = key
+        try:
+            outcome = await self.hot.create(organization_id, block_id, block)
+            if outcome is None:
+                self._insert(key, len(block), dirty=False)
+        finally:
+            self._promoting.discard(key)
+
+    async def _write_back_worker(self) -> None:
+        async with anyio.create_task_group() as task_group:
+            async for key in self._write_back_receive:
+                task_group.start_soon(self._write_back, key)
+
+    async def _write_back(self, key: BlockKey) -> None:
+        async with self._write_back_limiter:
+            await self._do_write_back(key)
+
+    async def _do_write_back(self, key: BlockKey) -> None:
+        organization_id, block_id = key
+        while True:
+            if key not in self._index:
+                # The block has been deleted in the meantime
+                return
+            block = await self.hot.read(organization_id, block_id)
+            if not isinstance(block, bytes):
+                # Nothing we can do, the block data is lost
+                self._logger.error(
+                    "Block write-back error: Block not available in hot tier",
+                    organization_id=organization_id.str,
+                    block_id=block_id.hex,
+                )
+                return
+
+            outcome = await self.cold.create(organization_id, block_id, block)
+            if outcome is None:
+                break
+
+            # Cold tier should have already logged the error
+            await anyio.sleep(WRITE_BACK_RETRY_DELAY)
+
+        if key not in self._index:
+            # The block has been deleted while being uploaded, hence the delete
+            # may have reached the cold tier before our upload: undo the latter.
+            # (Note the dirty marker has already been removed by the delete)
+            outcome = await self.cold.delete(organization_id, block_id)
+            if outcome is not None:
+                self._logger.warning(
+                    "Block write-back error: Cannot delete block uploaded after its deletion",
+                    organization_id=organization_id.str,
+                    block_id=block_id.hex,
+                )
+            return
+
+        marker = build_dirty_marker_path(self.hot.path, organization_id, block_id)
+        try:
+            await anyio.to_thread.run_sync(partial(marker.unlink, missing_ok=True))
+        except OSError as exc:
+            # Marker will be taken into account on next restart, leading to a
+            # useless (but harmless) new upload.
+            self._logger.warning(
+                "Block write-back error: Cannot remove dirty marker",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+
+        hot_block = self._index.get(key)
+        if hot_block is not None and hot_block.dirty:
+            hot_block.dirty = False
+            self.dirty_size -= hot_block.size
+            self._evict()
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        key = (organization_id, block_id)
+
+        hot_block = self._index.get(key)
+        if hot_block is not None:
+            outcome = await self.hot.read(organization_id, block_id)
+            if isinstance(outcome, bytes):
+                self.hits += 1
+                self._touch(key, hot_block)
+                return outcome
+            # Hot tier is faulty, fallback to the cold tier
+
+        self.misses += 1
+        outcome = await self.cold.read(organization_id, block_id)
+        if isinstance(outcome, bytes) and key not in self._index and key not in self._promoting:
+            self._promoting.add(key)
+            self._task_group.start_soon(self._promote, key, outcome)
+
+        return outcome
+
+    @override
+    async def _read_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreReadManyResult],
+    ) -> None:
+        hot_block_ids: list[BlockID] = []
+        cold_block_ids: list[BlockID] = []
+        for block_id in block_ids:
+            if (organization_id, block_id) in self._index:
+                hot_block_ids.append(block_id)
+            else:
+                cold_block_ids.append(block_id)
+
+        async with self.hot.read_many(organization_id, hot_block_ids) as sub_results:
+            async for block_id, outcome in sub_results:
+                if isinstance(outcome, bytes):
+                    self.hits += 1
+                    await results.send((block_id, outcome))
+                else:
+                    # Hot tier is faulty, fallback to the cold tier
+                    cold_block_ids.append(block_id)
+
+        self.misses += len(cold_block_ids)
+        async with self.cold.read_many(organization_id, cold_block_ids) as sub_results:
+            async for result in sub_results:
+                await results.send(result)
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        if self.write_back:
+            return await self._write_back_create(organization_id, block_id, block)
+        else:
+            return await self._write_through_create(organization_id, block_id, block)
+
+    async def _write_through_create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        key = (organization_id, block_id)
+        cold_outcome = None
+
+        async def _cold_create() -> None:
+            nonlocal cold_outcome
+            cold_outcome = await self.cold.create(organization_id, block_id, block)
+
+        async def _hot_create() -> None:
+            # Failing to write on the hot tier is not an issue, given the block
+            # will then be fetched from the cold tier.
+            if await self.hot.create(organization_id, block_id, block) is None:
+                self._insert(key, len(block), dirty=False)
+
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(_cold_create)
+            task_group.start_soon(_hot_create)
+
+        return cold_outcome
+
+    async def _write_back_create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        key = (organization_id, block_id)
+        if key in self._index:
+            # Keep calm and stay idempotent (if the block is dirty, its upload
+            # to the cold tier is already scheduled)
+            return None
+
+        # The marker must be written first, otherwise a crash could leave us
+        # with a block that is never going to be uploaded to the cold tier.
+        marker = build_dirty_marker_path(self.hot.path, organization_id, block_id)
+
+        def _create_marker() -> None:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+
+        try:
+            await anyio.to_thread.run_sync(_create_marker)
+            hot_outcome = await self.hot.create(organization_id, block_id, block)
+        except OSError as exc:
+            self._logger.warning(
+                "Block create error: Cannot write dirty marker",
+                organization_id=organization_id.str,
+                block_id=block_id.hex,
+                exc_info=exc,
+            )
+            hot_outcome = BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+
+        if hot_outcome is not None:
+            # Hot tier is faulty, fallback to a synchronous write on the cold tier
+            outcome = await self.cold.create(organization_id, block_id, block)
+            if outcome is None:
+                try:
+                    await anyio.to_thread.run_sync(partial(marker.unlink, missing_ok=True))
+                except OSError:
+                    # Marker will be taken into account on next restart
+                    pass
+            return outcome
+
+        self._insert(key, len(block), dirty=True)
+        self._write_back_send.send_nowait(key)
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        outcome = None
+        async with self.delete_many(organization_id, [block_id]) as results:
+            async for _, outcome in results:
+                pass
+        return outcome
+
+    @override
+    async def _delete_many(
+        self,
+        organization_id: OrganizationID,
+        block_ids: list[BlockID],
+        results: MemoryObjectSendStream[BlockStoreDeleteManyResult],
+    ) -> None:
+        dirty_markers: list[Path] = []
+        for block_id in block_ids:
+            hot_block = self._forget((organization_id, block_id))
+            if hot_block is not None and hot_block.dirty:
+                dirty_markers.append(
+                    build_dirty_marker_path(self.hot.path, organization_id, block_id)
+                )
+
+        def _remove_dirty_markers() -> None:
+            for marker in dirty_markers:
+                marker.unlink(missing_ok=True)
+
+        if dirty_markers:
+            try:
+                await anyio.to_thread.run_sync(_remove_dirty_markers)
+            except OSError:
+                # Orphan markers are removed on next restart
+                pass
+
+        # Block is deleted only once it has been removed from both tiers
+        replies: dict[BlockID, int] = {}
+        errors: set[BlockID] = set()
+
+        async def _tier_delete_many(tier: BaseBlockStoreComponent) -> None:
+            async with tier.delete_many(organization_id, block_ids) as sub_results:
+                async for block_id, outcome in sub_results:
+                    replies[block_id] = replies.get(block_id, 0) + 1
+                    if outcome is not None:
+                        errors.add(block_id)
+                    if replies[block_id] < 2:
+                        continue
+                    if block_id in errors:
+                        await results.send((block_id, BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE))
+                    else:
+                        await results.send((block_id, None))
+
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(_tier_delete_many, self.hot)
+            task_group.start_soon(_tier_delete_many, self.cold)
@@ -84,7 +84,42 @@ class MockedDatabaseConfig(BaseDatabaseConfig):
 
 class BaseBlockStoreConfig:
     # Overloaded by children
-    type: Literal["RAID0", "RAID1", "RAID5", "S3", "SWIFT", "POSTGRESQL", "MOCKED", "DISABLED"]
+    type: Literal[
+        "CACHE",
+        "RAID0",
+        "RAID1",
+        "RAID5",
+        "REED_SOLOMON",
+        "S3",
+        "SWIFT",
+        "FILESYSTEM",
+        "TIERED",
+        "POSTGRESQL",
+        "MOCKED",
+        "DISABLED",
+    ]
+
+
+@dataclass(slots=True)
+class CacheBlockStoreConfig(BaseBlockStoreConfig):
+    type = "CACHE"
+
+    blockstore: BaseBlockStoreConfig
+    # Maximum size (in bytes) of the block data kept in memory
+    max_size: int
+
+
+class RAID0BlockStorePlacement(enum.Enum):
+    """
+    How a RAID0 cluster determines the node storing a given block.
+
+    - `MODULO`: Block ID modulo the number of nodes (adding a node moves almost all blocks)
+    - `CONSISTENT_HASHING`: Hash ring with virtual nodes (adding a node only moves the
+      blocks it takes over, provided the new node is added last)
+    """
+
+    MODULO = enum.auto()
+    CONSISTENT_HASHING = enum.auto()
 
 
 @dataclass(slots=True)
@@ -92,24 +127,57 @@ class RAID0BlockStoreConfig(BaseBlockStoreConfig):
     type = "RAID0"
 
     blockstores: list[BaseBlockStoreConfig]
+    placement: RAID0BlockStorePlacement = RAID0BlockStorePlacement.MODULO
+    # Layout of the cluster before its nodes were changed: until all blocks are moved
+    # to their new node (see `parsec rebalance_raid0`), reads fall back to the
+    # previous node of the block.
+    previous_placement: RAID0BlockStorePlacement | None = None
+    previous_nodes_count: int | None = None
+
+
+@dataclass(slots=True, kw_only=True)
+class BaseRedundantBlockStoreConfig(BaseBlockStoreConfig):
+    """
+    Common configuration of the blockstores keeping redundant data among their nodes
+    (so that they can keep going when some nodes are down).
+    """
+
+    # Nodes are considered down after this many consecutive failures (`None` to disable),
+    # requests then skip them until they are probed again after the reset timeout (in seconds)
+    circuit_breaker_threshold: int | None = 5
+    circuit_breaker_reset_timeout: float = 30.0
 
 
 @dataclass(slots=True)
-class RAID1BlockStoreConfig(BaseBlockStoreConfig):
+class RAID1BlockStoreConfig(BaseRedundantBlockStoreConfig):
     type = "RAID1"
 
     blockstores: list[BaseBlockStoreConfig]
     partial_create_ok: bool = False
+    # A read is also sent to the next fastest node if the fastest one hasn't answered
+    # after this percentile of its recent latencies (`None` to disable hedged reads)
+    hedged_read_percentile: float | None = 95.0
 
 
 @dataclass(slots=True)
-class RAID5BlockStoreConfig(BaseBlockStoreConfig):
+class RAID5BlockStoreConfig(BaseRedundantBlockStoreConfig):
     type = "RAID5"
 
     blockstores: list[BaseBlockStoreConfig]
     partial_create_ok: bool = False
 
 
+@dataclass(slots=True)
+class ReedSolomonBlockStoreConfig(BaseRedundantBlockStoreConfig):
+    type = "REED_SOLOMON"
+
+    blockstores: list[BaseBlockStoreConfig]
+    # Number of nodes storing parity shards (i.e. number of nodes allowed to fail),
+    # the other nodes store the data shards
+    parity_shards: int
+    partial_create_ok: bool = False
+
+
 @dataclass(slots=True)
 class S3BlockStoreConfig(BaseBlockStoreConfig):
     type = "S3"
@@ -119,10 +187,16 @@ class S3BlockStoreConfig(BaseBlockStoreConfig):
     s3_bucket: str
     s3_key: str
     s3_secret: str
+    # Maximum number of S3 requests running concurrently (each request runs in
+    # a dedicated worker thread so that it never blocks the event loop).
+    s3_max_concurrency: int = 10
+    # Size of the HTTP connection pool (should be at least `s3_max_concurrency`,
+    # otherwise requests end up waiting for a connection to be available).
+    s3_max_pool_connections: int = 10
 
     def __str__(self) -> str:
         # Do not show the secret in the logs
-        return f"{self.__class__.__name__}(s3_endpoint_url={self.s3_endpoint_url}, s3_region={self.s3_region}, s3_bucket={self.s3_bucket}, s3_key={self.s3_key})"
+        return f"{self.__class__.__name__}(s3_endpoint_url={self.s3_endpoint_url}, s3_region={self.s3_region}, s3_bucket={self.s3_bucket}, s3_key={self.s3_key}, s3_max_concurrency={self.s3_max_concurrency}, s3_max_pool_connections={self.s3_max_pool_connections})"
 
     __repr__ = __str__
 
@@ -136,14 +210,58 @@ class SWIFTBlockStoreConfig(BaseBlockStoreConfig):
     swift_container: str
     swift_user: str
     swift_password: str
+    # Maximum number of Swift requests running concurrently (each request runs in
+    # a dedicated worker thread so that it never blocks the event loop).
+    swift_max_concurrency: int = 10
 
     def __str__(self) -> str:
         # Do not show the password in the logs
-        return f"{self.__class__.__name__}(swift_authurl={self.swift_authurl}, swift_tenant={self.swift_tenant}, swift_container={self.swift_container}, swift_user={self.swift_user})"
+        return f"{self.__class__.__name__}(swift_authurl={self.swift_authurl}, swift_tenant={self.swift_tenant}, swift_container={self.swift_container}, swift_user={self.swift_user}, swift_max_concurrency={self.swift_max_concurrency})"
 
     __repr__ = __str__
 
 
+class FilesystemBlockStoreDurability(enum.Enum):
+    """
+    Durability guarantee provided once a block has been created.
+
+    - `NONE`: Rely on the OS to flush the block data to disk (fastest but
+      blocks can be lost in case of power failure)
+    - `FILE`: Block data is flushed to disk before returning
+    - `FULL`: Block data and parent directory are flushed to disk before returning
+    """
+
+    NONE = enum.auto()
+    FILE = enum.auto()
+    FULL = enum.auto()
+
+
+@dataclass(slots=True)
+class FilesystemBlockStoreConfig(BaseBlockStoreConfig):
+    type = "FILESYSTEM"
+
+    path: str
+    durability: FilesystemBlockStoreDurability = FilesystemBlockStoreDurability.FULL
+    # Maximum number of filesystem operations running concurrently (each operation
+    # runs in a dedicated worker thread so that it never blocks the event loop).
+    max_concurrency: int = 10
+
+
+@dataclass(slots=True)
+class TieredBlockStoreConfig(BaseBlockStoreConfig):
+    type = "TIERED"
+
+    hot: FilesystemBlockStoreConfig
+    cold: BaseBlockStoreConfig
+    # Maximum size (in bytes) of the block data kept in the hot tier
+    hot_max_size: int
+    # Blocks not accessed for this amount of time (in seconds) are evicted from the hot tier
+    hot_max_age: int | None = None
+    # If `True`, a block create is only done on the hot tier, the block is then
+    # uploaded to the cold tier in the background
+    write_back: bool = False
+
+
 @dataclass(slots=True)
 class PostgreSQLBlockStoreConfig(BaseBlockStoreConfig):
     type = "POSTGRESQL"
@@ -352,8 +470,42 @@ class BackendConfig:
     organization_initial_realm_deletion_min_archiving_period: int = 2592000  # seconds (i.e 30 days)
     organization_initial_tos: dict[TosLocale, TosUrl] | None = None
 
-    # Number of SSE events kept in memory to allow client to catch up on reconnection
+    # SSE events kept in memory to allow client to catch up on reconnection (see the
+    # `Last-Event-ID` header): each organization keeps up to `sse_events_cache_size`
+    # events within `sse_events_cache_organization_max_bytes` bytes, and the least
+    # recently active organizations lose their oldest events first once the whole
+    # cache exceeds `sse_events_cache_max_bytes` bytes
     sse_events_cache_size: int = 1024
+    sse_events_cache_organization_max_bytes: int = 1024 * 1024
+    sse_events_cache_max_bytes: int = 256 * 1024 * 1024
+    # Number of authenticated devices kept in memory to skip the database lookup on
+    # authentication, and for how long (in seconds) a device is kept
+    auth_device_cache_size: int = 100_000
+    auth_device_cache_ttl: int = 3600
+    # Same thing for invitations (polled by the greeting steps) and account
+    # authentication methods, the TTL above is also used for them
+    auth_invited_cache_size: int = 10_000
+    auth_account_cache_size: int = 10_000
+    # Number of worker threads verifying the signature of the authenticated tokens,
+    # `None` to verify them directly on the event loop (an Ed25519 verification is
+    # cheap enough for this to be the sensible default, the threads only pay off when
+    # the event loop is saturated by a high rate of authenticated requests)
+    auth_token_verify_threads: int | None = None
+    # Maximum number of authenticated requests processed at the same time for a
+    # given organization (`None` for no limit), additional requests are queued
+    # up to `organization_max_queued_requests`, then rejected with a `503`
+    organization_max_in_flight_requests: int | None = None
+    organization_max_queued_requests: int = 100
+    # Number of authenticated requests per second allowed for a given organization
+    # (`None` for no limit), with bursts up to `organization_rate_limit_burst`
+    # requests. Requests exceeding the limit are rejected with a `503`
+    organization_rate_limit: float | None = None
+    organization_rate_limit_burst: int = 100
+    # Where to export the tracing spans (see `parsec.tracing.tracing_factory`),
+    # `None` to disable tracing
+    tracing_export: str | None = None
+    # Fraction of the requests traced
+    tracing_sample_rate: float = 0.01
     backend_mocked_data: dict[OrganizationID, MemoryOrganization] | None = None
 
     scws_config: ScwsConfig | None = None
@@ -370,6 +522,28 @@ class BackendConfig:
     def __post_init__(self):
         # Sanity checks
         assert self.sse_keepalive is None or self.sse_keepalive >= 0, self.sse_keepalive
+        assert self.sse_events_cache_size > 0, self.sse_events_cache_size
+        assert self.sse_events_cache_organization_max_bytes > 0, (
+            self.sse_events_cache_organization_max_bytes
+        )
+        assert self.sse_events_cache_max_bytes > 0, self.sse_events_cache_max_bytes
+        assert self.auth_device_cache_size > 0, self.auth_device_cache_size
+        assert self.auth_device_cache_ttl > 0, self.auth_device_cache_ttl
+        assert self.auth_invited_cache_size > 0, self.auth_invited_cache_size
+        assert self.auth_account_cache_size > 0, self.auth_account_cache_size
+        assert self.auth_token_verify_threads is None or self.auth_token_verify_threads > 0, (
+            self.auth_token_verify_threads
+        )
+        assert (
+            self.organization_max_in_flight_requests is None
+            or self.organization_max_in_flight_requests > 0
+        ), self.organization_max_in_flight_requests
+        assert self.organization_max_queued_requests >= 0, self.organization_max_queued_requests
+        assert self.organization_rate_limit is None or self.organization_rate_limit > 0, (
+            self.organization_rate_limit
+        )
+        assert self.organization_rate_limit_burst > 0, self.organization_rate_limit_burst
+        assert 0 <= self.tracing_sample_rate <= 1, self.tracing_sample_rate
         assert self.organization_initial_realm_deletion_min_archiving_period >= 0, (
             self.organization_initial_realm_deletion_min_archiving_period
         )
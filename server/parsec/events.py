@@ -17,6 +17,7 @@ from parsec.types import (
     Base64BytesField,
     DateTimeField,
     DeviceIDField,
+    EmailAddressField,
     GreetingAttemptIDField,
     InvitationStatusField,
     InvitationTokenField,
@@ -556,6 +557,22 @@ class EventUserUpdated(BaseModel):
     new_profile: UserProfileField
 
 
+class EventAccountAuthMethodsDisabled(BaseModel):
+    """
+    Some authentication methods of an account have been disabled (e.g. password
+    change, vault key rotation, account deletion).
+
+    This event is only used internally and never broadcasted to users.
+
+    It is used to update the auth system's cache.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, strict=True)
+    type: Literal["ACCOUNT_AUTH_METHODS_DISABLED"] = "ACCOUNT_AUTH_METHODS_DISABLED"
+    event_id: UUID = Field(default_factory=uuid4)
+    account_email: EmailAddressField
+
+
 type Event = (
     EventPinged
     | EventInvitation
@@ -575,6 +592,7 @@ type Event = (
     | EventUserRevokedOrFrozen
     | EventUserUnfrozen
     | EventUserUpdated
+    | EventAccountAuthMethodsDisabled
 )
 
 
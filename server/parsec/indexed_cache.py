@@ -0,0 +1,96 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class _Entry[V]:
+    value: V
+    expires_at: float
+    indexes: tuple[Hashable, ...]
+
+
+class IndexedCache[K: Hashable, V]:
+    """
+    Size-bounded cache evicting the least recently used entries, each entry also
+    expiring `ttl` seconds after it has been stored.
+
+    Entries can be tagged with index keys (e.g. the organization ID) so that all the
+    entries with a given index key can be invalidated at once, without going through
+    the whole cache.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        assert max_size > 0, max_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries: OrderedDict[K, _Entry[V]] = OrderedDict()
+        self._indexes: dict[Hashable, set[K]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= self._clock():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: K, value: V, indexes: Iterable[Hashable] = ()) -> None:
+        if key in self._entries:
+            self._remove(key)
+        expires_at = self._clock() + self.ttl if self.ttl is not None else float("inf")
+        entry = _Entry(value=value, expires_at=expires_at, indexes=tuple(indexes))
+        self._entries[key] = entry
+        for index in entry.indexes:
+            self._indexes.setdefault(index, set()).add(key)
+
+        while len(self._entries) > self.max_size:
+            evicted_key = next(iter(self._entries))
+            self._remove(evicted_key)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def invalidate_index(self, index: Hashable) -> None:
+        for key in self._indexes.get(index, set()).copy():
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._indexes.clear()
+
+    def _remove(self, key: K) -> None:
+        entry = self._entries.pop(key)
+        for index in entry.indexes:
+            keys = self._indexes[index]
+            keys.discard(key)
+            if not keys:
+                del self._indexes[index]
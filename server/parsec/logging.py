@@ -3,8 +3,14 @@ from __future__ import annotations
 
 import enum
 import logging
+import multiprocessing.util
+import os
+import queue
+import random
 import sys
-from collections.abc import Callable, MutableMapping
+import threading
+from collections.abc import Callable, Iterator, Mapping, MutableMapping
+from contextlib import contextmanager
 from datetime import UTC, datetime
 from typing import Any, Literal, TextIO, cast
 
@@ -59,9 +65,17 @@ class ParsecBoundLogger(structlog.typing.FilteringBoundLogger):
 
     # Custom helpers
 
-    def info_with_debug_extra(self, event: str, debug_extra: dict[str, Any], **kwargs: Any) -> None:
+    def info_with_debug_extra(
+        self,
+        event: str,
+        debug_extra: dict[str, Any] | Callable[[], dict[str, Any]],
+        **kwargs: Any,
+    ) -> None:
         """
         Log at INFO level, but also include extra information if log level is DEBUG.
+
+        `debug_extra` can be a callable (e.g. `event.model_dump`) to only build
+        the extra information if it is going to be logged.
         """
         ...
 
@@ -92,22 +106,42 @@ class ParsecBoundLogger(structlog.typing.FilteringBoundLogger):
         ...
 
 
+# Field containing a `LazyField` whose (dict) result is merged into the log fields
+_LAZY_DEBUG_EXTRA_KEY = "_lazy_debug_extra"
+
+
+def _rename_event_field(extra: dict[str, Any]) -> dict[str, Any]:
+    # `event` is already used for the log message
+    if "event" in extra:
+        extra["event_"] = extra.pop("event")
+    return extra
+
+
 def _make_filtering_bound_logger(min_level: int) -> type[ParsecBoundLogger]:
     bound_logger_cls = structlog.make_filtering_bound_logger(min_level)
 
     if min_level <= logging.DEBUG:
 
         def info_with_debug_extra(
-            self, event: str, debug_extra: dict[str, Any], **kwargs: Any
+            self,
+            event: str,
+            debug_extra: dict[str, Any] | Callable[[], dict[str, Any]],
+            **kwargs: Any,
         ) -> None:
-            if "event" in debug_extra:
-                debug_extra["event_"] = debug_extra.pop("event")
-            kwargs |= debug_extra
+            if callable(debug_extra):
+                # Only built if the log is actually emitted (i.e. not sampled out),
+                # see `_resolve_lazy_fields_processor`
+                kwargs[_LAZY_DEBUG_EXTRA_KEY] = LazyField(debug_extra)
+            else:
+                kwargs |= _rename_event_field(debug_extra)
             self.info(event, **kwargs)
     else:
 
         def info_with_debug_extra(
-            self, event: str, debug_extra: dict[str, Any], **kwargs: Any
+            self,
+            event: str,
+            debug_extra: dict[str, Any] | Callable[[], dict[str, Any]],
+            **kwargs: Any,
         ) -> None:
             self.info(event, **kwargs)
 
@@ -143,6 +177,124 @@ def _make_filtering_bound_logger(min_level: int) -> type[ParsecBoundLogger]:
 # By the way, did you know Python's stdlib logging module was inspired by Java's ?
 
 
+class LazyField:
+    """
+    Log field only computed if the log is actually emitted (i.e. not filtered out
+    by its level or by sampling), e.g. `logger.debug("Foo", bar=LazyField(compute_bar))`.
+    """
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], object]):
+        self.fn = fn
+
+    def __repr__(self) -> str:
+        # Fallback in case the field is rendered without `_resolve_lazy_fields_processor`
+        return repr(self.fn())
+
+
+class _QueueLogStream:
+    """
+    File-like object writing into `stream` from a dedicated thread, so that
+    logging never blocks the event loop on a slow stdout/file.
+
+    The queue is bounded: if the writer thread cannot keep up, the logs are
+    dropped (and counted) instead of using more and more memory.
+    """
+
+    def __init__(self, stream: TextIO, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.dropped = 0
+        self._closed = False
+        self._start()
+        # Threads don't survive `fork` (see `parsec run --workers`)
+        os.register_at_fork(after_in_child=self._start)
+        multiprocessing.util.register_after_fork(self, _QueueLogStream._close_at_process_exit)
+
+    def _start(self) -> None:
+        if self._closed:
+            return
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=self.max_size)
+        self._thread = threading.Thread(target=self._run, name="parsec-log-writer", daemon=True)
+        self._thread.start()
+
+    def _close_at_process_exit(self) -> None:
+        # Processes started by `multiprocessing` exit with `os._exit` (so `close`
+        # is never called by `queue_log_stream`), but run their finalizers first.
+        # A negative priority makes it run last, so the other finalizers can log.
+        if not self._closed:
+            multiprocessing.util.Finalize(self, self.close, exitpriority=-100)
+
+    def _run(self) -> None:
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            self.stream.write(data)
+            # Only flush once the burst of logs is written
+            if self._queue.empty():
+                self.stream.flush()
+        self.stream.flush()
+
+    def write(self, data: str) -> int:
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+        return len(data)
+
+    def flush(self) -> None:
+        # Flushing is done by the writer thread
+        pass
+
+    def close(self) -> None:
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self.dropped:
+            self.stream.write(f"{self.dropped} log lines dropped (log queue full)\n")
+            self.stream.flush()
+
+
+class _QueueLogger:
+    """
+    Structlog logger writing to a `_QueueLogStream` (unlike `structlog.PrintLogger`,
+    the line and its newline are written at once, so lines never get mixed up
+    when the queue is full).
+    """
+
+    def __init__(self, stream: _QueueLogStream):
+        self._stream = stream
+
+    def msg(self, message: str) -> None:
+        self._stream.write(message + "\n")
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class _QueueLoggerFactory:
+    def __init__(self, stream: _QueueLogStream):
+        self._stream = stream
+
+    def __call__(self, *args: Any) -> _QueueLogger:
+        return _QueueLogger(self._stream)
+
+
+@contextmanager
+def queue_log_stream(stream: TextIO, max_size: int = 10_000) -> Iterator[TextIO]:
+    """
+    Provide a stream to pass to `configure_logging` so that the logs are
+    written asynchronously to `stream`.
+    """
+    queue_stream = _QueueLogStream(stream, max_size)
+    try:
+        yield cast(TextIO, queue_stream)
+    finally:
+        queue_stream.close()
+
+
 # -- custom structlog processors
 #
 # A log processor is a regular callable that process a log message and can be
@@ -167,6 +319,40 @@ def _format_timestamp_processor(
     return event
 
 
+def _make_sampling_processor(
+    sampling: Mapping[str, float],
+) -> Callable[[logging.Logger, str, EventDict], EventDict]:
+    """
+    Only keep a fraction of the INFO/DEBUG logs with the given messages (e.g.
+    `{"RPC reply": 0.01}` to keep one `RPC reply` log out of a hundred).
+
+    Warnings and errors are never sampled.
+    """
+
+    def _sampling_processor(
+        logger: logging.Logger, method_name: str, event: EventDict
+    ) -> EventDict:
+        if method_name in ("debug", "info"):
+            rate = sampling.get(event["event"])
+            if rate is not None and random.random() >= rate:
+                raise structlog.DropEvent
+        return event
+
+    return _sampling_processor
+
+
+def _resolve_lazy_fields_processor(
+    logger: logging.Logger, method_name: str, event: EventDict
+) -> EventDict:
+    debug_extra = event.pop(_LAZY_DEBUG_EXTRA_KEY, None)
+    for key, value in event.items():
+        if isinstance(value, LazyField):
+            event[key] = value.fn()
+    if debug_extra is not None:
+        event.update(_rename_event_field(cast(dict[str, Any], debug_extra.fn())))
+    return event
+
+
 def _format_stdlib_positional_args(
     logger: logging.Logger, method_name: str, event: MutableMapping[str, object]
 ) -> MutableMapping[str, object]:
@@ -306,7 +492,10 @@ def _structlog_to_sentry_processor(
 
 
 def _configure_structlog_logger(
-    log_level: LogLevel, log_format: LogFormat, log_stream: TextIO
+    log_level: LogLevel,
+    log_format: LogFormat,
+    log_stream: TextIO,
+    sampling: Mapping[str, float] | None,
 ) -> None:
     # A bit of structlog architecture:
     # - lazy proxy: component obtained through `structlog.get_logger()`, laziness
@@ -372,10 +561,23 @@ def _configure_structlog_logger(
                 JSONRenderer(),
             ]
 
+    # Sampling is done first so that dropped logs cost as little as possible,
+    # then lazy fields are resolved before any other processor uses them
+    processors = [
+        *([_make_sampling_processor(sampling)] if sampling else []),
+        _resolve_lazy_fields_processor,
+        *processors,
+    ]
+
+    if isinstance(log_stream, _QueueLogStream):
+        logger_factory = _QueueLoggerFactory(log_stream)
+    else:
+        logger_factory = structlog.PrintLoggerFactory(file=log_stream)
+
     structlog.configure(
         processors=processors,
         wrapper_class=_make_filtering_bound_logger(log_level.value),
-        logger_factory=structlog.PrintLoggerFactory(file=log_stream),
+        logger_factory=logger_factory,
         cache_logger_on_first_use=True,
     )
 
@@ -478,8 +680,19 @@ def _configure_stdlib_logger(
     logger.addHandler(handler)
 
 
-def configure_logging(log_level: LogLevel, log_format: LogFormat, log_stream: TextIO) -> None:
-    _configure_structlog_logger(log_level, log_format, log_stream)
+def configure_logging(
+    log_level: LogLevel,
+    log_format: LogFormat,
+    log_stream: TextIO,
+    sampling: Mapping[str, float] | None = None,
+) -> None:
+    """
+    `sampling` maps log messages (e.g. `RPC reply`) to the fraction of their
+    INFO/DEBUG logs to keep, see `_make_sampling_processor`.
+
+    Use `queue_log_stream` to provide `log_stream` to write the logs asynchronously.
+    """
+    _configure_structlog_logger(log_level, log_format, log_stream, sampling)
     _configure_stdlib_logger(
         logging.getLogger(),  # root stdlib logger
         log_level,
@@ -5,7 +5,6 @@ import asyncio
 import queue
 import sqlite3
 import threading
-from collections import deque
 from collections.abc import AsyncGenerator, Callable
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -76,7 +75,6 @@ class RealmExporterInputDbError(RealmExporterError):
 VLOB_EXPORT_BATCH_SIZE = 100_000
 # Block metadata are really small (< 100 bytes)
 BLOCK_METADATA_EXPORT_BATCH_SIZE = 1_000_000
-BLOCK_DATA_EXPORT_PARALLELISM = 10
 # Among of RAM we are willing to use to store block data in memory
 # before flushing it to the SQLite database.
 BLOCK_DATA_EXPORT_RAM_LIMIT = 2**30  # 1Go
@@ -1070,7 +1068,7 @@ async def _do_export_blocks_data(
     # - The data we flush on the output database has no ordering guarantee.
     # - Any given batch can end up partially exported before we move to the next one.
 
-    def _get_next_batch_of_blocks(con: sqlite3.Connection) -> deque[tuple[SequentialID, BlockID]]:
+    def _get_next_batch_of_blocks(con: sqlite3.Connection) -> dict[BlockID, SequentialID]:
         rows = con.execute(
             "SELECT block.sequential_id, block.block_id\
             FROM block LEFT JOIN block_data\
@@ -1082,7 +1080,7 @@ async def _do_export_blocks_data(
             (BLOCK_METADATA_EXPORT_BATCH_SIZE,),
         ).fetchall()
 
-        batch: deque[tuple[SequentialID, BlockID]] = deque()
+        batch: dict[BlockID, SequentialID] = {}
         for row in rows:
             match row[0]:
                 case int() as sequential_id:
@@ -1106,7 +1104,7 @@ async def _do_export_blocks_data(
                         f"Output export database appears to be corrupted: `block` table contains unexpected `block_id` value `{unknown!r}` (expected bytes)"
                     )
 
-            batch.append((sequential_id, block_id))
+            batch[block_id] = sequential_id
 
         return batch
 
@@ -1164,7 +1162,7 @@ async def _do_export_blocks_data(
         if not batch:
             break
 
-        # Now process our batch in parallel
+        # Now process our batch (the blockstore fetches the blocks in parallel)
 
         consecutive_store_unavailable_errors = 0
 
@@ -1172,43 +1170,41 @@ async def _do_export_blocks_data(
             pass
 
         async def _fetch_data_in_batch() -> None:
-            while True:
-                try:
-                    (block_sequential_id, block_id) = batch.popleft()
-                except IndexError:
-                    # Nothing more to fetch !
-                    break
-
-                outcome = await backend.blockstore.read(organization_id, block_id)
-                match outcome:
-                    case bytes() as data:
-                        nonlocal consecutive_store_unavailable_errors
-                        consecutive_store_unavailable_errors = 0
-                        await _add_block_data_and_maybe_flush_to_sqlite(block_sequential_id, data)
-
-                    case BlockStoreReadBadOutcome.BLOCK_NOT_FOUND:
-                        # TODO: We currently never remove any block data from a realm (there
-                        #       is a `deleted_on` field in the `block` table but it is unused
-                        #       for now).
-                        #       This code should be updated if we ever decide to do so.
-                        raise RealmExporterInputDbError(
-                            f"Block `{block_id}` is missing from the blockstore database"
-                        )
-
-                    case BlockStoreReadBadOutcome.STORE_UNAVAILABLE:
-                        # By raising this error, we stop all parallel tasks (leaving the
-                        # current batch un-achieved but this is fine by design) to wait a
-                        # bit before retrying.
-                        # It would be a shame to abandon all those precious downloaded bytes,
-                        # so flush them before leaving !
-                        await output_db_con.execute(_flush_data_to_sqlite)
-                        raise StoreUnavailable
+            nonlocal consecutive_store_unavailable_errors
+
+            # Blocks are removed from the batch once fetched, so that only the
+            # remaining ones are fetched again on retry
+            async with backend.blockstore.read_many(organization_id, list(batch)) as results:
+                async for block_id, outcome in results:
+                    match outcome:
+                        case bytes() as data:
+                            consecutive_store_unavailable_errors = 0
+                            block_sequential_id = batch.pop(block_id)
+                            await _add_block_data_and_maybe_flush_to_sqlite(
+                                block_sequential_id, data
+                            )
+
+                        case BlockStoreReadBadOutcome.BLOCK_NOT_FOUND:
+                            # TODO: We currently never remove any block data from a realm (there
+                            #       is a `deleted_on` field in the `block` table but it is unused
+                            #       for now).
+                            #       This code should be updated if we ever decide to do so.
+                            raise RealmExporterInputDbError(
+                                f"Block `{block_id}` is missing from the blockstore database"
+                            )
+
+                        case BlockStoreReadBadOutcome.STORE_UNAVAILABLE:
+                            # By raising this error, we stop all parallel fetches (leaving the
+                            # current batch un-achieved but this is fine by design) to wait a
+                            # bit before retrying.
+                            # It would be a shame to abandon all those precious downloaded bytes,
+                            # so flush them before leaving !
+                            await output_db_con.execute(_flush_data_to_sqlite)
+                            raise StoreUnavailable
 
         while True:
             try:
-                async with asyncio.TaskGroup() as tg:
-                    for _ in range(BLOCK_DATA_EXPORT_PARALLELISM):
-                        tg.create_task(_fetch_data_in_batch())
+                await _fetch_data_in_batch()
 
                 # The current batch is done, we must ensure all the corresponding data
                 # are flushed to the output database before fetching a new one (otherwise
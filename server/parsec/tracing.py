@@ -0,0 +1,323 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+"""
+Lightweight request tracing, to find where the time goes in a slow request
+(e.g. waiting for a database connection, running a query, or reading from the
+blockstore).
+
+A trace is started for each RPC request (see `start_trace`), and sub-operations
+are recorded as child spans (see `span`). Sampling is head-based: the decision
+to record a trace is made when it starts, so that the non-recorded requests pay
+no more than a context variable lookup per span.
+
+Spans are exported in the OTLP JSON format, either to an OTLP/HTTP collector or
+to a local file (one export request per line, as read by the OpenTelemetry
+Collector's `otlpjsonfile` receiver).
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import random
+import secrets
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from parsec._version import __version__
+from parsec.logging import get_logger
+
+logger = get_logger()
+
+type SpanAttribute = str | int | float | bool
+
+SERVICE_NAME = "parsec-server"
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 5.0  # seconds
+EXPORT_TIMEOUT = 10.0  # seconds
+# Spans are dropped if the exporter cannot keep up
+EXPORT_MAX_QUEUED_SPANS = 8192
+
+# See https://opentelemetry.io/docs/specs/otel/trace/api/#spankind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+# See https://opentelemetry.io/docs/specs/otel/trace/api/#set-status
+SPAN_STATUS_UNSET = 0
+SPAN_STATUS_ERROR = 2
+
+
+@dataclass(slots=True)
+class Span:
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    name: str
+    start_time_ns: int
+    end_time_ns: int = 0
+    attributes: dict[str, SpanAttribute] = field(default_factory=dict)
+    error: bool = False
+
+    def to_otlp(self) -> dict[str, Any]:
+        otlp: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_SERVER if self.parent_span_id is None else SPAN_KIND_INTERNAL,
+            # 64bits integers are encoded as strings in OTLP JSON
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": SPAN_STATUS_ERROR if self.error else SPAN_STATUS_UNSET},
+        }
+        if self.parent_span_id is not None:
+            otlp["parentSpanId"] = self.parent_span_id
+        return otlp
+
+
+def _otlp_value(value: SpanAttribute) -> dict[str, Any]:
+    # Note `bool` must be checked before `int` since it is a subclass of it
+    match value:
+        case bool():
+            return {"boolValue": value}
+        case int():
+            return {"intValue": str(value)}
+        case float():
+            return {"doubleValue": value}
+        case str():
+            return {"stringValue": value}
+        # Given `value` may come from untyped code, we play defensive here
+        case unknown:  # pyright: ignore[reportUnnecessaryComparison]
+            assert False, unknown
+
+
+def _otlp_export_request(spans: list[Span]) -> dict[str, Any]:
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                        {"key": "service.version", "value": {"stringValue": __version__}},
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "parsec"},
+                        "spans": [span.to_otlp() for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class SpanExporter:
+    def export(self, spans: list[Span]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class OtlpHttpSpanExporter(SpanExporter):
+    def __init__(self, url: str):
+        self.url = url
+        self._client = httpx.Client(timeout=EXPORT_TIMEOUT)
+
+    def export(self, spans: list[Span]) -> None:
+        rep = self._client.post(self.url, json=_otlp_export_request(spans))
+        rep.raise_for_status()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class JsonFileSpanExporter(SpanExporter):
+    def __init__(self, path: Path):
+        # Append mode since each worker process (see `parsec run --workers`)
+        # writes to the same file
+        self._file = path.open("a", encoding="utf-8")
+
+    def export(self, spans: list[Span]) -> None:
+        # Single write so that lines from different processes don't get mixed up
+        self._file.write(json.dumps(_otlp_export_request(spans)) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Tracer:
+    """
+    Sample the traces and export the recorded spans by batches from a dedicated
+    thread (so that the export never blocks the event loop).
+    """
+
+    def __init__(self, exporter: SpanExporter, sample_rate: float):
+        assert 0 <= sample_rate <= 1, sample_rate
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._queue: queue.Queue[Span | None] = queue.Queue(maxsize=EXPORT_MAX_QUEUED_SPANS)
+        self._thread = threading.Thread(target=self._run, name="parsec-tracing", daemon=True)
+        self._thread.start()
+
+    def should_sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def on_end(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            batch: list[Span] = []
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception as exc:
+                    logger.warning("Cannot export tracing spans", spans=len(batch), exc_info=exc)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self.exporter.close()
+        if self.dropped:
+            logger.warning("Tracing spans dropped (export queue full)", spans=self.dropped)
+
+
+_tracer: Tracer | None = None
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def is_tracing_enabled() -> bool:
+    return _tracer is not None
+
+
+@contextmanager
+def tracing_factory(export: str | None, sample_rate: float) -> Iterator[None]:
+    """
+    Enable tracing while in the context manager (it is disabled if `export` is `None`).
+
+    `export` is either an OTLP/HTTP traces endpoint URL (e.g. `http://localhost:4318/v1/traces`)
+    or the path of a local file.
+    """
+    global _tracer
+
+    if export is None:
+        yield
+        return
+
+    assert _tracer is None, "Tracing already enabled"
+    if export.startswith(("http://", "https://")):
+        exporter = OtlpHttpSpanExporter(export)
+    else:
+        exporter = JsonFileSpanExporter(Path(export))
+    _tracer = Tracer(exporter, sample_rate)
+    try:
+        yield
+    finally:
+        tracer, _tracer = _tracer, None
+        tracer.close()
+
+
+def _new_span(name: str, parent: Span | None, attributes: dict[str, SpanAttribute]) -> Span:
+    return Span(
+        trace_id=parent.trace_id if parent is not None else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent.span_id if parent is not None else None,
+        name=name,
+        start_time_ns=time.time_ns(),
+        attributes=attributes,
+    )
+
+
+@contextmanager
+def _record(tracer: Tracer, recorded: Span) -> Iterator[Span]:
+    token = _current_span.set(recorded)
+    try:
+        yield recorded
+    except BaseException as exc:
+        recorded.error = True
+        recorded.attributes["exception.type"] = type(exc).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        recorded.end_time_ns = time.time_ns()
+        tracer.on_end(recorded)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: SpanAttribute) -> Iterator[Span | None]:
+    """
+    Start a new trace (typically for each request), yield `None` if the trace is
+    not recorded (tracing disabled or not sampled).
+    """
+    tracer = _tracer
+    if tracer is None or not tracer.should_sample():
+        # Make sure the children spans are not recorded as part of an outer trace
+        token = _current_span.set(None)
+        try:
+            yield None
+        finally:
+            _current_span.reset(token)
+        return
+
+    with _record(tracer, _new_span(name, None, attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: SpanAttribute) -> Iterator[Span | None]:
+    """
+    Record a child span of the current one, yield `None` if the current trace is
+    not recorded.
+    """
+    tracer = _tracer
+    parent = _current_span.get()
+    if tracer is None or parent is None:
+        yield None
+        return
+
+    with _record(tracer, _new_span(name, parent, attributes)) as child:
+        yield child
+
+
+def record_span(name: str, duration: float, error: bool, **attributes: SpanAttribute) -> None:
+    """
+    Record a child span of the current one that just ended after `duration` seconds
+    (for operations only reporting their duration once done, e.g. the queries
+    logged by asyncpg).
+    """
+    tracer = _tracer
+    parent = _current_span.get()
+    if tracer is None or parent is None:
+        return
+
+    child = _new_span(name, parent, attributes)
+    child.end_time_ns = child.start_time_ns
+    child.start_time_ns -= int(duration * 1e9)
+    child.error = error
+    tracer.on_end(child)
@@ -139,13 +139,18 @@ impl VerifyKey {
     }
 
     /// Verify a message using the given `VerifyKey`, `Signature` and `message`
-    fn verify_with_signature(&self, signature: &[u8], message: &[u8]) -> PyResult<()> {
-        self.0
-            .verify_with_signature(
-                <&[u8; libparsec_crypto::SigningKey::SIGNATURE_SIZE]>::try_from(signature)
-                    .map_err(|_| CryptoError::new_err("Invalid signature size"))?,
-                message,
-            )
+    ///
+    /// The GIL is released during the verification, so it can be run concurrently
+    /// from worker threads.
+    fn verify_with_signature(
+        &self,
+        py: Python<'_>,
+        signature: &[u8],
+        message: &[u8],
+    ) -> PyResult<()> {
+        let signature = <&[u8; libparsec_crypto::SigningKey::SIGNATURE_SIZE]>::try_from(signature)
+            .map_err(|_| CryptoError::new_err("Invalid signature size"))?;
+        py.detach(|| self.0.verify_with_signature(signature, message))
             .map_err(|_| CryptoError::new_err("Signature was forged or corrupt"))
     }
 
@@ -0,0 +1,183 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import io
+from typing import Any, override
+
+import anyio
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from swiftclient.exceptions import ClientException
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreReadBadOutcome,
+)
+from parsec.components.s3_blockstore import S3BlockStoreComponent
+from parsec.components.swift_blockstore import SwiftBlockStoreComponent
+
+
+class SpyBlockStoreComponent(BaseBlockStoreComponent):
+    """
+    In-memory blockstore keeping track of the operations it receives.
+
+    - Set `unavailable` to simulate a node failure.
+    - Set `read_gate`/`create_gate` to block reads/creates until the event is set.
+    """
+
+    def __init__(self) -> None:
+        self.blocks: dict[tuple[OrganizationID, BlockID], bytes] = {}
+        self.reads: list[BlockID] = []
+        self.creates: list[BlockID] = []
+        self.deletes: list[BlockID] = []
+        self.unavailable = False
+        self.read_gate: anyio.Event | None = None
+        self.create_gate: anyio.Event | None = None
+
+    @override
+    async def read(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> bytes | BlockStoreReadBadOutcome:
+        self.reads.append(block_id)
+        if self.read_gate is not None:
+            await self.read_gate.wait()
+        if self.unavailable:
+            return BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+        try:
+            return self.blocks[(organization_id, block_id)]
+        except KeyError:
+            return BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+    @override
+    async def create(
+        self, organization_id: OrganizationID, block_id: BlockID, block: bytes
+    ) -> BlockStoreCreateBadOutcome | None:
+        self.creates.append(block_id)
+        if self.create_gate is not None:
+            await self.create_gate.wait()
+        if self.unavailable:
+            return BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+        self.blocks[(organization_id, block_id)] = block
+
+    @override
+    async def delete(
+        self, organization_id: OrganizationID, block_id: BlockID
+    ) -> BlockStoreDeleteBadOutcome | None:
+        self.deletes.append(block_id)
+        if self.unavailable:
+            return BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+        self.blocks.pop((organization_id, block_id), None)
+
+
+class FakeS3Client:
+    """
+    In-memory replacement of the boto3 S3 client, reporting errors (e.g. missing
+    objects) the way S3 does.
+
+    Set `unavailable` to simulate a connection failure.
+    """
+
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.unavailable = False
+
+    def _check_available(self) -> None:
+        if self.unavailable:
+            raise EndpointConnectionError(endpoint_url="https://s3.test")
+
+    def head_bucket(self, Bucket: str) -> None:
+        pass
+
+    def get_object(self, Bucket: str, Key: str) -> dict[str, Any]:
+        self._check_available()
+        try:
+            return {"Body": io.BytesIO(self.objects[Key])}
+        except KeyError:
+            raise ClientError(
+                {
+                    "Error": {"Code": "NoSuchKey", "Message": "The specified key does not exist."},
+                    "ResponseMetadata": {"HTTPStatusCode": 404},
+                },
+                "GetObject",
+            )
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:
+        self._check_available()
+        self.objects[Key] = Body
+
+    def delete_object(self, Bucket: str, Key: str) -> None:
+        self._check_available()
+        self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket: str, Delete: dict[str, Any]) -> dict[str, Any]:
+        self._check_available()
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+
+def build_s3_blockstore(
+    monkeypatch: pytest.MonkeyPatch,
+) -> tuple[S3BlockStoreComponent, FakeS3Client]:
+    client = FakeS3Client()
+    monkeypatch.setattr("boto3.client", lambda *args, **kwargs: client)
+    blockstore = S3BlockStoreComponent(
+        s3_region="region", s3_bucket="bucket", s3_key="key", s3_secret="secret"
+    )
+    return blockstore, client
+
+
+class FakeSwiftConnection:
+    """
+    In-memory replacement of the swiftclient connection, reporting errors (e.g.
+    missing objects) the way Swift does.
+
+    Set `unavailable` to simulate a server failure.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.unavailable = False
+
+    def _check_available(self) -> None:
+        if self.unavailable:
+            raise ClientException("Service Unavailable", http_status=503)
+
+    def head_container(self, container: str) -> None:
+        pass
+
+    def get_object(self, container: str, obj: str) -> tuple[dict[str, str], bytes]:
+        self._check_available()
+        try:
+            return {}, self.objects[obj]
+        except KeyError:
+            raise ClientException("Object GET failed", http_status=404)
+
+    def put_object(self, container: str, obj: str, contents: bytes) -> None:
+        self._check_available()
+        self.objects[obj] = contents
+
+    def delete_object(self, container: str, obj: str) -> None:
+        self._check_available()
+        try:
+            del self.objects[obj]
+        except KeyError:
+            raise ClientException("Object DELETE failed", http_status=404)
+
+
+def build_swift_blockstore(
+    monkeypatch: pytest.MonkeyPatch,
+) -> tuple[SwiftBlockStoreComponent, FakeSwiftConnection]:
+    connection = FakeSwiftConnection()
+    monkeypatch.setattr("swiftclient.Connection", lambda **kwargs: connection)
+    blockstore = SwiftBlockStoreComponent(
+        auth_url="https://swift.test",
+        tenant="tenant",
+        container="container",
+        user="user",
+        password="password",
+    )
+    return blockstore, connection
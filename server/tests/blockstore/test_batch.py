@@ -0,0 +1,286 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import anyio
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    COMPOSITE_SUB_BATCH_SIZE,
+    BaseBlockStoreComponent,
+    BlockStoreCreateBadOutcome,
+    BlockStoreDeleteBadOutcome,
+    BlockStoreReadBadOutcome,
+)
+from parsec.components.cache_blockstore import CacheBlockStoreComponent
+from parsec.components.raid0_blockstore import RAID0BlockStoreComponent
+from parsec.components.raid1_blockstore import RAID1BlockStoreComponent
+from parsec.components.raid5_blockstore import RAID5BlockStoreComponent
+from parsec.components.reed_solomon_blockstore import ReedSolomonBlockStoreComponent
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+def build_blockstore(kind: str, nodes: list[SpyBlockStoreComponent]) -> BaseBlockStoreComponent:
+    match kind:
+        case "single":
+            return nodes[0]
+        case "cache":
+            return CacheBlockStoreComponent(nodes[0], max_size=1024)
+        case "raid0":
+            return RAID0BlockStoreComponent(nodes)  # type: ignore[arg-type]
+        case "raid1":
+            return RAID1BlockStoreComponent(nodes)  # type: ignore[arg-type]
+        case "raid5":
+            return RAID5BlockStoreComponent(nodes)  # type: ignore[arg-type]
+        case "reed_solomon":
+            return ReedSolomonBlockStoreComponent(nodes, parity_shards=1)  # type: ignore[arg-type]
+        case unknown:
+            assert False, unknown
+
+
+async def read_many(
+    blockstore: BaseBlockStoreComponent, block_ids: list[BlockID]
+) -> dict[BlockID, bytes | BlockStoreReadBadOutcome]:
+    outcomes: dict[BlockID, bytes | BlockStoreReadBadOutcome] = {}
+    async with blockstore.read_many(ORG_ID, block_ids) as results:
+        async for block_id, outcome in results:
+            assert block_id not in outcomes
+            outcomes[block_id] = outcome
+    return outcomes
+
+
+async def create_many(
+    blockstore: BaseBlockStoreComponent, blocks: list[tuple[BlockID, bytes]]
+) -> dict[BlockID, BlockStoreCreateBadOutcome | None]:
+    outcomes: dict[BlockID, BlockStoreCreateBadOutcome | None] = {}
+    async with blockstore.create_many(ORG_ID, blocks) as results:
+        async for block_id, outcome in results:
+            assert block_id not in outcomes
+            outcomes[block_id] = outcome
+    return outcomes
+
+
+@pytest.mark.parametrize("kind", ["single", "cache", "raid0", "raid1", "raid5", "reed_solomon"])
+async def test_create_and_read_many(kind: str) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = build_blockstore(kind, nodes)
+    blocks = [(BlockID.new(), f"<block {i} data>".encode() * i) for i in range(50)]
+
+    assert await create_many(blockstore, blocks) == {block_id: None for block_id, _ in blocks}
+    # Data is consistent between single and batch operations
+    block_id, block = blocks[3]
+    assert await blockstore.read(ORG_ID, block_id) == block
+
+    missing_block_id = BlockID.new()
+    expected_missing_outcome = (
+        BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+        if kind in ("single", "cache", "raid0")
+        else BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    )
+    assert await read_many(
+        blockstore, [*(block_id for block_id, _ in blocks), missing_block_id]
+    ) == {
+        **dict(blocks),
+        missing_block_id: expected_missing_outcome,
+    }
+
+    assert await read_many(blockstore, []) == {}
+    assert await create_many(blockstore, []) == {}
+
+
+async def delete_many(
+    blockstore: BaseBlockStoreComponent, block_ids: list[BlockID]
+) -> dict[BlockID, BlockStoreDeleteBadOutcome | None]:
+    outcomes: dict[BlockID, BlockStoreDeleteBadOutcome | None] = {}
+    async with blockstore.delete_many(ORG_ID, block_ids) as results:
+        async for block_id, outcome in results:
+            assert block_id not in outcomes
+            outcomes[block_id] = outcome
+    return outcomes
+
+
+@pytest.mark.parametrize("kind", ["single", "cache", "raid0", "raid1", "raid5", "reed_solomon"])
+async def test_delete(kind: str) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = build_blockstore(kind, nodes)
+    blocks = [(BlockID.new(), f"<block {i} data>".encode()) for i in range(20)]
+    block_ids = [block_id for block_id, _ in blocks]
+    await create_many(blockstore, blocks)
+    # Populate the cache
+    for block_id in block_ids:
+        await blockstore.read(ORG_ID, block_id)
+
+    assert await blockstore.delete(ORG_ID, block_ids[0]) is None
+    # Deleting an unknown block is fine
+    unknown_block_id = BlockID.new()
+    assert await delete_many(blockstore, [*block_ids[1:], unknown_block_id]) == {
+        block_id: None for block_id in [*block_ids[1:], unknown_block_id]
+    }
+    assert all(not node.blocks for node in nodes)
+    assert all(
+        isinstance(outcome, BlockStoreReadBadOutcome)
+        for outcome in (await read_many(blockstore, block_ids)).values()
+    )
+
+
+@pytest.mark.parametrize("kind", ["raid1", "raid5", "reed_solomon"])
+async def test_delete_with_unavailable_node(kind: str) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = build_blockstore(kind, nodes)
+    block_id = BlockID.new()
+    await create_many(blockstore, [(block_id, b"<block data>")])
+
+    # Block must be removed from all the nodes
+    nodes[1].unavailable = True
+    assert await blockstore.delete(ORG_ID, block_id) == BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+    assert await delete_many(blockstore, [block_id]) == {
+        block_id: BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+    }
+
+
+async def test_duplicates_are_ignored() -> None:
+    spy = SpyBlockStoreComponent()
+    block_id = BlockID.new()
+
+    assert await create_many(spy, [(block_id, b"<block data>"), (block_id, b"<block data>")]) == {
+        block_id: None
+    }
+    assert spy.creates == [block_id]
+
+    assert await read_many(spy, [block_id, block_id]) == {block_id: b"<block data>"}
+    assert spy.reads == [block_id]
+
+
+async def test_concurrency_is_bounded() -> None:
+    spy = SpyBlockStoreComponent()
+    spy.batch_max_concurrency = 3
+    spy.read_gate = anyio.Event()
+    block_ids = [BlockID.new() for _ in range(10)]
+    for block_id in block_ids:
+        spy.blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    async with spy.read_many(ORG_ID, block_ids) as results:
+        await anyio.wait_all_tasks_blocked()
+        assert len(spy.reads) == 3
+        spy.read_gate.set()
+        assert len([outcome async for _, outcome in results]) == 10
+
+
+@pytest.mark.parametrize("kind", ["raid5", "reed_solomon"])
+async def test_composite_read_many_with_slow_node(kind: str) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = build_blockstore(kind, nodes)
+    block_ids = [BlockID.new() for _ in range(2 * COMPOSITE_SUB_BATCH_SIZE + 50)]
+    outcomes = await create_many(blockstore, [(block_id, block_id.bytes) for block_id in block_ids])
+    assert set(outcomes.values()) == {None}
+    for node in nodes:
+        node.reads.clear()
+
+    nodes[0].read_gate = anyio.Event()
+    async with blockstore.read_many(ORG_ID, block_ids) as results:
+        # Other nodes don't go further than the current sub-batch while waiting
+        # for the slow one
+        await anyio.wait_all_tasks_blocked()
+        assert len(nodes[1].reads) == COMPOSITE_SUB_BATCH_SIZE
+        nodes[0].read_gate.set()
+        assert {block_id: outcome async for block_id, outcome in results} == {
+            block_id: block_id.bytes for block_id in block_ids
+        }
+
+
+@pytest.mark.parametrize("kind", ["raid1", "raid5", "reed_solomon"])
+async def test_composite_create_many_with_slow_node(kind: str) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = build_blockstore(kind, nodes)
+    blocks = [(BlockID.new(), b"<block data>") for _ in range(2 * COMPOSITE_SUB_BATCH_SIZE + 50)]
+
+    nodes[0].create_gate = anyio.Event()
+    async with blockstore.create_many(ORG_ID, blocks) as results:
+        await anyio.wait_all_tasks_blocked()
+        assert len(nodes[1].creates) == COMPOSITE_SUB_BATCH_SIZE
+        nodes[0].create_gate.set()
+        assert {block_id: outcome async for block_id, outcome in results} == {
+            block_id: None for block_id, _ in blocks
+        }
+
+
+async def test_leaving_early_cancels_remaining_reads() -> None:
+    spy = SpyBlockStoreComponent()
+    block_ids = [BlockID.new() for _ in range(100)]
+    for block_id in block_ids:
+        spy.blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    async with spy.read_many(ORG_ID, block_ids) as results:
+        async for _ in results:
+            break
+    assert len(spy.reads) < len(block_ids)
+
+    # Errors raised by the caller are not wrapped into an exception group
+    with pytest.raises(KeyError):
+        async with spy.read_many(ORG_ID, block_ids) as results:
+            async for _ in results:
+                raise KeyError
+
+
+async def test_raid1_read_many_fallback() -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(2)]
+    blockstore = RAID1BlockStoreComponent(nodes)  # type: ignore[arg-type]
+    b1, b2 = BlockID.new(), BlockID.new()
+    nodes[0].blocks[(ORG_ID, b1)] = b"<block 1 data>"
+    nodes[1].blocks[(ORG_ID, b1)] = b"<block 1 data>"
+    nodes[1].blocks[(ORG_ID, b2)] = b"<block 2 data>"
+
+    assert await read_many(blockstore, [b1, b2]) == {b1: b"<block 1 data>", b2: b"<block 2 data>"}
+    # Second node is only queried for the block missing on the first one
+    assert set(nodes[0].reads) == {b1, b2}
+    assert nodes[1].reads == [b2]
+
+
+@pytest.mark.parametrize("partial_create_ok", [False, True])
+async def test_raid1_create_many_with_unavailable_node(partial_create_ok: bool) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(2)]
+    blockstore = RAID1BlockStoreComponent(nodes, partial_create_ok=partial_create_ok)  # type: ignore[arg-type]
+    nodes[1].unavailable = True
+    block_id = BlockID.new()
+
+    expected = None if partial_create_ok else BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+    assert await create_many(blockstore, [(block_id, b"<block data>")]) == {block_id: expected}
+
+
+async def test_raid5_read_many_degraded() -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = RAID5BlockStoreComponent(nodes)  # type: ignore[arg-type]
+    blocks = [(BlockID.new(), f"<block {i} data>".encode()) for i in range(10)]
+    assert await create_many(blockstore, blocks) == {block_id: None for block_id, _ in blocks}
+
+    # Checksum node is only used when a chunk is missing
+    assert await read_many(blockstore, [block_id for block_id, _ in blocks]) == dict(blocks)
+    assert nodes[2].reads == []
+
+    # One chunk missing, rebuilt from the checksum
+    degraded_block_id, _ = blocks[0]
+    del nodes[0].blocks[(ORG_ID, degraded_block_id)]
+    assert await read_many(blockstore, [block_id for block_id, _ in blocks]) == dict(blocks)
+    assert nodes[2].reads == [degraded_block_id]
+
+    # Two chunks missing, the block is lost
+    del nodes[1].blocks[(ORG_ID, degraded_block_id)]
+    assert await read_many(blockstore, [degraded_block_id]) == {
+        degraded_block_id: BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    }
+
+
+async def test_cache_read_many_does_not_populate_cache() -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=1024)
+    b1, b2 = BlockID.new(), BlockID.new()
+    spy.blocks = {(ORG_ID, b1): b"<block 1 data>", (ORG_ID, b2): b"<block 2 data>"}
+
+    assert await blockstore.read(ORG_ID, b1) == b"<block 1 data>"
+    spy.reads.clear()
+
+    assert await read_many(blockstore, [b1, b2]) == {b1: b"<block 1 data>", b2: b"<block 2 data>"}
+    assert spy.reads == [b2]
+    assert blockstore.size == len(b"<block 1 data>")
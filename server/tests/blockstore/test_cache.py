@@ -0,0 +1,137 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from collections.abc import Iterable
+from contextlib import AbstractAsyncContextManager
+
+import anyio
+import pytest
+from anyio.streams.memory import MemoryObjectReceiveStream
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BlockStoreReadBadOutcome, BlockStoreReadManyResult
+from parsec.components.cache_blockstore import CacheBlockStoreComponent
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+async def test_read_through() -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=1024)
+    block_id = BlockID.new()
+
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+    assert spy.blocks == {(ORG_ID, block_id): b"<block data>"}
+
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert spy.reads == [block_id]
+    assert (blockstore.hits, blockstore.misses) == (1, 1)
+    assert blockstore.size == len(b"<block data>")
+
+    # Organizations are isolated
+    other_org_id = OrganizationID("OtherOrg")
+    assert await blockstore.read(other_org_id, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+    assert spy.reads == [block_id, block_id]
+
+
+async def test_errors_are_not_cached() -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=1024)
+    block_id = BlockID.new()
+
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+    spy.blocks[(ORG_ID, block_id)] = b"<block data>"
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert spy.reads == [block_id, block_id]
+    assert blockstore.hits == 0
+
+
+async def test_lru_eviction() -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=30)
+    b1, b2, b3 = BlockID.new(), BlockID.new(), BlockID.new()
+    spy.blocks = {(ORG_ID, b1): b"1" * 10, (ORG_ID, b2): b"2" * 10, (ORG_ID, b3): b"3" * 15}
+
+    await blockstore.read(ORG_ID, b1)
+    await blockstore.read(ORG_ID, b2)
+    # Access b1 again so that b2 becomes the least recently used block
+    await blockstore.read(ORG_ID, b1)
+    await blockstore.read(ORG_ID, b3)
+    assert blockstore.evictions == 1
+    assert blockstore.size == 25
+
+    spy.reads.clear()
+    await blockstore.read(ORG_ID, b1)
+    await blockstore.read(ORG_ID, b3)
+    assert spy.reads == []
+    await blockstore.read(ORG_ID, b2)
+    assert spy.reads == [b2]
+
+
+async def test_block_bigger_than_cache() -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=10)
+    block_id = BlockID.new()
+    spy.blocks[(ORG_ID, block_id)] = b"x" * 11
+
+    assert await blockstore.read(ORG_ID, block_id) == b"x" * 11
+    assert await blockstore.read(ORG_ID, block_id) == b"x" * 11
+    assert spy.reads == [block_id, block_id]
+    assert blockstore.size == 0
+
+
+async def test_concurrent_reads_are_coalesced() -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=1024)
+    block_id = BlockID.new()
+    spy.blocks[(ORG_ID, block_id)] = b"<block data>"
+    spy.read_gate = anyio.Event()
+    results = []
+
+    async def _read() -> None:
+        results.append(await blockstore.read(ORG_ID, block_id))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(5):
+            tg.start_soon(_read)
+        await anyio.wait_all_tasks_blocked()
+        spy.read_gate.set()
+
+    assert results == [b"<block data>"] * 5
+    assert spy.reads == [block_id]
+    assert (blockstore.hits, blockstore.misses) == (4, 1)
+
+
+async def test_read_many(monkeypatch: pytest.MonkeyPatch) -> None:
+    spy = SpyBlockStoreComponent()
+    blockstore = CacheBlockStoreComponent(spy, max_size=1024)
+    b1, b2 = BlockID.new(), BlockID.new()
+    spy.blocks = {(ORG_ID, b1): b"<block 1 data>", (ORG_ID, b2): b"<block 2 data>"}
+    read_many_calls: list[list[BlockID]] = []
+    spy_read_many = spy.read_many
+
+    def _read_many(
+        organization_id: OrganizationID, block_ids: Iterable[BlockID]
+    ) -> AbstractAsyncContextManager[MemoryObjectReceiveStream[BlockStoreReadManyResult]]:
+        block_ids = list(block_ids)
+        read_many_calls.append(block_ids)
+        return spy_read_many(organization_id, block_ids)
+
+    monkeypatch.setattr(spy, "read_many", _read_many)
+
+    assert await blockstore.read(ORG_ID, b1) == b"<block 1 data>"
+
+    # Only the missing block is read from the blockstore...
+    async with blockstore.read_many(ORG_ID, [b1, b2]) as results:
+        outcomes = {block_id: outcome async for block_id, outcome in results}
+    assert outcomes == {b1: b"<block 1 data>", b2: b"<block 2 data>"}
+    assert read_many_calls == [[b2]]
+
+    # ...and nothing at all when all blocks are in the cache
+    assert await blockstore.read(ORG_ID, b2) == b"<block 2 data>"
+    async with blockstore.read_many(ORG_ID, [b1, b2]) as results:
+        outcomes = {block_id: outcome async for block_id, outcome in results}
+    assert outcomes == {b1: b"<block 1 data>", b2: b"<block 2 data>"}
+    assert read_many_calls == [[b2]]
@@ -0,0 +1,162 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import os
+
+import anyio
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BaseBlockStoreComponent, BlockStoreReadBadOutcome
+from parsec.components.circuit_breaker_blockstore import (
+    CircuitBreakerBlockStoreComponent,
+    CircuitBreakerState,
+)
+from parsec.components.raid5_blockstore import RAID5BlockStoreComponent
+from parsec.components.reed_solomon_blockstore import ReedSolomonBlockStoreComponent
+from tests.blockstore.common import (
+    SpyBlockStoreComponent,
+    build_s3_blockstore,
+    build_swift_blockstore,
+)
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+async def test_open_and_probe() -> None:
+    node = SpyBlockStoreComponent()
+    breaker = CircuitBreakerBlockStoreComponent(
+        node, name="node", failure_threshold=3, reset_timeout=0.05
+    )
+    block_id = BlockID.new()
+    node.blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    # Block not found is not a failure
+    assert await breaker.read(ORG_ID, BlockID.new()) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+    node.unavailable = True
+    for _ in range(3):
+        assert breaker.state == CircuitBreakerState.CLOSED
+        assert await breaker.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    assert breaker.state == CircuitBreakerState.OPEN
+    assert not breaker.is_available()
+    assert breaker.trips == 1
+
+    # Requests fail right away without reaching the node
+    assert await breaker.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    assert len(node.reads) == 4
+
+    # Failed probe opens the circuit again
+    await anyio.sleep(0.05)
+    assert breaker.state == CircuitBreakerState.HALF_OPEN
+    assert breaker.is_available()
+    assert await breaker.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    assert len(node.reads) == 5
+    assert breaker.state == CircuitBreakerState.OPEN
+
+    # Successful probe closes the circuit
+    await anyio.sleep(0.05)
+    node.unavailable = False
+    assert await breaker.read(ORG_ID, block_id) == b"<block data>"
+    assert breaker.state == CircuitBreakerState.CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+@pytest.mark.parametrize("backend", ["s3", "swift"])
+async def test_missing_objects_are_not_failures(
+    backend: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    build_node = {"s3": build_s3_blockstore, "swift": build_swift_blockstore}[backend]
+    node, client = build_node(monkeypatch)
+    breaker = CircuitBreakerBlockStoreComponent(node, name="node", failure_threshold=3)
+
+    for _ in range(5):
+        assert await breaker.read(ORG_ID, BlockID.new()) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+    assert breaker.state == CircuitBreakerState.CLOSED
+    assert breaker.consecutive_failures == 0
+
+    client.unavailable = True
+    for _ in range(3):
+        assert (
+            await breaker.read(ORG_ID, BlockID.new()) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+        )
+    assert breaker.state == CircuitBreakerState.OPEN
+
+
+async def test_single_probe_at_a_time() -> None:
+    node = SpyBlockStoreComponent()
+    breaker = CircuitBreakerBlockStoreComponent(node, name="node", failure_threshold=1)
+    block_id = BlockID.new()
+    node.blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    node.unavailable = True
+    assert await breaker.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    breaker.reset_timeout = 0
+    node.unavailable = False
+    node.read_gate = anyio.Event()
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(breaker.read, ORG_ID, block_id)
+        await anyio.wait_all_tasks_blocked()
+        # Probe is in progress
+        assert not breaker.is_available()
+        assert await breaker.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+        node.read_gate.set()
+
+    assert breaker.state == CircuitBreakerState.CLOSED
+    assert len(node.reads) == 2
+
+
+async def test_read_many_when_open() -> None:
+    node = SpyBlockStoreComponent()
+    breaker = CircuitBreakerBlockStoreComponent(node, name="node", failure_threshold=2)
+    block_ids = [BlockID.new() for _ in range(3)]
+
+    node.unavailable = True
+    async with breaker.read_many(ORG_ID, block_ids) as results:
+        outcomes = [outcome async for _, outcome in results]
+    assert outcomes == [BlockStoreReadBadOutcome.STORE_UNAVAILABLE] * 3
+    assert breaker.state == CircuitBreakerState.OPEN
+
+    node.reads.clear()
+    async with breaker.read_many(ORG_ID, block_ids) as results:
+        outcomes = [outcome async for _, outcome in results]
+    assert outcomes == [BlockStoreReadBadOutcome.STORE_UNAVAILABLE] * 3
+    assert node.reads == []
+
+
+def trip(breaker: CircuitBreakerBlockStoreComponent) -> None:
+    breaker.consecutive_failures = breaker.failure_threshold - 1
+    breaker._record(failed=True)  # pyright: ignore[reportPrivateUsage]
+    assert breaker.state == CircuitBreakerState.OPEN
+
+
+@pytest.mark.parametrize("kind", ["raid5", "reed_solomon"])
+async def test_skip_known_down_node(kind: str) -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(4)]
+    breakers = [
+        CircuitBreakerBlockStoreComponent(node, name=f"node {index}")
+        for index, node in enumerate(nodes)
+    ]
+    blockstore: BaseBlockStoreComponent
+    match kind:
+        case "raid5":
+            blockstore = RAID5BlockStoreComponent(breakers)  # type: ignore[arg-type]
+        case "reed_solomon":
+            blockstore = ReedSolomonBlockStoreComponent(breakers, parity_shards=1)  # type: ignore[arg-type]
+        case unknown:
+            assert False, unknown
+    block_id = BlockID.new()
+    block = os.urandom(1000)
+    assert await blockstore.create(ORG_ID, block_id, block) is None
+
+    # Nodes are read concurrently: a node known to be down is not waited for,
+    # instead the parity is fetched right away
+    nodes[1].read_gate = anyio.Event()
+    trip(breakers[1])
+    with anyio.fail_after(1):
+        assert await blockstore.read(ORG_ID, block_id) == block
+        async with blockstore.read_many(ORG_ID, [block_id]) as results:
+            assert [outcome async for _, outcome in results] == [block]
+    assert nodes[1].reads == []
+    assert nodes[3].reads == [block_id, block_id]
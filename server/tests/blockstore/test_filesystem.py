@@ -0,0 +1,101 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BlockStoreReadBadOutcome, blockstore_factory
+from parsec.components.filesystem_blockstore import (
+    FilesystemBlockStoreComponent,
+    build_filesystem_path,
+)
+from parsec.components.raid5_blockstore import RAID5BlockStoreComponent
+from parsec.config import (
+    FilesystemBlockStoreConfig,
+    FilesystemBlockStoreDurability,
+    RAID5BlockStoreConfig,
+)
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+@pytest.mark.parametrize("durability", FilesystemBlockStoreDurability)
+async def test_create_and_read(tmp_path: Path, durability: FilesystemBlockStoreDurability) -> None:
+    blockstore = FilesystemBlockStoreComponent(tmp_path, durability=durability)
+    block_id = BlockID.new()
+
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+
+    path = build_filesystem_path(tmp_path, ORG_ID, block_id)
+    assert path.read_bytes() == b"<block data>"
+    # No temporary file left behind
+    assert list(path.parent.iterdir()) == [path]
+
+    # Create is idempotent
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+
+
+async def test_delete(tmp_path: Path) -> None:
+    blockstore = FilesystemBlockStoreComponent(tmp_path)
+    block_id = BlockID.new()
+
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+    assert await blockstore.delete(ORG_ID, block_id) is None
+    assert not build_filesystem_path(tmp_path, ORG_ID, block_id).exists()
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+    # Delete is idempotent
+    assert await blockstore.delete(ORG_ID, block_id) is None
+
+
+async def test_empty_block(tmp_path: Path) -> None:
+    blockstore = FilesystemBlockStoreComponent(tmp_path)
+    block_id = BlockID.new()
+
+    assert await blockstore.create(ORG_ID, block_id, b"") is None
+    assert await blockstore.read(ORG_ID, block_id) == b""
+
+
+async def test_organizations_are_isolated(tmp_path: Path) -> None:
+    blockstore = FilesystemBlockStoreComponent(tmp_path)
+    block_id = BlockID.new()
+
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+    assert (
+        await blockstore.read(OrganizationID("OtherOrg"), block_id)
+        == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+    )
+
+
+def test_missing_root_directory(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        FilesystemBlockStoreComponent(tmp_path / "dummy")
+
+
+async def test_as_raid_member(tmp_path: Path) -> None:
+    nodes = [tmp_path / str(i) for i in range(3)]
+    for node in nodes:
+        node.mkdir()
+
+    async with blockstore_factory(
+        RAID5BlockStoreConfig(
+            blockstores=[FilesystemBlockStoreConfig(path=str(node)) for node in nodes]
+        )
+    ) as blockstore:
+        assert isinstance(blockstore, RAID5BlockStoreComponent)
+
+        block_id = BlockID.new()
+        block = b"<block data>" * 100
+        assert await blockstore.create(ORG_ID, block_id, block) is None
+        assert await blockstore.read(ORG_ID, block_id) == block
+
+    # Each node only stores a chunk of the block
+    for node in nodes:
+        chunk = build_filesystem_path(node, ORG_ID, block_id).read_bytes()
+        assert len(chunk) < len(block)
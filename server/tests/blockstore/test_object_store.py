@@ -0,0 +1,79 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BaseBlockStoreComponent, BlockStoreReadBadOutcome
+from parsec.components.raid0_blockstore import RAID0BlockStoreComponent, RAID0Layout
+from parsec.config import RAID0BlockStorePlacement
+from tests.blockstore.common import build_s3_blockstore, build_swift_blockstore
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+def build_blockstore(
+    kind: str, monkeypatch: pytest.MonkeyPatch
+) -> tuple[BaseBlockStoreComponent, Any]:
+    match kind:
+        case "s3":
+            return build_s3_blockstore(monkeypatch)
+        case "swift":
+            return build_swift_blockstore(monkeypatch)
+        case unknown:
+            assert False, unknown
+
+
+@pytest.mark.parametrize("kind", ("s3", "swift"))
+async def test_read(kind: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    blockstore, client = build_blockstore(kind, monkeypatch)
+    block_id = BlockID.new()
+
+    # Missing object is reported as such, and not as a store failure
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+
+    client.unavailable = True
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+
+    client.unavailable = False
+    assert await blockstore.delete(ORG_ID, block_id) is None
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+
+@pytest.mark.parametrize("kind", ("s3", "swift"))
+async def test_raid0_rebalance(kind: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    # A third node has been added to a 2 nodes cluster
+    nodes = [build_blockstore(kind, monkeypatch)[0] for _ in range(3)]
+    blockstore = RAID0BlockStoreComponent(
+        nodes,
+        placement=RAID0BlockStorePlacement.CONSISTENT_HASHING,
+        previous_layout=RAID0Layout(RAID0BlockStorePlacement.CONSISTENT_HASHING, 2),
+    )
+    block_ids = []
+    while len(block_ids) < 5:
+        block_id = BlockID.new()
+        if blockstore.layout.get_node(block_id) == 2:
+            block_ids.append(block_id)
+    for block_id in block_ids:
+        previous = nodes[blockstore.previous_layout.get_node(block_id)]  # type: ignore[union-attr]
+        assert await previous.create(ORG_ID, block_id, block_id.bytes) is None
+
+    # Blocks not moved yet are read from their previous node
+    for block_id in block_ids:
+        assert await blockstore.read(ORG_ID, block_id) == block_id.bytes
+    async with blockstore.read_many(ORG_ID, block_ids) as results:
+        assert {block_id: outcome async for block_id, outcome in results} == {
+            block_id: block_id.bytes for block_id in block_ids
+        }
+
+    # Rebalance is interrupted, then resumed from the start
+    assert await blockstore.rebalance(ORG_ID, block_ids[0]) is True
+    for block_id in block_ids:
+        assert await blockstore.rebalance(ORG_ID, block_id) is (block_id != block_ids[0])
+    for block_id in block_ids:
+        assert await blockstore.read(ORG_ID, block_id) == block_id.bytes
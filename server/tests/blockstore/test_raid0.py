@@ -0,0 +1,130 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BlockStoreReadBadOutcome
+from parsec.components.raid0_blockstore import (
+    RAID0BlockStoreComponent,
+    RAID0BlockStoreRebalanceBadOutcome,
+    RAID0Layout,
+)
+from parsec.config import RAID0BlockStorePlacement
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+@pytest.mark.parametrize("placement", RAID0BlockStorePlacement)
+def test_placement_distribution(placement: RAID0BlockStorePlacement) -> None:
+    layout = RAID0Layout(placement, 4)
+    block_ids = [BlockID.new() for _ in range(4000)]
+    counts = [0] * 4
+    for block_id in block_ids:
+        counts[layout.get_node(block_id)] += 1
+    assert all(600 < count < 1400 for count in counts), counts
+
+
+def test_consistent_hashing_only_moves_blocks_to_new_node() -> None:
+    previous = RAID0Layout(RAID0BlockStorePlacement.CONSISTENT_HASHING, 4)
+    current = RAID0Layout(RAID0BlockStorePlacement.CONSISTENT_HASHING, 5)
+    block_ids = [BlockID.new() for _ in range(5000)]
+
+    moved = [
+        block_id
+        for block_id in block_ids
+        if previous.get_node(block_id) != current.get_node(block_id)
+    ]
+    assert all(current.get_node(block_id) == 4 for block_id in moved)
+    # Roughly 1/5 of the blocks are moved (to be compared with the 4/5 moved by modulo)
+    assert 0.1 < len(moved) / len(block_ids) < 0.3
+
+
+def build_blockstore() -> tuple[RAID0BlockStoreComponent, list[SpyBlockStoreComponent]]:
+    # A fifth node has been added to a 4 nodes cluster
+    nodes = [SpyBlockStoreComponent() for _ in range(5)]
+    blockstore = RAID0BlockStoreComponent(
+        nodes,  # type: ignore[arg-type]
+        placement=RAID0BlockStorePlacement.CONSISTENT_HASHING,
+        previous_layout=RAID0Layout(RAID0BlockStorePlacement.CONSISTENT_HASHING, 4),
+    )
+    return blockstore, nodes
+
+
+def new_moved_block_id(blockstore: RAID0BlockStoreComponent) -> tuple[BlockID, int, int]:
+    assert blockstore.previous_layout is not None
+    while True:
+        block_id = BlockID.new()
+        previous_node = blockstore.previous_layout.get_node(block_id)
+        node = blockstore.layout.get_node(block_id)
+        if previous_node != node:
+            return block_id, previous_node, node
+
+
+async def test_read_falls_back_to_previous_node() -> None:
+    blockstore, nodes = build_blockstore()
+    block_id, previous_node, node = new_moved_block_id(blockstore)
+    nodes[previous_node].blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert nodes[node].reads == [block_id]
+    assert nodes[previous_node].reads == [block_id]
+
+    async with blockstore.read_many(ORG_ID, [block_id]) as results:
+        assert [outcome async for _, outcome in results] == [b"<block data>"]
+
+    del nodes[previous_node].blocks[(ORG_ID, block_id)]
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+
+async def test_rebalance() -> None:
+    blockstore, nodes = build_blockstore()
+    block_id, previous_node, node = new_moved_block_id(blockstore)
+    nodes[previous_node].blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    nodes[node].unavailable = True
+    assert (
+        await blockstore.rebalance(ORG_ID, block_id)
+        == RAID0BlockStoreRebalanceBadOutcome.STORE_UNAVAILABLE
+    )
+    # Block is left untouched on its previous node
+    assert nodes[previous_node].blocks == {(ORG_ID, block_id): b"<block data>"}
+
+    nodes[node].unavailable = False
+    assert await blockstore.rebalance(ORG_ID, block_id) is True
+    assert nodes[previous_node].blocks == {}
+    assert nodes[node].blocks == {(ORG_ID, block_id): b"<block data>"}
+
+    # Already moved
+    assert await blockstore.rebalance(ORG_ID, block_id) is False
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+
+
+async def test_delete_on_both_nodes() -> None:
+    blockstore, nodes = build_blockstore()
+    block_id, previous_node, node = new_moved_block_id(blockstore)
+    nodes[previous_node].blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    assert await blockstore.delete(ORG_ID, block_id) is None
+    assert nodes[previous_node].deletes == [block_id]
+    assert nodes[node].deletes == [block_id]
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+
+async def test_read_falls_back_to_previous_node_when_unavailable() -> None:
+    blockstore, nodes = build_blockstore()
+    block_id, previous_node, node = new_moved_block_id(blockstore)
+    nodes[node].unavailable = True
+
+    # The block may still be on its (unavailable) new node
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+    async with blockstore.read_many(ORG_ID, [block_id]) as results:
+        assert [outcome async for _, outcome in results] == [
+            BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+        ]
+
+    nodes[previous_node].blocks[(ORG_ID, block_id)] = b"<block data>"
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    async with blockstore.read_many(ORG_ID, [block_id]) as results:
+        assert [outcome async for _, outcome in results] == [b"<block data>"]
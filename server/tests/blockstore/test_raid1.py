@@ -0,0 +1,84 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import anyio
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BlockStoreReadBadOutcome
+from parsec.components.raid1_blockstore import LATENCY_MIN_SAMPLES, RAID1BlockStoreComponent
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+def build_blockstore(
+    latencies: list[float], hedged_read_percentile: float | None = 95.0
+) -> tuple[RAID1BlockStoreComponent, list[SpyBlockStoreComponent], BlockID]:
+    nodes = [SpyBlockStoreComponent() for _ in latencies]
+    blockstore = RAID1BlockStoreComponent(
+        nodes,  # type: ignore[arg-type]
+        hedged_read_percentile=hedged_read_percentile,
+    )
+    block_id = BlockID.new()
+    for index, latency in enumerate(latencies):
+        nodes[index].blocks[(ORG_ID, block_id)] = b"<block data>"
+        for _ in range(LATENCY_MIN_SAMPLES):
+            blockstore.latencies[index].record(latency)
+    return blockstore, nodes, block_id
+
+
+async def test_read_from_all_nodes_until_latencies_are_known() -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = RAID1BlockStoreComponent(nodes)  # type: ignore[arg-type]
+    block_id = BlockID.new()
+    nodes[2].blocks[(ORG_ID, block_id)] = b"<block data>"
+
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert [node.reads for node in nodes] == [[block_id], [block_id], [block_id]]
+    assert all(latency.ewma is not None for latency in blockstore.latencies)
+
+
+async def test_read_from_fastest_node() -> None:
+    blockstore, nodes, block_id = build_blockstore([0.5, 0.1, 0.3])
+
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert [len(node.reads) for node in nodes] == [0, 1, 0]
+
+
+async def test_failed_read_falls_back_to_next_fastest_node() -> None:
+    blockstore, nodes, block_id = build_blockstore([0.5, 0.1, 0.3])
+    nodes[1].unavailable = True
+
+    assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    assert [len(node.reads) for node in nodes] == [0, 1, 1]
+    # Failing node is pushed back
+    latency = blockstore.latencies[1].ewma
+    assert latency is not None
+    assert latency > 0.1
+
+    for node in nodes:
+        node.unavailable = True
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+
+
+async def test_hedged_read() -> None:
+    blockstore, nodes, block_id = build_blockstore([0.001, 0.002])
+    # Fastest node is stuck
+    nodes[0].read_gate = anyio.Event()
+
+    with anyio.fail_after(1):
+        assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+    # Hedged read has won, the stuck read has been cancelled
+    assert [len(node.reads) for node in nodes] == [1, 1]
+    latency = blockstore.latencies[0].ewma
+    assert latency is not None
+    assert latency > 0.001
+
+
+async def test_hedged_read_disabled() -> None:
+    blockstore, nodes, block_id = build_blockstore([0.001, 0.002], hedged_read_percentile=None)
+    nodes[0].read_gate = anyio.Event()
+
+    with anyio.move_on_after(0.1):
+        await blockstore.read(ORG_ID, block_id)
+    assert [len(node.reads) for node in nodes] == [1, 0]
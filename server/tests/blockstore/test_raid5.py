@@ -0,0 +1,56 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import os
+import struct
+
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.raid5_blockstore import (
+    RAID5BlockStoreComponent,
+    generate_checksum_chunk,
+    rebuild_block_from_chunks,
+    split_block_in_chunks,
+)
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+@pytest.mark.parametrize("nb_chunks", [1, 2, 3, 4])
+@pytest.mark.parametrize("block_len", [0, 1, 3, 7, 8, 1023, 1024])
+def test_split_and_rebuild(nb_chunks: int, block_len: int) -> None:
+    block = os.urandom(block_len)
+    chunks = split_block_in_chunks(block, nb_chunks)
+
+    # Chunks are the slices of the padded payload
+    assert len(chunks) == nb_chunks
+    assert len({len(chunk) for chunk in chunks}) == 1
+    payload = b"".join(chunks)
+    assert payload.startswith(struct.pack("!I", block_len) + block)
+    assert payload[4 + block_len :] == b"\x00" * (len(payload) - 4 - block_len)
+
+    assert rebuild_block_from_chunks(list(chunks), None) == block
+
+    # Any single missing chunk can be rebuilt from the checksum
+    checksum = generate_checksum_chunk(chunks)
+    for missing in range(nb_chunks):
+        degraded_chunks: list[bytes | None] = list(chunks)
+        degraded_chunks[missing] = None
+        assert rebuild_block_from_chunks(degraded_chunks, checksum) == block
+
+
+async def test_degraded_read() -> None:
+    nodes = [SpyBlockStoreComponent() for _ in range(3)]
+    blockstore = RAID5BlockStoreComponent(nodes)  # type: ignore[arg-type]
+    block_id = BlockID.new()
+    block = os.urandom(1024)
+    assert await blockstore.create(ORG_ID, block_id, block) is None
+
+    assert await blockstore.read(ORG_ID, block_id) == block
+    assert nodes[2].reads == []
+
+    nodes[1].unavailable = True
+    assert await blockstore.read(ORG_ID, block_id) == block
+    assert nodes[2].reads == [block_id]
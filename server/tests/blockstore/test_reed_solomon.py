@@ -0,0 +1,105 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import os
+from itertools import combinations
+
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BlockStoreCreateBadOutcome, BlockStoreReadBadOutcome
+from parsec.components.reed_solomon_blockstore import (
+    ReedSolomonBlockStoreComponent,
+    decode_data_shards,
+    encode_parity_shards,
+)
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+@pytest.mark.parametrize("data_shards, parity_shards", [(1, 1), (2, 1), (4, 2), (3, 3)])
+def test_decode_from_any_shards(data_shards: int, parity_shards: int) -> None:
+    data = [os.urandom(64) for _ in range(data_shards)]
+    shards = [*data, *encode_parity_shards(data, parity_shards)]
+    assert len(shards) == data_shards + parity_shards
+
+    for shard_indexes in combinations(range(len(shards)), data_shards):
+        available = {index: shards[index] for index in shard_indexes}
+        assert decode_data_shards(available, data_shards, parity_shards) == data
+
+
+def build_blockstore(
+    partial_create_ok: bool = False,
+) -> tuple[ReedSolomonBlockStoreComponent, list[SpyBlockStoreComponent]]:
+    # 4 data shards + 2 parity shards
+    nodes = [SpyBlockStoreComponent() for _ in range(6)]
+    blockstore = ReedSolomonBlockStoreComponent(
+        nodes,  # type: ignore[arg-type]
+        parity_shards=2,
+        partial_create_ok=partial_create_ok,
+    )
+    return blockstore, nodes
+
+
+async def test_read_with_failed_nodes() -> None:
+    blockstore, nodes = build_blockstore()
+    block_id = BlockID.new()
+    block = os.urandom(1000)
+    assert await blockstore.create(ORG_ID, block_id, block) is None
+    # Shards are a quarter of the block
+    assert all(len(shard) == 251 for shard in (node.blocks[(ORG_ID, block_id)] for node in nodes))
+
+    # Parity shards are only fetched when needed
+    assert await blockstore.read(ORG_ID, block_id) == block
+    assert [len(node.reads) for node in nodes] == [1, 1, 1, 1, 0, 0]
+
+    nodes[1].unavailable = True
+    assert await blockstore.read(ORG_ID, block_id) == block
+    assert [len(node.reads) for node in nodes] == [2, 2, 2, 2, 1, 0]
+
+    nodes[4].unavailable = True
+    assert await blockstore.read(ORG_ID, block_id) == block
+
+    nodes[2].unavailable = True
+    assert await blockstore.read(ORG_ID, block_id) == BlockStoreReadBadOutcome.STORE_UNAVAILABLE
+
+
+@pytest.mark.parametrize("partial_create_ok", [False, True])
+async def test_create_with_failed_nodes(partial_create_ok: bool) -> None:
+    blockstore, nodes = build_blockstore(partial_create_ok=partial_create_ok)
+    nodes[0].unavailable = True
+    nodes[5].unavailable = True
+
+    expected = None if partial_create_ok else BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+    assert await blockstore.create(ORG_ID, BlockID.new(), b"<block data>") == expected
+
+    nodes[3].unavailable = True
+    assert (
+        await blockstore.create(ORG_ID, BlockID.new(), b"<block data>")
+        == BlockStoreCreateBadOutcome.STORE_UNAVAILABLE
+    )
+
+
+async def test_read_many_with_failed_nodes() -> None:
+    blockstore, nodes = build_blockstore()
+    blocks = {BlockID.new(): os.urandom(i * 10) for i in range(10)}
+    async with blockstore.create_many(ORG_ID, list(blocks.items())) as results:
+        assert [outcome async for _, outcome in results] == [None] * len(blocks)
+
+    block_ids = list(blocks)
+    lost_block_id = block_ids[0]
+    degraded_block_id = block_ids[1]
+    for node in nodes[:3]:
+        del node.blocks[(ORG_ID, lost_block_id)]
+    del nodes[2].blocks[(ORG_ID, degraded_block_id)]
+
+    async with blockstore.read_many(ORG_ID, block_ids) as results:
+        outcomes = {block_id: outcome async for block_id, outcome in results}
+    assert outcomes == {
+        **blocks,
+        lost_block_id: BlockStoreReadBadOutcome.STORE_UNAVAILABLE,
+    }
+    # Parity shards are only fetched for the blocks missing data shards
+    assert nodes[4].reads == [lost_block_id, degraded_block_id]
+    assert nodes[5].reads == [lost_block_id]
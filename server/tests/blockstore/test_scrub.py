@@ -0,0 +1,130 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import (
+    BaseBlockStoreComponent,
+    BlockStoreScrubBadOutcome,
+    BlockStoreScrubOutcome,
+)
+from parsec.components.raid1_blockstore import RAID1BlockStoreComponent
+from parsec.components.raid5_blockstore import RAID5BlockStoreComponent
+from parsec.components.reed_solomon_blockstore import ReedSolomonBlockStoreComponent
+from tests.blockstore.common import (
+    SpyBlockStoreComponent,
+    build_s3_blockstore,
+    build_swift_blockstore,
+)
+
+ORG_ID = OrganizationID("CoolOrg")
+
+
+def build_raid_blockstore(
+    kind: str, nodes: list[BaseBlockStoreComponent]
+) -> BaseBlockStoreComponent:
+    match kind:
+        case "raid1":
+            return RAID1BlockStoreComponent(nodes)
+        case "raid5":
+            return RAID5BlockStoreComponent(nodes)
+        case "reed_solomon":
+            return ReedSolomonBlockStoreComponent(nodes, parity_shards=2)
+        case unknown:
+            assert False, unknown
+
+
+NODES_COUNT = {"raid1": 3, "raid5": 3, "reed_solomon": 5}
+
+
+def build_blockstore(kind: str) -> tuple[BaseBlockStoreComponent, list[SpyBlockStoreComponent]]:
+    nodes = [SpyBlockStoreComponent() for _ in range(NODES_COUNT[kind])]
+    return build_raid_blockstore(kind, nodes), nodes  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize("kind", ["raid1", "raid5", "reed_solomon"])
+async def test_scrub(kind: str) -> None:
+    blockstore, nodes = build_blockstore(kind)
+    block_id = BlockID.new()
+    block = os.urandom(1000)
+    assert await blockstore.create(ORG_ID, block_id, block) is None
+    key = (ORG_ID, block_id)
+    expected = [node.blocks[key] for node in nodes]
+
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubOutcome.HEALTHY
+
+    # Missing copy/chunk is rebuilt
+    del nodes[0].blocks[key]
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubOutcome.REPAIRED
+    assert [node.blocks[key] for node in nodes] == expected
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubOutcome.HEALTHY
+
+    # Unreachable nodes prevent from checking the block
+    nodes[1].unavailable = True
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+    nodes[1].unavailable = False
+
+    # Not enough copies/chunks left
+    lost = {"raid1": 3, "raid5": 2, "reed_solomon": 3}[kind]
+    for node in nodes[:lost]:
+        del node.blocks[key]
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubBadOutcome.BLOCK_LOST
+
+
+@pytest.mark.parametrize("backend", ["s3", "swift"])
+@pytest.mark.parametrize("kind", ["raid1", "raid5", "reed_solomon"])
+async def test_scrub_object_store_nodes(
+    kind: str, backend: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    build_node = {"s3": build_s3_blockstore, "swift": build_swift_blockstore}[backend]
+    nodes, clients = zip(*(build_node(monkeypatch) for _ in range(NODES_COUNT[kind])))
+    blockstore = build_raid_blockstore(kind, list(nodes))
+    block_id = BlockID.new()
+    assert await blockstore.create(ORG_ID, block_id, os.urandom(1000)) is None
+    expected = [dict(client.objects) for client in clients]
+
+    # The node reports the missing object (and not a failure), so it is repaired
+    clients[0].objects.clear()
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubOutcome.REPAIRED
+    assert [client.objects for client in clients] == expected
+
+    clients[1].unavailable = True
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubBadOutcome.STORE_UNAVAILABLE
+
+
+async def test_raid1_divergent_replicas() -> None:
+    blockstore, nodes = build_blockstore("raid1")
+    block_id = BlockID.new()
+    key = (ORG_ID, block_id)
+    assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+
+    # Majority wins
+    nodes[2].blocks[key] = b"<corrupted>"
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubOutcome.REPAIRED
+    assert nodes[2].blocks[key] == b"<block data>"
+    assert nodes[2].deletes == [block_id]
+
+    # No majority
+    nodes[1].blocks[key] = b"<corrupted>"
+    del nodes[2].blocks[key]
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubBadOutcome.BLOCK_CORRUPTED
+    assert nodes[0].blocks[key] == b"<block data>"
+
+
+@pytest.mark.parametrize("kind", ["raid5", "reed_solomon"])
+async def test_corrupted_chunk(kind: str) -> None:
+    blockstore, nodes = build_blockstore(kind)
+    block_id = BlockID.new()
+    key = (ORG_ID, block_id)
+    assert await blockstore.create(ORG_ID, block_id, os.urandom(1000)) is None
+
+    chunk = bytearray(nodes[1].blocks[key])
+    chunk[10] ^= 0xFF
+    nodes[1].blocks[key] = bytes(chunk)
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubBadOutcome.BLOCK_CORRUPTED
+
+    nodes[1].blocks[key] = b"<too short>"
+    assert await blockstore.scrub(ORG_ID, block_id) == BlockStoreScrubBadOutcome.BLOCK_CORRUPTED
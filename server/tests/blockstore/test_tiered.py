@@ -0,0 +1,247 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import anyio
+import pytest
+
+from parsec._parsec import BlockID, OrganizationID
+from parsec.components.blockstore import BlockStoreDeleteBadOutcome, BlockStoreReadBadOutcome
+from parsec.components.filesystem_blockstore import (
+    FilesystemBlockStoreComponent,
+    build_filesystem_path,
+)
+from parsec.components.tiered_blockstore import (
+    TieredBlockStoreComponent,
+    build_dirty_marker_path,
+)
+from tests.blockstore.common import SpyBlockStoreComponent
+
+ORG_ID = OrganizationID("CoolOrg")
+
+type TieredFactory = Callable[..., TieredBlockStoreComponent]
+
+
+async def wait_for(predicate: Callable[[], bool]) -> None:
+    # Background operations on the hot tier are run in worker threads, hence
+    # `anyio.wait_all_tasks_blocked` is not enough to wait for them.
+    for _ in range(100):
+        if predicate():
+            return
+        await anyio.sleep(0.01)
+    assert predicate()
+
+
+@asynccontextmanager
+async def tiered_factory(tmp_path: Path) -> AsyncIterator[TieredFactory]:
+    async with anyio.create_task_group() as task_group:
+
+        def _factory(
+            cold: SpyBlockStoreComponent, max_size: int = 1024, **kwargs: object
+        ) -> TieredBlockStoreComponent:
+            return TieredBlockStoreComponent(
+                FilesystemBlockStoreComponent(tmp_path),
+                cold,
+                task_group,
+                max_size=max_size,
+                **kwargs,  # type: ignore[arg-type]
+            )
+
+        yield _factory
+        task_group.cancel_scope.cancel()
+
+
+async def test_write_through(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold)
+        block_id = BlockID.new()
+
+        assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+        assert cold.blocks == {(ORG_ID, block_id): b"<block data>"}
+        assert build_filesystem_path(tmp_path, ORG_ID, block_id).read_bytes() == b"<block data>"
+
+        # Served by the hot tier
+        assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+        assert cold.reads == []
+        assert (blockstore.hits, blockstore.misses) == (1, 0)
+
+
+async def test_write_through_cold_tier_failure(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    cold.unavailable = True
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold)
+        block_id = BlockID.new()
+
+        assert await blockstore.create(ORG_ID, block_id, b"<block data>") is not None
+
+
+async def test_promote_on_read(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    block_id = BlockID.new()
+    cold.blocks[(ORG_ID, block_id)] = b"<block data>"
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold)
+
+        assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+        await wait_for(lambda: blockstore.size > 0)
+        assert build_filesystem_path(tmp_path, ORG_ID, block_id).read_bytes() == b"<block data>"
+
+        assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+        assert cold.reads == [block_id]
+        assert (blockstore.hits, blockstore.misses) == (1, 1)
+
+
+async def test_read_many_does_not_promote(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    b1, b2 = BlockID.new(), BlockID.new()
+    cold.blocks[(ORG_ID, b2)] = b"<block 2 data>"
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold)
+        assert await blockstore.create(ORG_ID, b1, b"<block 1 data>") is None
+        cold.reads.clear()
+
+        async with blockstore.read_many(ORG_ID, [b1, b2]) as results:
+            outcomes = {block_id: outcome async for block_id, outcome in results}
+        assert outcomes == {b1: b"<block 1 data>", b2: b"<block 2 data>"}
+        assert cold.reads == [b2]
+        assert (blockstore.hits, blockstore.misses) == (1, 1)
+
+        await anyio.wait_all_tasks_blocked()
+        assert blockstore.size == len(b"<block 1 data>")
+
+
+async def test_read_not_found(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold)
+
+        outcome = await blockstore.read(ORG_ID, BlockID.new())
+        assert outcome == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+
+async def test_evict_by_size(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold, max_size=25)
+        b1, b2, b3 = BlockID.new(), BlockID.new(), BlockID.new()
+
+        await blockstore.create(ORG_ID, b1, b"1" * 10)
+        await blockstore.create(ORG_ID, b2, b"2" * 10)
+        # Access b1 so that b2 becomes the least recently used block
+        await blockstore.read(ORG_ID, b1)
+        await blockstore.create(ORG_ID, b3, b"3" * 10)
+
+        assert blockstore.evictions == 1
+        assert blockstore.size == 20
+        await wait_for(lambda: not build_filesystem_path(tmp_path, ORG_ID, b2).exists())
+
+        # Evicted block is still available from the cold tier
+        assert await blockstore.read(ORG_ID, b2) == b"2" * 10
+        assert cold.reads == [b2]
+
+
+async def test_evict_by_age(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr("parsec.components.tiered_blockstore.time.time", lambda: now)
+    cold = SpyBlockStoreComponent()
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold, max_age=60)
+        b1, b2 = BlockID.new(), BlockID.new()
+
+        await blockstore.create(ORG_ID, b1, b"1" * 10)
+        now += 30
+        await blockstore.create(ORG_ID, b2, b"2" * 10)
+        now += 31
+        # Creating a block also triggers the eviction of the old ones
+        await blockstore.create(ORG_ID, BlockID.new(), b"")
+
+        assert blockstore.evictions == 1
+        await wait_for(lambda: not build_filesystem_path(tmp_path, ORG_ID, b1).exists())
+        assert build_filesystem_path(tmp_path, ORG_ID, b2).exists()
+
+
+async def test_write_back(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    cold.unavailable = True
+    block_id = BlockID.new()
+    marker = build_dirty_marker_path(tmp_path, ORG_ID, block_id)
+
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold, max_size=1, write_back=True)
+
+        # Cold tier is not needed to create the block...
+        assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+        await wait_for(lambda: len(cold.creates) > 0)
+        assert marker.exists()
+        assert cold.blocks == {}
+        # ...and dirty blocks are never evicted, even if the hot tier is full
+        assert blockstore.evictions == 0
+        assert await blockstore.read(ORG_ID, block_id) == b"<block data>"
+
+    # Restart the server: upload to the cold tier is resumed
+    cold.unavailable = False
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold, max_size=1, write_back=True)
+        assert blockstore.dirty_size == len(b"<block data>")
+        await wait_for(lambda: blockstore.dirty_size == 0)
+
+        assert cold.blocks == {(ORG_ID, block_id): b"<block data>"}
+        assert not marker.exists()
+        # Now that the block is safely stored in the cold tier, it can be evicted
+        assert blockstore.dirty_size == 0
+        assert blockstore.evictions == 1
+
+
+async def test_delete(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    cold.unavailable = True
+    b1, b2 = BlockID.new(), BlockID.new()
+
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold, write_back=True)
+        assert await blockstore.create(ORG_ID, b1, b"<block 1 data>") is None
+        assert await blockstore.create(ORG_ID, b2, b"<block 2 data>") is None
+        await wait_for(lambda: len(cold.creates) == 2)
+
+        # Block must be removed from both tiers
+        outcome = await blockstore.delete(ORG_ID, b1)
+        assert outcome == BlockStoreDeleteBadOutcome.STORE_UNAVAILABLE
+        cold.unavailable = False
+        assert await blockstore.delete(ORG_ID, b1) is None
+        assert await blockstore.delete(ORG_ID, b2) is None
+
+        assert blockstore.size == blockstore.dirty_size == 0
+        for block_id in (b1, b2):
+            assert not build_filesystem_path(tmp_path, ORG_ID, block_id).exists()
+            assert not build_dirty_marker_path(tmp_path, ORG_ID, block_id).exists()
+            outcome = await blockstore.read(ORG_ID, block_id)
+            assert outcome == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
+
+
+async def test_delete_during_write_back(tmp_path: Path) -> None:
+    cold = SpyBlockStoreComponent()
+    cold.create_gate = anyio.Event()
+    block_id = BlockID.new()
+
+    async with tiered_factory(tmp_path) as factory:
+        blockstore = factory(cold, write_back=True)
+        assert await blockstore.create(ORG_ID, block_id, b"<block data>") is None
+        # Upload to the cold tier is in progress...
+        await wait_for(lambda: len(cold.creates) == 1)
+
+        # ...when the block gets deleted
+        assert await blockstore.delete(ORG_ID, block_id) is None
+        assert cold.deletes == [block_id]
+
+        # Upload finishes after the delete, the block must not come back
+        cold.create_gate.set()
+        await wait_for(lambda: len(cold.deletes) == 2)
+        assert cold.blocks == {}
+        assert not build_dirty_marker_path(tmp_path, ORG_ID, block_id).exists()
+        outcome = await blockstore.read(ORG_ID, block_id)
+        assert outcome == BlockStoreReadBadOutcome.BLOCK_NOT_FOUND
@@ -4,28 +4,32 @@ from __future__ import annotations
 import pytest
 from click import BadParameter
 
-from parsec.cli.options import _parse_blockstore_params
+from parsec.cli.options import parse_blockstore_params
 from parsec.config import (
+    FilesystemBlockStoreConfig,
+    FilesystemBlockStoreDurability,
     MockedBlockStoreConfig,
     PostgreSQLBlockStoreConfig,
     RAID0BlockStoreConfig,
+    RAID0BlockStorePlacement,
+    ReedSolomonBlockStoreConfig,
     S3BlockStoreConfig,
     SWIFTBlockStoreConfig,
 )
 
 
 def test_parse_mocked() -> None:
-    config = _parse_blockstore_params(["MOCKED"])
+    config = parse_blockstore_params(["MOCKED"])
     assert config == MockedBlockStoreConfig()
 
 
 def test_parse_postgresql() -> None:
-    config = _parse_blockstore_params(["POSTGRESQL"])
+    config = parse_blockstore_params(["POSTGRESQL"])
     assert config == PostgreSQLBlockStoreConfig()
 
 
 def test_parse_s3() -> None:
-    config = _parse_blockstore_params(["s3:s3.example.com:region1:bucketA:key123:S3cr3t"])
+    config = parse_blockstore_params(["s3:s3.example.com:region1:bucketA:key123:S3cr3t"])
     assert config == S3BlockStoreConfig(
         s3_endpoint_url="https://s3.example.com",
         s3_region="region1",
@@ -36,7 +40,7 @@ def test_parse_s3() -> None:
 
 
 def test_parse_s3_with_default_endpoint() -> None:
-    config = _parse_blockstore_params(["s3::region1:bucketA:key123:S3cr3t"])
+    config = parse_blockstore_params(["s3::region1:bucketA:key123:S3cr3t"])
     assert config == S3BlockStoreConfig(
         s3_endpoint_url=None,
         s3_region="region1",
@@ -46,8 +50,31 @@ def test_parse_s3_with_default_endpoint() -> None:
     )
 
 
+@pytest.mark.parametrize(
+    "extra, expected_max_concurrency, expected_max_pool_connections",
+    (
+        (":32", 32, 32),
+        (":4", 4, 10),
+        (":32:64", 32, 64),
+    ),
+)
+def test_parse_s3_with_max_concurrency(
+    extra: str, expected_max_concurrency: int, expected_max_pool_connections: int
+) -> None:
+    config = parse_blockstore_params([f"s3:s3.example.com:region1:bucketA:key123:S3cr3t{extra}"])
+    assert config == S3BlockStoreConfig(
+        s3_endpoint_url="https://s3.example.com",
+        s3_region="region1",
+        s3_bucket="bucketA",
+        s3_key="key123",
+        s3_secret="S3cr3t",
+        s3_max_concurrency=expected_max_concurrency,
+        s3_max_pool_connections=expected_max_pool_connections,
+    )
+
+
 def test_parse_s3_with_custom_url_scheme() -> None:
-    config = _parse_blockstore_params(
+    config = parse_blockstore_params(
         ["s3:http\\://s3.example.com:region1:bucketA:key123:\\:S3cr3t\\\\"]
     )
     assert config == S3BlockStoreConfig(
@@ -60,18 +87,32 @@ def test_parse_s3_with_custom_url_scheme() -> None:
 
 
 def test_parse_swift() -> None:
-    config = _parse_blockstore_params(["swift:swift.example.com:tenant2:containerB:user123:S3cr3t"])
+    config = parse_blockstore_params(["swift:swift.example.com:tenant2:containerB:user123:S3cr3t"])
+    assert config == SWIFTBlockStoreConfig(
+        swift_authurl="https://swift.example.com",
+        swift_tenant="tenant2",
+        swift_container="containerB",
+        swift_user="user123",
+        swift_password="S3cr3t",
+    )
+
+
+def test_parse_swift_with_max_concurrency() -> None:
+    config = parse_blockstore_params(
+        ["swift:swift.example.com:tenant2:containerB:user123:S3cr3t:32"]
+    )
     assert config == SWIFTBlockStoreConfig(
         swift_authurl="https://swift.example.com",
         swift_tenant="tenant2",
         swift_container="containerB",
         swift_user="user123",
         swift_password="S3cr3t",
+        swift_max_concurrency=32,
     )
 
 
 def test_parse_swift_custom_url_scheme() -> None:
-    config = _parse_blockstore_params(
+    config = parse_blockstore_params(
         ["swift:http\\://swift.example.com:tenant2:containerB:user123:\\:S3cr3t\\\\"]
     )
     assert config == SWIFTBlockStoreConfig(
@@ -83,8 +124,43 @@ def test_parse_swift_custom_url_scheme() -> None:
     )
 
 
+def test_parse_filesystem() -> None:
+    config = parse_blockstore_params(["filesystem:/var/lib/parsec/blocks"])
+    assert config == FilesystemBlockStoreConfig(
+        path="/var/lib/parsec/blocks",
+        durability=FilesystemBlockStoreDurability.FULL,
+    )
+
+
+@pytest.mark.parametrize("durability", FilesystemBlockStoreDurability)
+def test_parse_filesystem_with_durability(durability: FilesystemBlockStoreDurability) -> None:
+    config = parse_blockstore_params([f"filesystem:C\\:\\parsec:{durability.name.lower()}"])
+    assert config == FilesystemBlockStoreConfig(
+        path="C:\\parsec",  # Also test escaping in path
+        durability=durability,
+    )
+
+
+@pytest.mark.parametrize(
+    "param, expected_path, expected_durability",
+    (
+        ("filesystem:C:\\data", "C:\\data", FilesystemBlockStoreDurability.FULL),
+        ("filesystem:C:\\data:file", "C:\\data", FilesystemBlockStoreDurability.FILE),
+        # Not a known durability, hence part of the path
+        ("filesystem:/foo:dummy", "/foo:dummy", FilesystemBlockStoreDurability.FULL),
+        # Escaped colon, hence part of the path
+        ("filesystem:/foo\\:none", "/foo:none", FilesystemBlockStoreDurability.FULL),
+    ),
+)
+def test_parse_filesystem_path_with_colon(
+    param: str, expected_path: str, expected_durability: FilesystemBlockStoreDurability
+) -> None:
+    config = parse_blockstore_params([param])
+    assert config == FilesystemBlockStoreConfig(path=expected_path, durability=expected_durability)
+
+
 def test_parse_simple_raid() -> None:
-    config = _parse_blockstore_params(
+    config = parse_blockstore_params(
         [
             "raid0:0:MOCKED",
             "raid0:1:POSTGRESQL",
@@ -114,17 +190,43 @@ def test_parse_simple_raid() -> None:
     )
 
 
+def test_parse_raid0_migration() -> None:
+    config = parse_blockstore_params([f"raid0ch/raid0/2:{i}:MOCKED" for i in range(3)])
+    assert config == RAID0BlockStoreConfig(
+        blockstores=[MockedBlockStoreConfig() for _ in range(3)],
+        placement=RAID0BlockStorePlacement.CONSISTENT_HASHING,
+        previous_placement=RAID0BlockStorePlacement.MODULO,
+        previous_nodes_count=2,
+    )
+
+
+def test_parse_reed_solomon() -> None:
+    config = parse_blockstore_params([f"rs2:{i}:MOCKED" for i in range(5)])
+    assert config == ReedSolomonBlockStoreConfig(
+        blockstores=[MockedBlockStoreConfig() for _ in range(5)],
+        parity_shards=2,
+    )
+
+
 @pytest.mark.parametrize(
     "param",
     [
         "foo",  # Unknown type
         "s3:",  # Too few parts
-        "s3:s3.example.com:region1:bucketA:key123:S3cr3t:dummy",  # Too much parts
+        "s3:s3.example.com:region1:bucketA:key123:S3cr3t:dummy",  # Invalid max concurrency
+        "s3:s3.example.com:region1:bucketA:key123:S3cr3t:10:0",  # Invalid max pool connections
+        "s3:s3.example.com:region1:bucketA:key123:S3cr3t:10:10:dummy",  # Too much parts
+        "swift:swift.example.com:tenant2:containerB:user123:S3cr3t:dummy",  # Invalid max concurrency
+        "swift:swift.example.com:tenant2:containerB:user123:S3cr3t:0",  # Invalid max concurrency
+        "swift:swift.example.com:tenant2:containerB:user123:S3cr3t:10:dummy",  # Too much parts
+        "filesystem",  # Missing path
+        "filesystem:",  # Missing path
+        "filesystem::full",  # Missing path
     ],
 )
 def test_bad_single_param(param: str) -> None:
     with pytest.raises(BadParameter):
-        _parse_blockstore_params([param])
+        parse_blockstore_params([param])
 
 
 @pytest.mark.parametrize(
@@ -132,12 +234,12 @@ def test_bad_single_param(param: str) -> None:
     [
         "foo",  # Unknown type
         "s3:",  # Too few parts
-        "s3:s3.example.com:region1:bucketA:key123:S3cr3t:dummy",  # Too much parts
+        "s3:s3.example.com:region1:bucketA:key123:S3cr3t:10:10:dummy",  # Too much parts
     ],
 )
 def test_invalid_mix_raid_params(param: str) -> None:
     with pytest.raises(BadParameter):
-        _parse_blockstore_params([param])
+        parse_blockstore_params([param])
 
 
 @pytest.mark.parametrize(
@@ -149,8 +251,11 @@ def test_invalid_mix_raid_params(param: str) -> None:
         ["raid0:1:MOCKED", "raid0:2:MOCKED"],  # Hole in the nodes
         ["raid0:0:MOCKED", "raid0:2:MOCKED"],  # Hole in the nodes
         ["raid0:0:MOCKED", "raid0:0:MOCKED"],  # Same node multiple times
+        ["raid0ch/raid0ch/3:0:MOCKED", "raid0ch/raid0ch/3:1:MOCKED"],  # Nodes removed
+        ["rs0:0:MOCKED", "rs0:1:MOCKED"],  # No parity shard
+        ["rs2:0:MOCKED", "rs2:1:MOCKED"],  # No data shard
     ],
 )
 def test_bad_raid_params(params: list[str]) -> None:
     with pytest.raises(BadParameter):
-        _parse_blockstore_params(params)
+        parse_blockstore_params(params)
@@ -84,6 +84,65 @@ def test_dry_run(
     assert "Dry run" in result.output
 
 
+def test_purge_blocks(
+    tmp_path,
+    workspace_archived_template,
+) -> None:
+    runner = CliRunner()
+    blocks_file = tmp_path / "blocks.txt"
+    realm_id = workspace_archived_template["wksp_ready_to_delete_id"]
+
+    result = runner.invoke(
+        cli,
+        f"delete_realm {COMMON_ARGS}"
+        f" --organization {ORG}"
+        f" --realm {realm_id}"
+        f" --dump-realm-blocks {blocks_file}"
+        f" --purge-blockstore MOCKED",
+    )
+    assert result.exit_code == 0, result.output
+    slugs = [line for line in blocks_file.read_text().splitlines() if line.strip()]
+    assert len(slugs) == 5
+    assert "Deleted 5 block(s) from the blockstore" in result.output
+    # Purge is done, so no progress is kept
+    assert not (tmp_path / "blocks.txt.purge-progress").exists()
+
+
+def test_purge_blocks_resume(
+    tmp_path,
+    workspace_archived_template,
+) -> None:
+    runner = CliRunner()
+    blocks_file = tmp_path / "blocks.txt"
+    realm_id = workspace_archived_template["wksp_ready_to_delete_id"]
+
+    result = runner.invoke(
+        cli,
+        f"delete_realm {COMMON_ARGS}"
+        f" --organization {ORG}"
+        f" --realm {realm_id}"
+        f" --dump-realm-blocks {blocks_file}"
+        f" --dry-run",
+    )
+    assert result.exit_code == 0, result.output
+
+    # Simulate an interrupted purge
+    (tmp_path / "blocks.txt.purge-progress").write_text("3")
+
+    result = runner.invoke(
+        cli,
+        f"delete_realm {COMMON_ARGS}"
+        f" --organization {ORG}"
+        f" --realm {realm_id}"
+        f" --dump-realm-blocks {blocks_file}"
+        f" --purge-blockstore MOCKED",
+    )
+    assert result.exit_code == 0, result.output
+    assert "Resuming the purge" in result.output
+    assert "Deleted 5 block(s) from the blockstore" in result.output
+    assert not (tmp_path / "blocks.txt.purge-progress").exists()
+
+
 def test_realm_not_eligible(
     tmp_path,
     workspace_archived_template,
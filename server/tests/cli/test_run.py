@@ -2,20 +2,30 @@
 from __future__ import annotations
 
 import enum
+import os
+import signal
 import sys
-from collections.abc import Generator
+from collections.abc import Callable, Coroutine, Generator
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 from ssl import PROTOCOL_TLS_CLIENT, SSLContext
 from time import sleep
+from types import SimpleNamespace
+from typing import Any
 from urllib.error import URLError
 from urllib.request import urlopen
 
 import anyio
+import httpx
 import pytest
 import trustme
 from click.testing import CliRunner
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from parsec.asgi import serve_parsec_asgi_app
+from parsec.cli.run import _run_workers
 from tests.cli.common import cli_invoke_in_thread, cli_running
 from tests.common.client import CoolorgRpcClients
 
@@ -135,3 +145,102 @@ async def test_run_conflicting_scws_pkey_opts(
 
     assert "Error: Cannot have both a file & content set for SCWS private key" in result.output
     assert result.exit_code == 2
+
+
+async def test_run_workers_requires_postgresql(unused_tcp_port: int):
+    result = await cli_invoke_in_thread(
+        f"run --dev --port={unused_tcp_port} --host=127.0.0.1 --workers=2",
+    )
+
+    assert "Error: --workers requires a PostgreSQL database (see --db)" in result.output
+    assert result.exit_code == 1
+
+
+async def test_run_workers_rejects_hot_tier(unused_tcp_port: int, tmp_path: Path):
+    result = await cli_invoke_in_thread(
+        f"run --dev --port={unused_tcp_port} --host=127.0.0.1 --workers=2"
+        f" --blockstore-hot-tier={tmp_path}",
+    )
+
+    assert "Error: --blockstore-hot-tier is not compatible with --workers" in result.output
+    assert result.exit_code == 1
+
+
+def _build_pid_app() -> FastAPI:
+    app = FastAPI()
+    # The server only needs the backend to notify its shutdown
+    app.state.backend = SimpleNamespace(events=SimpleNamespace(stop=lambda: None))
+
+    @app.get("/")
+    async def pid() -> PlainTextResponse:
+        return PlainTextResponse(str(os.getpid()))
+
+    return app
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Workers are only supported on Linux")
+async def test_run_workers_start_and_stop(unused_tcp_port: int):
+    run_backend = partial(
+        serve_parsec_asgi_app,
+        app=_build_pid_app(),
+        host="127.0.0.1",
+        port=unused_tcp_port,
+        proxy_trusted_addresses=None,
+        ssl_ciphers=[],
+        reuse_port=True,
+    )
+
+    pids: set[int] = set()
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_run_workers, 2, run_backend)
+
+        # The workers listen on the same port, the kernel balances the connections
+        with anyio.fail_after(10):
+            while len(pids) < 2:
+                try:
+                    async with httpx.AsyncClient() as client:
+                        rep = await client.get(f"http://127.0.0.1:{unused_tcp_port}/")
+                except httpx.ConnectError:
+                    await anyio.sleep(0.1)
+                    continue
+                pids.add(int(rep.text))
+        assert os.getpid() not in pids
+
+        # Graceful stop of the whole service, no worker is reported as crashed
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    for pid in pids:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+
+async def _worker_returning() -> None:
+    # e.g. the server failed to start
+    pass
+
+
+async def _worker_raising() -> None:
+    raise RuntimeError("D'oh !")
+
+
+async def _worker_killed() -> None:
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Workers are only supported on Linux")
+@pytest.mark.parametrize(
+    "run_backend, expected_exit_code",
+    (
+        (_worker_returning, 0),
+        (_worker_raising, 1),
+        (_worker_killed, -signal.SIGKILL),
+    ),
+    ids=("returning", "raising", "killed"),
+)
+async def test_run_workers_crash(
+    run_backend: Callable[[], Coroutine[Any, Any, None]], expected_exit_code: int
+):
+    # A worker stopping on its own is a crash, whatever its exit code
+    with pytest.raises(SystemExit) as exc:
+        await _run_workers(2, run_backend)
+    assert f"has stopped unexpectedly (exit code {expected_exit_code})" in str(exc.value)
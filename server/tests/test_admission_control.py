@@ -0,0 +1,212 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import asyncio
+
+import pytest
+
+from parsec._parsec import OrganizationID, authenticated_cmds
+from parsec.admission_control import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUED,
+    ADMISSION_REJECTED,
+    AdmissionRejected,
+    OrganizationAdmissionControl,
+    retry_after_header,
+)
+from parsec.backend import Backend
+from parsec.components.auth import AuthenticatedToken
+from tests.common import CoolorgRpcClients
+
+ORG1 = OrganizationID("Org1")
+ORG2 = OrganizationID("Org2")
+
+
+async def test_disabled() -> None:
+    admission_control = OrganizationAdmissionControl(
+        max_in_flight=None, max_queued=0, rate=None, burst=1
+    )
+    assert not admission_control.enabled
+    for _ in range(10):
+        async with admission_control.admit(ORG1) as rejected:
+            assert rejected is None
+
+
+async def test_rate_limit() -> None:
+    now = 0.0
+    admission_control = OrganizationAdmissionControl(
+        max_in_flight=None, max_queued=0, rate=2, burst=3, clock=lambda: now
+    )
+
+    for _ in range(3):
+        async with admission_control.admit(ORG1) as rejected:
+            assert rejected is None
+    rejected_count = ADMISSION_REJECTED.get("rate_limited")
+    async with admission_control.admit(ORG1) as rejected:
+        assert rejected == AdmissionRejected(reason="rate_limited", retry_after=0.5)
+        assert retry_after_header(rejected) == "1"
+    assert ADMISSION_REJECTED.get("rate_limited") == rejected_count + 1
+
+    # Organizations are limited independently
+    async with admission_control.admit(ORG2) as rejected:
+        assert rejected is None
+
+    # Refilled by 2 tokens per second
+    now = 1.0
+    for _ in range(2):
+        async with admission_control.admit(ORG1) as rejected:
+            assert rejected is None
+    async with admission_control.admit(ORG1) as rejected:
+        assert rejected is not None
+
+    # Cost is capped to the burst size
+    now = 10.0
+    async with admission_control.admit(ORG1, cost=10) as rejected:
+        assert rejected is None
+    async with admission_control.admit(ORG1, cost=2) as rejected:
+        assert rejected == AdmissionRejected(reason="rate_limited", retry_after=1)
+
+
+async def test_max_in_flight() -> None:
+    admission_control = OrganizationAdmissionControl(
+        max_in_flight=1, max_queued=1, rate=None, burst=1
+    )
+    events: list[str] = []
+    release = asyncio.Event()
+
+    async def _request(name: str) -> None:
+        async with admission_control.admit(ORG1) as rejected:
+            if rejected is not None:
+                events.append(f"{name} {rejected.reason}")
+                return
+            events.append(f"{name} started")
+            await release.wait()
+        events.append(f"{name} done")
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_request("r1"))
+        await asyncio.sleep(0)
+        tg.create_task(_request("r2"))
+        await asyncio.sleep(0)
+        tg.create_task(_request("r3"))
+        await asyncio.sleep(0)
+
+        # Other organizations are not impacted
+        async with admission_control.admit(ORG2) as rejected:
+            assert rejected is None
+
+        assert events == ["r1 started", "r3 queue_full"]
+        admission_control.collect_metrics()
+        assert ADMISSION_IN_FLIGHT.get() == 1
+        assert ADMISSION_QUEUED.get() == 1
+        release.set()
+
+    assert events == ["r1 started", "r3 queue_full", "r1 done", "r2 started", "r2 done"]
+
+
+async def test_max_in_flight_multiple_slots() -> None:
+    admission_control = OrganizationAdmissionControl(
+        max_in_flight=3, max_queued=2, rate=None, burst=1
+    )
+    events: list[str] = []
+    releases = {name: asyncio.Event() for name in ("r1", "b1", "b2", "r2")}
+
+    async def _request(name: str, in_flight: int = 1) -> None:
+        async with admission_control.admit(ORG1, in_flight=in_flight) as rejected:
+            if rejected is not None:
+                events.append(f"{name} {rejected.reason}")
+                return
+            events.append(f"{name} started")
+            await releases[name].wait()
+        events.append(f"{name} done")
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_request("r1"))
+        await asyncio.sleep(0.01)
+        # Needs all the slots
+        tg.create_task(_request("b1", in_flight=3))
+        await asyncio.sleep(0.01)
+        # Queued behind the request waiting for multiple slots
+        tg.create_task(_request("r2"))
+        await asyncio.sleep(0.01)
+        tg.create_task(_request("b2", in_flight=3))
+        await asyncio.sleep(0.01)
+        assert events == ["r1 started", "b2 queue_full"]
+
+        admission_control.collect_metrics()
+        assert ADMISSION_QUEUED.get() == 2
+        releases["r1"].set()
+        await asyncio.sleep(0.01)
+        assert events == ["r1 started", "b2 queue_full", "r1 done", "b1 started"]
+
+        # Two requests taking multiple slots don't deadlock each other
+        tg.create_task(_request("b2", in_flight=3))
+        await asyncio.sleep(0.01)
+        releases["b1"].set()
+        await asyncio.sleep(0.01)
+        assert events[4:] == ["b1 done", "r2 started"]
+
+        releases["r2"].set()
+        await asyncio.sleep(0.01)
+        assert events[6:] == ["r2 done", "b2 started"]
+        releases["b2"].set()
+
+    assert events[8:] == ["b2 done"]
+    admission_control.collect_metrics()
+    assert ADMISSION_IN_FLIGHT.get() == 0
+    assert ADMISSION_QUEUED.get() == 0
+
+
+async def test_prune_idle_organizations(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("parsec.admission_control.ORGANIZATIONS_PRUNE_THRESHOLD", 2)
+    now = 0.0
+    admission_control = OrganizationAdmissionControl(
+        max_in_flight=1, max_queued=0, rate=1, burst=1, clock=lambda: now
+    )
+    org3, org4, org5 = (OrganizationID(f"Org{i}") for i in range(3, 6))
+
+    async def _admit(organization_id: OrganizationID) -> None:
+        async with admission_control.admit(organization_id) as rejected:
+            assert rejected is None
+
+    async with admission_control.admit(ORG1) as rejected:
+        assert rejected is None
+        await _admit(ORG2)
+
+        # Neither ORG1 (request in flight) nor ORG2 (empty token bucket) is idle
+        await _admit(org3)
+        assert admission_control._organizations.keys() == {ORG1, ORG2, org3}
+
+        # Threshold has been doubled since no organization could be pruned
+        now = 10.0
+        await _admit(org4)
+        assert len(admission_control._organizations) == 4
+        await _admit(org5)
+        assert admission_control._organizations.keys() == {ORG1, org4, org5}
+
+    # A pruned organization starts again with a full token bucket
+    await _admit(ORG2)
+    async with admission_control.admit(ORG2) as rejected:
+        assert rejected is not None
+
+
+async def test_rpc_rejected(coolorg: CoolorgRpcClients, backend: Backend) -> None:
+    backend.admission_control = OrganizationAdmissionControl(
+        max_in_flight=None, max_queued=0, rate=1, burst=1
+    )
+    client = coolorg.alice
+
+    rep = await client.ping(ping="hello")
+    assert rep == authenticated_cmds.latest.ping.RepOk(pong="hello")
+
+    token = AuthenticatedToken.generate_raw(
+        device_id=client.device_id,
+        timestamp=client.now_factory(),
+        key=client.signing_key,
+    )
+    rep = await client.raw_client.post(
+        client.url,
+        headers={"Authorization": f"Bearer {token.decode()}", **client.headers},
+        content=authenticated_cmds.latest.ping.Req(ping="hello").dump(),
+    )
+    assert rep.status_code == 503
+    assert rep.headers["Retry-After"] == "1"
@@ -0,0 +1,207 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import pytest
+
+from parsec._parsec import (
+    AccountAuthMethodID,
+    DateTime,
+    SecretKey,
+    ValidationCode,
+    authenticated_account_cmds,
+    invited_cmds,
+)
+from parsec.components.account import UntrustedPasswordAlgorithmArgon2id
+from parsec.events import EventAccountAuthMethodsDisabled, EventInvitation, EventOrganizationExpired
+
+from .common import AuthenticatedAccountRpcClient, Backend, CoolorgRpcClients, RpcTransportError
+
+
+async def test_invited_auth_cache_hit(backend: Backend, coolorg: CoolorgRpcClients) -> None:
+    cache = backend.auth._invited_cache
+
+    rep = await coolorg.invited_alice_dev3.ping(ping="hello")
+    assert rep == invited_cmds.latest.ping.RepOk(pong="hello")
+    assert len(cache) == 1
+    hits = cache.hits
+
+    rep = await coolorg.invited_alice_dev3.ping(ping="hello")
+    assert rep == invited_cmds.latest.ping.RepOk(pong="hello")
+    assert cache.hits == hits + 1
+
+
+@pytest.mark.parametrize("kind", ("cancelled", "completed", "organization_expired"))
+async def test_invited_auth_cache_invalidation(
+    kind: str, backend: Backend, coolorg: CoolorgRpcClients
+) -> None:
+    # Populate the cache
+    rep = await coolorg.invited_alice_dev3.ping(ping="hello")
+    assert rep == invited_cmds.latest.ping.RepOk(pong="hello")
+
+    with backend.event_bus.spy() as spy:
+        match kind:
+            case "cancelled":
+                outcome = await backend.invite.cancel(
+                    now=DateTime.now(),
+                    organization_id=coolorg.organization_id,
+                    author=coolorg.alice.device_id,
+                    token=coolorg.invited_alice_dev3.token,
+                )
+                expected_event_type = EventInvitation
+                expected_status_code = 410
+
+            case "completed":
+                outcome = await backend.invite.complete(
+                    now=DateTime.now(),
+                    organization_id=coolorg.organization_id,
+                    author=coolorg.alice.device_id,
+                    token=coolorg.invited_alice_dev3.token,
+                )
+                expected_event_type = EventInvitation
+                expected_status_code = 410
+
+            case "organization_expired":
+                outcome = await backend.organization.update(
+                    now=DateTime.now(), id=coolorg.organization_id, is_expired=True
+                )
+                expected_event_type = EventOrganizationExpired
+                expected_status_code = 460
+
+            case unknown:
+                assert False, unknown
+
+        assert outcome is None
+        # The auth component is connected to the event bus before the spy,
+        # so the cache has been invalidated once the spy has seen the event.
+        await spy.wait(expected_event_type)
+
+    with pytest.raises(RpcTransportError) as ctx:
+        await coolorg.invited_alice_dev3.ping(ping="hello")
+    assert ctx.value.rep.status_code == expected_status_code
+
+
+async def test_account_auth_cache_hit(
+    backend: Backend, alice_account: AuthenticatedAccountRpcClient
+) -> None:
+    cache = backend.auth._account_auth_cache
+
+    rep = await alice_account.ping(ping="hello")
+    assert rep == authenticated_account_cmds.latest.ping.RepOk(pong="hello")
+    assert len(cache) == 1
+    hits = cache.hits
+
+    rep = await alice_account.ping(ping="hello")
+    assert rep == authenticated_account_cmds.latest.ping.RepOk(pong="hello")
+    assert cache.hits == hits + 1
+
+
+@pytest.mark.parametrize(
+    "kind",
+    (
+        "password_change",
+        "auth_method_disable",
+        "vault_key_rotation",
+        "account_recover",
+        "account_delete",
+    ),
+)
+async def test_account_auth_cache_invalidation(
+    kind: str, backend: Backend, alice_account: AuthenticatedAccountRpcClient
+) -> None:
+    # Populate the cache
+    rep = await alice_account.ping(ping="hello")
+    assert rep == authenticated_account_cmds.latest.ping.RepOk(pong="hello")
+
+    new_auth_method_id = AccountAuthMethodID.new()
+    new_auth_method_mac_key = SecretKey.generate()
+    new_auth_method_password_algorithm = UntrustedPasswordAlgorithmArgon2id(
+        opslimit=65536, memlimit_kb=3, parallelism=1
+    )
+
+    with backend.event_bus.spy() as spy:
+        match kind:
+            case "password_change":
+                # Alice's current auth method is a password one, hence it gets
+                # disabled by the creation of a new password auth method.
+                outcome = await backend.account.auth_method_create(
+                    now=DateTime.now(),
+                    auth_method_id=alice_account.auth_method_id,
+                    created_by_user_agent="",
+                    created_by_ip="",
+                    new_auth_method_id=new_auth_method_id,
+                    new_auth_method_mac_key=new_auth_method_mac_key,
+                    new_auth_method_password_algorithm=new_auth_method_password_algorithm,
+                    new_vault_key_access=b"<vault_key_access>",
+                )
+
+            case "auth_method_disable":
+                outcome = await backend.account.auth_method_create(
+                    now=DateTime.now(),
+                    auth_method_id=alice_account.auth_method_id,
+                    created_by_user_agent="",
+                    created_by_ip="",
+                    new_auth_method_id=new_auth_method_id,
+                    new_auth_method_mac_key=new_auth_method_mac_key,
+                    new_auth_method_password_algorithm=None,
+                    new_vault_key_access=b"<vault_key_access>",
+                )
+                assert outcome is None
+                outcome = await backend.account.auth_method_disable(
+                    now=DateTime.now(),
+                    auth_method_id=new_auth_method_id,
+                    to_disable_auth_method_id=alice_account.auth_method_id,
+                )
+
+            case "vault_key_rotation":
+                outcome = await backend.account.vault_key_rotation(
+                    now=DateTime.now(),
+                    auth_method_id=alice_account.auth_method_id,
+                    created_by_ip="",
+                    created_by_user_agent="",
+                    new_auth_method_id=new_auth_method_id,
+                    new_auth_method_mac_key=new_auth_method_mac_key,
+                    new_auth_method_password_algorithm=new_auth_method_password_algorithm,
+                    new_vault_key_access=b"<vault_key_access>",
+                    items={},
+                )
+
+            case "account_recover":
+                validation_code = await backend.account.recover_send_validation_email(
+                    now=DateTime.now(), email=alice_account.account_email
+                )
+                assert isinstance(validation_code, ValidationCode)
+                outcome = await backend.account.recover_proceed(
+                    now=DateTime.now(),
+                    validation_code=validation_code,
+                    email=alice_account.account_email,
+                    created_by_user_agent="",
+                    created_by_ip="",
+                    new_vault_key_access=b"<vault_key_access>",
+                    new_auth_method_id=new_auth_method_id,
+                    new_auth_method_mac_key=new_auth_method_mac_key,
+                    new_auth_method_password_algorithm=new_auth_method_password_algorithm,
+                )
+
+            case "account_delete":
+                validation_code = await backend.account.delete_send_validation_email(
+                    now=DateTime.now(), auth_method_id=alice_account.auth_method_id
+                )
+                assert isinstance(validation_code, ValidationCode)
+                outcome = await backend.account.delete_proceed(
+                    now=DateTime.now(),
+                    auth_method_id=alice_account.auth_method_id,
+                    validation_code=validation_code,
+                )
+
+            case unknown:
+                assert False, unknown
+
+        assert outcome is None
+        # The auth component is connected to the event bus before the spy,
+        # so the cache has been invalidated once the spy has seen the event.
+        await spy.wait_event_occurred(
+            EventAccountAuthMethodsDisabled(account_email=alice_account.account_email)
+        )
+
+    with pytest.raises(RpcTransportError) as ctx:
+        await alice_account.ping(ping="hello")
+    assert ctx.value.rep.status_code == 403
@@ -0,0 +1,56 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+from parsec.indexed_cache import IndexedCache
+
+
+def test_lru_eviction() -> None:
+    cache: IndexedCache[str, int] = IndexedCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    # "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_rate == 0.75
+
+
+def test_ttl() -> None:
+    now = 0.0
+    cache: IndexedCache[str, int] = IndexedCache(max_size=10, ttl=5, clock=lambda: now)
+    cache.set("a", 1, indexes=["x"])
+    now = 4.9
+    assert cache.get("a") == 1
+    now = 5.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate_index() -> None:
+    cache: IndexedCache[str, int] = IndexedCache(max_size=10)
+    cache.set("a", 1, indexes=["org1", ("org1", "alice")])
+    cache.set("b", 2, indexes=["org1", ("org1", "bob")])
+    cache.set("c", 3, indexes=["org2", ("org2", "alice")])
+
+    cache.invalidate_index(("org1", "alice"))
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    cache.invalidate_index("org1")
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    # Unknown index is a noop
+    cache.invalidate_index("org1")
+
+    # Overwriting an entry updates its indexes
+    cache.set("c", 4, indexes=["org3"])
+    cache.invalidate_index("org2")
+    assert cache.get("c") == 4
+    cache.invalidate("c")
+    assert len(cache) == 0
@@ -0,0 +1,111 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import io
+import logging
+import multiprocessing
+import sys
+from pathlib import Path
+from typing import TextIO
+
+import pytest
+import structlog
+
+from parsec.logging import (
+    LazyField,
+    _make_filtering_bound_logger,
+    _make_sampling_processor,
+    _resolve_lazy_fields_processor,
+    queue_log_stream,
+)
+
+
+def test_sampling_processor() -> None:
+    processor = _make_sampling_processor({"RPC reply": 0, "RPC request": 1})
+    logger = logging.getLogger()
+
+    with pytest.raises(structlog.DropEvent):
+        processor(logger, "info", {"event": "RPC reply"})
+    # Warnings and errors are never sampled
+    for method_name in ("warning", "error"):
+        event = {"event": "RPC reply"}
+        assert processor(logger, method_name, event) is event
+    for message in ("RPC request", "SSE session start"):
+        event = {"event": message}
+        assert processor(logger, "info", event) is event
+
+
+def test_lazy_field() -> None:
+    calls = []
+
+    def _compute() -> dict[str, int]:
+        calls.append(None)
+        return {"a": 1}
+
+    field = LazyField(_compute)
+    assert not calls
+    event = _resolve_lazy_fields_processor(
+        logging.getLogger(), "info", {"event": "Foo", "field": field}
+    )
+    assert event == {"event": "Foo", "field": {"a": 1}}
+    assert repr(field) == "{'a': 1}"
+    assert len(calls) == 2
+
+
+def test_info_with_debug_extra_is_lazy() -> None:
+    calls = []
+
+    def _debug_extra() -> dict[str, str]:
+        calls.append(None)
+        return {"event": "EVENT_FOO", "bar": "bar"}
+
+    logs = []
+
+    def _collect(logger: object, method_name: str, event: dict[str, object]) -> str:
+        logs.append(event)
+        return ""
+
+    logger = _make_filtering_bound_logger(logging.DEBUG)(
+        structlog.ReturnLogger(),
+        processors=[
+            _make_sampling_processor({"Sampled out": 0}),
+            _resolve_lazy_fields_processor,
+            _collect,
+        ],
+        context={},
+    )
+
+    # Debug extra is not built for the sampled out logs...
+    logger.info_with_debug_extra("Sampled out", _debug_extra, foo="foo")
+    assert not calls
+    assert not logs
+
+    # ...but it is for the emitted ones
+    logger.info_with_debug_extra("Emitted", _debug_extra, foo="foo")
+    assert len(calls) == 1
+    assert logs == [{"event": "Emitted", "foo": "foo", "event_": "EVENT_FOO", "bar": "bar"}]
+
+
+def test_queue_log_stream() -> None:
+    output = io.StringIO()
+    with queue_log_stream(output, max_size=1000) as stream:
+        for i in range(100):
+            stream.write(f"line {i}\n")
+    assert output.getvalue() == "".join(f"line {i}\n" for i in range(100))
+
+
+def _write_lines(stream: TextIO) -> None:
+    for i in range(100):
+        print(f"line {i}", file=stream)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="No fork on Windows")
+def test_queue_log_stream_in_forked_process(tmp_path: Path) -> None:
+    log_file = tmp_path / "logs"
+    with log_file.open("w") as output, queue_log_stream(output) as stream:
+        # Similar to the workers of `parsec run --workers`
+        process = multiprocessing.get_context("fork").Process(target=_write_lines, args=(stream,))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        # The logs have been written by the forked process before it exited
+        assert log_file.read_text() == "".join(f"line {i}\n" for i in range(100))
@@ -0,0 +1,62 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import httpx
+
+from parsec._parsec import authenticated_cmds
+from parsec.metrics import MetricsRegistry
+from tests.common import AdminUnauthErrorsTester, CoolorgRpcClients
+
+
+def test_render() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("foo_total", "Foo counter.", labels=("cmd", "status"))
+    gauge = registry.gauge("bar", "Bar gauge.")
+    histogram = registry.histogram("baz_seconds", "Baz histogram.", buckets=(0.1, 1.0))
+
+    counter.inc("ping", "RepOk")
+    counter.inc("ping", "RepOk")
+    counter.inc('a"b', "RepOk")
+    registry.add_collector(lambda: gauge.set(42))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render() == (
+        "# HELP foo_total Foo counter.\n"
+        "# TYPE foo_total counter\n"
+        'foo_total{cmd="ping",status="RepOk"} 2\n'
+        'foo_total{cmd="a\\"b",status="RepOk"} 1\n'
+        "# HELP bar Bar gauge.\n"
+        "# TYPE bar gauge\n"
+        "bar 42\n"
+        "# HELP baz_seconds Baz histogram.\n"
+        "# TYPE baz_seconds histogram\n"
+        'baz_seconds_bucket{le="0.1"} 1\n'
+        'baz_seconds_bucket{le="1.0"} 2\n'
+        'baz_seconds_bucket{le="+Inf"} 3\n'
+        "baz_seconds_sum 5.55\n"
+        "baz_seconds_count 3\n"
+    )
+
+
+async def test_metrics_auth(
+    administration_route_unauth_errors_tester: AdminUnauthErrorsTester,
+) -> None:
+    async def do(client: httpx.AsyncClient):
+        return await client.get("http://parsec.invalid/metrics")
+
+    await administration_route_unauth_errors_tester(do)
+
+
+async def test_metrics(
+    coolorg: CoolorgRpcClients, administration_client: httpx.AsyncClient
+) -> None:
+    rep = await coolorg.alice.ping(ping="hello")
+    assert rep == authenticated_cmds.latest.ping.RepOk(pong="hello")
+
+    rep = await administration_client.get("http://parsec.invalid/metrics")
+    assert rep.status_code == 200, rep.content
+    assert rep.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'parsec_rpc_requests_total{cmd="ping",status="RepOk"}' in rep.text
+    assert 'parsec_rpc_request_duration_seconds_count{cmd="ping"}' in rep.text
+    assert 'parsec_auth_cache_lookups_total{cache="device",result="miss"}' in rep.text
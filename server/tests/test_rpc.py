@@ -3,6 +3,8 @@
 
 import httpx
 import pytest
+from fastapi import HTTPException, Request
+from starlette.types import Message
 
 from parsec._parsec import (
     ApiVersion,
@@ -12,6 +14,11 @@ from parsec._parsec import (
     authenticated_cmds,
     invited_cmds,
 )
+from parsec.asgi.rpc import (
+    BODY_INITIAL_BUFFER_SIZE,
+    MAX_CONTENT_LENGTH,
+    _rpc_get_body_with_limit_check,
+)
 from parsec.ballpark import BALLPARK_CLIENT_EARLY_OFFSET, BALLPARK_CLIENT_LATE_OFFSET
 from parsec.components.auth import AuthenticatedToken
 from tests.common import AuthenticatedAccountRpcClient, CoolorgRpcClients, RpcTransportError
@@ -551,3 +558,56 @@ async def test_authenticated_account_bad_auth(
     with pytest.raises(RpcTransportError) as exc:
         await client.ping(ping="hello")
     assert exc.value.rep.status_code == expected_status_code
+
+
+def _build_request(chunks: list[bytes], content_length: int | None) -> Request:
+    headers = (
+        [(b"content-length", str(content_length).encode())] if content_length is not None else []
+    )
+    messages: list[Message] = [
+        {"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks
+    ]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    messages.reverse()
+
+    async def receive() -> Message:
+        return messages.pop()
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+@pytest.mark.parametrize("with_content_length", (True, False))
+@pytest.mark.parametrize("chunk_size", (1000, BODY_INITIAL_BUFFER_SIZE, 300_000))
+async def test_rpc_get_body(with_content_length: bool, chunk_size: int) -> None:
+    body = bytes(range(256)) * (MAX_CONTENT_LENGTH // 256)
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    request = _build_request(chunks, len(body) if with_content_length else None)
+
+    assert await _rpc_get_body_with_limit_check(request) == body
+
+
+@pytest.mark.parametrize("kind", ("too_big_content_length", "longer_than_declared", "too_big"))
+async def test_rpc_get_body_too_big(kind: str) -> None:
+    match kind:
+        case "too_big_content_length":
+            request = _build_request([b"a"], MAX_CONTENT_LENGTH + 1)
+        case "longer_than_declared":
+            request = _build_request([b"a" * 1000, b"a"], 1000)
+        case "too_big":
+            request = _build_request([b"a" * 1000] * (MAX_CONTENT_LENGTH // 1000 + 1), None)
+        case unknown:
+            assert False, unknown
+
+    with pytest.raises(HTTPException) as exc:
+        await _rpc_get_body_with_limit_check(request)
+    assert exc.value.status_code == 413
+
+
+async def test_rpc_get_body_shorter_than_declared() -> None:
+    # The body is returned as-is (it will then fail to be deserialized), without
+    # having allocated the buffer for the announced size
+    request = _build_request([b"a" * 1000], MAX_CONTENT_LENGTH)
+    body = await _rpc_get_body_with_limit_check(request)
+    assert body == b"a" * 1000
+    assert isinstance(body.obj, bytearray)
+    assert len(body.obj) == BODY_INITIAL_BUFFER_SIZE
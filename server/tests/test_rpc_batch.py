@@ -0,0 +1,124 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import pytest
+
+from parsec._parsec import AccessToken, DeviceID, authenticated_cmds
+from parsec.asgi.rpc import BATCH_MAX_CONTENT_LENGTH
+from parsec.asgi.rpc_batch import dump_batch, load_batch
+from parsec.components.auth import AuthenticatedToken
+from tests.common import CoolorgRpcClients
+
+
+@pytest.mark.parametrize("items_count", (0, 1, 15, 16, 0x10000))
+def test_batch_roundtrip(items_count: int) -> None:
+    items = [b"", b"a" * 0xFF, b"b" * 0x100, b"c" * 0x10000][: min(items_count, 4)]
+    items += [b"x"] * (items_count - len(items))
+
+    raw = dump_batch(items)
+    assert [bytes(item) for item in load_batch(raw)] == items
+
+
+@pytest.mark.parametrize(
+    "raw",
+    (
+        b"",
+        # Not an array
+        b"\xc4\x01a",
+        # Items are not binaries
+        b"\x91\xa1a",
+        # Truncated
+        b"\x92\xc4\x01a",
+        b"\x91\xc4\x02a",
+        b"\xdc\x00",
+        # Trailing data
+        b"\x91\xc4\x01ab",
+    ),
+)
+def test_load_bad_batch(raw: bytes) -> None:
+    with pytest.raises(ValueError):
+        load_batch(raw)
+
+
+async def _post_batch(
+    coolorg: CoolorgRpcClients, content: bytes, concurrency: int | None = None
+) -> tuple[int, bytes]:
+    client = coolorg.alice
+    token = AuthenticatedToken.generate_raw(
+        device_id=client.device_id,
+        timestamp=client.now_factory(),
+        key=client.signing_key,
+    )
+    headers = {
+        "Authorization": f"Bearer {token.decode()}",
+        **client.headers,
+    }
+    if concurrency is not None:
+        headers["Batch-Concurrency"] = str(concurrency)
+    rep = await client.raw_client.post(f"{client.url}/batch", headers=headers, content=content)
+    return rep.status_code, rep.content
+
+
+@pytest.mark.parametrize("concurrency", (None, 4))
+async def test_authenticated_batch(coolorg: CoolorgRpcClients, concurrency: int | None) -> None:
+    reqs = [
+        authenticated_cmds.latest.ping.Req(ping="hello").dump(),
+        authenticated_cmds.latest.invite_cancel.Req(token=AccessToken.new()).dump(),
+        authenticated_cmds.latest.ping.Req(ping="world").dump(),
+    ]
+
+    status_code, content = await _post_batch(coolorg, dump_batch(reqs), concurrency)
+    assert status_code == 200, content
+
+    reps = load_batch(content)
+    assert len(reps) == 3
+    assert authenticated_cmds.latest.ping.Rep.load(bytes(reps[0])) == (
+        authenticated_cmds.latest.ping.RepOk(pong="hello")
+    )
+    assert authenticated_cmds.latest.invite_cancel.Rep.load(bytes(reps[1])) == (
+        authenticated_cmds.latest.invite_cancel.RepInvitationNotFound()
+    )
+    assert authenticated_cmds.latest.ping.Rep.load(bytes(reps[2])) == (
+        authenticated_cmds.latest.ping.RepOk(pong="world")
+    )
+
+
+async def test_authenticated_empty_batch(coolorg: CoolorgRpcClients) -> None:
+    status_code, content = await _post_batch(coolorg, dump_batch([]))
+    assert status_code == 200, content
+    assert load_batch(content) == []
+
+
+async def test_authenticated_batch_bad_auth_before_body(coolorg: CoolorgRpcClients) -> None:
+    client = coolorg.alice
+    token = AuthenticatedToken.generate_raw(
+        device_id=DeviceID.new(),
+        timestamp=client.now_factory(),
+        key=client.signing_key,
+    )
+    headers = {
+        "Authorization": f"Bearer {token.decode()}",
+        **client.headers,
+        # The body is rejected as too big only once the client is authenticated
+        "Content-Length": str(BATCH_MAX_CONTENT_LENGTH + 1),
+    }
+    rep = await client.raw_client.post(f"{client.url}/batch", headers=headers, content=b"")
+    assert rep.status_code == 403, rep.content
+
+
+@pytest.mark.parametrize("kind", ("bad_batch", "bad_command", "bad_concurrency"))
+async def test_authenticated_bad_batch(coolorg: CoolorgRpcClients, kind: str) -> None:
+    reqs = [authenticated_cmds.latest.ping.Req(ping="hello").dump()]
+    content = dump_batch(reqs)
+    concurrency = None
+    match kind:
+        case "bad_batch":
+            content = content[:-1]
+        case "bad_command":
+            content = dump_batch([*reqs, b"<dummy>"])
+        case "bad_concurrency":
+            concurrency = 0
+        case unknown:
+            assert False, unknown
+
+    status_code, _ = await _post_batch(coolorg, content, concurrency)
+    assert status_code == 415
@@ -0,0 +1,133 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import gzip
+import importlib
+import sys
+
+import pytest
+from fastapi.responses import StreamingResponse
+
+from parsec._parsec import authenticated_cmds
+from parsec.asgi import rpc_compression
+from parsec.asgi.rpc_compression import (
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_STREAMING_MIN_SIZE,
+    compressed_response,
+    negotiate_encoding,
+)
+from parsec.components.auth import AuthenticatedToken
+from tests.common import CoolorgRpcClients
+
+try:
+    from compression import zstd  # pyright: ignore[reportMissingImports] Python>=3.14 module
+except ImportError:
+    zstd = None
+
+requires_zstd = pytest.mark.skipif(zstd is None, reason="Python built without zstd support")
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    (
+        (None, None),
+        ("", None),
+        ("identity", None),
+        ("br", None),
+        ("gzip", "gzip"),
+        pytest.param("gzip, deflate, br, zstd", "zstd", marks=requires_zstd),
+        ("GZIP;q=0.5, zstd;q=0", "gzip"),
+        ("zstd;q=0, gzip;q=0", None),
+        pytest.param("*", "zstd", marks=requires_zstd),
+        ("zstd;q=0, *", "gzip"),
+    ),
+)
+def test_negotiate_encoding(accept_encoding: str | None, expected: str | None) -> None:
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_negotiate_encoding_without_zstd(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Simulate a Python built without libzstd (`None` makes the import fail, note
+    # the parent package is also patched given it may already have a `zstd` attribute)
+    monkeypatch.setitem(sys.modules, "compression", None)
+    monkeypatch.setitem(sys.modules, "compression.zstd", None)
+    try:
+        importlib.reload(rpc_compression)
+        assert list(rpc_compression.COMPRESSORS) == ["gzip"]
+        assert rpc_compression.negotiate_encoding("gzip, deflate, br, zstd") == "gzip"
+        assert rpc_compression.negotiate_encoding("*") == "gzip"
+        assert rpc_compression.negotiate_encoding("zstd") is None
+    finally:
+        monkeypatch.undo()
+        importlib.reload(rpc_compression)
+
+
+def _decompress(encoding: str, data: bytes) -> bytes:
+    match encoding:
+        case "zstd":
+            assert zstd is not None
+            return zstd.decompress(data)
+        case "gzip":
+            return gzip.decompress(data)
+        case unknown:
+            assert False, unknown
+
+
+@pytest.mark.parametrize("encoding", (pytest.param("zstd", marks=requires_zstd), "gzip"))
+@pytest.mark.parametrize("kind", ("small", "regular", "streaming"))
+async def test_compressed_response(encoding: str, kind: str) -> None:
+    match kind:
+        case "small":
+            content = b"a" * (COMPRESSION_MIN_SIZE - 1)
+        case "regular":
+            content = b"a" * COMPRESSION_MIN_SIZE
+        case "streaming":
+            content = bytes(range(256)) * (COMPRESSION_STREAMING_MIN_SIZE // 256 + 1)
+        case unknown:
+            assert False, unknown
+
+    rep = compressed_response(content, encoding, {"Content-Type": "application/msgpack"})
+    assert rep.status_code == 200
+    assert rep.headers["Content-Type"] == "application/msgpack"
+
+    if kind == "small":
+        assert "Content-Encoding" not in rep.headers
+        assert rep.body == content
+        return
+
+    assert rep.headers["Content-Encoding"] == encoding
+    if kind == "streaming":
+        assert isinstance(rep, StreamingResponse)
+        body = b"".join([chunk async for chunk in rep.body_iterator])  # type: ignore[misc]
+    else:
+        body = rep.body
+    assert len(body) < len(content)
+    assert _decompress(encoding, bytes(body)) == content
+
+
+@pytest.mark.parametrize("accept_encoding", ("gzip", "identity"))
+async def test_rpc_compressed_rep(coolorg: CoolorgRpcClients, accept_encoding: str) -> None:
+    client = coolorg.alice
+    ping = "a" * COMPRESSION_MIN_SIZE
+    token = AuthenticatedToken.generate_raw(
+        device_id=client.device_id,
+        timestamp=client.now_factory(),
+        key=client.signing_key,
+    )
+    rep = await client.raw_client.post(
+        client.url,
+        headers={
+            "Authorization": f"Bearer {token.decode()}",
+            "Accept-Encoding": accept_encoding,
+            **client.headers,
+        },
+        content=authenticated_cmds.latest.ping.Req(ping=ping).dump(),
+    )
+    assert rep.status_code == 200
+    if accept_encoding == "identity":
+        assert "Content-Encoding" not in rep.headers
+    else:
+        assert rep.headers["Content-Encoding"] == accept_encoding
+    # Note the reply is transparently decompressed by HTTPX
+    assert authenticated_cmds.latest.ping.Rep.load(rep.content) == (
+        authenticated_cmds.latest.ping.RepOk(pong=ping)
+    )
@@ -1,6 +1,5 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
 
-from collections import deque
 from unittest.mock import MagicMock
 
 import anyio
@@ -9,11 +8,17 @@ import pytest
 from parsec._parsec import (
     ActiveUsersLimit,
     DateTime,
+    DeviceID,
+    OrganizationID,
     RevokedUserCertificate,
     SigningKey,
+    UserID,
+    UserProfile,
+    VlobID,
     authenticated_cmds,
 )
-from parsec.events import EventPinged
+from parsec.components.events import RegisteredClient, RegisteredClientsRouting, SseEventsCache
+from parsec.events import EventCommonCertificate, EventPinged, EventRealmCertificate
 from tests.common import (
     Backend,
     CoolorgRpcClients,
@@ -41,8 +46,9 @@ async def test_events_listen_auth_then_not_allowed(
 
 
 async def test_missed_events(minimalorg: MinimalorgRpcClients, backend: Backend) -> None:
-    backend.config.sse_events_cache_size = 2
-    backend.events._last_events_cache = deque(maxlen=backend.config.sse_events_cache_size)
+    backend.events._last_events_cache = SseEventsCache(
+        max_events=2, organization_max_bytes=1024 * 1024, max_bytes=1024 * 1024
+    )
 
     # We use dispatch_incoming_event to ensure the event is processed immediately once the function return.
     # That allow to bypass the standard route of `EventBus.send` that goes through to event system of PostgreSQL.
@@ -286,3 +292,102 @@ async def test_close_on_organization_tos_updated(
         # And then the connection is closed
         with pytest.raises(StopAsyncIteration):
             event = await bob_sse.next_event()
+
+
+def test_clients_routing() -> None:
+    org1 = OrganizationID("Org1")
+    org2 = OrganizationID("Org2")
+    realm_id = VlobID.new()
+
+    def _client(organization_id: OrganizationID, user_id: UserID) -> RegisteredClient:
+        return RegisteredClient(
+            channel_sender=MagicMock(),
+            organization_id=organization_id,
+            device_id=DeviceID.new(),
+            user_id=user_id,
+            realms=set(),
+            profile=UserProfile.STANDARD,
+            cancel_scope=anyio.CancelScope(),
+        )
+
+    alice = UserID.new()
+    bob = UserID.new()
+    alice1 = _client(org1, alice)
+    alice2 = _client(org1, alice)
+    bob1 = _client(org1, bob)
+    other = _client(org2, alice)
+
+    routing = RegisteredClientsRouting()
+    for client in (alice1, alice2, bob1, other):
+        routing.add(client)
+
+    certificate = EventCommonCertificate(organization_id=org1, timestamp=DateTime.now())
+    assert routing.candidates(certificate) == [alice1, alice2, bob1]
+
+    # Realm is shared with Bob: the certificate goes to his clients even if they don't
+    # know about the realm yet
+    shared = EventRealmCertificate(
+        organization_id=org1,
+        timestamp=DateTime.now(),
+        realm_id=realm_id,
+        user_id=bob,
+        role_removed=False,
+    )
+    assert routing.candidates(shared) == [bob1]
+    routing.add_realm(alice1, realm_id)
+    routing.add_realm(bob1, realm_id)
+    assert bob1.realms == {realm_id}
+    assert routing.candidates(shared) == [alice1, bob1]
+
+    routing.discard_realm(alice1, realm_id)
+    assert alice1.realms == set()
+    assert routing.user_clients(org1, alice) == [alice1, alice2]
+
+    routing.remove(bob1)
+    routing.remove(alice1)
+    routing.remove(alice2)
+    assert routing.candidates(shared) == []
+    assert routing.organization_clients(org2) == [other]
+    # No empty entries are left behind
+    assert routing.by_organization.keys() == {org2}
+    assert routing.by_user.keys() == {(org2, alice)}
+    assert routing.by_realm == {}
+
+
+def test_events_cache() -> None:
+    org1 = OrganizationID("Org1")
+    org2 = OrganizationID("Org2")
+    cache = SseEventsCache(max_events=3, organization_max_bytes=100, max_bytes=150)
+
+    def _ping(organization_id: OrganizationID, size: int = 10) -> EventPinged:
+        event = EventPinged(organization_id=organization_id, ping="foo")
+        cache.append(event, size)
+        return event
+
+    e1, e2, e3 = _ping(org1), _ping(org1), _ping(org1)
+    assert list(cache.events_after(org1, e1.event_id) or ()) == [e2, e3]
+    assert list(cache.events_after(org1, e3.event_id) or ()) == []
+    # Organizations have their own history
+    assert cache.events_after(org2, e1.event_id) is None
+
+    # Too many events in the organization
+    e4 = _ping(org1)
+    assert cache.events_after(org1, e1.event_id) is None
+    assert list(cache.events_after(org1, e2.event_id) or ()) == [e3, e4]
+
+    # A burst in another organization doesn't evict the events of the first one...
+    for _ in range(10):
+        _ping(org2)
+    assert list(cache.events_after(org1, e2.event_id) or ()) == [e3, e4]
+
+    # ...unless the organization budget is exceeded (the last event is always kept)...
+    e5 = _ping(org2, size=200)
+    assert cache.events_after(org2, e5.event_id) is not None
+    assert cache.size == 200
+    # ...or the whole cache is, in which case the least recently active organization
+    # is evicted first
+    assert cache.events_after(org1, e4.event_id) is None
+    e6 = _ping(org1, size=50)
+    assert cache.events_after(org2, e5.event_id) is None
+    assert list(cache.events_after(org1, e6.event_id) or ()) == []
+    assert cache.size == 50
@@ -2,10 +2,11 @@
 
 import base64
 
+import anyio
 import pytest
 
-from parsec._parsec import AccountAuthMethodID, DateTime, SecretKey
-from parsec.components.auth import AccountAuthenticationToken
+from parsec._parsec import AccountAuthMethodID, DateTime, DeviceID, SecretKey, SigningKey
+from parsec.components.auth import AccountAuthenticationToken, AuthenticatedToken, TokenVerifier
 
 
 def gen_account_auth_token() -> tuple[bytes, AccountAuthenticationToken, SecretKey]:
@@ -68,3 +69,31 @@ def test_bad_format() -> None:
 
         with pytest.raises(ValueError):
             AccountAuthenticationToken.from_raw(bad_raw)
+
+
+async def test_token_verifier_batches_concurrent_verifications() -> None:
+    signing_key = SigningKey.generate()
+    other_signing_key = SigningKey.generate()
+    now = DateTime.now()
+    tokens = [
+        AuthenticatedToken.from_raw(
+            AuthenticatedToken.generate_raw(DeviceID.new(), now, signing_key)
+        )
+        for _ in range(10)
+    ]
+    verifier = TokenVerifier(max_threads=2)
+    results: dict[int, bool] = {}
+
+    async def _verify(index: int, token: AuthenticatedToken) -> None:
+        key = signing_key if index % 2 else other_signing_key
+        results[index] = await verifier.verify(token, key.verify_key)
+
+    async with anyio.create_task_group() as tg:
+        for index, token in enumerate(tokens):
+            tg.start_soon(_verify, index, token)
+
+    assert results == {index: bool(index % 2) for index in range(10)}
+    assert verifier.verifications == 10
+    # All the verifications have arrived together
+    assert verifier.batches == 1
+    assert verifier.average_verification_cost > 0
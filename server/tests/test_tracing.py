@@ -0,0 +1,78 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) BUSL-1.1 2016-present Scille SAS
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from parsec._parsec import authenticated_cmds
+from parsec.tracing import record_span, span, start_trace, tracing_factory
+from tests.common import CoolorgRpcClients
+
+
+def _load_spans(path: Path) -> list[dict[str, Any]]:
+    spans = []
+    for line in path.read_text().splitlines():
+        for resource_spans in json.loads(line)["resourceSpans"]:
+            for scope_spans in resource_spans["scopeSpans"]:
+                spans += scope_spans["spans"]
+    return spans
+
+
+def test_tracing(tmp_path: Path) -> None:
+    path = tmp_path / "spans.json"
+
+    with tracing_factory(export=str(path), sample_rate=1):
+        # Not in a trace, so not recorded
+        with span("orphan") as orphan:
+            assert orphan is None
+
+        with start_trace("root", foo="bar") as root:
+            assert root is not None
+            with span("child", count=1) as child:
+                assert child is not None
+                record_span("query", duration=0.1, error=False, statement="SELECT 1")
+            with pytest.raises(ValueError):
+                with span("failing"):
+                    raise ValueError
+
+    spans = {span["name"]: span for span in _load_spans(path)}
+    assert spans.keys() == {"root", "child", "query", "failing"}
+    assert {span["traceId"] for span in spans.values()} == {root.trace_id}
+
+    assert "parentSpanId" not in spans["root"]
+    assert spans["root"]["attributes"] == [{"key": "foo", "value": {"stringValue": "bar"}}]
+    assert spans["child"]["parentSpanId"] == root.span_id
+    assert spans["child"]["attributes"] == [{"key": "count", "value": {"intValue": "1"}}]
+    assert spans["query"]["parentSpanId"] == child.span_id
+    assert (
+        int(spans["query"]["endTimeUnixNano"]) - int(spans["query"]["startTimeUnixNano"])
+        == 100_000_000
+    )
+    assert spans["failing"]["parentSpanId"] == root.span_id
+    assert spans["failing"]["status"] == {"code": 2}
+
+
+def test_tracing_not_sampled(tmp_path: Path) -> None:
+    path = tmp_path / "spans.json"
+
+    with tracing_factory(export=str(path), sample_rate=0):
+        with start_trace("root") as root:
+            assert root is None
+            with span("child") as child:
+                assert child is None
+
+    assert _load_spans(path) == []
+
+
+async def test_rpc_traced(coolorg: CoolorgRpcClients, tmp_path: Path) -> None:
+    path = tmp_path / "spans.json"
+
+    with tracing_factory(export=str(path), sample_rate=1):
+        rep = await coolorg.alice.ping(ping="hello")
+        assert rep == authenticated_cmds.latest.ping.RepOk(pong="hello")
+
+    (rpc_span,) = _load_spans(path)
+    assert rpc_span["name"] == "rpc ping"
+    assert {"key": "rpc.status", "value": {"stringValue": "RepOk"}} in rpc_span["attributes"]